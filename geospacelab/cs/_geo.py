@@ -15,6 +15,7 @@ import numpy as np
 from geospacelab.cs._cs_base import SpaceCSBase, SphericalCoordinates, CartesianCoordinates, SpaceCartesianCS, SpaceSphericalCS
 import geospacelab.toolbox.utilities.pylogging as mylog
 import geospacelab.toolbox.utilities.pybasic as pybasic
+from geospacelab.cs.geo_utilities import rotation_matrix_ENU_to_GEOC, rotate_vectors
 
 
 class GEO(SpaceSphericalCS):
@@ -148,32 +149,19 @@ class LENUCartesian(SpaceCartesianCS):
         y_0 = cs_0['y']
         z_0 = cs_0['z']
 
-        R_1 = np.array([
-            [1,     0,                  0],
-            [0,     np.cos(theta_0),    np.sin(theta_0)],
-            [0,     -np.sin(theta_0),    np.cos(theta_0)]
-        ])
-
-        R_2 = np.array([
-            [-np.sin(phi_0),    np.cos(phi_0),     0],
-            [-np.cos(phi_0),     -np.sin(phi_0),     0],
-            [0,                 0,                  1]
-        ])
-
         x = self.coords.x
         y = self.coords.y
         z = self.coords.z
-        shape_x = x.shape
 
-        v = np.array([x.flatten(), y.flatten(), z.flatten()]).T
-        v_0 = np.array([x_0, y_0, z_0])
-        v_0 = np.tile(v_0, (x.size, 1))
+        v = np.stack(np.broadcast_arrays(x, y, z), axis=-1)
+        v_0 = np.stack(np.broadcast_arrays(x_0, y_0, z_0), axis=-1)
+        R = rotation_matrix_ENU_to_GEOC(theta_0, phi_0)
 
-        v_new = v @ R_1 @ R_2 + v_0
+        v_new = rotate_vectors(R, v) + v_0
 
-        x_new = np.reshape(v_new[:, 0], shape_x)
-        y_new = np.reshape(v_new[:, 1], shape_x)
-        z_new = np.reshape(v_new[:, 2], shape_x)
+        x_new = v_new[..., 0]
+        y_new = v_new[..., 1]
+        z_new = v_new[..., 2]
 
         coords = {'x': x_new, 'y': y_new, 'z': z_new}
 
@@ -487,29 +475,16 @@ class GEOCCartesian(SpaceCartesianCS):
         x = self.coords.x
         y = self.coords.y
         z = self.coords.z
-        shape_x = x.shape
-
-        v = np.array([x.flatten(), y.flatten(), z.flatten()]).T
-        v_0 = np.array([x_0, y_0, z_0])
-        v_0 = np.tile(v_0, (x.size, 1))
-
-        R_1 = np.array([
-            [-np.sin(phi_0), -np.cos(phi_0), 0],
-            [np.cos(phi_0), -np.sin(phi_0), 0],
-            [0, 0, 1]
-        ])
 
-        R_2 = np.array([
-            [1, 0, 0],
-            [0, np.cos(theta_0), -np.sin(theta_0)],
-            [0, np.sin(theta_0), np.cos(theta_0)]
-        ])
+        v = np.stack(np.broadcast_arrays(x, y, z), axis=-1)
+        v_0 = np.stack(np.broadcast_arrays(x_0, y_0, z_0), axis=-1)
+        R = rotation_matrix_ENU_to_GEOC(theta_0, phi_0)
 
-        v_new = (v - v_0) @ R_1 @ R_2
+        v_new = rotate_vectors(R, v - v_0, inverse=True)
 
-        x_new = np.reshape(v_new[:, 0], shape_x)
-        y_new = np.reshape(v_new[:, 1], shape_x)
-        z_new = np.reshape(v_new[:, 2], shape_x)
+        x_new = v_new[..., 0]
+        y_new = v_new[..., 1]
+        z_new = v_new[..., 2]
         cs_new = LENUCartesian(coords={'x': x_new, 'y': y_new, 'z': z_new}, lat_0=lat_0, lon_0=lon_0)
 
         if kind == 'sph':
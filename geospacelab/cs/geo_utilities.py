@@ -23,3 +23,40 @@ def convert_local_az_el_range_to_geo(lat_0, lon_0, height_0, az, el, beam_range=
     el = el * rd
 
 
+def rotation_matrix_ENU_to_GEOC(theta_0, phi_0):
+    """
+    Stacked rotation matrices from the local east-north-up (ENU) frames to the geocentric Cartesian frame.
+
+    :param theta_0: the co-latitudes of the origins of the local frames in radians, a scalar or an array.
+    :param phi_0: the longitudes of the origins of the local frames in radians, broadcastable to theta_0.
+    :return: the matrices with the shape of theta_0 + (3, 3). The columns are the unit vectors of
+        east, north, and up in the geocentric Cartesian frame.
+    """
+    theta_0, phi_0 = np.broadcast_arrays(np.asarray(theta_0, dtype=float), np.asarray(phi_0, dtype=float))
+    sin_theta, cos_theta = np.sin(theta_0), np.cos(theta_0)
+    sin_phi, cos_phi = np.sin(phi_0), np.cos(phi_0)
+    m = np.empty(theta_0.shape + (3, 3))
+    m[..., 0, 0] = -sin_phi
+    m[..., 1, 0] = cos_phi
+    m[..., 2, 0] = 0.
+    m[..., 0, 1] = -cos_theta * cos_phi
+    m[..., 1, 1] = -cos_theta * sin_phi
+    m[..., 2, 1] = sin_theta
+    m[..., 0, 2] = sin_theta * cos_phi
+    m[..., 1, 2] = sin_theta * sin_phi
+    m[..., 2, 2] = cos_theta
+    return m
+
+
+def rotate_vectors(matrices, vectors, inverse=False):
+    """
+    Applies stacked rotation matrices to stacked vectors as batched matrix products.
+
+    :param matrices: the rotation matrices with the shape (..., 3, 3).
+    :param vectors: the vectors with the shape (..., 3), broadcastable to the leading dimensions of matrices.
+    :param inverse: if True, applies the inverse (transpose) of the matrices.
+    :return: the rotated vectors with the shape (..., 3).
+    """
+    if inverse:
+        return np.einsum('...ji,...j->...i', matrices, vectors)
+    return np.einsum('...ij,...j->...i', matrices, vectors)
@@ -28,6 +28,8 @@ import numpy as np
 import geospacelab.toolbox.utilities.pylogging as mylog
 import geospacelab.toolbox.utilities.pybasic as pybasic
 import geospacelab.toolbox.utilities.pyclass as pyclass
+import geospacelab.toolbox.utilities.pydatetime as dttool
+import geospacelab.toolbox.utilities.numpyarray as arraytool
 from geospacelab.config import pref
 
 
@@ -224,6 +226,70 @@ class DatasetBase(object):
     def get_variable_names(self) -> list:
         return list(self._variables.keys())
 
+    def search_crossings(self, var_name, value, var_datetime_name=None, period=None, **conditions):
+        """
+        Search the times when a variable crosses a value, e.g., when a satellite crosses a magnetic latitude.
+        The crossings are the sign changes of the variable minus the value, refined by the linear interpolation
+        (see :func:`search_crossings <geospacelab.toolbox.utilities.numpyarray.search_crossings>`).
+        The crossings can be filtered by the ranges of the other variables interpolated at the crossing times, e.g.,
+
+            >>> dts_c, inds = dataset.search_crossings('SC_AACGM_LAT', 66.6, SC_GEO_LON=[8., 32.])
+
+        :param var_name: the name of the variable.
+        :param value: the value to be crossed.
+        :param var_datetime_name: the name of the time variable. If None, the UT dependence of the variable,
+            or 'DATETIME'.
+        :param period: the period of the variable. If None, it is inferred from the name,
+            see :meth:`get_variable_period`.
+        :param conditions: the ranges [v_0, v_1] of the other variables at the crossing times.
+        :return: dts_c, inds, the crossing times, and the indices of the samples nearest to the crossings.
+        """
+        dts = self._get_variable_datetimes(var_name, var_datetime_name)
+        if not dts.size:
+            return np.array([], dtype=object), np.array([], dtype=int)
+        x, dt0 = dttool.convert_datetime_to_sectime(dts, dt0=dts[0])
+        if period is None:
+            period = self.get_variable_period(var_name)
+        x_c, _ = arraytool.search_crossings(x, self._get_variable_series(var_name, x.size), value, period=period)
+
+        mask = np.ones(x_c.shape, dtype=bool)
+        for name, value_range in conditions.items():
+            p = self.get_variable_period(name)
+            y_c = arraytool.interp_series(x, self._get_variable_series(name, x.size), x_c, period=p)
+            mask &= arraytool.mask_in_range(y_c, value_range, period=p)
+        x_c = x_c[mask]
+
+        dts_c = np.array([dt0 + datetime.timedelta(seconds=sectime) for sectime in x_c], dtype=object)
+        inds = arraytool.search_nearest_indices(x, x_c)
+        return dts_c, inds
+
+    @staticmethod
+    def get_variable_period(var_name):
+        """
+        Infer the period of a variable from its name, 24. for the local times (MLT, LST),
+        360. for the longitudes (LON), or None.
+        """
+        name = var_name.upper()
+        if 'MLT' in name or 'LST' in name:
+            return 24.
+        if 'LON' in name:
+            return 360.
+        return None
+
+    def _get_variable_datetimes(self, var_name, var_datetime_name=None):
+        if var_datetime_name is not None:
+            return self[var_datetime_name].value.flatten()
+        depend = self[var_name].get_depend(axis=0, retrieve_data=True)
+        if depend is not None and depend.get('UT', None) is not None:
+            return np.asarray(depend['UT']).flatten()
+        return self['DATETIME'].value.flatten()
+
+    def _get_variable_series(self, var_name, size):
+        value = self[var_name].value
+        if value is None or value.size != size:
+            raise ValueError("The variable {} is not a series along the times!".format(var_name))
+        return value.flatten()
+
     def register_method(self, func):
         from types import MethodType
         setattr(self, func.__name__, MethodType(func, self))
@@ -9,6 +9,7 @@ __email__ = "lei.cai@oulu.fi"
 __docformat__ = "reStructureText"
 
 import copy
+import datetime
 import weakref
 import re
 
@@ -20,6 +21,15 @@ import geospacelab.toolbox.utilities.pylogging as mylog
 import geospacelab.toolbox.utilities.pybasic as basic
 
 
+def _copy_value(value):
+    # Copying a data array is equivalent to a deep copy if the elements are immutable (numbers, datetimes, or strings),
+    # and avoids deep-copying the elements of an object array (e.g., datetimes) one by one.
+    if isinstance(value, np.ndarray) and (
+            value.dtype != object or value.size == 0 or isinstance(value.flat[0], (datetime.datetime, str))):
+        return value.copy()
+    return copy.deepcopy(value)
+
+
 class VisualAxis(object):
     """
     The attribute class appended to the Visual class for setting the attributes along an axis.
@@ -50,6 +60,7 @@ class VisualAxis(object):
         self.reverse = False
         self.visible = True
         self.shift = None
+        self.lod = None     # level-of-detail decimation of line plots along this axis, None follows the panel
 
     def config(self, logging=True, **kwargs):
         pyclass.set_object_attributes(self, append=False, logging=logging, **kwargs)
@@ -76,6 +87,7 @@ class VisualPlotConfig(object):
         self.scatter = {}
         self.fill_between = {}
         self.style = None # "1E", "1P" or "1noE", "1S", "1B", "2P"
+        self.raster = None  # draw "2P" as an image: 'auto', 'regrid', or False. None follows the panel
 
     def config(self, logging=True, **kwargs):
         pyclass.set_object_attributes(self, append=False, logging=logging, **kwargs)
@@ -373,7 +385,7 @@ class VariableBase(object):
             depend = self.depends[axis]
         else:
             return None
-        depend_new = copy.deepcopy(depend)
+        depend_new = {key: _copy_value(value) for key, value in depend.items()}
         if retrieve_data:
             for key, value in depend.items():
                 if isinstance(value, str):
@@ -382,7 +394,7 @@ class VariableBase(object):
                     except KeyError:
                         print('The variable {} has not been assigned!'.format(key))
                         value = None
-                depend_new[key] = copy.deepcopy(value)
+                    depend_new[key] = _copy_value(value)
         return depend_new
 
     def set_depend(self, axis, depend_dict):
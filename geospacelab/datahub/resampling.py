@@ -0,0 +1,165 @@
+# Licensed under the BSD 3-Clause License
+# Copyright (C) 2021 GeospaceLab (geospacelab)
+# Author: Lei Cai, Space Physics and Astronomy, University of Oulu
+
+__author__ = "Lei Cai"
+__copyright__ = "Copyright 2021, GeospaceLab"
+__license__ = "BSD-3-Clause License"
+__email__ = "lei.cai@oulu.fi"
+__docformat__ = "reStructureText"
+
+import datetime
+
+import numpy as np
+
+import geospacelab.toolbox.utilities.pydatetime as dttool
+import geospacelab.toolbox.utilities.numpyarray as arraytool
+from geospacelab.datahub.__dataset_base__ import DatasetUser
+
+
+class TimeResampler(object):
+    """
+    Resample the series from the original times to the target times. The positions of the target times are
+    searched once, and the weights are shared by all the variables:
+
+        - 'linear': the linear interpolation between the two samples around a target time.
+        - 'circular': the linear interpolation along the shorter arc for a periodic quantity,
+          e.g., the longitudes or the local times.
+        - 'nearest': the nearest sample, e.g., for the flags.
+
+    The target times out of the original times, or in a data gap, where the nearest sample is farther than
+    data_time_res / 1.5, are masked.
+
+    :param x_0: the original times (numeric), monotonically increasing.
+    :param x_1: the target times (numeric).
+    :param data_time_res: the time resolution of the original data. If None, the median step of x_0 is used.
+    """
+
+    def __init__(self, x_0, x_1, data_time_res=None):
+        x_0 = np.asarray(x_0, dtype=float).flatten()
+        x_1 = np.asarray(x_1, dtype=float).flatten()
+        if x_0.size < 2:
+            raise ValueError("At least two samples are required for the resampling!")
+        if data_time_res is None:
+            data_time_res = np.median(np.diff(x_0))
+        self.size_0 = x_0.size
+        self.size_1 = x_1.size
+
+        self.inds_0 = np.clip(np.searchsorted(x_0, x_1, side='right') - 1, 0, x_0.size - 2)
+        self.inds_1 = self.inds_0 + 1
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.weights = (x_1 - x_0[self.inds_0]) / (x_0[self.inds_1] - x_0[self.inds_0])
+        # the nearest sample is the left one at a half step.
+        self.inds_nearest = np.where(self.weights > 0.5, self.inds_1, self.inds_0)
+        self.mask = (np.abs(x_0[self.inds_nearest] - x_1) > data_time_res / 1.5) \
+            | (x_1 < x_0[0]) | (x_1 > x_0[-1])
+
+    def __call__(self, values, method='linear', period=None, masked=False):
+        """
+        Resample the values of a variable.
+
+        :param values: the values, values.shape[0] == x_0.size.
+        :param method: 'linear', 'circular', or 'nearest'.
+        :param period: the period for 'circular', e.g., 360. for the longitudes or 24. for the local times.
+            The results are in [0, period).
+        :param masked: if True, a masked array is returned, otherwise, the masked values are NaN
+            (None for the non-numeric values).
+        :return: the resampled values, of the shape (x_1.size, ) + values.shape[1:].
+        """
+        values = np.asarray(values)
+        shape = (self.size_1, ) + values.shape[1:]
+        values = values.reshape((self.size_0, -1))
+        if method == 'nearest':
+            values_new = values[self.inds_nearest]
+        elif method in ['linear', 'circular']:
+            values = values.astype(float)
+            v_0 = values[self.inds_0]
+            dv = values[self.inds_1] - v_0
+            if method == 'circular':
+                dv = arraytool.wrap_difference(dv, period)
+            w = self.weights[:, np.newaxis]
+            # the exact samples are kept next to a NaN.
+            values_new = v_0 + np.where(w == 0, 0., w * dv)
+            if method == 'circular':
+                values_new = np.mod(values_new, period)
+        else:
+            raise NotImplementedError
+        values_new = values_new.reshape(shape)
+        mask = np.broadcast_to(self.mask.reshape((self.size_1, ) + (1, ) * (len(shape) - 1)), shape)
+        if masked:
+            return np.ma.array(values_new, mask=mask)
+        if not np.issubdtype(values_new.dtype, np.number):
+            values_new = values_new.astype(object)
+            values_new[mask] = None
+        else:
+            values_new = values_new.astype(float)
+            values_new[mask] = np.nan
+        return values_new
+
+
+def resample_evenly(
+        dataset, time_res, data_time_res=None, dt_fr=None, dt_to=None, var_datetime_name='SC_DATETIME',
+        periods=None, nearest_variables=None, masked=False):
+    """
+    Resample a dataset to the evenly spaced times, with one :class:`TimeResampler` for all the variables along
+    the times. The variables which are not series along the times are copied.
+
+    :param dataset: the dataset.
+    :param time_res: the time resolution of the target times in seconds.
+    :param data_time_res: the time resolution of the data in seconds, for the gap mask, see :class:`TimeResampler`.
+    :param dt_fr: the first target time. If None, the time stepped back from the first sample by the multiples
+        of time_res, as close as possible to dataset.dt_fr.
+    :param dt_to: the last target time. If None, the time stepped forward from the last sample by the multiples
+        of time_res, as close as possible to dataset.dt_to.
+    :param var_datetime_name: the name of the time variable.
+    :param periods: a dict of the periods of the circular variables. If None, the periods are inferred from the
+        variable names, see :meth:`DatasetBase.get_variable_period <geospacelab.datahub.DatasetBase.get_variable_period>`.
+    :param nearest_variables: a list of the variables resampled with the nearest samples. If None, the variables
+        having 'FLAG' in the names.
+    :param masked: if True, the values are masked arrays, otherwise, the masked values are NaN.
+    :return: a new dataset, DatasetUser.
+    """
+    ds_new = DatasetUser(dt_fr=dataset.dt_fr, dt_to=dataset.dt_to, visual=dataset.visual)
+    ds_new.clone_variables(dataset)
+    dts = ds_new[var_datetime_name].value.flatten()
+    dt0 = dttool.get_start_of_the_day(dts[0])
+    x_0, _ = dttool.convert_datetime_to_sectime(dts, dt0=dt0)
+    if dt_fr is None:
+        dt_fr = dts[0] - datetime.timedelta(
+            seconds=np.floor(((dts[0] - ds_new.dt_fr).total_seconds() / time_res)) * time_res
+        )
+    if dt_to is None:
+        dt_to = dts[-1] + datetime.timedelta(
+            seconds=np.floor(((ds_new.dt_to - dts[-1]).total_seconds() / time_res)) * time_res
+        )
+    sec_fr = (dt_fr - dt0).total_seconds()
+    sec_to = (dt_to - dt0).total_seconds()
+    x_1 = np.arange(sec_fr, sec_to + time_res / 2, time_res)
+
+    resampler = TimeResampler(x_0, x_1, data_time_res=data_time_res)
+
+    dts_new = dt0 + x_1.astype(object) * datetime.timedelta(seconds=1)
+    ds_new[var_datetime_name].value = dts_new.reshape((dts_new.size, 1))
+
+    for var_name in ds_new.keys():
+        if var_name == var_datetime_name:
+            continue
+        var = ds_new[var_name]
+        if var.value is None or np.shape(var.value)[0] != x_0.size:
+            continue
+        if periods is None:
+            period = ds_new.get_variable_period(var_name)
+        else:
+            period = periods.get(var_name, None)
+        if nearest_variables is None:
+            is_nearest = 'FLAG' in var_name.upper()
+        else:
+            is_nearest = var_name in nearest_variables
+        if is_nearest or not np.issubdtype(np.asarray(var.value).dtype, np.number):
+            method = 'nearest'
+        elif period is not None:
+            method = 'circular'
+        else:
+            method = 'linear'
+        var.value = resampler(var.value, method=method, period=period, masked=masked)
+    return ds_new
@@ -20,6 +20,7 @@ from geospacelab.config import prf
 import geospacelab.toolbox.utilities.pydatetime as dttool
 import geospacelab.toolbox.utilities.pybasic as basic
 import geospacelab.toolbox.utilities.pylogging as mylog
+from geospacelab.wrapper.geopack.geopack import geopack
 from geospacelab.datahub.sources.cdaweb.omni.loader import Loader as default_Loader
 from geospacelab.datahub.sources.cdaweb.omni.downloader import Downloader as default_Downloader
 import geospacelab.datahub.sources.cdaweb.omni.variable_config as var_config
@@ -284,6 +285,34 @@ class Dataset(datahub.DatasetSourced):
         self[var_name] = var
         return self[var_name]
 
+    def add_GSM_vector(self, var_names_GSE=None, var_names_GSM=None):
+        """
+        Converts a vector from GSE to GSM with the epoch of each record, and adds the components as new variables.
+
+        :param var_names_GSE: the names of the x, y, and z components in GSE, default ['v_x', 'v_y', 'v_z'].
+        :param var_names_GSM: the names of the new variables. If None, "_GSE" in var_names_GSE is replaced by "_GSM",
+            or "_GSM" is appended.
+        :return: the list of the new variables.
+        """
+        if var_names_GSE is None:
+            var_names_GSE = ['v_x', 'v_y', 'v_z']
+        if var_names_GSM is None:
+            var_names_GSM = [
+                vn.replace('_GSE', '_GSM') if '_GSE' in vn else vn + '_GSM' for vn in var_names_GSE
+            ]
+        uts, _ = dttool.convert_datetime_to_sectime(
+            self['DATETIME'].flatten(), dt0=datetime.datetime(1970, 1, 1))
+        comps = geopack.transform(
+            *[self[vn].flatten() for vn in var_names_GSE], 'gse', 'gsm', ut=uts
+        )
+        variables = []
+        for vn_GSE, vn_GSM, comp in zip(var_names_GSE, var_names_GSM, comps):
+            var = self[vn_GSE].clone(var_name=vn_GSM)
+            var.name = vn_GSM
+            var.value = comp.reshape(comp.size, 1)
+            variables.append(self[vn_GSM])
+        return variables
+
     def add_NCF(self):
         """
         Solar wind-magnetosphere coupling function by Newell et al., JGR, 2007.
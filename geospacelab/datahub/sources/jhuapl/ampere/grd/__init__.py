@@ -11,6 +11,7 @@ from geospacelab.datahub.sources.jhuapl import jhuapl_database
 from geospacelab.config import prf
 import geospacelab.toolbox.utilities.pybasic as basic
 import geospacelab.toolbox.utilities.pylogging as mylog
+import geospacelab.toolbox.utilities.numpyinterp as interptool
 import geospacelab.toolbox.utilities.pydatetime as dttool
 from geospacelab.datahub.sources.jhuapl.ampere.grd.loader import Loader as default_Loader
 from geospacelab.datahub.sources.jhuapl.ampere.grd.downloader import Downloader as default_Downloader
@@ -108,7 +109,15 @@ class Dataset(datahub.DatasetSourced):
         return ind
 
     def grid_fac(self, fac_data, mlat_data=None, mlt_data=None, mlt_res=0.05, mlat_res=0.05, interp_method='cubic'):
-        import scipy.interpolate as si
+        """
+        Interpolate the FACs onto a regular MLT-MLAT grid.
+
+        The triangulation of the (MLT, MLAT) lattice is cached by the grid geometry, and reused for the frames on
+        the same lattice. The frames can be gridded in a batch, with fac_data of the shape (nframes, nlon, nlat),
+        e.g., self['GRID_Jr'].value for all the frames.
+
+        :return: grid_mlat, grid_mlt, grid_fac. grid_fac has the shape (nframes, nmlt, nmlat) for a batch.
+        """
         x = np.arange(0, 24, mlt_res)
         if self.pole == 'S':
             y = np.arange(-90, -40, mlat_res)
@@ -121,19 +130,20 @@ class Dataset(datahub.DatasetSourced):
             mlt_data = self['GRID_MLT'].value[0, ::]
         if mlat_data is None:
             mlat_data = self['GRID_MLAT'].value[0, ::]
+        fac_data = np.asarray(fac_data)
 
         xdata = np.vstack((mlt_data, mlt_data[0, :]))
         xdata[mlt_data.shape[0], :] = 24.
 
         ydata = np.vstack((mlat_data, mlat_data[0, :]))
-        zdata = np.vstack((fac_data, fac_data[0, :]))
-
-        grid_fac = si.griddata(
-            (xdata.flatten(), ydata.flatten()),
-            zdata.flatten(),
-            (grid_x, grid_y),
-            method=interp_method
-        )
+        zdata = np.concatenate((fac_data, fac_data[..., :1, :]), axis=-2)
+        # (npoints,) or (npoints, nframes)
+        zdata = zdata.reshape(zdata.shape[:-2] + (-1,)).T
+
+        interpolator = interptool.get_interpolator((xdata, ydata), (grid_x, grid_y))
+        grid_fac = interpolator(zdata, method=interp_method)
+        if fac_data.ndim == 3:
+            grid_fac = np.moveaxis(grid_fac, -1, 0)
         grid_mlat = grid_y
         grid_mlt = grid_x
         return grid_mlat, grid_mlt, grid_fac
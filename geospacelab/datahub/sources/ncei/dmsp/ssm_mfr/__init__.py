@@ -12,6 +12,7 @@ import numpy as np
 import datetime
 
 import geospacelab.datahub as datahub
+import geospacelab.datahub.resampling as resampling
 from geospacelab.datahub import DatabaseModel, FacilityModel, InstrumentModel, ProductModel
 from geospacelab.datahub.sources.ncei import ncei_database
 from geospacelab.datahub.sources.ncei.dmsp import dmsp_facility
@@ -261,58 +262,19 @@ class Dataset(datahub.DatasetSourced):
         return done
 
     def interp_evenly(self, time_res=1, time_res_o=1, dt_fr=None, dt_to=None):
-        from scipy.interpolate import interp1d
-        import geospacelab.toolbox.utilities.numpymath as nm
-
-        ds_new = datahub.DatasetUser(dt_fr=self.dt_fr, dt_to=self.dt_to, visual=self.visual)
-        ds_new.clone_variables(self)
-        dts = ds_new['SC_DATETIME'].value.flatten()
-        dt0 = dttool.get_start_of_the_day(dts[0])
-        x_0 = np.array([(dt - dt0).total_seconds() for dt in dts])
+        dts = self['SC_DATETIME'].value.flatten()
+        # the default times are truncated to the whole seconds.
         if dt_fr is None:
             dt_fr = dts[0] - datetime.timedelta(
-                seconds=np.floor(((dts[0] - ds_new.dt_fr).total_seconds() / time_res)) * time_res
+                seconds=np.floor(((dts[0] - self.dt_fr).total_seconds() / time_res)) * time_res
             )
             dt_fr = datetime.datetime(dt_fr.year, dt_fr.month, dt_fr.day, dt_fr.hour, dt_fr.minute, dt_fr.second)
         if dt_to is None:
             dt_to = dts[-1] + datetime.timedelta(
-                seconds=np.floor(((ds_new.dt_to - dts[-1]).total_seconds() / time_res)) * time_res
+                seconds=np.floor(((self.dt_to - dts[-1]).total_seconds() / time_res)) * time_res
             )
             dt_to = datetime.datetime(dt_to.year, dt_to.month, dt_to.day, dt_to.hour, dt_to.minute, dt_to.second)
-        sec_fr = (dt_fr - dt0).total_seconds()
-        sec_to = (dt_to - dt0).total_seconds()
-        x_1 = np.arange(sec_fr, sec_to + time_res / 2, time_res)
-
-        f = interp1d(x_0, x_0, kind='nearest', bounds_error=False, fill_value=(x_0[0], x_0[-1]))
-        pseudo_x = f(x_1)
-        mask = np.abs(pseudo_x-x_1) > time_res_o/1.5
-
-        dts_new = np.array([dt0 + datetime.timedelta(seconds=sec) for sec in x_1])
-        ds_new['SC_DATETIME'].value = dts_new.reshape((dts_new.size, 1))
-
-        period_var_dict = {'SC_GEO_LON': 360.,
-                           'SC_AACGM_LON': 360.,
-                           'SC_APEX_LON': 360.,
-                           'SC_GEO_LST': 24.,
-                           'SC_AACGM_MLT': 24.,
-                           'SC_APEX_MLT': 24}
-
-        for var_name in ds_new.keys():
-            if var_name in ['SC_DATETIME']:
-                continue
-            if var_name in period_var_dict.keys():
-                var = ds_new[var_name].value.flatten()
-                var_new = nm.interp_period_data(x_0, var, x_1, period=period_var_dict[var_name], method='linear', bounds_error=False)
-                var_new[mask] = np.nan
-                ds_new[var_name].value = var_new.reshape((dts_new.size, 1))
-            else:
-                method = 'linear' if 'FLAG' not in var_name else 'nearest'
-                var = ds_new[var_name].value.flatten()
-                f = interp1d(x_0, var, kind=method, bounds_error=False)
-                var_new = f(x_1)
-                var_new[mask] = np.nan
-                ds_new[var_name].value = var_new.reshape((dts_new.size, 1))
-        return ds_new
+        return resampling.resample_evenly(self, time_res, data_time_res=time_res_o, dt_fr=dt_fr, dt_to=dt_to)
 
     def download_data(self, dt_fr=None, dt_to=None):
         if dt_fr is None:
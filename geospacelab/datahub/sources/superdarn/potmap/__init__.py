@@ -10,6 +10,8 @@ from geospacelab.datahub.sources.superdarn import superdarn_database
 from geospacelab.config import prf
 import geospacelab.toolbox.utilities.pybasic as basic
 import geospacelab.toolbox.utilities.pylogging as mylog
+import geospacelab.toolbox.utilities.numpyinterp as interptool
+import geospacelab.toolbox.utilities.numpyarray as arraytool
 from geospacelab.datahub.sources.superdarn.potmap.loader import Loader as default_Loader
 import geospacelab.datahub.sources.superdarn.potmap.variable_config as var_config
 
@@ -109,22 +111,56 @@ class Dataset(datahub.DatasetSourced):
         ind = np.where(np.abs(delta_sectime) == np.min(np.abs(delta_sectime)))[0][0]
         return ind
 
-    def grid_phi(self, mlat_data, mlt_data, phi_data, mlt_res=0.2, mlat_res=0.5, interp_method='cubic'):
-        import scipy.interpolate as si
+    def grid_phi(
+            self, mlat_data, mlt_data, phi_data, mlon_data=None, mlt_res=0.2, mlat_res=0.5, interp_method='cubic'):
+        """
+        Interpolate the electric potentials onto a regular MLT-MLAT grid.
+
+        If mlon_data is given, the (MLON/15, MLAT) lattice, which does not change with the time, is triangulated
+        once, and the MLT grid of each frame is shifted to the lattice by the MLT offset of the frame,
+        MLT - MLON/15. Otherwise, the (MLT, MLAT) lattice is triangulated. The triangulations are cached by the
+        lattice (see :func:`geospacelab.toolbox.utilities.numpyinterp.get_triangulation`). The frames can be
+        gridded in a batch, with phi_data of the shape (nframes, nlon, nlat). If mlat_data, mlt_data, and mlon_data
+        are of the same shape as phi_data, each frame is shifted by its own MLT offset.
+
+        :return: grid_mlat, grid_mlt, grid_phi. grid_phi has the shape (nframes, nmlt, nmlat) for a batch.
+        """
+        mlat_data = np.asarray(mlat_data)
+        mlt_data = np.asarray(mlt_data)
+        phi_data = np.asarray(phi_data)
+        if mlt_data.ndim == 3:
+            grids = [
+                self.grid_phi(
+                    mlat_data[i], mlt_data[i], phi_data[i],
+                    mlon_data=None if mlon_data is None else np.asarray(mlon_data)[i],
+                    mlt_res=mlt_res, mlat_res=mlat_res, interp_method=interp_method
+                )
+                for i in range(phi_data.shape[0])
+            ]
+            return grids[0][0], grids[0][1], np.array([grid[2] for grid in grids])
+
         x = np.arange(0, 24, mlt_res)
         y = np.arange(50, 90, mlat_res)
         grid_x, grid_y = np.meshgrid(x, y, indexing='ij')
 
-        xdata = np.vstack((mlt_data, mlt_data+24.))
+        if mlon_data is None:
+            x_lattice = mlt_data
+            grid_x_lattice = grid_x
+        else:
+            x_lattice = np.mod(np.asarray(mlon_data) / 15., 24)
+            d_mlt = np.mod(mlt_data - x_lattice, 24).flatten()
+            mlt_offset = d_mlt[0] + np.median(arraytool.wrap_difference(d_mlt - d_mlt[0], 24))
+            # The query points are shifted into [12, 36), inside the lattice and its copy at +24.
+            grid_x_lattice = np.mod(grid_x - mlt_offset - 12, 24) + 12
+        xdata = np.vstack((x_lattice, x_lattice + 24.))
         ydata = np.vstack((mlat_data, mlat_data))
-        zdata = np.vstack((phi_data, phi_data))
-        grid_phi = si.griddata(
-            (xdata.flatten(), ydata.flatten()),
-            zdata.flatten(),
-            (grid_x, grid_y),
-            method=interp_method,
-            rescale=False
-        )
+        zdata = np.concatenate((phi_data, phi_data), axis=-2)
+        # (npoints,) or (npoints, nframes)
+        zdata = zdata.reshape(zdata.shape[:-2] + (-1,)).T
+        interpolator = interptool.get_interpolator((xdata, ydata), (grid_x_lattice, grid_y))
+        grid_phi = interpolator(zdata, method=interp_method)
+        if phi_data.ndim == 3:
+            grid_phi = np.moveaxis(grid_phi, -1, 0)
         grid_mlat = grid_y
         grid_mlt = grid_x
         return grid_mlat, grid_mlt, grid_phi
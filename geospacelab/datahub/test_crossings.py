@@ -0,0 +1,63 @@
+import unittest
+import datetime
+import numpy as np
+
+from geospacelab.datahub import DatasetUser
+
+
+class SearchCrossings(unittest.TestCase):
+    """The crossings of a satellite track at a magnetic latitude, at the times known from the track."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dt0 = datetime.datetime(2016, 3, 14)
+        secs = np.arange(30., 6 * 3600., 60.)
+        # linear between the poles at the multiples of 3000 s, crossing 60 deg at 375 s and 5625 s in each orbit.
+        mlat = 80. * (2 * np.abs(np.mod(secs / 6000., 1.) * 2 - 1) - 1)
+        cls.secs = secs
+        cls.dts = np.array([cls.dt0 + datetime.timedelta(seconds=sec) for sec in secs])
+        cls.dataset = cls.create_dataset(cls.dts, mlat, np.mod(secs * 0.05 + 300., 360.))
+        cls.secs_c = np.array([375., 5625., 6375., 11625., 12375., 17625., 18375.])
+
+    @classmethod
+    def create_dataset(cls, dts, mlat, lon):
+        dataset = DatasetUser(dt_fr=cls.dt0, dt_to=cls.dt0 + datetime.timedelta(hours=6))
+        dataset.add_variable('SC_DATETIME', value=dts.reshape((-1, 1)))
+        dataset.add_variable('SC_GEO_LON', value=lon.reshape((-1, 1)))
+        var = dataset.add_variable('SC_AACGM_LAT', value=mlat.reshape((-1, 1)))
+        var.depends = {0: {'UT': 'SC_DATETIME'}}
+        return dataset
+
+    def get_secs(self, dts):
+        return np.array([(dt - self.dt0).total_seconds() for dt in dts])
+
+    def test_crossings(self):
+        dts_c, inds = self.dataset.search_crossings('SC_AACGM_LAT', 60.)
+        np.testing.assert_allclose(self.get_secs(dts_c), self.secs_c, atol=1e-6)
+        np.testing.assert_array_equal(
+            inds, np.argmin(np.abs(self.secs[np.newaxis, :] - self.secs_c[:, np.newaxis]), axis=1))
+
+    def test_conditions(self):
+        # the longitudes at the crossings are 318.75, 221.25, 258.75, 161.25, 198.75, 101.25, and 138.75.
+        dts_c, _ = self.dataset.search_crossings('SC_AACGM_LAT', 60., SC_GEO_LON=[250., 330.])
+        np.testing.assert_allclose(self.get_secs(dts_c), [375., 6375.], atol=1e-6)
+        # the range across 0.
+        dts_c, _ = self.dataset.search_crossings('SC_AACGM_LAT', 60., SC_GEO_LON=[300., 230.])
+        np.testing.assert_allclose(self.get_secs(dts_c), np.delete(self.secs_c, 2), atol=1e-6)
+
+    def test_gaps(self):
+        mlat = self.dataset['SC_AACGM_LAT'].value.flatten().copy()
+        mlat[(self.secs > 11000.) & (self.secs < 13000.)] = np.nan
+        dataset = self.create_dataset(self.dts, mlat, self.dataset['SC_GEO_LON'].value.flatten())
+        dts_c, _ = dataset.search_crossings('SC_AACGM_LAT', 60.)
+        np.testing.assert_allclose(self.get_secs(dts_c), np.delete(self.secs_c, [3, 4]), atol=1e-6)
+
+    def test_empty(self):
+        dataset = self.create_dataset(np.array([], dtype=object), np.array([]), np.array([]))
+        dts_c, inds = dataset.search_crossings('SC_AACGM_LAT', 60., SC_GEO_LON=[250., 330.])
+        self.assertEqual(dts_c.size, 0)
+        self.assertEqual(inds.size, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
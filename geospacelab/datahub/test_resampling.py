@@ -0,0 +1,102 @@
+import unittest
+import datetime
+import numpy as np
+from scipy.interpolate import interp1d
+
+import geospacelab.toolbox.utilities.numpymath as nm
+from geospacelab.datahub import DatasetUser
+from geospacelab.datahub.resampling import resample_evenly
+
+
+def interp_evenly_by_interp1d(dts, variables, x_1, dt0, data_time_res, periods):
+    """The reference: the interpolation of each variable by interp1d, as interp_evenly was implemented before."""
+    x_0 = np.array([(dt - dt0).total_seconds() for dt in dts])
+    f = interp1d(x_0, x_0, kind='nearest', bounds_error=False, fill_value=(x_0[0], x_0[-1]))
+    pseudo_x = f(x_1)
+    mask = np.abs(pseudo_x - x_1) > data_time_res / 1.5
+
+    results = {}
+    for var_name, var in variables.items():
+        if var_name in periods.keys():
+            var_new = nm.interp_period_data(
+                x_0, var, x_1, period=periods[var_name], method='linear', bounds_error=False)
+        else:
+            method = 'linear' if 'FLAG' not in var_name else 'nearest'
+            f = interp1d(x_0, var, kind=method, bounds_error=False)
+            var_new = f(x_1)
+        var_new[mask] = np.nan
+        results[var_name] = var_new
+    return results
+
+
+class ResampleEvenly(unittest.TestCase):
+    """resample_evenly should agree with the interpolation by interp1d on a track with the data gaps."""
+
+    data_time_res = 10.
+    # not a divisor of data_time_res, and no target time at the middle of two samples.
+    time_res = 6.
+    periods = {'SC_GEO_LON': 360., 'SC_GEO_LST': 24.}
+
+    @staticmethod
+    def get_lon(secs):
+        # the longitudes in [-180, 180), crossing the date line several times.
+        return np.mod(secs * 0.0637 + 150., 360.) - 180.
+
+    @classmethod
+    def get_lst(cls, secs):
+        return np.mod(secs / 3600. + cls.get_lon(secs) / 15., 24.)
+
+    @classmethod
+    def setUpClass(cls):
+        dt0 = datetime.datetime(2018, 7, 1)
+        secs = np.arange(3., 4 * 3600., cls.data_time_res)
+        rng = np.random.default_rng(2018)
+        for ind in rng.choice(secs.size - 100, 6, replace=False):
+            secs[ind:ind + int(rng.integers(2, 100))] = np.nan
+        secs = secs[np.isfinite(secs)]
+
+        cls.variables = {
+            'SC_GEO_LAT': 80. * np.sin(2 * np.pi * secs / 5640.),
+            'SC_GEO_LON': cls.get_lon(secs),
+            'SC_GEO_LST': cls.get_lst(secs),
+            'rho_n': 1e-12 * (2. + np.cos(2 * np.pi * secs / 2820.)),
+            'FLAG': np.mod(np.floor(secs / 600.), 3.),
+        }
+        cls.dts = np.array([dt0 + datetime.timedelta(seconds=sec) for sec in secs])
+        cls.dt0 = dt0
+        cls.dataset = DatasetUser(dt_fr=dt0, dt_to=dt0 + datetime.timedelta(hours=4))
+        cls.dataset.add_variable('SC_DATETIME', value=cls.dts.reshape((-1, 1)))
+        for var_name, value in cls.variables.items():
+            cls.dataset.add_variable(var_name, value=value.reshape((-1, 1)))
+
+    def test_same_as_interp1d(self):
+        ds_new = resample_evenly(self.dataset, self.time_res, data_time_res=self.data_time_res)
+        dts_new = ds_new['SC_DATETIME'].value.flatten()
+        x_1 = np.array([(dt - self.dt0).total_seconds() for dt in dts_new])
+        np.testing.assert_allclose(np.diff(x_1), self.time_res)
+
+        results = interp_evenly_by_interp1d(
+            self.dts, self.variables, x_1, self.dt0, self.data_time_res, self.periods)
+        for var_name, expected in results.items():
+            with self.subTest(variable=var_name):
+                actual = ds_new[var_name].value.flatten()
+                np.testing.assert_array_equal(np.isnan(actual), np.isnan(expected))
+                valid = ~np.isnan(expected)
+                self.assertTrue(np.any(~valid))
+                if var_name in self.periods.keys():
+                    # interp_period_data interpolates the sines and cosines, which deviates from the linear
+                    # change of the angles next to the quadrant crossings. The angles change linearly in the
+                    # track, between the samples either side of a target time.
+                    period = self.periods[var_name]
+                    get_truth = {'SC_GEO_LON': self.get_lon, 'SC_GEO_LST': self.get_lst}[var_name]
+                    for values, atol in [(expected[valid], 1e-3 * period), (get_truth(x_1[valid]), 1e-8)]:
+                        diff = np.mod(actual[valid] - values + period / 2, period) - period / 2
+                        np.testing.assert_allclose(diff, 0., atol=atol)
+                elif var_name == 'FLAG':
+                    np.testing.assert_array_equal(actual[valid], expected[valid])
+                else:
+                    np.testing.assert_allclose(actual[valid], expected[valid], rtol=1e-10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,221 @@
+# Licensed under the BSD 3-Clause License
+# Copyright (C) 2021 GeospaceLab (geospacelab)
+# Author: Lei Cai, Space Physics and Astronomy, University of Oulu
+
+__author__ = "Lei Cai"
+__copyright__ = "Copyright 2021, GeospaceLab"
+__license__ = "BSD-3-Clause License"
+__email__ = "lei.cai@oulu.fi"
+__docformat__ = "reStructureText"
+
+
+import copy
+import time
+import traceback
+
+import geospacelab.toolbox.utilities.pylogging as mylog
+
+
+def render_batch(
+        jobs, file_dir=None, n_workers=None, group_size=8,
+        quicklook_kwargs=None, save_kwargs=None, logging=True):
+    """
+    Render the quicklooks of the express dashboards (e.g., EISCATDashboard, OMNIDashboard, and DMSPTSDashboard)
+    in batch.
+
+    Each job is rendered by ``quicklook()`` and saved by ``save_figure()`` on an Agg canvas, which is not managed by
+    pyplot. The jobs having the same dashboard class and keyword arguments and the overlapping time ranges are
+    put into a group (at most group_size jobs). The data of a group are loaded once for the union of the time ranges,
+    and the jobs in the group are rendered one by one from the loaded data clipped to their time ranges. The groups are rendered in a pool of
+    n_workers processes.
+
+    :param jobs: a list of the jobs (dashboard_class, dt_fr, dt_to, kwargs), where kwargs are the keyword arguments
+        to create the dashboard, e.g., {'sat_id': 'f16'} for DMSPTSDashboard.
+    :param file_dir: the directory of the figures, the current working directory by default.
+    :param n_workers: the number of the worker processes. If None or 1, the jobs are rendered in this process.
+    :param group_size: the maximal number of the jobs sharing the loaded data.
+    :param quicklook_kwargs: the keyword arguments of ``quicklook()``.
+    :param save_kwargs: the keyword arguments of ``save_figure()``, e.g., {'dpi': 150}.
+    :param logging: if True, show the summary of the rendering.
+    :return: a list of the reports in the order of the jobs. A report is a dict with the keys:
+        'dashboard', 'dt_fr', 'dt_to', 'group', 'status' ('done' or 'failed'), 'file_path',
+        'time_load' (the time of loading the data of the group, shared by the jobs in the group), 'time_draw',
+        'time_save', 'error', and 'traceback'.
+    """
+    if quicklook_kwargs is None:
+        quicklook_kwargs = {}
+    if save_kwargs is None:
+        save_kwargs = {}
+    groups = _group_jobs(jobs, group_size=group_size)
+
+    if n_workers is not None and n_workers > 1 and len(groups) > 1:
+        import concurrent.futures
+        with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker) as executor:
+            futures = [
+                executor.submit(_render_group, group_id, group, file_dir, quicklook_kwargs, save_kwargs)
+                for group_id, group in enumerate(groups)]
+            results = []
+            for group_id, (group, future) in enumerate(zip(groups, futures)):
+                try:
+                    results.append(future.result())
+                except Exception as error:
+                    # e.g., the worker process is terminated.
+                    results.append(_fail_group(group_id, group, error))
+    else:
+        results = [
+            _render_group(group_id, group, file_dir, quicklook_kwargs, save_kwargs)
+            for group_id, group in enumerate(groups)]
+
+    reports = [None] * len(jobs)
+    for group_reports in results:
+        for ind, report in group_reports:
+            reports[ind] = report
+
+    if logging:
+        num_failed = sum(report['status'] == 'failed' for report in reports)
+        time_total = sum(
+            report['time_draw'] + report['time_save'] for report in reports if report['status'] == 'done')
+        mylog.simpleinfo.info(
+            "Rendered {} of {} quicklooks in {} groups. Drawing and saving time: {:.1f} s.".format(
+                len(reports) - num_failed, len(reports), len(groups), time_total))
+        for report in reports:
+            if report['status'] == 'failed':
+                mylog.StreamLogger.warning("{} ({} - {}): {}".format(
+                    report['dashboard'], report['dt_fr'], report['dt_to'], report['error']))
+    return reports
+
+
+def _group_jobs(jobs, group_size=8):
+    # Jobs with the same dashboard class and kwargs and overlapping time ranges share the loaded data.
+    groups_by_key = {}
+    for ind, job in enumerate(jobs):
+        dashboard_class, dt_fr, dt_to = job[:3]
+        kwargs = job[3] if len(job) > 3 and job[3] is not None else {}
+        key = (dashboard_class.__module__, dashboard_class.__name__, repr(sorted(kwargs.items())))
+        groups_by_key.setdefault(key, []).append((ind, dashboard_class, dt_fr, dt_to, kwargs))
+
+    groups = []
+    for items in groups_by_key.values():
+        items = sorted(items, key=lambda item: item[2])
+        group = []
+        dt_to_group = None
+        for item in items:
+            if group and (item[2] > dt_to_group or len(group) >= group_size):
+                groups.append(group)
+                group = []
+            if not group:
+                dt_to_group = item[3]
+            dt_to_group = max(dt_to_group, item[3])
+            group.append(item)
+        if group:
+            groups.append(group)
+    return groups
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def _new_report(item, group_id):
+    ind, dashboard_class, dt_fr, dt_to, kwargs = item
+    report = {
+        'dashboard': dashboard_class.__name__, 'dt_fr': dt_fr, 'dt_to': dt_to, 'group': group_id,
+        'status': None, 'file_path': None,
+        'time_load': None, 'time_draw': 0., 'time_save': 0.,
+        'error': None, 'traceback': None,
+    }
+    return report
+
+
+def _fail_group(group_id, group, error, time_load=None, tb=None):
+    reports = []
+    for item in group:
+        report = _new_report(item, group_id)
+        report.update(status='failed', time_load=time_load, error=repr(error), traceback=tb)
+        reports.append((item[0], report))
+    return reports
+
+
+def _render_group(group_id, group, file_dir, quicklook_kwargs, save_kwargs):
+    dashboard_class, kwargs = group[0][1], group[0][4]
+    dt_fr = min(item[2] for item in group)
+    dt_to = max(item[3] for item in group)
+
+    t0 = time.perf_counter()
+    try:
+        kwargs = dict(kwargs, figure='off')
+        dashboard = dashboard_class(dt_fr, dt_to, **kwargs)
+        # The data are clipped to the time range of each job, and the visual settings, which may be changed in
+        # drawing (e.g., the axis limits), are restored for each job.
+        values = []
+        visuals = []
+        for dataset in dashboard.datasets.values():
+            for var in dataset._variables.values():
+                values.append((var, var.value))
+                if var.visual is not None:
+                    visuals.append((var, _copy_visual(var.visual.axis), _copy_visual(var.visual.plot_config)))
+    except Exception as error:
+        return _fail_group(group_id, group, error, time_load=time.perf_counter() - t0, tb=traceback.format_exc())
+    time_load = time.perf_counter() - t0
+
+    reports = []
+    for item in group:
+        ind, _, dt_fr, dt_to, _ = item
+        report = _new_report(item, group_id)
+        report['time_load'] = time_load
+        t0 = time.perf_counter()
+        try:
+            for var, value in values:
+                var.value = value
+            for dataset in dashboard.datasets.values():
+                dataset.dt_fr = dt_fr
+                dataset.dt_to = dt_to
+                if hasattr(dataset, 'time_filter_by_range'):
+                    for var_datetime_name in _get_datetime_variable_names(dataset):
+                        dataset.time_filter_by_range(var_datetime_name=var_datetime_name)
+            for var, axis, plot_config in visuals:
+                var.visual.axis = _copy_visual(axis)
+                var.visual.plot_config = _copy_visual(plot_config)
+            dashboard._xlim = [dt_fr, dt_to]
+            dashboard.panels = {}
+            dashboard.extra_axes = {}
+            dashboard.figure = 'agg'
+            dashboard.quicklook(**quicklook_kwargs)
+            t1 = time.perf_counter()
+            report['time_draw'] = t1 - t0
+            report['file_path'] = dashboard.save_figure(file_dir=file_dir, **save_kwargs)
+            report['time_save'] = time.perf_counter() - t1
+            report['status'] = 'done'
+        except Exception as error:
+            report['time_draw'] = time.perf_counter() - t0
+            report.update(status='failed', error=repr(error), traceback=traceback.format_exc())
+        finally:
+            if dashboard.figure is not None:
+                dashboard.close()
+        reports.append((ind, report))
+    return reports
+
+
+def _get_datetime_variable_names(dataset):
+    # The time variables of the dataset, which the variables depend on along the axis 0, e.g., 'SC_DATETIME' for DMSP.
+    var_datetime_names = []
+    for var in dataset._variables.values():
+        depend_0 = var.depends.get(0, None) if var.depends else None
+        if not depend_0:
+            continue
+        for var_datetime_name in depend_0.values():
+            if isinstance(var_datetime_name, str) and var_datetime_name not in var_datetime_names \
+                    and dataset._variables.get(var_datetime_name) is not None:
+                var_datetime_names.append(var_datetime_name)
+    if not var_datetime_names and dataset._variables.get('DATETIME') is not None:
+        var_datetime_names.append('DATETIME')
+    return var_datetime_names
+
+
+def _copy_visual(obj):
+    # Some visual settings (e.g., with the matplotlib objects) can not be deep copied.
+    try:
+        return copy.deepcopy(obj)
+    except (ValueError, TypeError):
+        return copy.copy(obj)
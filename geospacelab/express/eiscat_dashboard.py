@@ -109,7 +109,7 @@ class EISCATDashboard(TSDashboard):
     def save_figure(self, file_name=None, file_dir=None, append_time=True, **kwargs):
         if file_name is None:
             file_name = kwargs.pop('file_name', self.title.replace(', ', '_'))
-        super().save_figure(file_name=file_name, file_dir=file_dir, append_time=append_time, **kwargs)
+        return super().save_figure(file_name=file_name, file_dir=file_dir, append_time=append_time, **kwargs)
 
     def add_title(self, x=0.5, y=1.06, title=None, append_time=True, **kwargs):
         if title is None:
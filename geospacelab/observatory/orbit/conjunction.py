@@ -0,0 +1,273 @@
+# Licensed under the BSD 3-Clause License
+# Copyright (C) 2021 GeospaceLab (geospacelab)
+# Author: Lei Cai, Space Physics and Astronomy, University of Oulu
+
+import itertools
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+import geospacelab.toolbox.utilities.numpyarray as arraytool
+import geospacelab.toolbox.utilities.pylogging as mylog
+
+
+Re = 6371.2
+
+
+class Track(object):
+    """
+    The positions of a satellite (a time series) or a ground site (a fixed position), for the conjunction search.
+
+    :param lat: the latitudes in degrees, e.g., the geographic latitudes of the satellite or its footpoints.
+    :param lon: the longitudes in degrees.
+    :param dts: the datetimes of the samples. None for a ground site.
+    :param mlat: the magnetic latitudes, required for the MLAT window.
+    :param mlon: the magnetic longitudes, required for the MLT window between a satellite and a site.
+    :param mlt: the magnetic local times, required for the MLT window between two satellites.
+    :param name: the name shown in the results.
+    """
+
+    def __init__(self, lat, lon, dts=None, mlat=None, mlon=None, mlt=None, name=None):
+        self.name = name
+        self.is_site = dts is None
+        lat = np.asarray(lat, dtype=float).flatten()
+        lon = np.asarray(lon, dtype=float).flatten()
+        data = {'lat': lat, 'lon': lon, 'mlat': mlat, 'mlon': mlon, 'mlt': mlt}
+        data = {key: np.asarray(value, dtype=float).flatten() if value is not None else None
+                for key, value in data.items()}
+        if self.is_site:
+            self.dts = None
+            self.sectime = None
+            inds = np.arange(lat.size)
+        else:
+            dts = np.asarray(dts).flatten()
+            sectime = arraytool.convert_x_to_numeric(dts, xtype='datetime')
+            inds = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon) & np.isfinite(sectime))
+            # the samples are sorted by time for the sweeps.
+            inds = inds[np.argsort(sectime[inds], kind='stable')]
+            self.dts = dts[inds]
+            self.sectime = sectime[inds]
+        # the indices of the samples in the input arrays.
+        self.inds = inds
+        for key, value in data.items():
+            setattr(self, key, value[inds] if value is not None else None)
+        phi = np.deg2rad(self.lon)
+        theta = np.deg2rad(self.lat)
+        self.xyz = np.stack((np.cos(theta) * np.cos(phi), np.cos(theta) * np.sin(phi), np.sin(theta)), axis=-1)
+
+    @classmethod
+    def from_dataset(cls, dataset, name=None, lat_key='SC_GEO_LAT', lon_key='SC_GEO_LON', time_key='SC_DATETIME',
+                     mlat_key=None, mlon_key=None, mlt_key=None):
+        """
+        Create a track from a dataset of a satellite, e.g., a Swarm, DMSP, GRACE, or CHAMP dataset.
+        Use lat_key='SC_FP_N_GEO_LAT' and lon_key='SC_FP_N_GEO_LON' for the conjunctions of the northern
+        footpoints (see :func:`add_footpoints <geospacelab.observatory.orbit.footpoint.add_footpoints>`).
+
+        :param mlat_key: the name of the magnetic latitude, e.g., 'SC_AACGM_LAT'.
+        :param mlon_key: the name of the magnetic longitude, e.g., 'SC_AACGM_LON'.
+        :param mlt_key: the name of the magnetic local time, e.g., 'SC_AACGM_MLT'.
+        """
+        def get_value(key):
+            if key is None or key not in dataset.keys() or dataset[key].value is None:
+                return None
+            return dataset[key].flatten()
+
+        if name is None:
+            name = '_'.join(str(s) for s in [getattr(dataset, 'facility', None), getattr(dataset, 'sat_id', None)]
+                            if s is not None) or None
+        return cls(
+            get_value(lat_key), get_value(lon_key), dts=get_value(time_key),
+            mlat=get_value(mlat_key), mlon=get_value(mlon_key), mlt=get_value(mlt_key), name=name)
+
+    @classmethod
+    def site(cls, lat, lon, mlat=None, mlon=None, name=None):
+        """
+        Create a ground site, e.g., an EISCAT or PFISR radar or an all-sky camera.
+        """
+        return cls([lat], [lon], mlat=None if mlat is None else [mlat], mlon=None if mlon is None else [mlon],
+                   name=name)
+
+
+class ConjunctionFinder(object):
+    """
+    Search the conjunctions of two satellites, or of a satellite and a ground site. A pair of the samples is in
+    conjunction if their great-circle distance on the sphere of Re is within distance, their times are within
+    time_window (for two satellites), and their MLATs and MLTs are within mlat_window and mlt_window (if set).
+
+    For two satellites, the time range is swept in blocks of block_size seconds. The samples of the second
+    satellite within the block extended by time_window are indexed by a k-d tree on the unit vectors, and the
+    samples of the first satellite in the block query the tree for the neighbours within the chord of distance.
+    For a site, the distances to the samples are computed directly in the blocks.
+
+    The matched samples of the first track, with the nearest matched samples of the second track, are grouped
+    into the conjunction intervals, which are split at the gaps longer than max_gap.
+
+    :param distance: the maximal distance in km.
+    :param time_window: the maximal time difference in seconds between the samples of two satellites.
+    :param mlat_window: the maximal difference of the MLATs in degrees.
+    :param mlt_window: the maximal difference of the MLTs in hours.
+    :param max_gap: the maximal gap in seconds in an interval. If None, twice the median sampling interval
+        of the first track.
+    :param block_size: the time span in seconds of a block in the sweep.
+    """
+
+    def __init__(self, distance=500., time_window=60., mlat_window=None, mlt_window=None, max_gap=None,
+                 block_size=3600.):
+        self.distance = distance
+        self.time_window = time_window
+        self.mlat_window = mlat_window
+        self.mlt_window = mlt_window
+        self.max_gap = max_gap
+        self.block_size = max(block_size, time_window)
+
+    def search(self, track_1, track_2):
+        """
+        Search the conjunctions of two tracks.
+
+        :param track_1: a satellite track.
+        :param track_2: a satellite track or a site.
+        :return: a list of the conjunction intervals, each of which is a dict with the keys
+            'name_1', 'name_2', 'dt_fr', 'dt_to' (the times of the first track), 'dt_closest' and 'dt_closest_2'
+            (the times of the closest approach of the first and second tracks, None for a site),
+            'distance_min' (km), and the arrays 'index_1', 'index_2' (the indices in the input arrays), and
+            'distance' (km) of the matched samples.
+        """
+        if track_1.is_site:
+            raise ValueError("The first track must be a satellite track!")
+        self._check_windows(track_1, track_2)
+        chord = 2 * np.sin(min(self.distance / Re, np.pi) / 2)
+        pairs = []
+        t = track_1.sectime
+        if t.size == 0:
+            return []
+        if track_2.is_site:
+            start, stop = t[0], t[-1]
+        else:
+            t2 = track_2.sectime
+            if t2.size == 0:
+                return []
+            start = max(t[0], t2[0] - self.time_window)
+            stop = min(t[-1], t2[-1] + self.time_window)
+            if start > stop:
+                return []
+        # the last block ends after stop.
+        blocks = start + self.block_size * np.arange(int(np.floor((stop - start) / self.block_size)) + 2)
+
+        for b0, b1 in zip(blocks[:-1], blocks[1:]):
+            i0, i1 = np.searchsorted(t, [b0, b1], side='left')
+            if i1 == i0:
+                continue
+            if track_2.is_site:
+                j1 = np.repeat(np.arange(i0, i1), track_2.xyz.shape[0])
+                j2 = np.tile(np.arange(track_2.xyz.shape[0]), i1 - i0)
+                dot = np.sum(track_1.xyz[j1] * track_2.xyz[j2], axis=1)
+                # the chord length from the dot product of the unit vectors.
+                within = 2 - 2 * dot <= chord ** 2
+                j1, j2 = j1[within], j2[within]
+            else:
+                k0, k1 = np.searchsorted(t2, [b0 - self.time_window, b1 + self.time_window], side='left')
+                if k1 == k0:
+                    continue
+                tree = cKDTree(track_2.xyz[k0:k1])
+                neighbours = tree.query_ball_point(track_1.xyz[i0:i1], chord, return_sorted=False)
+                lengths = np.fromiter((len(n) for n in neighbours), dtype=int, count=len(neighbours))
+                if not lengths.any():
+                    continue
+                j1 = np.repeat(np.arange(i0, i1), lengths)
+                j2 = np.concatenate([n for n in neighbours if n]).astype(int) + k0
+                within = np.abs(t[j1] - t2[j2]) <= self.time_window
+                j1, j2 = j1[within], j2[within]
+            within = self._check_magnetic(track_1, track_2, j1, j2)
+            pairs.append((j1[within], j2[within]))
+
+        if not pairs:
+            return []
+        j1 = np.concatenate([p[0] for p in pairs])
+        j2 = np.concatenate([p[1] for p in pairs])
+        dot = np.clip(np.sum(track_1.xyz[j1] * track_2.xyz[j2], axis=1), -1., 1.)
+        d = np.arccos(dot) * Re
+        within = d <= self.distance
+        j1, j2, d = j1[within], j2[within], d[within]
+        if not j1.size:
+            return []
+        # the nearest sample of the second track for each matched sample of the first track.
+        order = np.lexsort((d, j1))
+        j1, j2, d = j1[order], j2[order], d[order]
+        first = np.concatenate(([True], np.diff(j1) != 0))
+        j1, j2, d = j1[first], j2[first], d[first]
+        return self._group_intervals(track_1, track_2, j1, j2, d)
+
+    def _check_windows(self, track_1, track_2):
+        if self.mlat_window is not None and (track_1.mlat is None or track_2.mlat is None):
+            raise ValueError("The MLATs of the tracks are required for the MLAT window!")
+        if self.mlt_window is not None:
+            if track_2.is_site and (track_1.mlon is None or track_2.mlon is None):
+                raise ValueError("The MLONs of the satellite and the site are required for the MLT window!")
+            if not track_2.is_site and (track_1.mlt is None or track_2.mlt is None):
+                raise ValueError("The MLTs of the satellites are required for the MLT window!")
+
+    def _check_magnetic(self, track_1, track_2, j1, j2):
+        within = np.ones(j1.shape, dtype=bool)
+        if self.mlat_window is not None:
+            within &= np.abs(track_1.mlat[j1] - track_2.mlat[j2]) <= self.mlat_window
+        if self.mlt_window is not None:
+            if track_2.is_site:
+                # the MLT of the site at the time of the satellite differs by the difference of the MLONs.
+                d_mlt = (track_1.mlon[j1] - track_2.mlon[j2]) / 15.
+            else:
+                d_mlt = track_1.mlt[j1] - track_2.mlt[j2]
+            d_mlt = np.abs(np.mod(d_mlt + 12., 24.) - 12.)
+            within &= d_mlt <= self.mlt_window
+        return within
+
+    def _group_intervals(self, track_1, track_2, j1, j2, d):
+        t = track_1.sectime
+        max_gap = self.max_gap
+        if max_gap is None:
+            max_gap = 2 * np.median(np.diff(t)) if t.size > 1 else 0.
+        splits = np.flatnonzero(np.diff(t[j1]) > max_gap) + 1
+        intervals = []
+        for k1, k2, dk in zip(np.split(j1, splits), np.split(j2, splits), np.split(d, splits)):
+            ind_min = np.argmin(dk)
+            intervals.append({
+                'name_1': track_1.name,
+                'name_2': track_2.name,
+                'dt_fr': track_1.dts[k1[0]],
+                'dt_to': track_1.dts[k1[-1]],
+                'dt_closest': track_1.dts[k1[ind_min]],
+                'dt_closest_2': None if track_2.is_site else track_2.dts[k2[ind_min]],
+                'distance_min': dk[ind_min],
+                'index_1': track_1.inds[k1],
+                'index_2': track_2.inds[k2],
+                'distance': dk,
+            })
+        return intervals
+
+
+def search_conjunctions(tracks, **kwargs):
+    """
+    Search the conjunctions of each pair of the tracks (satellites and sites), e.g.,
+
+        >>> tracks = [Track.from_dataset(ds_swarm_a, mlat_key='SC_AACGM_LAT', mlon_key='SC_AACGM_LON'),
+        >>>           Track.from_dataset(ds_dmsp_f16, mlat_key='SC_AACGM_LAT', mlon_key='SC_AACGM_LON'),
+        >>>           Track.site(69.58, 19.23, name='EISCAT-UHF')]
+        >>> intervals = search_conjunctions(tracks, distance=300., time_window=120.)
+
+    The intervals can be marked in a TSDashboard by add_shading(interval['dt_fr'], interval['dt_to']).
+
+    :param tracks: a list of the tracks.
+    :param kwargs: the keyword arguments of :class:`ConjunctionFinder`.
+    :return: the list of the conjunction intervals of all the pairs, sorted by dt_fr.
+    """
+    finder = ConjunctionFinder(**kwargs)
+    intervals = []
+    for track_1, track_2 in itertools.combinations(tracks, 2):
+        if track_1.is_site and track_2.is_site:
+            continue
+        if track_1.is_site:
+            track_1, track_2 = track_2, track_1
+        intervals_pair = finder.search(track_1, track_2)
+        mylog.simpleinfo.info("Found {} conjunctions of {} and {}.".format(
+            len(intervals_pair), track_1.name, track_2.name))
+        intervals.extend(intervals_pair)
+    return sorted(intervals, key=lambda interval: interval['dt_fr'])
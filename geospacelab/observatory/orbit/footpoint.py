@@ -0,0 +1,327 @@
+# Licensed under the BSD 3-Clause License
+# Copyright (C) 2021 GeospaceLab (geospacelab)
+# Author: Lei Cai, Space Physics and Astronomy, University of Oulu
+
+import datetime
+import hashlib
+import pathlib
+
+import numpy as np
+
+from geospacelab.config import prf
+import geospacelab.toolbox.utilities.pydatetime as dttool
+import geospacelab.toolbox.utilities.pylogging as mylog
+from geospacelab.wrapper.geopack.geopack import geopack
+
+
+default_cache_dir = prf.datahub_data_root_dir / 'Footpoints'
+
+footpoint_keys = ['N_GEO_LAT', 'N_GEO_LON', 'S_GEO_LAT', 'S_GEO_LON']
+
+Re = 6371.2
+
+
+class FootpointMapper(object):
+    """
+    Maps the positions of a satellite along the magnetic field lines to the footpoints on the
+    sphere at the altitude alt_fp, in both the northern and southern hemispheres (one of which is the
+    footpoint in the satellite's hemisphere and the other is the conjugate point).
+
+    The field lines are traced with geopack.trace_batch from anchor points along the track. The
+    footpoints of the samples between two anchors are interpolated, if the footpoint traced from
+    the middle sample agrees with the interpolated one within the tolerance; otherwise the segment
+    is split and checked again. The results can be cached on disk, keyed by the satellite,
+    the time, the field models, the model parameters, and the tracing parameters. The cached samples
+    are reused only if the positions of the satellite are the same.
+
+    :param sat_id: the satellite ID, used for the disk cache. If None, no cache is used.
+    :param exname: the external field model, 't89', 't96', 't01', or 't04'.
+    :param parmod: the iopt for T89, or the 10-element array of the model parameters for the other models.
+    :param inname: the internal field model, 'igrf' or 'dipole'.
+    :param alt_fp: the altitude of the footpoints in km.
+    :param anchor_interval: the time interval between the initial anchor points in seconds.
+    :param tolerance: the permissible error of the interpolated footpoints in km.
+    :param recalc_res: the time resolution of the geopack contexts (recalc) in seconds.
+    :param rlim: the outer boundary of the field line tracing in Re.
+    :param cache: if True, the results are cached on disk.
+    :param cache_dir: the root directory of the disk cache.
+    """
+
+    def __init__(
+            self, sat_id=None, exname='t89', parmod=2, inname='igrf', alt_fp=110.,
+            anchor_interval=60., tolerance=1., recalc_res=600., rlim=10.,
+            cache=True, cache_dir=None,
+    ):
+        self.sat_id = sat_id
+        self.exname = exname
+        self.parmod = parmod
+        self.inname = inname
+        self.alt_fp = alt_fp
+        self.anchor_interval = anchor_interval
+        self.tolerance = tolerance
+        self.recalc_res = recalc_res
+        self.rlim = rlim
+        self.cache = cache and sat_id is not None
+        self.cache_dir = pathlib.Path(default_cache_dir if cache_dir is None else cache_dir)
+
+    @property
+    def cache_key(self):
+        key = repr((self.exname, np.round(np.atleast_1d(self.parmod).astype(float), 6).tolist(),
+                    self.inname, float(self.alt_fp), float(self.tolerance), float(self.anchor_interval),
+                    float(self.recalc_res), float(self.rlim)))
+        return hashlib.md5(key.encode()).hexdigest()[:10]
+
+    def map(self, dts, lat, lon, alt=None, r=None):
+        """
+        Maps the satellite positions to the footpoints.
+
+        :param dts: the datetimes of the samples.
+        :param lat, lon: the geocentric latitudes and longitudes of the satellite in degrees.
+        :param alt: the altitudes of the satellite in km.
+        :param r: the geocentric distances of the satellite in km, used if alt is None.
+        :return: a dict with the keys 'N_GEO_LAT', 'N_GEO_LON', 'S_GEO_LAT', 'S_GEO_LON'. The footpoints
+            are nan, where the field line does not reach the sphere of alt_fp in that hemisphere.
+        """
+        dts = np.array(dts).flatten()
+        lat = np.array(lat, dtype=float).flatten()
+        lon = np.array(lon, dtype=float).flatten()
+        if alt is not None:
+            r = Re + np.array(alt, dtype=float).flatten()
+        else:
+            r = np.array(r, dtype=float).flatten()
+        sectime, _ = dttool.convert_datetime_to_sectime(dts, dt0=datetime.datetime(1970, 1, 1))
+
+        results = {key: np.full(dts.shape, np.nan) for key in footpoint_keys}
+        ind_missing = np.arange(dts.size)
+        if self.cache:
+            pos_hash = _get_position_hash(lat, lon, r)
+            ind_missing = self._load_cache(sectime, pos_hash, results)
+
+        if ind_missing.size > 0:
+            mylog.simpleinfo.info(
+                f"Mapping {ind_missing.size} satellite positions to the footpoints at {self.alt_fp} km ...")
+            fps = self._map_track(sectime[ind_missing], lat[ind_missing], lon[ind_missing], r[ind_missing])
+            for key in footpoint_keys:
+                results[key][ind_missing] = fps[key]
+            if self.cache:
+                self._save_cache(
+                    sectime[ind_missing], pos_hash[ind_missing], {key: fps[key] for key in footpoint_keys})
+        return results
+
+    def _map_track(self, sectime, lat, lon, r):
+        n = sectime.size
+        theta = np.deg2rad(90. - lat)
+        phi = np.deg2rad(lon)
+        x, y, z = geopack.sphcar(r / Re, theta, phi, 1)
+
+        # unit vectors of the footpoints in GEO
+        fp_n = np.full((3, n), np.nan)
+        fp_s = np.full((3, n), np.nan)
+        traced = np.zeros(n, dtype=bool)
+
+        def trace(ind):
+            ind = ind[~traced[ind]]
+            if ind.size == 0:
+                return
+            fp_n[:, ind], fp_s[:, ind] = self._trace(sectime[ind], x[ind], y[ind], z[ind])
+            traced[ind] = True
+
+        # The initial anchors: every anchor_interval, and the edges of the data gaps.
+        bins = np.floor((sectime - sectime[0]) / self.anchor_interval)
+        is_anchor = np.ones(n, dtype=bool)
+        is_anchor[1:] = (np.diff(bins) > 0) | (np.diff(sectime) > self.anchor_interval)
+        is_anchor[:-1] |= np.diff(sectime) > self.anchor_interval
+        is_anchor[-1] = True
+        anchors = np.where(is_anchor)[0]
+        trace(anchors)
+
+        # Segments between the anchors, which are not separated by a data gap.
+        segments = [
+            (i0, i1) for i0, i1 in zip(anchors[:-1], anchors[1:])
+            if i1 - i0 > 1 and sectime[i1] - sectime[i0] <= 2 * self.anchor_interval
+        ]
+        while segments:
+            ind_mid = np.array([(i0 + i1) // 2 for i0, i1 in segments])
+            trace(ind_mid)
+            segments_next = []
+            for (i0, i1), im in zip(segments, ind_mid):
+                err = max(
+                    self._interpolation_error(fp, sectime, i0, i1, im) for fp in (fp_n, fp_s)
+                )
+                if err <= self.tolerance:
+                    ind = np.arange(i0 + 1, i1)
+                    ind = ind[~traced[ind]]
+                    for fp in (fp_n, fp_s):
+                        fp[:, ind] = self._interpolate(fp, sectime, i0, i1, ind)
+                    continue
+                for j0, j1 in ((i0, im), (im, i1)):
+                    if j1 - j0 > 1:
+                        segments_next.append((j0, j1))
+            segments = segments_next
+
+        fps = {}
+        for hemisphere, fp in (('N', fp_n), ('S', fp_s)):
+            _, theta_fp, phi_fp = geopack.sphcar(fp[0], fp[1], fp[2], -1)
+            fps[hemisphere + '_GEO_LAT'] = 90. - np.rad2deg(theta_fp)
+            lon_fp = np.rad2deg(phi_fp)
+            fps[hemisphere + '_GEO_LON'] = np.where(lon_fp > 180., lon_fp - 360., lon_fp)
+        return fps
+
+    @staticmethod
+    def _interpolate(fp, sectime, i0, i1, ind):
+        w = (sectime[ind] - sectime[i0]) / (sectime[i1] - sectime[i0])
+        v = fp[:, [i0]] * (1 - w) + fp[:, [i1]] * w
+        return v / np.sqrt(np.sum(v**2, axis=0))
+
+    def _interpolation_error(self, fp, sectime, i0, i1, im):
+        traced_nan = np.isnan(fp[0, im])
+        interp = self._interpolate(fp, sectime, i0, i1, np.array([im]))[:, 0]
+        if traced_nan or np.isnan(interp[0]):
+            # both open (or both closed) in this hemisphere is required for the interpolation.
+            return 0. if traced_nan and np.isnan(interp[0]) and np.isnan(fp[0, i0]) and np.isnan(fp[0, i1]) \
+                else np.inf
+        return np.sqrt(np.sum((interp - fp[:, im])**2)) * (Re + self.alt_fp)
+
+    def _trace(self, sectime, x, y, z):
+        """
+        Traces the field lines from the GEO positions (in Re), grouped by the geopack contexts.
+        Returns the unit vectors of the northern and southern footpoints in GEO.
+        """
+        r0 = 1. + self.alt_fp / Re
+        fp_n = np.full((3, sectime.size), np.nan)
+        fp_s = np.full((3, sectime.size), np.nan)
+        ut_ctx = np.round(sectime / self.recalc_res) * self.recalc_res
+        for ut in np.unique(ut_ctx):
+            ind = np.where(ut_ctx == ut)[0]
+            ctx = geopack.recalc_context(ut)
+            xgsm, ygsm, zgsm = geopack.geogsm(x[ind], y[ind], z[ind], 1, ctx=ctx)
+            # tracing parallel to B (dir=-1) ends in the northern hemisphere, and antiparallel in the southern.
+            # Both directions are traced in one batch.
+            n = ind.size
+            dirs = np.concatenate((np.full(n, -1.), np.full(n, 1.)))
+            xf, yf, zf, flag, xx, yy, zz = geopack.trace_batch(
+                np.tile(xgsm, 2), np.tile(ygsm, 2), np.tile(zgsm, 2), dirs, self.rlim, r0,
+                self.parmod, self.exname, self.inname, return_lines=True, ctx=ctx)
+            xf, yf, zf = _interpolate_to_sphere(xx, yy, zz, r0)
+            xf, yf, zf = geopack.geogsm(xf, yf, zf, -1, ctx=ctx)
+            rf = np.sqrt(xf**2 + yf**2 + zf**2)
+            fp = np.where(flag == 1, np.array([xf, yf, zf]) / rf, np.nan)
+            fp_n[:, ind] = fp[:, :n]
+            fp_s[:, ind] = fp[:, n:]
+        return fp_n, fp_s
+
+    def _cache_file_path(self, day):
+        return self.cache_dir / self.sat_id.upper() / day.strftime('%Y') / \
+            f"FP_{self.sat_id.upper()}_{day.strftime('%Y%m%d')}_{self.exname.upper()}_{self.cache_key}.npz"
+
+    def _days(self, sectime):
+        days = np.unique(np.floor(sectime / 86400.))
+        return [(d, datetime.datetime(1970, 1, 1) + datetime.timedelta(days=d)) for d in days]
+
+    def _load_cache(self, sectime, pos_hash, results):
+        found = np.zeros(sectime.shape, dtype=bool)
+        ms = np.round(sectime * 1000).astype(np.int64)
+        for d, day in self._days(sectime):
+            file_path = self._cache_file_path(day)
+            if not file_path.is_file():
+                continue
+            cached = np.load(file_path)
+            if 'POS_HASH' not in cached.files:
+                continue
+            ms_cached = cached['UNIX_TIME_MS']
+            ind = np.searchsorted(ms_cached, ms)
+            ind = np.clip(ind, 0, ms_cached.size - 1)
+            # the cached samples must have the same times and positions.
+            matched = (ms_cached[ind] == ms) & (cached['POS_HASH'][ind] == pos_hash)
+            for key in footpoint_keys:
+                results[key][matched] = cached[key][ind[matched]]
+            found |= matched
+        return np.where(~found)[0]
+
+    def _save_cache(self, sectime, pos_hash, fps):
+        ms = np.round(sectime * 1000).astype(np.int64)
+        day_ids = np.floor(sectime / 86400.)
+        for d, day in self._days(sectime):
+            in_day = day_ids == d
+            data = {'UNIX_TIME_MS': ms[in_day], 'POS_HASH': pos_hash[in_day]}
+            data.update({key: fps[key][in_day] for key in footpoint_keys})
+            file_path = self._cache_file_path(day)
+            if file_path.is_file():
+                cached = dict(np.load(file_path))
+                data = {key: np.concatenate((cached[key], data[key])) for key in data.keys()}
+            # the samples of the same times are replaced by the new ones.
+            ms_rev = data['UNIX_TIME_MS'][::-1]
+            ms_all, ind = np.unique(ms_rev, return_index=True)
+            ind = ms_rev.size - 1 - ind
+            data = {key: value[ind] for key, value in data.items()}
+            file_path.parent.resolve().mkdir(parents=True, exist_ok=True)
+            np.savez(file_path, **data)
+
+
+def _get_position_hash(lat, lon, r):
+    """
+    A hash of each position rounded to 1e-6 degrees and 1 m, for checking the positions of the cached samples.
+    """
+    with np.errstate(invalid='ignore'):
+        keys = np.array([
+            np.round(lat * 1e6), np.round(np.mod(lon, 360.) * 1e6), np.round(r * 1e3)
+        ]).astype(np.int64).view(np.uint64)
+    # FNV-1a over the three rounded coordinates.
+    pos_hash = np.full(keys.shape[1:], 14695981039346656037, dtype=np.uint64)
+    for key in keys:
+        pos_hash = (pos_hash ^ key) * np.uint64(1099511628211)
+    return pos_hash.view(np.int64)
+
+
+def _interpolate_to_sphere(xx, yy, zz, r0):
+    """
+    Interpolates the end points of the field lines to the sphere of r0, between the last two points of each line.
+    """
+    npoint = np.sum(np.isfinite(xx), axis=1)
+    ind = np.arange(xx.shape[0])
+    i1 = np.maximum(npoint - 1, 0)
+    i0 = np.maximum(npoint - 2, 0)
+    p0 = np.array([xx[ind, i0], yy[ind, i0], zz[ind, i0]])
+    p1 = np.array([xx[ind, i1], yy[ind, i1], zz[ind, i1]])
+    r_0 = np.sqrt(np.sum(p0**2, axis=0))
+    r_1 = np.sqrt(np.sum(p1**2, axis=0))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w = np.where(r_0 != r_1, (r0 - r_0) / (r_1 - r_0), 1.)
+    w = np.clip(w, 0., 1.)
+    return p0 + (p1 - p0) * w
+
+
+def add_footpoints(dataset, sat_id=None, **kwargs):
+    """
+    Adds the footpoints of a LEO satellite to the dataset, as the variables SC_FP_N_GEO_LAT, SC_FP_N_GEO_LON,
+    SC_FP_S_GEO_LAT, and SC_FP_S_GEO_LON. The dataset must have SC_DATETIME, SC_GEO_LAT, SC_GEO_LON, and
+    either SC_GEO_ALT (km) or SC_GEO_r (km).
+
+    :param dataset: the dataset of the satellite.
+    :param sat_id: the satellite ID for the disk cache. If None, the attribute sat_id of the dataset is used.
+    :param kwargs: the keyword arguments of FootpointMapper.
+    :return: the FootpointMapper.
+    """
+    if sat_id is None:
+        sat_id = getattr(dataset, 'sat_id', None)
+        facility = getattr(dataset, 'facility', None)
+        if sat_id is not None and isinstance(facility, str):
+            sat_id = facility + '_' + sat_id
+    mapper = FootpointMapper(sat_id=sat_id, **kwargs)
+
+    shape = dataset['SC_DATETIME'].value.shape
+    if 'SC_GEO_ALT' in dataset.keys() and dataset['SC_GEO_ALT'].value is not None:
+        alt, r = dataset['SC_GEO_ALT'].flatten(), None
+    else:
+        alt, r = None, dataset['SC_GEO_r'].flatten()
+    fps = mapper.map(
+        dataset['SC_DATETIME'].flatten(), dataset['SC_GEO_LAT'].flatten(), dataset['SC_GEO_LON'].flatten(),
+        alt=alt, r=r)
+
+    for key in footpoint_keys:
+        var = dataset.add_variable(var_name='SC_FP_' + key)
+        var.value = fps[key].reshape(shape)
+        var.label = 'FP ' + key.split('_')[0] + (' GLAT' if key.endswith('LAT') else ' GLON')
+        var.unit = 'deg'
+        var.depends = dataset['SC_GEO_LAT'].depends
+    return mapper
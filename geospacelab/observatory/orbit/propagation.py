@@ -0,0 +1,434 @@
+# Licensed under the BSD 3-Clause License
+# Copyright (C) 2021 GeospaceLab (geospacelab)
+# Author: Lei Cai, Space Physics and Astronomy, University of Oulu
+
+import datetime
+import hashlib
+import pathlib
+
+import numpy as np
+
+from geospacelab.config import prf
+import geospacelab.toolbox.utilities.pydatetime as dttool
+import geospacelab.toolbox.utilities.pylogging as mylog
+from geospacelab.datahub.__dataset_base__ import DatasetUser
+from geospacelab.wrapper.geopack.geopack import geopack
+
+
+default_cache_dir = prf.datahub_data_root_dir / 'Orbits'
+
+default_variable_names = [
+    'SC_GEO_LAT', 'SC_GEO_LON', 'SC_GEO_ALT',
+    'SC_GEO_X', 'SC_GEO_Y', 'SC_GEO_Z',
+    'SC_GSE_X', 'SC_GSE_Y', 'SC_GSE_Z',
+    'SC_GSM_X', 'SC_GSM_Y', 'SC_GSM_Z',
+    'SC_AACGM_LAT', 'SC_AACGM_LON', 'SC_AACGM_MLT',
+    'SC_DATETIME'
+]
+
+Re = 6371.2
+
+# the dates of the leap seconds since the GPS epoch, after which GPS - UTC increases by 1 second.
+leap_second_dates = [
+    (1981, 7, 1), (1982, 7, 1), (1983, 7, 1), (1985, 7, 1), (1988, 1, 1), (1990, 1, 1), (1991, 1, 1),
+    (1992, 7, 1), (1993, 7, 1), (1994, 7, 1), (1996, 1, 1), (1997, 7, 1), (1999, 1, 1), (2006, 1, 1),
+    (2009, 1, 1), (2012, 7, 1), (2015, 7, 1), (2017, 1, 1),
+]
+
+
+class TLEPropagator(object):
+    """
+    Propagates the two-line elements (TLEs) of a satellite with SGP4 (the package sgp4 is required).
+    With a history of TLEs, each time is propagated from the TLE with the nearest epoch. The positions in TEME are
+    rotated to GEO by the Greenwich mean sidereal time (IAU-82), with UT1 = UTC and without the polar motion.
+
+    :param tles: a list of the TLEs, (line1, line2).
+    """
+
+    def __init__(self, tles):
+        from sgp4.api import Satrec
+
+        if not list(tles):
+            raise ValueError("No TLE is given!")
+        self.tles = [(line1.strip(), line2.strip()) for line1, line2 in tles]
+        sats = [Satrec.twoline2rv(line1, line2) for line1, line2 in self.tles]
+        epochs = np.array([sat.jdsatepoch + sat.jdsatepochF for sat in sats])
+        ind = np.argsort(epochs, kind='stable')
+        self.sats = [sats[i] for i in ind]
+        self.tles = [self.tles[i] for i in ind]
+        self.epochs = (epochs[ind] - 2440587.5) * 86400.
+
+    @classmethod
+    def from_file(cls, file_path, sat_num=None):
+        """
+        Reads the TLEs from a text file, e.g., downloaded from CelesTrak or Space-Track. The title lines of
+        the three-line format are skipped.
+
+        :param file_path: the file path.
+        :param sat_num: the NORAD catalog number of the satellite. If None, all the TLEs are read.
+        """
+        with open(file_path, 'r') as f:
+            lines = [line.rstrip() for line in f if line.strip()]
+        tles = []
+        for line1, line2 in zip(lines[:-1], lines[1:]):
+            if not (line1.startswith('1 ') and line2.startswith('2 ')):
+                continue
+            if sat_num is not None and int(line1[2:7]) != int(sat_num):
+                continue
+            tles.append((line1, line2))
+        return cls(tles)
+
+    @property
+    def source_key(self):
+        key = repr(self.tles)
+        return hashlib.md5(key.encode()).hexdigest()[:10]
+
+    def propagate(self, sectime):
+        """
+        Propagates the TLEs to the times.
+
+        :param sectime: the times in seconds since 1970-01-01.
+        :return: x, y, z, the GEO cartesian coordinates in km, nan where SGP4 fails.
+        """
+        sectime = np.asarray(sectime, dtype=float).flatten()
+        days = np.floor(sectime / 86400.)
+        jd = 2440587.5 + days
+        fr = (sectime - days * 86400.) / 86400.
+
+        # the TLE with the nearest epoch.
+        if len(self.sats) > 1:
+            ind_tle = np.searchsorted((self.epochs[1:] + self.epochs[:-1]) / 2, sectime)
+        else:
+            ind_tle = np.zeros(sectime.shape, dtype=int)
+        teme = np.full((sectime.size, 3), np.nan)
+        for i in np.unique(ind_tle):
+            ind = np.where(ind_tle == i)[0]
+            e, r, v = self.sats[i].sgp4_array(jd[ind], fr[ind])
+            teme[ind] = np.where(e[:, np.newaxis] == 0, r, np.nan)
+
+        gmst = _gmst(jd + fr)
+        cos_g = np.cos(gmst)
+        sin_g = np.sin(gmst)
+        x = cos_g * teme[:, 0] + sin_g * teme[:, 1]
+        y = -sin_g * teme[:, 0] + cos_g * teme[:, 1]
+        z = teme[:, 2]
+        return x, y, z
+
+
+class EphemerisInterpolator(object):
+    """
+    Interpolates the tabulated positions of a satellite in GEO, e.g., from the SP3 files, with the Lagrange
+    polynomials over a sliding window of the nearest epochs. The window is not allowed to span a data gap.
+
+    :param sectime: the epochs in seconds since 1970-01-01, strictly increasing.
+    :param x, y, z: the GEO cartesian coordinates in km.
+    :param num_points: the number of the epochs in a window, i.e., the degree of the polynomials + 1.
+    :param max_gap_scale: a window with a step larger than max_gap_scale times the median step is a data gap.
+    """
+
+    def __init__(self, sectime, x, y, z, num_points=10, max_gap_scale=1.5, source_key=''):
+        sectime = np.asarray(sectime, dtype=float).flatten()
+        ind = np.argsort(sectime, kind='stable')
+        self.sectime = sectime[ind]
+        self.positions = np.stack(
+            [np.asarray(c, dtype=float).flatten()[ind] for c in (x, y, z)], axis=-1)
+        self.num_points = min(num_points, self.sectime.size)
+        self.max_gap_scale = max_gap_scale
+        self.step = np.median(np.diff(self.sectime)) if self.sectime.size > 1 else 0.
+        self._source_key = source_key
+
+    @classmethod
+    def from_sp3(cls, file_paths, sat_id=None, **kwargs):
+        """
+        Reads the positions from the SP3-c or SP3-d files. The epochs in the GPS or TAI time are converted to UTC.
+
+        :param file_paths: a file path or a list of the file paths.
+        :param sat_id: the satellite ID in the files, e.g., 'L47'. If None, the files must have only one satellite.
+        :param kwargs: the keyword arguments of EphemerisInterpolator.
+        """
+        if isinstance(file_paths, (str, pathlib.Path)):
+            file_paths = [file_paths]
+        sectime = []
+        positions = []
+        sat_ids = set()
+        for file_path in file_paths:
+            t = None
+            time_system = None
+            with open(file_path, 'r') as f:
+                for line in f:
+                    if line.startswith('%c') and time_system is None:
+                        time_system = line[9:12].strip().upper()
+                    elif line.startswith('*'):
+                        fields = line[1:].split()
+                        dt = datetime.datetime(*[int(v) for v in fields[:5]]) + \
+                            datetime.timedelta(seconds=float(fields[5]))
+                        t = (dt - datetime.datetime(1970, 1, 1)).total_seconds()
+                        if time_system == 'GPS':
+                            t = t - _get_gps_utc_offset(t)
+                        elif time_system == 'TAI':
+                            t = t - _get_gps_utc_offset(t) - 19.
+                    elif line.startswith('P') and t is not None:
+                        sid = line[1:4].strip()
+                        sat_ids.add(sid)
+                        if sat_id is not None and sid != sat_id:
+                            continue
+                        xyz = [float(line[4 + 14 * i: 18 + 14 * i]) for i in range(3)]
+                        sectime.append(t)
+                        positions.append(xyz)
+        if sat_id is None and len(sat_ids) > 1:
+            raise ValueError("Multiple satellites {} found! Set sat_id.".format(sorted(sat_ids)))
+        if not positions:
+            raise ValueError("No position is found in the SP3 files!")
+        positions = np.array(positions)
+        # the bad or absent positions are zeros.
+        positions[np.all(positions == 0, axis=1)] = np.nan
+        sectime, ind = np.unique(np.array(sectime), return_index=True)
+        positions = positions[ind]
+        key = repr(sorted(str(pathlib.Path(fp).name) for fp in file_paths)) + str(sat_id)
+        source_key = hashlib.md5(key.encode()).hexdigest()[:10]
+        return cls(sectime, positions[:, 0], positions[:, 1], positions[:, 2], source_key=source_key, **kwargs)
+
+    @property
+    def source_key(self):
+        return self._source_key
+
+    def propagate(self, sectime):
+        """
+        Interpolates the positions at the times.
+
+        :param sectime: the times in seconds since 1970-01-01.
+        :return: x, y, z, the GEO cartesian coordinates in km, nan out of the epochs or over a data gap.
+        """
+        sectime = np.asarray(sectime, dtype=float).flatten()
+        n = self.num_points
+        t = self.sectime
+        if t.size < 2:
+            nan = np.full(sectime.shape, np.nan)
+            return nan, nan.copy(), nan.copy()
+        i_0 = np.clip(np.searchsorted(t, sectime) - n // 2, 0, t.size - n)
+        inds = i_0[:, np.newaxis] + np.arange(n)
+        # the times normalized by the step for the numerical stability.
+        tn = (t[inds] - t[i_0][:, np.newaxis]) / self.step
+        q = (sectime - t[i_0]) / self.step
+
+        weights = np.ones((sectime.size, n))
+        for j in range(n):
+            for m in range(n):
+                if m != j:
+                    weights[:, j] *= (q - tn[:, m]) / (tn[:, j] - tn[:, m])
+        results = np.einsum('ij,ijk->ik', weights, self.positions[inds])
+
+        invalid = (sectime < t[0]) | (sectime > t[-1])
+        invalid |= np.any(np.diff(tn, axis=1) > self.max_gap_scale, axis=1)
+        results[invalid] = np.nan
+        return results[:, 0], results[:, 1], results[:, 2]
+
+
+class OrbitPosition_Local(DatasetUser):
+    """
+    The orbit positions of a satellite computed locally from the TLEs or the ephemeris files, an offline
+    alternative of :class:`OrbitPosition_SSCWS <geospacelab.observatory.orbit.sc_orbit.OrbitPosition_SSCWS>` with
+    the same variables at any time grid. The positions are converted to GSE and GSM with one geopack context
+    per sample, and to AACGM in batches of aacgm_time_res (the AACGM coordinates are independent of the time of
+    day, and only the MLTs are converted with the time of each sample).
+
+    The results are cached on disk by day, keyed by the satellite, the source (the TLEs or the files), and the
+    time of each sample.
+
+    :param dt_fr: the start time.
+    :param dt_to: the stop time.
+    :param time_res: the time resolution in seconds.
+    :param dts: the times, used instead of dt_fr, dt_to, and time_res.
+    :param sat_id: the satellite ID, used for the disk cache. If None, no cache is used.
+    :param tles: a list of the TLEs (line1, line2).
+    :param tle_file: the path of a TLE file, see :meth:`TLEPropagator.from_file`.
+    :param sp3_files: the paths of the SP3 files, see :meth:`EphemerisInterpolator.from_sp3`.
+    :param sp3_sat_id: the satellite ID in the SP3 files.
+    :param propagator: a TLEPropagator or EphemerisInterpolator, used instead of tles, tle_file, and sp3_files.
+    :param to_AACGM: if True, the AACGM coordinates are computed.
+    :param aacgm_time_res: the time span of a batch of the AACGM conversion in seconds.
+    :param cache: if True, the results are cached on disk.
+    :param cache_dir: the root directory of the disk cache.
+    """
+
+    def __init__(
+            self,
+            dt_fr: datetime.datetime = None,
+            dt_to: datetime.datetime = None,
+            time_res: float = 60.,
+            dts=None,
+            sat_id: str = None,
+            tles=None,
+            tle_file=None,
+            sp3_files=None,
+            sp3_sat_id: str = None,
+            propagator=None,
+            to_AACGM: bool = True,
+            aacgm_time_res: float = 86400.,
+            cache: bool = True,
+            cache_dir=None,
+            **kwargs
+    ):
+        kwargs.setdefault('name', 'Orbit')
+        super().__init__(dt_fr=dt_fr, dt_to=dt_to, **kwargs)
+
+        if propagator is None:
+            if tles is not None:
+                propagator = TLEPropagator(tles)
+            elif tle_file is not None:
+                propagator = TLEPropagator.from_file(tle_file)
+            elif sp3_files is not None:
+                propagator = EphemerisInterpolator.from_sp3(sp3_files, sat_id=sp3_sat_id)
+            else:
+                raise ValueError("Either tles, tle_file, sp3_files, or propagator must be set!")
+        self.propagator = propagator
+        self.sat_id = sat_id
+        self.time_res = time_res
+        self.to_AACGM = to_AACGM
+        self.aacgm_time_res = aacgm_time_res
+        self.cache = cache and sat_id is not None
+        self.cache_dir = pathlib.Path(default_cache_dir if cache_dir is None else cache_dir)
+
+        if dts is None:
+            num = int(np.floor((dt_to - dt_fr).total_seconds() / time_res)) + 1
+            dts = np.array([dt_fr + datetime.timedelta(seconds=time_res * i) for i in range(num)])
+        else:
+            dts = np.array(dts).flatten()
+            self.dt_fr = dts[0] if self.dt_fr is None else self.dt_fr
+            self.dt_to = dts[-1] if self.dt_to is None else self.dt_to
+        self.load_data(dts)
+
+    @property
+    def cache_key(self):
+        key = repr((self.propagator.__class__.__name__, self.propagator.source_key, bool(self.to_AACGM)))
+        return hashlib.md5(key.encode()).hexdigest()[:10]
+
+    def load_data(self, dts):
+        sectime, _ = dttool.convert_datetime_to_sectime(dts, dt0=datetime.datetime(1970, 1, 1))
+        keys = [var_name for var_name in default_variable_names if var_name != 'SC_DATETIME']
+        if not self.to_AACGM:
+            keys = [key for key in keys if 'AACGM' not in key]
+
+        results = {key: np.full(sectime.shape, np.nan) for key in keys}
+        ind_missing = np.arange(sectime.size)
+        if self.cache:
+            ind_missing = self._load_cache(sectime, results)
+        if ind_missing.size > 0:
+            mylog.simpleinfo.info(f"Computing {ind_missing.size} orbit positions ...")
+            orbits = self._compute(sectime[ind_missing], dts[ind_missing])
+            for key in keys:
+                results[key][ind_missing] = orbits[key]
+            if self.cache:
+                self._save_cache(sectime[ind_missing], orbits, keys)
+
+        results['SC_DATETIME'] = dts
+        for var_name in default_variable_names:
+            if var_name not in results.keys():
+                continue
+            var = self.add_variable(var_name)
+            var.value = results[var_name].reshape((sectime.size, 1))
+            if var_name != 'SC_DATETIME':
+                var.depends = {0: {'UT': 'SC_DATETIME'}}
+
+    def _compute(self, sectime, dts):
+        x, y, z = self.propagator.propagate(sectime)
+        r = np.sqrt(x**2 + y**2 + z**2)
+        with np.errstate(invalid='ignore'):
+            lat = 90. - np.rad2deg(np.arccos(z / r))
+        lon = np.mod(np.rad2deg(np.arctan2(y, x)), 360.)
+        orbits = {
+            'SC_GEO_LAT': lat,
+            'SC_GEO_LON': lon,
+            'SC_GEO_ALT': r - Re,
+            'SC_GEO_X': x,
+            'SC_GEO_Y': y,
+            'SC_GEO_Z': z,
+        }
+        ctx = geopack.recalc_context(sectime)
+        for cs_out in ['gse', 'gsm']:
+            coords = geopack.transform(x, y, z, 'geo', cs_out, ctx=ctx)
+            for comp, value in zip(['X', 'Y', 'Z'], coords):
+                orbits['SC_' + cs_out.upper() + '_' + comp] = value
+        if self.to_AACGM:
+            orbits.update(self._convert_to_AACGM(sectime, dts, lat, lon, r - Re))
+        return orbits
+
+    def _convert_to_AACGM(self, sectime, dts, lat, lon, height):
+        import aacgmv2 as aacgm
+
+        mlat = np.full(sectime.shape, np.nan)
+        mlon = np.full(sectime.shape, np.nan)
+        mlt = np.full(sectime.shape, np.nan)
+        valid = np.isfinite(lat)
+        batches = np.floor(sectime / self.aacgm_time_res)
+        for b in np.unique(batches[valid]):
+            ind = np.where(valid & (batches == b))[0]
+            dt = datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=b * self.aacgm_time_res)
+            mlat[ind], mlon[ind], _ = aacgm.convert_latlon_arr(
+                in_lat=lat[ind], in_lon=lon[ind], height=height[ind], dtime=dt, method_code='G2A')
+        valid &= np.isfinite(mlon)
+        if np.any(valid):
+            mlt[valid] = aacgm.convert_mlt(mlon[valid], dts[valid])
+        return {'SC_AACGM_LAT': mlat, 'SC_AACGM_LON': mlon, 'SC_AACGM_MLT': mlt}
+
+    def _cache_file_path(self, day):
+        return self.cache_dir / self.sat_id.upper() / day.strftime('%Y') / \
+            f"ORBIT_{self.sat_id.upper()}_{day.strftime('%Y%m%d')}_{self.cache_key}.npz"
+
+    @staticmethod
+    def _days(sectime):
+        days = np.unique(np.floor(sectime / 86400.))
+        return [(d, datetime.datetime(1970, 1, 1) + datetime.timedelta(days=d)) for d in days]
+
+    def _load_cache(self, sectime, results):
+        found = np.zeros(sectime.shape, dtype=bool)
+        ms = np.round(sectime * 1000).astype(np.int64)
+        for d, day in self._days(sectime):
+            file_path = self._cache_file_path(day)
+            if not file_path.is_file():
+                continue
+            with np.load(file_path) as cached:
+                ms_cached = cached['UNIX_TIME_MS']
+                ind = np.searchsorted(ms_cached, ms)
+                ind = np.clip(ind, 0, ms_cached.size - 1)
+                matched = ms_cached[ind] == ms
+                for key in results.keys():
+                    results[key][matched] = cached[key][ind[matched]]
+            found |= matched
+        return np.where(~found)[0]
+
+    def _save_cache(self, sectime, orbits, keys):
+        ms = np.round(sectime * 1000).astype(np.int64)
+        day_ids = np.floor(sectime / 86400.)
+        for d, day in self._days(sectime):
+            in_day = day_ids == d
+            data = {'UNIX_TIME_MS': ms[in_day]}
+            data.update({key: orbits[key][in_day] for key in keys})
+            file_path = self._cache_file_path(day)
+            if file_path.is_file():
+                with np.load(file_path) as f:
+                    cached = dict(f)
+                data = {key: np.concatenate((cached[key], data[key])) for key in data.keys()}
+            ms_all, ind = np.unique(data['UNIX_TIME_MS'], return_index=True)
+            data = {key: value[ind] for key, value in data.items()}
+            file_path.parent.resolve().mkdir(parents=True, exist_ok=True)
+            np.savez(file_path, **data)
+
+
+def _gmst(jd_ut1):
+    """
+    The Greenwich mean sidereal time (IAU-82) in radians.
+    """
+    t = (jd_ut1 - 2451545.0) / 36525.
+    gmst = 67310.54841 + (876600. * 3600. + 8640184.812866) * t + 0.093104 * t**2 - 6.2e-6 * t**3
+    return np.mod(gmst * 2 * np.pi / 86400., 2 * np.pi)
+
+
+def _get_gps_utc_offset(sectime_gps):
+    """
+    GPS - UTC in seconds at the GPS times in seconds since 1970-01-01.
+    """
+    dates = [(datetime.datetime(*date) - datetime.datetime(1970, 1, 1)).total_seconds() for date in leap_second_dates]
+    # the leap seconds are counted in the GPS time.
+    dates = np.array(dates) + np.arange(len(dates))
+    return np.searchsorted(dates, sectime_gps, side='right').astype(float)
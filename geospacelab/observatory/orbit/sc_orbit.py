@@ -14,6 +14,7 @@ from geospacelab.config import prf
 import geospacelab.toolbox.utilities.pydatetime as dttool
 import geospacelab.toolbox.utilities.pylogging as mylog
 from geospacelab.datahub.__dataset_base__ import DatasetSourced
+from geospacelab.wrapper.geopack.geopack import geopack
 
 default_dataset_attrs = {
     'data_root_dir': prf.datahub_data_root_dir / 'SSCWS',
@@ -23,6 +24,7 @@ default_variable_names = [
                 'SC_GEO_LAT', 'SC_GEO_LON', 'SC_GEO_ALT',
                 'SC_GEO_X', 'SC_GEO_Y', 'SC_GEO_Z',
                 'SC_GSE_X', 'SC_GSE_Y', 'SC_GSE_Z',
+                'SC_GSM_X', 'SC_GSM_Y', 'SC_GSM_Z',
                 'SC_AACGM_LAT', 'SC_AACGM_LON', 'SC_AACGM_MLT',
                 'SC_DATETIME'
             ]
@@ -92,6 +94,18 @@ class OrbitPosition_SSCWS(DatasetSourced):
             variables['SC_DATETIME'] = np.reshape(variables['SC_DATETIME'], (fnc['UNIX_TIME'].shape[0], 1))
             fnc.close()
 
+            gsm_names = ['SC_GSM_X', 'SC_GSM_Y', 'SC_GSM_Z']
+            if 'SC_GSE_X' in omit_variables:
+                omit_variables.extend(gsm_names)
+            else:
+                # GSE to GSM with the epoch of each sample.
+                coords_gsm = geopack.transform(
+                    variables['SC_GSE_X'].flatten(), variables['SC_GSE_Y'].flatten(), variables['SC_GSE_Z'].flatten(),
+                    'gse', 'gsm', ut=variables['UNIX_TIME'].flatten()
+                )
+                for var_name, value in zip(gsm_names, coords_gsm):
+                    variables[var_name] = value.reshape((value.size, 1))
+
             for var_name in self._variables.keys():
                 if var_name in omit_variables:
                     continue
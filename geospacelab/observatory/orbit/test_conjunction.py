@@ -0,0 +1,113 @@
+import unittest
+import datetime
+import numpy as np
+from geospacelab.observatory.orbit.conjunction import Track, ConjunctionFinder, search_conjunctions, Re
+
+
+def circular_orbit(secs, period, inclination, node_lon, phase=0.):
+    u = 2 * np.pi * secs / period + phase
+    inc = np.deg2rad(inclination)
+    lat = np.rad2deg(np.arcsin(np.sin(inc) * np.sin(u)))
+    lon = node_lon + np.rad2deg(np.arctan2(np.cos(inc) * np.sin(u), np.cos(u)))
+    return lat, np.mod(lon, 360.)
+
+
+def great_circle_distance(lat_1, lon_1, lat_2, lon_2):
+    lat_1, lon_1, lat_2, lon_2 = [np.deg2rad(a) for a in (lat_1, lon_1, lat_2, lon_2)]
+    dot = np.sin(lat_1) * np.sin(lat_2) + np.cos(lat_1) * np.cos(lat_2) * np.cos(lon_1 - lon_2)
+    return np.arccos(np.clip(dot, -1., 1.)) * Re
+
+
+def search_by_brute_force(track_1, track_2, distance, time_window):
+    """The reference: all the N x M pairs, and the nearest matched sample of the second track."""
+    d = great_circle_distance(
+        track_1.lat[:, np.newaxis], track_1.lon[:, np.newaxis], track_2.lat[np.newaxis, :], track_2.lon[np.newaxis, :])
+    within = d <= distance
+    if not track_2.is_site:
+        within &= np.abs(track_1.sectime[:, np.newaxis] - track_2.sectime[np.newaxis, :]) <= time_window
+    d = np.where(within, d, np.inf)
+    j1 = np.flatnonzero(np.any(within, axis=1))
+    j2 = np.argmin(d[j1], axis=1)
+    return j1, j2, d[j1, j2]
+
+
+class ConjunctionSearch(unittest.TestCase):
+    """The search by the k-d trees in the blocks should agree with the brute-force search."""
+
+    distance = 500.
+    time_window = 120.
+
+    @classmethod
+    def setUpClass(cls):
+        dt0 = datetime.datetime(2015, 3, 17)
+        rng = np.random.default_rng(2015)
+        # two polar orbits with different periods, meeting at the poles from time to time.
+        secs_1 = np.arange(0., 12 * 3600., 10.)
+        secs_1 = secs_1[rng.uniform(size=secs_1.size) > 0.05]
+        secs_2 = np.arange(7., 12 * 3600., 15.)
+        lat_1, lon_1 = circular_orbit(secs_1, 94.5 * 60., 87.4, 20.)
+        lat_2, lon_2 = circular_orbit(secs_2, 101.5 * 60., 98.8, 35., phase=0.4)
+        cls.track_1 = Track(lat_1, lon_1, dts=[dt0 + datetime.timedelta(seconds=s) for s in secs_1], name='A')
+        cls.track_2 = Track(lat_2, lon_2, dts=[dt0 + datetime.timedelta(seconds=s) for s in secs_2], name='B')
+        cls.secs_1 = secs_1
+        cls.lat_1, cls.lon_1 = lat_1, lon_1
+        cls.dt0 = dt0
+
+    def check_intervals(self, intervals, track_1, track_2, expected):
+        j1, j2, d = expected
+        self.assertGreater(j1.size, 0)
+        index_1 = np.concatenate([interval['index_1'] for interval in intervals])
+        index_2 = np.concatenate([interval['index_2'] for interval in intervals])
+        distances = np.concatenate([interval['distance'] for interval in intervals])
+        np.testing.assert_array_equal(index_1, track_1.inds[j1])
+        np.testing.assert_array_equal(index_2, track_2.inds[j2])
+        np.testing.assert_allclose(distances, d, rtol=1e-9, atol=1e-6)
+
+        # the intervals are split at the gaps longer than twice the median sampling interval.
+        max_gap = 2 * np.median(np.diff(track_1.sectime))
+        splits = np.flatnonzero(np.diff(track_1.sectime[j1]) > max_gap) + 1
+        self.assertEqual(len(intervals), splits.size + 1)
+        for interval, k1, k2, dk in zip(intervals, np.split(j1, splits), np.split(j2, splits), np.split(d, splits)):
+            self.assertEqual(interval['dt_fr'], track_1.dts[k1[0]])
+            self.assertEqual(interval['dt_to'], track_1.dts[k1[-1]])
+            self.assertEqual(interval['dt_closest'], track_1.dts[k1[np.argmin(dk)]])
+            if not track_2.is_site:
+                self.assertEqual(interval['dt_closest_2'], track_2.dts[k2[np.argmin(dk)]])
+            self.assertAlmostEqual(interval['distance_min'], np.min(dk), places=6)
+
+    def test_two_satellites(self):
+        expected = search_by_brute_force(self.track_1, self.track_2, self.distance, self.time_window)
+        # the blocks shorter than the passes, to check the matches across the blocks.
+        for block_size in [600., 3600.]:
+            with self.subTest(block_size=block_size):
+                finder = ConjunctionFinder(
+                    distance=self.distance, time_window=self.time_window, block_size=block_size)
+                intervals = finder.search(self.track_1, self.track_2)
+                self.check_intervals(intervals, self.track_1, self.track_2, expected)
+
+    def test_site(self):
+        site = Track.site(78.15, 16.04, name='SITE')
+        expected = search_by_brute_force(self.track_1, site, self.distance, None)
+        finder = ConjunctionFinder(distance=self.distance, block_size=600.)
+        intervals = finder.search(self.track_1, site)
+        self.check_intervals(intervals, self.track_1, site, expected)
+        self.assertTrue(all(interval['dt_closest_2'] is None for interval in intervals))
+
+    def test_no_conjunction(self):
+        # a satellite in the equatorial orbit never comes close to the polar passes.
+        secs = np.arange(0., 12 * 3600., 20.)
+        lat, lon = circular_orbit(secs, 95. * 60., 5., 0.)
+        track = Track(lat, lon, dts=[self.dt0 + datetime.timedelta(seconds=s) for s in secs])
+        j1, _, _ = search_by_brute_force(self.track_1, track, self.distance, self.time_window)
+        self.assertEqual(j1.size, 0)
+        finder = ConjunctionFinder(distance=self.distance, time_window=self.time_window)
+        self.assertEqual(finder.search(self.track_1, track), [])
+        # the tracks not overlapping in time.
+        track_later = Track(self.lat_1, self.lon_1, dts=[
+            self.dt0 + datetime.timedelta(days=1, seconds=s) for s in self.secs_1])
+        self.assertEqual(finder.search(self.track_1, track_later), [])
+        self.assertEqual(search_conjunctions([self.track_1, track], distance=self.distance), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
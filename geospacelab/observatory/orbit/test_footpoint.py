@@ -0,0 +1,76 @@
+import unittest
+import datetime
+import tempfile
+import numpy as np
+from geospacelab.observatory.orbit.footpoint import FootpointMapper, footpoint_keys, Re
+
+
+def great_circle_distance(lat_1, lon_1, lat_2, lon_2, r):
+    lat_1, lon_1, lat_2, lon_2 = np.deg2rad([lat_1, lon_1, lat_2, lon_2])
+    cos_d = np.sin(lat_1) * np.sin(lat_2) + np.cos(lat_1) * np.cos(lat_2) * np.cos(lon_1 - lon_2)
+    return np.arccos(np.clip(cos_d, -1., 1.)) * r
+
+
+class FootpointTrack(unittest.TestCase):
+    """The footpoints interpolated between the anchors should agree with the dense tracing."""
+
+    alt_fp = 110.
+    tolerance = 2.     # km
+
+    @classmethod
+    def setUpClass(cls):
+        # a polar pass at 450 km, sampled every 10 s over 20 min.
+        n = 121
+        cls.dts = np.array([datetime.datetime(2015, 3, 17, 6, 0) + datetime.timedelta(seconds=10 * i)
+                            for i in range(n)])
+        cls.lat = np.linspace(40., 85., n)
+        cls.lon = np.linspace(20., 30., n)
+        cls.alt = np.full(n, 450.)
+
+    def mapper(self, **kwargs):
+        kwargs.setdefault('tolerance', self.tolerance)
+        return FootpointMapper(alt_fp=self.alt_fp, **kwargs)
+
+    def test_interpolation_within_tolerance(self):
+        fps = self.mapper(anchor_interval=300.).map(self.dts, self.lat, self.lon, alt=self.alt)
+        # every sample is an anchor for the dense tracing.
+        fps_dense = self.mapper(anchor_interval=1.).map(self.dts, self.lat, self.lon, alt=self.alt)
+        for hemisphere in ('N', 'S'):
+            lat, lon = fps[hemisphere + '_GEO_LAT'], fps[hemisphere + '_GEO_LON']
+            lat_d, lon_d = fps_dense[hemisphere + '_GEO_LAT'], fps_dense[hemisphere + '_GEO_LON']
+            np.testing.assert_array_equal(np.isnan(lat), np.isnan(lat_d))
+            valid = ~np.isnan(lat)
+            self.assertTrue(np.any(valid))
+            d = great_circle_distance(lat[valid], lon[valid], lat_d[valid], lon_d[valid], Re + self.alt_fp)
+            # the error of the linear interpolation is checked only at the midpoints of the segments.
+            self.assertLessEqual(np.max(d), 2 * self.tolerance)
+
+    def test_cache_round_trip(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            mapper = self.mapper(sat_id='test', cache_dir=cache_dir)
+            fps = mapper.map(self.dts, self.lat, self.lon, alt=self.alt)
+
+            mapper._map_track = lambda *args: self.fail("The cached footpoints are not reused.")
+            fps_cached = mapper.map(self.dts, self.lat, self.lon, alt=self.alt)
+            for key in footpoint_keys:
+                np.testing.assert_array_equal(fps[key], fps_cached[key])
+
+            # the cached samples are not reused for other tracing parameters or positions.
+            calls = []
+            mapper_other = self.mapper(sat_id='test', cache_dir=cache_dir, tolerance=self.tolerance / 2)
+            self.assertNotEqual(mapper_other.cache_key, mapper.cache_key)
+            mapper_other._map_track = lambda sectime, *args: calls.append(sectime.size) or \
+                {key: np.full(sectime.shape, np.nan) for key in footpoint_keys}
+            mapper_other.map(self.dts, self.lat, self.lon, alt=self.alt)
+            self.assertEqual(calls, [self.dts.size])
+
+            calls.clear()
+            mapper._map_track = mapper_other._map_track
+            lat = self.lat.copy()
+            lat[:10] += 0.1
+            mapper.map(self.dts, lat, self.lon, alt=self.alt)
+            self.assertEqual(calls, [10])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,242 @@
+import unittest
+import datetime
+import pathlib
+import shutil
+import tempfile
+from unittest import mock
+import numpy as np
+
+from geospacelab.observatory.orbit.propagation import \
+    TLEPropagator, EphemerisInterpolator, OrbitPosition_Local, Re, _gmst, _get_gps_utc_offset
+
+try:
+    import sgp4
+except ImportError:
+    sgp4 = None
+
+
+tle_1 = (
+    '1 25544U 98067A   19343.69339541  .00001764  00000-0  38792-4 0  9991',
+    '2 25544  51.6439 211.2001 0007417  17.6667  85.6398 15.50103472202482',
+)
+# the same elements at an epoch two days later.
+tle_2 = (
+    '1 25544U 98067A   19345.69339541  .00001764  00000-0  38792-4 0  9991',
+    '2 25544  51.6439 211.2001 0007417  17.6667  85.6398 15.50103472202482',
+)
+
+
+def get_sectime(dt):
+    return (dt - datetime.datetime(1970, 1, 1)).total_seconds()
+
+
+def circular_orbit(sectime):
+    # a smooth track in GEO, not an actual orbit.
+    u = 2 * np.pi * np.asarray(sectime) / 5800.
+    inc = np.deg2rad(87.)
+    r = Re + 500.
+    return r * np.cos(u), r * np.sin(u) * np.cos(inc), r * np.sin(u) * np.sin(inc)
+
+
+def write_sp3(file_path, sectime_utc, positions, sat_id='L47', time_system='GPS'):
+    with open(file_path, 'w') as f:
+        dt0 = datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=sectime_utc[0])
+        f.write('#dP{:%Y %m %d %H %M} 0.00000000 {:6d} ORBIT IGS14 FIT  TST\n'.format(dt0, len(sectime_utc)))
+        f.write('+    1   {}\n'.format(sat_id))
+        f.write('%c L  cc {} ccc cccc cccc cccc cccc ccccc ccccc ccccc ccccc\n'.format(time_system))
+        for t, xyz in zip(sectime_utc, positions):
+            if time_system == 'GPS':
+                t = t + _get_gps_utc_offset(t)
+            dt = datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=t)
+            f.write('*  {:%Y %m %d %H %M} {:11.8f}\n'.format(dt, dt.second + dt.microsecond / 1e6))
+            f.write('P{:3s}{:14.6f}{:14.6f}{:14.6f} 999999.999999\n'.format(sat_id, *xyz))
+        f.write('EOF\n')
+
+
+class Utilities(unittest.TestCase):
+
+    def test_gmst(self):
+        # Vallado, Fundamentals of Astrodynamics and Applications, Example 3-5, at 1992-08-20 12:14 UT1.
+        gmst = _gmst(2448854.5 + (12 * 3600. + 14 * 60.) / 86400.)
+        self.assertAlmostEqual(np.rad2deg(gmst), 152.578787886, places=6)
+
+    def test_gps_utc_offset(self):
+        for dt, offset in [(datetime.datetime(1980, 1, 6), 0.), (datetime.datetime(2016, 12, 31, 23, 59, 59), 17.),
+                           (datetime.datetime(2017, 1, 1, 0, 0, 18), 18.), (datetime.datetime(2020, 1, 1), 18.)]:
+            self.assertEqual(_get_gps_utc_offset(get_sectime(dt)), offset)
+
+
+@unittest.skipIf(sgp4 is None, "sgp4 is not installed")
+class TLEPropagation(unittest.TestCase):
+
+    def propagate_by_sgp4(self, tle, sectime):
+        from sgp4.api import Satrec
+        sat = Satrec.twoline2rv(*tle)
+        days = np.floor(sectime / 86400.)
+        e, r, v = sat.sgp4_array(2440587.5 + days, (sectime - days * 86400.) / 86400.)
+        self.assertTrue(np.all(e == 0))
+        return r
+
+    def test_positions(self):
+        propagator = TLEPropagator([tle_1])
+        sectime = get_sectime(datetime.datetime(2019, 12, 9, 16)) + np.arange(0., 6000., 60.)
+        x, y, z = propagator.propagate(sectime)
+        teme = self.propagate_by_sgp4(tle_1, sectime)
+        # the rotation about the z axis by the sidereal time.
+        np.testing.assert_allclose(np.sqrt(x**2 + y**2 + z**2), np.linalg.norm(teme, axis=1), rtol=1e-12)
+        np.testing.assert_allclose(z, teme[:, 2], rtol=1e-12)
+        gmst = _gmst(2440587.5 + sectime / 86400.)
+        diff = np.arctan2(teme[:, 1], teme[:, 0]) - np.arctan2(y, x) - gmst
+        np.testing.assert_allclose(np.mod(diff + np.pi, 2 * np.pi) - np.pi, 0., atol=1e-9)
+        # the ISS.
+        r = np.sqrt(x**2 + y**2 + z**2)
+        self.assertTrue(np.all((r - Re > 380.) & (r - Re < 450.)))
+        self.assertTrue(np.all(np.abs(np.rad2deg(np.arcsin(z / r))) < 51.7))
+
+    def test_nearest_epoch(self):
+        # the TLEs are sorted by the epochs, and the times are propagated from the TLE with the nearest epoch.
+        propagator = TLEPropagator([tle_2, tle_1])
+        self.assertEqual(propagator.tles, [tle_1, tle_2])
+        epoch_1 = get_sectime(datetime.datetime(2019, 12, 9)) + 0.69339541 * 86400.
+        sectime = epoch_1 + np.array([-3600., 0., 86000., 86800., 2 * 86400., 3 * 86400.])
+        x, y, z = propagator.propagate(sectime)
+        for inds, tle in [([0, 1, 2], tle_1), ([3, 4, 5], tle_2)]:
+            xs, ys, zs = TLEPropagator([tle]).propagate(sectime[inds])
+            np.testing.assert_array_equal(x[inds], xs)
+            np.testing.assert_array_equal(y[inds], ys)
+            np.testing.assert_array_equal(z[inds], zs)
+
+    def test_from_file(self):
+        tmp_dir = pathlib.Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        file_path = tmp_dir / 'tles.txt'
+        other = (tle_1[0].replace('25544U', '43013U'), tle_1[1].replace('2 25544', '2 43013'))
+        with open(file_path, 'w') as f:
+            f.write('\n'.join(['ISS (ZARYA)', *tle_2, 'NOAA 20', *other, '', *tle_1]) + '\n')
+        self.assertEqual(TLEPropagator.from_file(file_path, sat_num=25544).tles, [tle_1, tle_2])
+        self.assertEqual(len(TLEPropagator.from_file(file_path).tles), 3)
+        with self.assertRaises(ValueError):
+            TLEPropagator.from_file(file_path, sat_num=1)
+
+
+class SP3Interpolation(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = pathlib.Path(tempfile.mkdtemp())
+        t0 = get_sectime(datetime.datetime(2020, 3, 1))
+        cls.epochs = t0 + np.arange(0., 86400., 300.)
+        # a data gap, and a bad position written as zeros.
+        cls.epochs = np.delete(cls.epochs, np.arange(100, 110))
+        positions = np.stack(circular_orbit(cls.epochs), axis=-1)
+        positions[200] = 0.
+        cls.file_path = cls.tmp_dir / 'test.sp3'
+        write_sp3(cls.file_path, cls.epochs, positions)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+    def test_read(self):
+        interpolator = EphemerisInterpolator.from_sp3(self.file_path)
+        # the epochs are in UTC.
+        np.testing.assert_allclose(interpolator.sectime, self.epochs, atol=1e-6)
+        x, y, z = circular_orbit(self.epochs)
+        np.testing.assert_allclose(interpolator.positions[:200, 0], x[:200], atol=1e-6)
+        self.assertTrue(np.all(np.isnan(interpolator.positions[200])))
+        self.assertRaises(ValueError, EphemerisInterpolator.from_sp3, self.file_path, sat_id='L48')
+
+    def test_interpolation(self):
+        interpolator = EphemerisInterpolator.from_sp3(self.file_path)
+        sectime = np.arange(self.epochs[0] - 100., self.epochs[-1] + 100., 17.)
+        x, y, z = interpolator.propagate(sectime)
+        truth = np.stack(circular_orbit(sectime), axis=-1)
+        results = np.stack((x, y, z), axis=-1)
+
+        in_gap = (sectime > self.epochs[99]) & (sectime < self.epochs[100])
+        out_of_range = (sectime < self.epochs[0]) | (sectime > self.epochs[-1])
+        self.assertTrue(np.all(np.isnan(results[in_gap | out_of_range])))
+        valid = np.all(np.isfinite(results), axis=1)
+        self.assertFalse(np.any(valid & (in_gap | out_of_range)))
+        # the windows over the gap or the bad position are invalid.
+        near_gap = (sectime > self.epochs[99] - 10 * 300.) & (sectime < self.epochs[100] + 10 * 300.)
+        near_bad = np.abs(sectime - self.epochs[200]) < 10 * 300.
+        self.assertTrue(np.all(valid | out_of_range | near_gap | near_bad))
+        self.assertGreater(np.sum(valid), 0.8 * sectime.size)
+        # within 10 cm, and 10 m next to the ends where the windows are one-sided.
+        np.testing.assert_allclose(results[valid], truth[valid], atol=1e-2, rtol=0)
+        away = valid & (sectime > self.epochs[5]) & (sectime < self.epochs[-5]) & \
+            (np.abs(sectime - self.epochs[99]) > 5 * 300.) & (np.abs(sectime - self.epochs[100]) > 5 * 300.) & \
+            (np.abs(sectime - self.epochs[200]) > 15 * 300.)
+        np.testing.assert_allclose(results[away], truth[away], atol=1e-4, rtol=0)
+        # on the epochs.
+        x, y, z = interpolator.propagate(self.epochs[:50])
+        np.testing.assert_allclose(x, circular_orbit(self.epochs[:50])[0], atol=1e-6)
+
+    def test_empty(self):
+        interpolator = EphemerisInterpolator.from_sp3(self.file_path)
+        x, y, z = interpolator.propagate([])
+        self.assertEqual((x.size, y.size, z.size), (0, 0, 0))
+
+
+class OrbitCache(unittest.TestCase):
+    """The orbit positions loaded from the disk cache are the same as the computed positions."""
+
+    def setUp(self):
+        self.cache_dir = pathlib.Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        t0 = get_sectime(datetime.datetime(2020, 3, 1, 20))
+        epochs = t0 + np.arange(0., 12 * 3600., 60.)
+        self.propagator = EphemerisInterpolator(epochs, *circular_orbit(epochs), source_key='test')
+        self.dt_fr = datetime.datetime(2020, 3, 1, 22)
+        self.dt_to = datetime.datetime(2020, 3, 2, 2)
+
+    def load(self, dt_fr, dt_to, **kwargs):
+        kwargs.setdefault('propagator', self.propagator)
+        return OrbitPosition_Local(
+            dt_fr=dt_fr, dt_to=dt_to, time_res=30., sat_id='test', to_AACGM=False, cache_dir=self.cache_dir,
+            **kwargs)
+
+    def test_cache(self):
+        orbit = self.load(self.dt_fr, self.dt_to)
+        # one file for each day.
+        file_paths = sorted(self.cache_dir.glob('TEST/2020/ORBIT_TEST_*.npz'))
+        self.assertEqual([fp.name.split('_')[2] for fp in file_paths], ['20200301', '20200302'])
+
+        with mock.patch.object(self.propagator, 'propagate', wraps=self.propagator.propagate) as propagate:
+            orbit_cached = self.load(self.dt_fr, self.dt_to)
+            propagate.assert_not_called()
+        for var_name in orbit.keys():
+            with self.subTest(variable=var_name):
+                value = orbit[var_name].value
+                self.assertEqual(value.shape, (481, 1))
+                np.testing.assert_array_equal(orbit_cached[var_name].value, value)
+        self.assertTrue(np.all(np.isfinite(orbit['SC_GSM_X'].value)))
+        np.testing.assert_allclose(orbit['SC_GEO_ALT'].value, 500., atol=1e-6)
+
+    def test_partial(self):
+        orbit = self.load(self.dt_fr, self.dt_to)
+        # only the times not in the cache are computed, and merged into the cache file.
+        dt_to = self.dt_to + datetime.timedelta(hours=1)
+        with mock.patch.object(self.propagator, 'propagate', wraps=self.propagator.propagate) as propagate:
+            orbit_extended = self.load(self.dt_fr, dt_to)
+            propagate.assert_called_once()
+            sectime = propagate.call_args[0][0]
+        np.testing.assert_allclose(sectime, get_sectime(self.dt_to) + np.arange(30., 3601., 30.))
+        np.testing.assert_array_equal(orbit_extended['SC_GEO_X'].value[:481], orbit['SC_GEO_X'].value)
+
+        with mock.patch.object(self.propagator, 'propagate', side_effect=AssertionError):
+            orbit_cached = self.load(self.dt_fr, dt_to)
+        for var_name in ['SC_GEO_X', 'SC_GSM_Z']:
+            np.testing.assert_array_equal(orbit_cached[var_name].value, orbit_extended[var_name].value)
+
+    def test_different_source(self):
+        self.load(self.dt_fr, self.dt_to)
+        propagator = EphemerisInterpolator(self.propagator.sectime, *self.propagator.positions.T, source_key='other')
+        with mock.patch.object(propagator, 'propagate', wraps=propagator.propagate) as propagate:
+            self.load(self.dt_fr, self.dt_to, propagator=propagator)
+            propagate.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
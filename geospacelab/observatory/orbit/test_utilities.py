@@ -0,0 +1,171 @@
+import unittest
+import datetime
+import numpy as np
+from geospacelab.observatory.orbit.utilities import LEOToolbox
+
+
+def sector_by_loops(lat, dts, inds_center, inds_before, inds_after, is_in_sector, get_pseudo_lat):
+    """The reference: the loop over the centers, as group_by_sector was implemented before the vectorization."""
+    sector = np.zeros((dts.size,))
+    dts_c = np.zeros_like(dts)
+    pseudo_lat = np.full((dts.size,), np.nan)
+    for num, ind_rec in enumerate(inds_center):
+        ind_tmp = np.where(inds_before < ind_rec)[0]
+        ind_1 = inds_before[ind_tmp[-1]] if list(ind_tmp) else 0
+        ind_tmp = np.where(inds_after > ind_rec)[0]
+        ind_2 = inds_after[ind_tmp[0]] if list(ind_tmp) else len(lat) - 1
+        inds_seg = np.array(range(ind_1, ind_2))
+
+        dt_c = dts[ind_rec]
+        lat_seg = lat[inds_seg]
+        dts_seg = dts[inds_seg]
+        delta_t_seg = np.array([(dt1 - dt_c).total_seconds() / 60. for dt1 in dts_seg])
+        inds_seg_seg = np.where(is_in_sector(lat_seg) & (np.abs(delta_t_seg) < 60.))[0]
+
+        inds_sector = inds_seg[inds_seg_seg]
+        sector[inds_sector] = num + 1
+        dts_c[inds_sector] = dt_c
+        pseudo_lat[inds_sector] = get_pseudo_lat(lat_seg, dts_seg < dt_c)[inds_seg_seg]
+    return sector, dts_c, pseudo_lat
+
+
+class GroupBySector(unittest.TestCase):
+    """The vectorized sectorization should agree with the loop over the centers."""
+
+    boundary_lat = 45.
+
+    @classmethod
+    def setUpClass(cls):
+        # a polar orbit of 95 min, sampled every 30 s over one day, with the data gaps.
+        dt0 = datetime.datetime(2016, 3, 14)
+        secs = np.arange(0, 86400, 30.)
+        rng = np.random.default_rng(2016)
+        for ind in rng.choice(secs.size - 200, 5, replace=False):
+            secs[ind:ind + int(rng.integers(20, 200))] = np.nan
+        secs = secs[np.isfinite(secs)]
+        phase = 2 * np.pi * secs / (95 * 60.) + 0.3
+        lat = np.rad2deg(np.arcsin(np.sin(np.deg2rad(87.)) * np.sin(phase)))
+
+        cls.dts = np.array([dt0 + datetime.timedelta(seconds=sec) for sec in secs])
+        cls.lat = lat
+        cls.toolbox = LEOToolbox(dt_fr=dt0, dt_to=dt0 + datetime.timedelta(days=1))
+        cls.toolbox['SC_DATETIME'].value = cls.dts.reshape((-1, 1))
+        cls.toolbox['SC_GEO_LAT'].value = lat.reshape((-1, 1))
+        cls.toolbox['SC_GEO_LON'].value = np.mod(secs / 240., 360.).reshape((-1, 1))
+        cls.toolbox['SC_GEO_LST'].value = np.mod(secs / 3600., 24.).reshape((-1, 1))
+        cls.toolbox.search_orbit_nodes()
+
+    def reference(self, sector_name, dts=None):
+        dts = self.dts if dts is None else dts
+        lat = self.lat
+        inds_n = self.toolbox.northern_nodes['INDEX']
+        inds_n = inds_n[lat[inds_n] > np.max(lat[inds_n]) / 1.5]
+        inds_s = self.toolbox.southern_nodes['INDEX']
+        inds_s = inds_s[lat[inds_s] < np.min(lat[inds_s]) / 1.5]
+        inds_asc = np.asarray(self.toolbox.ascending_nodes['INDEX'])
+        inds_dsc = np.asarray(self.toolbox.descending_nodes['INDEX'])
+        b = np.abs(self.boundary_lat)
+        configs = {
+            'N': (inds_n, inds_s, inds_s, lambda x: x > b,
+                  lambda x, before: np.where(before, x, 180. - x)),
+            'S': (inds_s, inds_n, inds_n, lambda x: x < -b,
+                  lambda x, before: np.where(before, 180. - x, 360. + x)),
+            'ASC': (inds_asc, inds_s, inds_n, lambda x: np.abs(x) < b,
+                    lambda x, before: x),
+            'DSC': (inds_dsc, inds_n, inds_s, lambda x: np.abs(x) < b,
+                    lambda x, before: 180. - x),
+        }
+        return sector_by_loops(lat, dts, *configs[sector_name])
+
+    def test_sectors(self):
+        for sector_name in ['N', 'S', 'ASC', 'DSC']:
+            with self.subTest(sector=sector_name):
+                self.toolbox.group_by_sector(sector_name, self.boundary_lat)
+                sector, dts_c, pseudo_lat = self.reference(sector_name)
+                self.assertTrue(np.any(sector > 0))
+                np.testing.assert_array_equal(self.toolbox['SECTOR_' + sector_name].value.flatten(), sector)
+                np.testing.assert_array_equal(
+                    self.toolbox['SECTOR_' + sector_name + '_DATETIME'].value.flatten(), dts_c)
+                np.testing.assert_array_equal(
+                    self.toolbox['SECTOR_' + sector_name + '_PSEUDO_LAT'].value.flatten(), pseudo_lat)
+
+    def test_new_times(self):
+        # the times of the spacecraft changed in place are used for the sectors.
+        toolbox = LEOToolbox(dt_fr=self.toolbox.dt_fr, dt_to=self.toolbox.dt_to)
+        for var_name in ['SC_DATETIME', 'SC_GEO_LAT', 'SC_GEO_LON', 'SC_GEO_LST']:
+            toolbox[var_name].value = self.toolbox[var_name].value.copy()
+        toolbox.search_orbit_nodes()
+        toolbox.group_by_sector('N', self.boundary_lat)
+
+        dts = toolbox['SC_DATETIME'].value
+        dts[:] = dts[0, 0] + (dts - dts[0, 0]) * 2
+        toolbox.group_by_sector('N', self.boundary_lat)
+        sector, dts_c, pseudo_lat = self.reference('N', dts=self.dts[0] + (self.dts - self.dts[0]) * 2)
+        np.testing.assert_array_equal(toolbox['SECTOR_N'].value.flatten(), sector)
+        np.testing.assert_array_equal(toolbox['SECTOR_N_DATETIME'].value.flatten(), dts_c)
+
+
+class GriddataBySectorBinning(unittest.TestCase):
+    """The sector grids aggregated by binning should agree with the brute-force binning."""
+
+    @classmethod
+    def setUpClass(cls):
+        dt0 = datetime.datetime(2016, 3, 14)
+        secs = np.arange(0, 86400, 30.)
+        phase = 2 * np.pi * secs / (95 * 60.) + 0.3
+        lat = np.rad2deg(np.arcsin(np.sin(np.deg2rad(87.)) * np.sin(phase)))
+        cls.toolbox = LEOToolbox(dt_fr=dt0, dt_to=dt0 + datetime.timedelta(days=1))
+        cls.toolbox['SC_DATETIME'].value = np.array(
+            [dt0 + datetime.timedelta(seconds=sec) for sec in secs]).reshape((-1, 1))
+        cls.toolbox['SC_GEO_LAT'].value = lat.reshape((-1, 1))
+        # the longitudes crossing 0/360 in the northern sectors.
+        cls.toolbox['SC_GEO_LON'].value = np.mod(secs / 240. - 30., 360.).reshape((-1, 1))
+        cls.toolbox['SC_GEO_LST'].value = np.mod(secs / 3600., 24.).reshape((-1, 1))
+        cls.toolbox.add_variable('TEST_VALUE', value=np.cos(phase * 3.).reshape((-1, 1)))
+        cls.toolbox.group_by_sector('N', 60.)
+        cls.dt0 = dt0
+
+    def test_binning(self):
+        self.toolbox.griddata_by_sector(
+            sector_name='N', variable_names=['TEST_VALUE', 'SC_GEO_LON'], x_grid_res=3600., y_grid_res=2.,
+            binning='mean')
+        grid_x = self.toolbox['SECTOR_N_GRID_X'].value[:, 0]
+        grid_y = self.toolbox['SECTOR_N_GRID_Y'].value[0, :]
+        x_edges = np.concatenate(([grid_x[0] - 1800.], (grid_x[1:] + grid_x[:-1]) / 2, [grid_x[-1] + 1800.]))
+        y_edges = np.concatenate(([grid_y[0] - 1.], (grid_y[1:] + grid_y[:-1]) / 2, [grid_y[-1] + 1.]))
+
+        sector = self.toolbox['SECTOR_N'].value.flatten()
+        in_sector = sector > 0
+        dts_c = self.toolbox['SECTOR_N_DATETIME'].value.flatten()[in_sector]
+        x = np.array([(dt - self.dt0).total_seconds() for dt in dts_c])
+        y = self.toolbox['SECTOR_N_PSEUDO_LAT'].value.flatten()[in_sector]
+        for var_name, period in [('TEST_VALUE', None), ('SC_GEO_LON', 360.)]:
+            with self.subTest(variable=var_name):
+                values = self.toolbox[var_name].value.flatten()[in_sector]
+                grid = self.toolbox['SECTOR_N_GRID_' + var_name].value
+                self.assertEqual(grid.shape, (grid_x.size, grid_y.size))
+                expected = np.full(grid.shape, np.nan)
+                for i in range(grid_x.size):
+                    for j in range(grid_y.size):
+                        v = values[(x >= x_edges[i]) & (x < x_edges[i + 1])
+                                   & (y >= y_edges[j]) & (y < y_edges[j + 1])]
+                        if not v.size:
+                            continue
+                        if period is None:
+                            expected[i, j] = np.mean(v)
+                        else:
+                            a = np.deg2rad(v)
+                            expected[i, j] = np.mod(np.rad2deg(np.arctan2(np.mean(np.sin(a)), np.mean(np.cos(a)))),
+                                                    360.)
+                np.testing.assert_array_equal(np.isnan(grid), np.isnan(expected))
+                valid = np.isfinite(grid)
+                self.assertTrue(np.any(valid))
+                diff = grid[valid] - expected[valid]
+                if period is not None:
+                    self.assertTrue(np.all((grid[valid] >= 0.) & (grid[valid] < period)))
+                    diff = np.mod(diff + period / 2, period) - period / 2
+                np.testing.assert_allclose(diff, 0., atol=1e-9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,8 +7,23 @@ import scipy.signal as sig
 
 from geospacelab.datahub import DatasetUser
 from geospacelab.toolbox.utilities import pydatetime as dttool
+import geospacelab.toolbox.utilities.numpybinning as numpybinning
 import geospacelab.toolbox.utilities.numpymath as npmath
 from geospacelab.cs import GEOCSpherical
+from geospacelab.cs.geo_utilities import rotation_matrix_ENU_to_GEOC, rotate_vectors
+
+
+def _convert_datetime_to_sectime(dts, dt0):
+    # The same as [(dt - dt0).total_seconds() for dt in dts], with the datetime arithmetic done by numpy.
+    return _convert_datetime_to_microseconds(dts, dt0) / 1e6
+
+
+def _convert_datetime_to_microseconds(dts, dt0):
+    # The exact times in microseconds since dt0, to compare the times as the datetimes.
+    dts = np.asarray(dts, dtype=object)
+    if not dts.size:
+        return np.zeros((0,), dtype=np.int64)
+    return ((dts - dt0) // datetime.timedelta(microseconds=1)).astype(np.int64)
 
 
 class LEOToolbox(DatasetUser):
@@ -122,185 +137,114 @@ class LEOToolbox(DatasetUser):
         inds_center_S = inds_center_S[iii]
         # inds_center_S = inds_center_S[np.where(lat[inds_center_S] < -np.abs(boundary_lat))[0]]
 
-        # Sector centered at the northern pole from the ascending node towards the descending node.
+        # The segment of a sector is bounded by the nodes before and after its center:
+        # N, centered at the northern pole from the ascending node towards the descending node;
+        # S, centered at the southern pole from the descending node towards the ascending node;
+        # ASC, centered at the ascending node from south towards north;
+        # DSC, centered at the descending node from north towards south.
         if sector_name == 'N':
-            sector = np.zeros((dts.size,))
-            dts_c = np.zeros_like(dts)
-
-            pseudo_lat = np.empty_like(sector)
-            pseudo_lat[:] = np.nan
-            for num, ind_rec in enumerate(inds_center_N):
-
-                ind_tmp = np.where(inds_center_S < ind_rec)[0]
-                if list(ind_tmp):
-                    ind_rec_S1 = inds_center_S[ind_tmp[-1]]
-                else:
-                    ind_rec_S1 = 0
-                ind_tmp = np.where(inds_center_S > ind_rec)[0]
-                if list(ind_tmp):
-                    ind_rec_S2 = inds_center_S[ind_tmp[0]]
-                else:
-                    ind_rec_S2 = len(lat) - 1
-                inds_seg = np.array(range(ind_rec_S1, ind_rec_S2))
-
-                dt_c = dts[ind_rec]
-                lat_seg = lat[inds_seg]
-                dts_seg = dts[inds_seg]
-                delta_t_seg = np.array([(dt1 - dt_c).total_seconds() / 60. for dt1 in dts_seg])
-                inds_seg_seg = np.where((lat_seg > boundary_lat) & (np.abs(delta_t_seg) < 60.))[0]
-
-                inds_sector = inds_seg[inds_seg_seg]
-                sector[inds_sector] = num + 1
-                dts_c[inds_sector] = dt_c
-
-
-                lat_seg = np.where(dts_seg < dt_c, lat_seg, 180. - lat_seg)
-                pseudo_lat[inds_sector] = lat_seg[inds_seg_seg]
-
-            self.add_variable(var_name='SECTOR_N', value=sector.reshape((sector.size, 1)))
-            self.add_variable(var_name='SECTOR_N_DATETIME', value=dts_c.reshape((sector.size, 1)))
-            self.add_variable(var_name='SECTOR_N_PSEUDO_LAT', value=pseudo_lat.reshape((sector.size, 1)))
-            self.sectors['N'] = {
-                'BOUNDARY_LAT': boundary_lat,
-                'PSEUDO_LAT_RANGE': [boundary_lat, 180. - boundary_lat],
-                'VARIABLE_NAMES': ['SECTOR_N', 'SECTOR_N_DATETIME', 'SECTOR_N_PSEUDO_LAT']
-            }
-        
-        # Sector centered at the southern pole from the descending node towards the ascending node.
+            inds_center, inds_before, inds_after = inds_center_N, inds_center_S, inds_center_S
+            pseudo_lat_range = [boundary_lat, 180. - boundary_lat]
         elif sector_name == 'S':
-            sector = np.zeros((dts.size,))
-            dts_c = np.zeros_like(dts)
-
-            pseudo_lat = np.empty_like(sector)
-            pseudo_lat[:] = np.nan
-            for num, ind_rec in enumerate(inds_center_S):
-
-                ind_tmp = np.where(inds_center_N < ind_rec)[0]
-                if list(ind_tmp):
-                    ind_rec_N1 = inds_center_N[ind_tmp[-1]]
-                else:
-                    ind_rec_N1 = 0
-                ind_tmp = np.where(inds_center_N > ind_rec)[0]
-                if list(ind_tmp):
-                    ind_rec_N2 = inds_center_N[ind_tmp[0]]
-                else:
-                    ind_rec_N2 = len(lat) - 1
-                inds_seg = np.array(range(ind_rec_N1, ind_rec_N2))
-
-                dt_c = dts[ind_rec]
-                lat_seg = lat[inds_seg]
-                dts_seg = dts[inds_seg]
-                delta_t_seg = np.array([(dt1 - dt_c).total_seconds() / 60. for dt1 in dts_seg])
-                inds_seg_seg = np.where((lat_seg < -np.abs(boundary_lat)) & (np.abs(delta_t_seg) < 60.))[0]
-
-                inds_sector = inds_seg[inds_seg_seg]
-                sector[inds_sector] = num + 1
-                dts_c[inds_sector] = dt_c
-
-                lat_seg = np.where(dts_seg < dt_c, 180. - lat_seg, 360. + lat_seg)
-                pseudo_lat[inds_sector] = lat_seg[inds_seg_seg]
-
-            self.add_variable(var_name='SECTOR_S', value=sector.reshape((sector.size, 1)))
-            self.add_variable(var_name='SECTOR_S_DATETIME', value=dts_c.reshape((sector.size, 1)))
-            self.add_variable(var_name='SECTOR_S_PSEUDO_LAT', value=pseudo_lat.reshape((sector.size, 1)))
-            self.sectors['S'] = {
-                'BOUNDARY_LAT': boundary_lat,
-                'PSEUDO_LAT_RANGE': [180. + np.abs(boundary_lat), 360. - np.abs(boundary_lat)],
-                'VARIABLE_NAMES': ['SECTOR_S', 'SECTOR_S_DATETIME', 'SECTOR_S_PSEUDO_LAT']
-            }
-
-        # Sector centered at the asending node from south towards north.
+            inds_center, inds_before, inds_after = inds_center_S, inds_center_N, inds_center_N
+            pseudo_lat_range = [180. + np.abs(boundary_lat), 360. - np.abs(boundary_lat)]
         elif sector_name == 'ASC':
-            sector = np.zeros((dts.size,))
-            dts_c = np.zeros_like(dts)
+            inds_center, inds_before, inds_after = inds_asc, inds_center_S, inds_center_N
+            pseudo_lat_range = [-np.abs(boundary_lat), np.abs(boundary_lat)]
+        elif sector_name == 'DSC':
+            inds_center, inds_before, inds_after = inds_dsc, inds_center_N, inds_center_S
+            pseudo_lat_range = [180. - np.abs(boundary_lat), 180. + np.abs(boundary_lat)]
+        else:
+            raise NotImplementedError
 
-            pseudo_lat = np.empty_like(sector)
-            pseudo_lat[:] = np.nan
-            for num, ind_rec in enumerate(inds_asc):
+        inds_center = np.asarray(inds_center, dtype=int)
+        inds, nums = self._get_sector_segments(inds_center, inds_before, inds_after, lat.size)
 
-                ind_tmp = np.where(inds_center_S < ind_rec)[0]
-                if list(ind_tmp):
-                    ind_rec_S1 = inds_center_S[ind_tmp[-1]]
-                else:
-                    ind_rec_S1 = 0
-                ind_tmp = np.where(inds_center_N > ind_rec)[0]
-                if list(ind_tmp):
-                    ind_rec_N1 = inds_center_N[ind_tmp[0]]
-                else:
-                    ind_rec_N1 = len(lat) - 1 
-                inds_seg = np.array(range(ind_rec_S1, ind_rec_N1))
-
-                dt_c = dts[ind_rec]
-                lat_seg = lat[inds_seg]
-                dts_seg = dts[inds_seg]
-                delta_t_seg = np.array([(dt1 - dt_c).total_seconds() / 60. for dt1 in dts_seg])
-                inds_seg_seg = np.where((np.abs(lat_seg) < np.abs(boundary_lat)) & (np.abs(delta_t_seg) < 60.))[0]
-
-                inds_sector = inds_seg[inds_seg_seg]
-                sector[inds_sector] = num + 1
-                dts_c[inds_sector] = dt_c
-
-                lat_seg = np.where(lat_seg < 0, lat_seg, lat_seg)
-                pseudo_lat[inds_sector] = lat_seg[inds_seg_seg]
-
-            self.add_variable(var_name='SECTOR_ASC', value=sector.reshape((sector.size, 1)))
-            self.add_variable(var_name='SECTOR_ASC_DATETIME', value=dts_c.reshape((sector.size, 1)))
-            self.add_variable(var_name='SECTOR_ASC_PSEUDO_LAT', value=pseudo_lat.reshape((sector.size, 1)))
-            self.sectors['ASC'] = {
-                'BOUNDARY_LAT': boundary_lat,
-                'PSEUDO_LAT_RANGE': [-np.abs(boundary_lat), np.abs(boundary_lat)],
-                'VARIABLE_NAMES': ['SECTOR_ASC', 'SECTOR_ASC_DATETIME', 'SECTOR_ASC_PSEUDO_LAT']
-            }
-            
-            # Sector centered at the asending node from south towards north.
+        us = _convert_datetime_to_microseconds(dts, dts[0])
+        lat_seg = lat[inds]
+        delta_t_seg = us[inds] - us[inds_center[nums]]
+        if sector_name == 'N':
+            is_lat = lat_seg > boundary_lat
+        elif sector_name == 'S':
+            is_lat = lat_seg < -np.abs(boundary_lat)
+        else:
+            is_lat = np.abs(lat_seg) < np.abs(boundary_lat)
+        inds_seg_seg = np.where(is_lat & (np.abs(delta_t_seg) < 3600 * 10**6))[0]
+        inds, nums = inds[inds_seg_seg], nums[inds_seg_seg]
+        lat_seg, delta_t_seg = lat_seg[inds_seg_seg], delta_t_seg[inds_seg_seg]
+
+        # The overlapping segments (e.g., at the data gaps) are assigned to the last sector.
+        pos = np.arange(inds.size)
+        pos_last = np.full((lat.size,), -1)
+        np.maximum.at(pos_last, inds, pos)
+        is_last = pos_last[inds] == pos
+        inds, nums, lat_seg, delta_t_seg = inds[is_last], nums[is_last], lat_seg[is_last], delta_t_seg[is_last]
+
+        if sector_name == 'N':
+            lat_seg = np.where(delta_t_seg < 0, lat_seg, 180. - lat_seg)
+        elif sector_name == 'S':
+            lat_seg = np.where(delta_t_seg < 0, 180. - lat_seg, 360. + lat_seg)
         elif sector_name == 'DSC':
-            sector = np.zeros((dts.size,))
-            dts_c = np.zeros_like(dts)
+            lat_seg = 180. - lat_seg
+
+        sector = np.zeros((dts.size,))
+        sector[inds] = nums + 1
+        dts_c = np.zeros_like(dts)
+        dts_c[inds] = dts[inds_center[nums]]
+        pseudo_lat = np.empty_like(sector)
+        pseudo_lat[:] = np.nan
+        pseudo_lat[inds] = lat_seg
+
+        var_names = ['SECTOR_' + sector_name, 'SECTOR_' + sector_name + '_DATETIME',
+                     'SECTOR_' + sector_name + '_PSEUDO_LAT']
+        self.add_variable(var_name=var_names[0], value=sector.reshape((sector.size, 1)))
+        self.add_variable(var_name=var_names[1], value=dts_c.reshape((sector.size, 1)))
+        self.add_variable(var_name=var_names[2], value=pseudo_lat.reshape((sector.size, 1)))
+        self.sectors[sector_name] = {
+            'BOUNDARY_LAT': boundary_lat,
+            'PSEUDO_LAT_RANGE': pseudo_lat_range,
+            'VARIABLE_NAMES': var_names
+        }
 
-            pseudo_lat = np.empty_like(sector)
-            pseudo_lat[:] = np.nan
-            for num, ind_rec in enumerate(inds_dsc):
+    @staticmethod
+    def _get_sector_segments(inds_center, inds_before, inds_after, num_samples):
+        """
+        Get the samples in the segments of the sectors. The segment of a center is from the last node in inds_before
+        before the center (or the first sample) to the first node in inds_after after the center (or the last sample,
+        exclusively).
+
+        :return: inds, nums. The indices of the samples in the segments, and the numbers of the segments (starting
+            from 0), in the order of the centers.
+        """
+        inds_before = np.asarray(inds_before, dtype=int)
+        inds_after = np.asarray(inds_after, dtype=int)
+        i = np.searchsorted(inds_before, inds_center, side='left') - 1
+        starts = np.where(i >= 0, inds_before[np.maximum(i, 0)] if inds_before.size else 0, 0)
+        i = np.searchsorted(inds_after, inds_center, side='right')
+        stops = np.where(
+            i < inds_after.size, inds_after[np.minimum(i, inds_after.size - 1)] if inds_after.size else 0,
+            num_samples - 1)
+        lengths = np.maximum(stops - starts, 0)
+        nums = np.repeat(np.arange(inds_center.size), lengths)
+        offsets = np.cumsum(lengths) - lengths
+        inds = np.arange(nums.size) - np.repeat(offsets - starts, lengths)
+        return inds, nums
 
-                ind_tmp = np.where(inds_center_N < ind_rec)[0]
-                if list(ind_tmp):
-                    ind_rec_N1 = inds_center_N[ind_tmp[-1]]
-                else:
-                    ind_rec_N1 = 0
-                ind_tmp = np.where(inds_center_S > ind_rec)[0]
-                if list(ind_tmp):
-                    ind_rec_S1 = inds_center_S[ind_tmp[0]]
-                else:
-                    ind_rec_S1 = len(lat) - 1
-                inds_seg = np.array(range(ind_rec_N1, ind_rec_S1))
-
-                dt_c = dts[ind_rec]
-                lat_seg = lat[inds_seg]
-                dts_seg = dts[inds_seg]
-                delta_t_seg = np.array([(dt1 - dt_c).total_seconds() / 60. for dt1 in dts_seg])
-                inds_seg_seg = np.where((np.abs(lat_seg) < np.abs(boundary_lat)) & (np.abs(delta_t_seg) < 60.))[0]
-
-                inds_sector = inds_seg[inds_seg_seg]
-                sector[inds_sector] = num + 1
-                dts_c[inds_sector] = dt_c
-
-                lat_seg = np.where(lat_seg > 0, 180. - lat_seg, 180. - lat_seg)
-                pseudo_lat[inds_sector] = lat_seg[inds_seg_seg]
-
-            self.add_variable(var_name='SECTOR_DSC', value=sector.reshape((sector.size, 1)))
-            self.add_variable(var_name='SECTOR_DSC_DATETIME', value=dts_c.reshape((sector.size, 1)))
-            self.add_variable(var_name='SECTOR_DSC_PSEUDO_LAT', value=pseudo_lat.reshape((sector.size, 1)))
-            self.sectors['DSC'] = {
-                'BOUNDARY_LAT': boundary_lat,
-                'PSEUDO_LAT_RANGE': [180. - np.abs(boundary_lat), 180. + np.abs(boundary_lat)],
-                'VARIABLE_NAMES': ['SECTOR_DSC', 'SECTOR_DSC_DATETIME', 'SECTOR_DSC_PSEUDO_LAT']
-            }
-        else:
-            raise NotImplementedError
-                
     def griddata_by_sector(
             self, sector_name=None, variable_names=None, x_grid_res=20*60, y_grid_res=0.5, along_track_interp=True,
-            x_data_res=None, y_data_res=None, along_track_binning=False, 
+            x_data_res=None, y_data_res=None, along_track_binning=False, binning=None,
             ):
+        """
+        Grid the variables of the samples in a sector onto a (time, pseudo latitude) grid.
+
+        :param binning: if not None, the samples are aggregated into the bins of the grid by
+            :class:`GridBinner <geospacelab.toolbox.utilities.numpybinning.GridBinner>` with the method
+            'mean', 'median', 'count', or 'nearest', where the times of the samples are the center times of their
+            sectors. The bins are computed once for all the variables, and the empty bins are NaN.
+            The longitudes and local times are averaged as periodic variables.
+            Otherwise, the variables are interpolated (along_track_interp or along_track_binning) or gridded by
+            scipy.interpolate.griddata.
+        """
         self.visual = 'on'
         dts_c = self['_'.join(('SECTOR', sector_name, 'DATETIME'))].value.flatten()
         dts = self['SC_DATETIME'].value.flatten()
@@ -318,16 +262,16 @@ class LEOToolbox(DatasetUser):
         y_data = lat[sector > 0]
         is_finite = np.isfinite(y_data)
         dt0 = dttool.get_start_of_the_day(self.dt_fr)
-        sectime = np.array([(dt - dt0).total_seconds() for dt in x_data])
+        sectime = _convert_datetime_to_sectime(x_data, dt0)
         x = sectime
         y = y_data
         
-        x_1 = np.array([(dt - dt0).total_seconds() for dt in x_data_1]) 
+        x_1 = _convert_datetime_to_sectime(x_data_1, dt0)
         # max_x = np.ceil(np.max(x) / self.xgrid_res) * self.xgrid_res
         # min_x = np.floor(np.min(x) / self.xgrid_res) * self.xgrid_res
 
         x_unique = np.unique(dts_c[sector > 0])
-        x_unique = [(t - dt0).total_seconds() for t in x_unique]
+        x_unique = list(_convert_datetime_to_sectime(x_unique, dt0))
         if x_data_res is None:
             x_data_res = np.median(np.diff(x_unique))
 
@@ -336,7 +280,7 @@ class LEOToolbox(DatasetUser):
             if y_grid_res > y_data_res:
                 y_data_res = y_grid_res
 
-        ny = int(np.ceil(np.diff(lat_range) / y_grid_res) + 1)
+        ny = int(np.ceil(np.diff(lat_range)[0] / y_grid_res) + 1)
         if x_grid_res is None:
             grid_x, grid_y = np.meshgrid(x_unique, np.linspace(lat_range[0], lat_range[1], ny))
             x_interp = False
@@ -355,25 +299,37 @@ class LEOToolbox(DatasetUser):
             )
             x_interp = True
 
-        grid_lat = griddata((x_1, y), y, (grid_x, grid_y), method='nearest')
-
         if self.sector_cs == 'AACGM':
-            mask_y = np.abs(grid_y - grid_lat) > y_data_res * 2
+            y_mask_scale = 2
             which_lat = 'AACGM_LAT'
         if self.sector_cs == 'APEX':
-            mask_y = np.abs(grid_y - grid_lat) > y_data_res * 2
+            y_mask_scale = 2
             which_lat = 'APEX_LAT' 
         else:
-            mask_y = np.abs(grid_y - grid_lat) > y_data_res * 1.2
+            y_mask_scale = 1.2
             which_lat = 'GEO_LAT'
-            
-        grid_sectime = griddata((x_1, y), x_1, (grid_x, grid_y), method='nearest')
-        mask_x = np.abs(grid_x - grid_sectime) > x_data_res * 1.5
+
+        if binning is not None:
+            binner = numpybinning.GridBinner(x_1, y, grid_x[0, :], grid_y[:, 0])
+        else:
+            grid_lat = griddata((x_1, y), y, (grid_x, grid_y), method='nearest')
+            mask_y = np.abs(grid_y - grid_lat) > y_data_res * y_mask_scale
+
+            grid_sectime = griddata((x_1, y), x_1, (grid_x, grid_y), method='nearest')
+            mask_x = np.abs(grid_x - grid_sectime) > x_data_res * 1.5
 
         method = 'linear'
         for var_name in variable_names:
             vrb = self[var_name].value.flatten()[sector>0]
-            if along_track_binning:
+            if binning is not None:
+                if 'LON' in var_name:
+                    period = 360.
+                elif 'LST' in var_name or 'MLT' in var_name:
+                    period = 24.
+                else:
+                    period = None
+                grid_z = binner(vrb, method=binning, period=period).T
+            elif along_track_binning:
                 sector_1 = sector[sector>0]
                 n_tracks = int(np.max(sector))
                 n_lats = ny
@@ -463,8 +419,9 @@ class LEOToolbox(DatasetUser):
                         grid_z[ii, :] = zd
             else:
                 grid_z = griddata((x, y), vrb, (grid_x, grid_y), method=method)
-            grid_z[mask_y] = np.nan
-            grid_z[mask_x] = np.nan
+            if binning is None:
+                grid_z[mask_y] = np.nan
+                grid_z[mask_x] = np.nan
             var_name_in = '_'.join(('SECTOR', sector_name, 'GRID', var_name))
             self.sectors[sector_name]['VARIABLE_NAMES'].append(var_name_in) 
             
@@ -515,7 +472,15 @@ class LEOToolbox(DatasetUser):
         var.unit = 'h'
         var.depends = self['SC_GEO_LON'].depends
         return var
-    
+
+    def add_footpoints(self, sat_id=None, **kwargs):
+        """
+        Adds the northern and southern footpoints (SC_FP_[N/S]_GEO_[LAT/LON]) of the satellite.
+        See geospacelab.observatory.orbit.footpoint.FootpointMapper for the keyword arguments.
+        """
+        from geospacelab.observatory.orbit.footpoint import add_footpoints
+        return add_footpoints(self, sat_id=sat_id, **kwargs)
+
     @staticmethod
     def format_pseudo_lat_label(ax, sector_name, is_integer=True, y_tick_res=15.):
         if is_integer:
@@ -687,24 +652,11 @@ class LEOToolbox(DatasetUser):
         )
         
         dv = np.array([dx.flatten(), dy.flatten(), dz.flatten()]).T
-        
-        v_new = np.empty_like(dv)
-        
-        for ind, (phi_c, theta_c) in enumerate(zip(phi_0, theta_0)):
-            R_1 = np.array([
-                [-np.sin(phi_c), -np.cos(phi_c), 0],
-                [np.cos(phi_c), -np.sin(phi_c), 0],
-                [0, 0, 1]
-            ])
-
-            R_2 = np.array([
-                [1, 0, 0],
-                [0, np.cos(theta_c), -np.sin(theta_c)],
-                [0, np.sin(theta_c), np.cos(theta_c)]
-            ])
-            v_new[ind, :] = dv[ind, :].reshape((1, 3)) @ R_1 @ R_2
-            
-        
+
+        # the displacements in the local ENU frames.
+        R = rotation_matrix_ENU_to_GEOC(theta_0, phi_0)
+        v_new = rotate_vectors(R, dv, inverse=True)
+
         norm = np.sqrt(v_new[:, 0]**2 + v_new[:, 1]**2 + v_new[:, 2]**2)
         
         v_unit = np.empty_like(v_new)
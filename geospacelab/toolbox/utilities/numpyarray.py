@@ -78,58 +78,126 @@ def numpy_array_self_mask(data, conditions=None):
     return data
 
 
+def convert_x_to_numeric(x, xtype=None):
+    """
+    Convert the x values to a flat numeric array, the datetimes are converted to seconds since 1970-01-01.
+    """
+    x = numpy.asarray(x)
+    if xtype != 'datetime':
+        return x.flatten().astype(float)
+    if numpy.issubdtype(x.dtype, numpy.datetime64):
+        return x.flatten().astype('datetime64[us]').astype(numpy.int64) * 1e-6
+    # faster than the conversion of the datetime objects to datetime64 by numpy.
+    sectime, dt0 = dttool.convert_datetime_to_sectime(x.flatten(), dt0=datetime.datetime(1970, 1, 1))
+    return sectime
+
+
+def search_gaps(x, xtype=None, xres=None, xresscale=1.1):
+    """
+    Search the gaps in x, where the step is greater than xres * xresscale.
+
+    :param x: the x values, monotonically increasing.
+    :param xtype: 'datetime' if x are datetimes, otherwise None.
+    :param xres: the resolution of x, in seconds for datetimes. If None, the median step is used.
+    :param xresscale: the factor of xres for a gap.
+    :return: inds, xres. inds are the indices of the last samples before the gaps.
+    """
+    x1 = convert_x_to_numeric(x, xtype=xtype)
+    diff_x1 = numpy.diff(x1)
+    if xres is None:
+        xres = numpy.median(diff_x1) if diff_x1.size > 0 else 0.
+    inds = numpy.flatnonzero(diff_x1 > xres * xresscale)
+    return inds, xres
+
+
+def mask_gaps(x, ys, xtype=None, xres=None, xresscale=1.1, axis=0, gap_inds=None):
+    """
+    Mask the gaps in the data series by inserting NaN samples, so that a line plot is broken at the gaps.
+    At each gap, two samples are inserted at xres/10 after the sample before the gap and xres/10 before
+    the sample after the gap. The gap indices are computed once and applied to all the arrays in ys
+    by a single scatter into preallocated arrays.
+
+    :param x: the x values along the axis, a 1-D array or an array with the other dimensions of length 1.
+    :param ys: an array or a list of arrays having the same length as x along the axis.
+    :param xtype: 'datetime' if x are datetimes, otherwise None.
+    :param xres: the resolution of x, in seconds for datetimes. If None, the median step is used.
+    :param xresscale: the factor of xres for a gap.
+    :param axis: the axis of ys along x.
+    :param gap_inds: the indices of the last samples before the gaps, if already known (see search_gaps).
+    :return: xnew, ysnew. ysnew is an array or a list, following the type of ys.
+    """
+    is_list = isinstance(ys, (list, tuple))
+    if not is_list:
+        ys = [ys]
+    if gap_inds is None:
+        gap_inds, xres = search_gaps(x, xtype=xtype, xres=xres, xresscale=xresscale)
+    if len(gap_inds) == 0:
+        return x, (list(ys) if is_list else ys[0])
+
+    x = numpy.asarray(x)
+    x_axis = axis if x.ndim > 1 else 0
+    n = x.shape[x_axis]
+    n_gap = len(gap_inds)
+    # the positions of the original samples and the inserted samples in the new arrays.
+    shift = numpy.zeros(n, dtype=numpy.int64)
+    shift[gap_inds + 1] = 2
+    pos = numpy.arange(n) + numpy.cumsum(shift)
+    pos_fwd = pos[gap_inds] + 1
+    pos_bwd = pos_fwd + 1
+
+    res = datetime.timedelta(seconds=float(xres)) if xtype == 'datetime' else xres
+    x_flat = x.flatten()
+    xnew = numpy.empty(n + 2 * n_gap, dtype=x.dtype)
+    xnew[pos] = x_flat
+    xnew[pos_fwd] = x_flat[gap_inds] + res / 10
+    xnew[pos_bwd] = x_flat[gap_inds + 1] - res / 10
+    shape = list(x.shape)
+    shape[x_axis] = xnew.size
+    xnew = xnew.reshape(shape)
+
+    ysnew = []
+    for y in ys:
+        y = numpy.asarray(y)
+        y = numpy.moveaxis(y, axis, 0)
+        dtype = y.dtype if numpy.issubdtype(y.dtype, numpy.inexact) else float
+        ynew = numpy.empty((n + 2 * n_gap,) + y.shape[1:], dtype=dtype)
+        ynew[pos] = y
+        ynew[pos_fwd] = numpy.nan
+        ynew[pos_bwd] = numpy.nan
+        ysnew.append(numpy.moveaxis(ynew, 0, axis))
+    return xnew, (ysnew if is_list else ysnew[0])
+
+
 def data_resample(
         x=None, y=None, xtype=None, xres=None, xresscale=1.1,
         method='Null',  # Null - insert NaN, 'linear', 'cubic', ... (interpolation method)
         axis=0, forward=True, depth=0.
 ):
 
-    x1 = x
-    if xtype == 'datetime':
-        # dt0 = datetime.datetime(1970, 1, 1)
-        sectime, dt0 = dttool.convert_datetime_to_sectime(x1)
-        x1 = sectime
-
-    diff_x1 = numpy.diff(x1.flatten())
-    if xres is None:
-        xres = numpy.median(diff_x1)
-    inds = numpy.where(diff_x1 > xres * xresscale)[0]
+    if method == 'Null':
+        return mask_gaps(x, y, xtype=xtype, xres=xres, xresscale=xresscale, axis=axis)
 
+    x1 = convert_x_to_numeric(x, xtype=xtype)
+    inds, xres = search_gaps(x, xtype=xtype, xres=xres, xresscale=xresscale)
     if len(inds) == 0:
         return x, y
-    if depth > 10:
-        return x, y
 
-    inds = [i+1 for i in inds]
+    inds = inds + 1
     # for x
-    value = []
-    for ind in inds:
-        res = xres
-        if xtype == 'datetime':
-            res = datetime.timedelta(seconds=xres)
-        if forward:
-            value.append(x[ind - 1] + res/10)
-        else:
-            value.append(x[ind] - res/10)
+    res = xres
+    if xtype == 'datetime':
+        res = datetime.timedelta(seconds=xres)
+    x_flat = numpy.asarray(x).flatten()
+    if forward:
+        value = x_flat[inds - 1] + res/10
+    else:
+        value = x_flat[inds] - res/10
     xnew = numpy.insert(x, inds, value, axis=axis)
 
     # for y
-    if method == 'Null':
-        value = numpy.nan
-        ynew = numpy.insert(y, inds, value, axis=axis)
-    else:
-        ifunc = interp1d(x1.flatten(), y, kind=method, axis=axis)
-        x_p = xnew
-        if xtype=='datetime':
-            x_p, dt0 = dttool.convert_datetime_to_sectime(xnew)
-        ynew = ifunc(x_p.flatten())
-
-    if method == 'Null':
-        xnew, ynew = data_resample(
-        x=xnew, y=ynew, xtype=xtype, xres=xres, xresscale=xresscale,
-        method='Null',  # Null - insert NaN, 'linear', 'cubic', ... (interpolation method)
-        axis=axis, forward=False, depth=depth+1
-)
+    ifunc = interp1d(x1, y, kind=method, axis=axis)
+    x_p = convert_x_to_numeric(xnew, xtype=xtype)
+    ynew = ifunc(x_p)
 
     return xnew, ynew
 
@@ -174,59 +242,277 @@ def data_resample_2d(
         axis=0, forward=True, depth=0
 ):
 
-    x1 = x
-    if xtype == 'datetime':
-        # dt0 = datetime.datetime(1970, 1, 1)
-        sectime, dt0 = dttool.convert_datetime_to_sectime(x1)
-        x1 = sectime
-
-    diff_x1 = numpy.diff(x1.flatten())
-    if xres is None:
-        xres = numpy.median(diff_x1)
-    inds = numpy.where(diff_x1 > xres * xresscale)[0]
-
+    inds, xres = search_gaps(x, xtype=xtype, xres=xres, xresscale=xresscale)
     if len(inds) == 0:
         return x, y, z
 
-    if depth > 10:
-        return x, y, z
+    if method == 'Null':
+        xnew, znew = mask_gaps(x, z, xtype=xtype, xres=xres, axis=axis, gap_inds=inds)
+        # for y, the values of the nearest samples, i.e., before and after the gaps.
+        y = numpy.asarray(y)
+        if y.ndim > axis and y.shape[axis] == numpy.asarray(z).shape[axis]:
+            y_inds = numpy.insert(numpy.arange(y.shape[axis]), numpy.repeat(inds + 1, 2),
+                                  numpy.stack((inds, inds + 1), axis=-1).flatten())
+            ynew = numpy.take(y, y_inds, axis=axis)
+        else:
+            ynew = y
+        return xnew, ynew, znew
 
-    inds = [i+1 for i in inds]
+    x1 = convert_x_to_numeric(x, xtype=xtype)
+    inds = inds + 1
     # for x
-    value = []
-    for ind in inds:
-        res = xres
-        if xtype == 'datetime':
-            res = datetime.timedelta(seconds=xres)
-        if forward:
-            value.append(x[ind - 1] + res/10)
-        else:
-            value.append(x[ind] - res/10)
+    res = xres
+    if xtype == 'datetime':
+        res = datetime.timedelta(seconds=xres)
+    x_flat = numpy.asarray(x).flatten()
+    if forward:
+        value = x_flat[inds - 1] + res/10
+    else:
+        value = x_flat[inds] - res/10
     xnew = numpy.insert(x, inds, value, axis=axis)
+    x_p = convert_x_to_numeric(xnew, xtype=xtype)
 
     # for y
-    method_y = 'nearest'
-    ifunc = interp1d(x1.flatten(), y, kind=method_y, axis=axis, fill_value="extrapolate")
-    x_p = xnew
-    if xtype == 'datetime':
-        x_p, dt0 = dttool.convert_datetime_to_sectime(xnew)
-    ynew = ifunc(x_p.flatten())
+    ifunc = interp1d(x1, y, kind='nearest', axis=axis, fill_value="extrapolate")
+    ynew = ifunc(x_p)
 
     # for z
-    if method == 'Null':
-        value = numpy.nan
-        znew = numpy.insert(z, inds, value, axis=axis)
-    else:
-        ifunc = interp1d(x1.flatten(), z, kind=method, axis=axis)
-        x_p = xnew
-        if xtype == 'datetime':
-            x_p, dt0 = dttool.convert_datetime_to_sectime(xnew)
-        znew = ifunc(x_p.flatten())
-    if method == 'Null':
-        xnew, ynew, znew = data_resample_2d(
-            x=xnew, y=ynew, z=znew, xtype=xtype, xres=xres, xresscale=xresscale,
-            method='Null',  # Null - insert NaN, 'linear', 'cubic', ... (interpolation method)
-            axis=axis, forward=False, depth=depth+1
-        )
+    ifunc = interp1d(x1, z, kind=method, axis=axis)
+    znew = ifunc(x_p)
 
     return xnew, ynew, znew
+
+
+def minmax_decimation_indices(x, y, x_range=None, n_bins=1000, axis=0):
+    """
+    Select the samples of a series for drawing a line at a given horizontal resolution (M4 decimation).
+    The x range is divided into n_bins columns. In each column and each segment between NaNs,
+    the first, last, minimum, and maximum samples are kept, and the first NaN of each run of NaNs is kept.
+    Hence, the drawn line has the same extrema in each column and the same gaps as the full series.
+
+    :param x: the x values (numeric), monotonically increasing along the axis.
+    :param y: the y values, a 1-D or 2-D array. For a 2-D array, the samples selected for any column are kept.
+    :param x_range: [x_min, x_max] of the columns. If None, the range of x is used.
+    :param n_bins: the number of columns, e.g., the width of the axes in pixels.
+    :param axis: the axis of y along x.
+    :return: the sorted indices of the selected samples along the axis.
+    """
+    x = numpy.asarray(x, dtype=float).flatten()
+    y = numpy.moveaxis(numpy.asarray(y, dtype=float), axis, 0).reshape((x.size, -1))
+    if x_range is None:
+        x_range = [numpy.nanmin(x), numpy.nanmax(x)]
+    width = (x_range[1] - x_range[0]) / n_bins
+    if not width > 0:
+        return numpy.arange(x.size)
+    # the samples out of the range are collected in two extra columns.
+    bins = numpy.clip(numpy.floor((x - x_range[0]) / width), -1, n_bins)
+
+    keep = numpy.zeros(x.size, dtype=bool)
+    for y_col in y.T:
+        is_nan = numpy.isnan(y_col)
+        # the first NaN of each run of NaNs.
+        keep[is_nan & ~numpy.concatenate(([False], is_nan[:-1]))] = True
+
+        inds = numpy.flatnonzero(~is_nan)
+        if inds.size == 0:
+            continue
+        # groups of consecutive finite samples in the same column and the same segment.
+        segments = numpy.cumsum(is_nan)[inds]
+        b = bins[inds]
+        new_group = numpy.concatenate(([True], (numpy.diff(b) != 0) | (numpy.diff(segments) != 0)))
+        starts = numpy.flatnonzero(new_group)
+        ends = numpy.concatenate((starts[1:], [inds.size])) - 1
+        group = numpy.cumsum(new_group) - 1
+
+        v = y_col[inds]
+        keep[inds[starts]] = True
+        keep[inds[ends]] = True
+        for reduce in (numpy.minimum, numpy.maximum):
+            extrema = reduce.reduceat(v, starts)
+            pos = numpy.flatnonzero(v == extrema[group])
+            first = numpy.concatenate(([True], numpy.diff(group[pos]) != 0))
+            keep[inds[pos[first]]] = True
+    return numpy.flatnonzero(keep)
+
+
+def regrid_uniform(x, z, xres=None, xresscale=1.1, axis=0, exact=True, rtol=1e-2, max_size_factor=10):
+    """
+    Put the samples of z onto a uniform grid of x, e.g., for drawing the data as an image.
+    The grid starts at x[0] with the step xres. Without a sample close to a grid node, the node is filled with NaN.
+
+    :param x: the x values (numeric), strictly increasing.
+    :param z: the data array, z.shape[axis] == x.size.
+    :param xres: the step of the grid. If None, the median step of x is used.
+    :param xresscale: a node takes the nearest sample within xres * xresscale / 2 (used if exact is False).
+    :param axis: the axis of z along x.
+    :param exact: if True, every sample must be on a node (within rtol * xres), otherwise, None is returned.
+    :param rtol: the tolerance of the sample positions relative to xres, for exact=True.
+    :param max_size_factor: None is returned if the grid has more than max_size_factor * x.size nodes.
+    :return: x_grid, z_grid, or None if the samples cannot be put onto a uniform grid.
+    """
+    x = numpy.asarray(x, dtype=float).flatten()
+    z = numpy.moveaxis(numpy.asarray(z), axis, 0)
+    if x.size < 2 or z.shape[0] != x.size or not numpy.all(numpy.isfinite(x)):
+        return None
+    diff_x = numpy.diff(x)
+    if numpy.any(diff_x <= 0):
+        return None
+    if xres is None:
+        xres = numpy.median(diff_x)
+    if not xres > 0:
+        return None
+
+    pos = (x - x[0]) / xres
+    n = int(numpy.round(pos[-1])) + 1
+    if n > max_size_factor * x.size:
+        return None
+    if exact:
+        inds = numpy.round(pos).astype(int)
+        if numpy.any(numpy.abs(pos - inds) > rtol) or numpy.any(numpy.diff(inds) < 1):
+            return None
+    else:
+        # the nearest sample of each node.
+        nodes = numpy.arange(n)
+        i_r = numpy.clip(numpy.searchsorted(pos, nodes), 1, x.size - 1)
+        i_l = i_r - 1
+        i_n = numpy.where(nodes - pos[i_l] <= pos[i_r] - nodes, i_l, i_r)
+        valid = numpy.abs(pos[i_n] - nodes) <= xresscale / 2
+        inds = nodes[valid]
+        z = z[i_n[valid]]
+
+    z_grid = numpy.full((n,) + z.shape[1:], numpy.nan)
+    z_grid[inds] = z
+    x_grid = x[0] + numpy.arange(n) * xres
+    return x_grid, numpy.moveaxis(z_grid, 0, axis)
+
+
+def block_mean(z, factor, axis=0):
+    """
+    Average z over the blocks of factor consecutive samples along the axis, ignoring NaNs.
+    The last block is averaged over the remaining samples.
+
+    :param z: the data array.
+    :param factor: the number of the samples in a block.
+    :param axis: the axis to be reduced.
+    :return: the block means, having ceil(z.shape[axis] / factor) samples along the axis.
+    """
+    z = numpy.moveaxis(numpy.asarray(z, dtype=float), axis, 0)
+    factor = int(factor)
+    if factor < 2:
+        return numpy.moveaxis(z, 0, axis)
+    n = -(-z.shape[0] // factor)
+    z_pad = numpy.full((n * factor,) + z.shape[1:], numpy.nan)
+    z_pad[:z.shape[0]] = z
+    z_pad = z_pad.reshape((n, factor) + z.shape[1:])
+    finite = numpy.isfinite(z_pad)
+    count = numpy.sum(finite, axis=1)
+    total = numpy.sum(numpy.where(finite, z_pad, 0.), axis=1)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        z_mean = numpy.where(count > 0, total / count, numpy.nan)
+    return numpy.moveaxis(z_mean, 0, axis)
+
+
+def wrap_difference(d, period):
+    """
+    Wrap the differences of a periodic quantity into [-period/2, period/2).
+    """
+    return numpy.mod(d + period / 2, period) - period / 2
+
+
+def search_crossings(x, y, value, period=None):
+    """
+    Search the crossings of a series at a value, where y - value changes its sign between two consecutive samples.
+    The crossing positions are refined by the linear interpolation between the two samples. A sample equal to the
+    value is counted once, and the crossings next to a NaN are not searched.
+
+    :param x: the x values (numeric), monotonically increasing.
+    :param y: the y values.
+    :param value: the value to be crossed.
+    :param period: the period of y, e.g., 360. for the longitudes or 24. for the local times. The difference y - value
+        is wrapped into [-period/2, period/2), and its jumps at the opposite value, e.g., value + 180. for the
+        longitudes, are not crossings.
+    :return: x_c, inds, the crossing positions, and the indices of the samples before (or at) the crossings.
+    """
+    x = numpy.asarray(x, dtype=float).flatten()
+    y = numpy.asarray(y, dtype=float).flatten()
+    d = y - value
+    if period is not None:
+        d = wrap_difference(d, period)
+    d_0 = d[:-1]
+    d_1 = d[1:]
+    with numpy.errstate(invalid='ignore'):
+        is_crossing = ((d_0 < 0) & (d_1 >= 0)) | ((d_0 > 0) & (d_1 <= 0))
+        if period is not None:
+            is_crossing &= numpy.abs(d_1 - d_0) < period / 2
+    inds = numpy.flatnonzero(is_crossing)
+    frac = d_0[inds] / (d_0[inds] - d_1[inds])
+    x_c = x[inds] + frac * (x[inds + 1] - x[inds])
+    # a crossing on a sample takes the index of the sample.
+    inds = numpy.where(frac == 1, inds + 1, inds)
+    # a crossing on the first sample has no sample before.
+    if d.size and d[0] == 0:
+        x_c = numpy.concatenate(([x[0]], x_c))
+        inds = numpy.concatenate(([0], inds))
+    return x_c, inds
+
+
+def interp_series(x, y, xq, period=None):
+    """
+    Linearly interpolate a series at the query positions, which is NaN out of the range of x.
+    A periodic quantity is interpolated along the shorter arc between two samples.
+
+    :param x: the x values (numeric), monotonically increasing.
+    :param y: the y values.
+    :param xq: the query positions.
+    :param period: the period of y, e.g., 360. for the longitudes or 24. for the local times. The results are in
+        [0, period).
+    :return: the interpolated values.
+    """
+    x = numpy.asarray(x, dtype=float).flatten()
+    y = numpy.asarray(y, dtype=float).flatten()
+    xq = numpy.asarray(xq, dtype=float)
+    if x.size < 2:
+        return numpy.where(xq == x[0], y[0], numpy.nan) if x.size else numpy.full(xq.shape, numpy.nan)
+    i_0 = numpy.clip(numpy.searchsorted(x, xq, side='right') - 1, 0, x.size - 2)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        frac = (xq - x[i_0]) / (x[i_0 + 1] - x[i_0])
+        dy = y[i_0 + 1] - y[i_0]
+        if period is not None:
+            dy = wrap_difference(dy, period)
+        yq = y[i_0] + numpy.where(frac == 0, 0., frac * dy)
+        if period is not None:
+            yq = numpy.mod(yq, period)
+    return numpy.where((xq >= x[0]) & (xq <= x[-1]), yq, numpy.nan)
+
+
+def mask_in_range(y, value_range, period=None):
+    """
+    Check if the values are in a range [v_0, v_1]. For a periodic quantity, the range may go across the period,
+    e.g., [22., 2.] for the local times from 22 to 2.
+    """
+    y = numpy.asarray(y, dtype=float)
+    v_0, v_1 = value_range
+    with numpy.errstate(invalid='ignore'):
+        if period is None:
+            return (y >= v_0) & (y <= v_1)
+        width = numpy.mod(v_1 - v_0, period)
+        if width == 0 and v_1 != v_0:
+            return numpy.isfinite(y)
+        return numpy.mod(y - v_0, period) <= width
+
+
+def search_nearest_indices(x, xq):
+    """
+    Get the indices of the samples nearest to the query positions.
+
+    :param x: the x values (numeric), monotonically increasing.
+    :param xq: the query positions.
+    :return: the indices.
+    """
+    x = numpy.asarray(x, dtype=float).flatten()
+    xq = numpy.asarray(xq, dtype=float)
+    i_r = numpy.clip(numpy.searchsorted(x, xq), 1, max(x.size - 1, 1))
+    i_l = i_r - 1
+    if x.size < 2:
+        return numpy.zeros(xq.shape, dtype=int)
+    return numpy.where(xq - x[i_l] <= x[i_r] - xq, i_l, i_r)
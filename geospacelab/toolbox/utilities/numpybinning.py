@@ -0,0 +1,184 @@
+# Licensed under the BSD 3-Clause License
+# Copyright (C) 2021 GeospaceLab (geospacelab)
+# Author: Lei Cai, Space Physics and Astronomy, University of Oulu
+
+__author__ = "Lei Cai"
+__copyright__ = "Copyright 2021, GeospaceLab"
+__license__ = "BSD-3-Clause License"
+__email__ = "lei.cai@oulu.fi"
+__docformat__ = "reStructureText"
+
+import numpy as np
+
+
+def get_bin_indices(x, centers):
+    """
+    Get the indices of the bins centered at the grid nodes. The bin edges are the midpoints between the nodes,
+    and the outer edges are half a step outside the first and last nodes.
+
+    :param x: the values.
+    :param centers: the grid nodes, strictly increasing.
+    :return: the bin indices of the values, -1 for the values outside the grid or NaN.
+    """
+    x = np.asarray(x, dtype=float)
+    centers = np.asarray(centers, dtype=float).flatten()
+    if centers.size == 1:
+        return np.where(np.isfinite(x), 0, -1)
+    mids = (centers[1:] + centers[:-1]) / 2
+    edges = np.concatenate((
+        [centers[0] - (centers[1] - centers[0]) / 2], mids, [centers[-1] + (centers[-1] - centers[-2]) / 2]))
+    inds = np.searchsorted(edges, x, side='right') - 1
+    inds[(inds < 0) | (inds >= centers.size) | ~np.isfinite(x)] = -1
+    return inds
+
+
+class GridBinner(object):
+    """
+    Aggregate the scattered samples of one or more variables into the bins of a 2-D grid, e.g., the along-track
+    data of a satellite in the bins of (time, latitude). The bin of each sample is computed once, and the values
+    of the variables are aggregated by the bin indices with np.bincount and sorting:
+
+        - 'count': the number of the finite samples in a bin.
+        - 'mean': the mean of the finite samples in a bin.
+        - 'median': the median of the finite samples in a bin.
+        - 'nearest': the value of the sample nearest to the bin center, where the distances are
+          normalized by the bin sizes.
+
+    The bins without any finite sample are NaN (0 for 'count').
+
+    :param x: the x coordinates of the samples.
+    :param y: the y coordinates of the samples.
+    :param x_grid: the bin centers along x, strictly increasing.
+    :param y_grid: the bin centers along y, strictly increasing.
+    """
+
+    methods = ['count', 'mean', 'median', 'nearest']
+
+    def __init__(self, x, y, x_grid, y_grid):
+        x = np.asarray(x, dtype=float).flatten()
+        y = np.asarray(y, dtype=float).flatten()
+        self.x_grid = np.asarray(x_grid, dtype=float).flatten()
+        self.y_grid = np.asarray(y_grid, dtype=float).flatten()
+        self.shape = (self.x_grid.size, self.y_grid.size)
+
+        ix = get_bin_indices(x, self.x_grid)
+        iy = get_bin_indices(y, self.y_grid)
+        valid = (ix >= 0) & (iy >= 0)
+        # the samples in the grid and their flat bin indices in the C order of shape.
+        self.inds = np.flatnonzero(valid)
+        self.bins = ix[valid] * self.shape[1] + iy[valid]
+
+        # the distances to the bin centers, normalized by the bin sizes.
+        dx = np.gradient(self.x_grid) if self.x_grid.size > 1 else np.ones(1)
+        dy = np.gradient(self.y_grid) if self.y_grid.size > 1 else np.ones(1)
+        self.distances = np.hypot(
+            (x[valid] - self.x_grid[ix[valid]]) / dx[ix[valid]],
+            (y[valid] - self.y_grid[iy[valid]]) / dy[iy[valid]])
+        self.num_samples = x.size
+
+    def __call__(self, values, method='mean', period=None):
+        """
+        Aggregate the values of a variable.
+
+        :param values: the values of the samples, an array of the same size as x, or a 2-D array of the shape
+            (x.size, num_variables) for several variables.
+        :param method: 'count', 'mean', 'median', or 'nearest'.
+        :param period: the period of the values, e.g., 360. for the longitudes or 24. for the local times.
+            The mean of a periodic variable is the circular mean, and its median is taken from the values
+            unwrapped around the circular mean. The results are in [0, period).
+        :return: the grid of the shape (x_grid.size, y_grid.size), or (x_grid.size, y_grid.size, num_variables)
+            for a 2-D array of values.
+        """
+        values = np.asarray(values, dtype=float)
+        is_1d = values.ndim == 1
+        values = values.reshape((self.num_samples, -1))[self.inds]
+        results = []
+        for v in values.T:
+            if method == 'count':
+                grid = self._count(v)
+            elif method == 'mean':
+                grid = self._mean(v) if period is None else self._mean_period(v, period)
+            elif method == 'median':
+                grid = self._median(v) if period is None else self._median_period(v, period)
+            elif method == 'nearest':
+                grid = self._nearest(v)
+            else:
+                raise NotImplementedError
+            results.append(grid.reshape(self.shape))
+        if is_1d:
+            return results[0]
+        return np.stack(results, axis=-1)
+
+    def aggregate(self, variables, method='mean', periods=None):
+        """
+        Aggregate the values of several variables on the same samples.
+
+        :param variables: a dict of the values of the variables.
+        :param method: the method, see :meth:`__call__`.
+        :param periods: a dict of the periods of the periodic variables.
+        :return: a dict of the grids.
+        """
+        periods = {} if periods is None else periods
+        return {key: self(value, method=method, period=periods.get(key, None)) for key, value in variables.items()}
+
+    def _size(self):
+        return self.shape[0] * self.shape[1]
+
+    def _count(self, v):
+        return np.bincount(self.bins[np.isfinite(v)], minlength=self._size()).astype(float)
+
+    def _mean(self, v):
+        finite = np.isfinite(v)
+        count = np.bincount(self.bins[finite], minlength=self._size())
+        total = np.bincount(self.bins[finite], weights=v[finite], minlength=self._size())
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(count > 0, total / count, np.nan)
+
+    def _mean_period(self, v, period):
+        factor = 2 * np.pi / period
+        sin_mean = self._mean(np.sin(v * factor))
+        cos_mean = self._mean(np.cos(v * factor))
+        return _wrap_period(np.arctan2(sin_mean, cos_mean) / factor, period)
+
+    def _median(self, v):
+        finite = np.isfinite(v)
+        bins = self.bins[finite]
+        v = v[finite]
+        grid = np.full((self._size(),), np.nan)
+        if not v.size:
+            return grid
+        # sort the samples by the bins, and by the values in each bin.
+        order = np.lexsort((v, bins))
+        bins = bins[order]
+        v = v[order]
+        count = np.bincount(bins, minlength=self._size())
+        starts = np.cumsum(count) - count
+        has = count > 0
+        lo = starts[has] + (count[has] - 1) // 2
+        hi = starts[has] + count[has] // 2
+        grid[has] = (v[lo] + v[hi]) / 2
+        return grid
+
+    def _median_period(self, v, period):
+        center = self._mean_period(v, period)[self.bins]
+        v_unwrapped = center + np.mod(v - center + period / 2, period) - period / 2
+        return _wrap_period(self._median(v_unwrapped), period)
+
+    def _nearest(self, v):
+        finite = np.isfinite(v)
+        bins = self.bins[finite]
+        grid = np.full((self._size(),), np.nan)
+        if not bins.size:
+            return grid
+        # the first sample of each bin after sorting by the bins and the distances.
+        order = np.lexsort((self.distances[finite], bins))
+        bins = bins[order]
+        first = np.concatenate(([True], np.diff(bins) != 0))
+        grid[bins[first]] = v[finite][order][first]
+        return grid
+
+
+def _wrap_period(v, period):
+    r = np.mod(v, period)
+    # np.mod of a tiny negative value rounds to period.
+    return np.where(r >= period, r - period, r)
@@ -0,0 +1,166 @@
+# Licensed under the BSD 3-Clause License
+# Copyright (C) 2021 GeospaceLab (geospacelab)
+# Author: Lei Cai, Space Physics and Astronomy, University of Oulu
+
+__author__ = "Lei Cai"
+__copyright__ = "Copyright 2021, GeospaceLab"
+__license__ = "BSD-3-Clause License"
+__email__ = "lei.cai@oulu.fi"
+__docformat__ = "reStructureText"
+
+import collections
+import hashlib
+
+import numpy as np
+from scipy.spatial import Delaunay, cKDTree
+from scipy.interpolate import CloughTocher2DInterpolator
+
+
+class ScatteredInterpolator(object):
+    """
+    Interpolate the values at a set of scattered 2-D points onto a set of query points, as
+    ``scipy.interpolate.griddata``. The Delaunay triangulation, the simplices and the barycentric weights of the
+    query points, and the nearest neighbours are computed once, and reused for the values of different variables
+    or time frames on the same points. The triangulation is cached by the data points (see :func:`get_triangulation`),
+    and shared by the interpolators of different query points.
+
+    :param points: the coordinates of the data points, a tuple (x, y) or an array of shape (npoints, 2).
+    :param xi: the coordinates of the query points, a tuple (x, y) of arrays with the same shape, or an array
+        of shape (..., 2).
+    """
+
+    def __init__(self, points, xi):
+        self.points = _as_points(points)
+        if isinstance(xi, tuple):
+            self.shape = np.shape(xi[0])
+        else:
+            self.shape = np.shape(xi)[:-1]
+        self.xi = _as_points(xi)
+
+        self._tri = None
+        self._simplex = None
+        self._weights = None
+        self._tree = None
+        self._nearest = None
+
+    @property
+    def tri(self):
+        if self._tri is None:
+            self._tri = get_triangulation(self.points)
+        return self._tri
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            self._tree = cKDTree(self.points)
+        return self._tree
+
+    def _linear_weights(self):
+        if self._weights is None:
+            tri = self.tri
+            simplex = tri.find_simplex(self.xi)
+            # barycentric coordinates of the query points in their simplices.
+            trans = tri.transform[simplex]
+            b = np.einsum('ijk,ik->ij', trans[:, :2, :], self.xi - trans[:, 2, :])
+            weights = np.hstack((b, 1 - np.sum(b, axis=1, keepdims=True)))
+            self._simplex = simplex
+            self._weights = weights
+        return self._simplex, self._weights
+
+    def nearest(self):
+        """
+        Query the nearest data points.
+
+        :return: distance, index. The distance to and the index of the nearest data point of each query point.
+        """
+        if self._nearest is None:
+            distance, index = self.tree.query(self.xi)
+            self._nearest = (distance.reshape(self.shape), index.reshape(self.shape))
+        return self._nearest
+
+    def __call__(self, values, method='linear', fill_value=np.nan):
+        """
+        Interpolate the values at the data points.
+
+        :param values: the values at the data points, an array of shape (npoints,) or (npoints, ...),
+            e.g., (npoints, nframes) for all the frames in a batch.
+        :param method: 'linear', 'nearest', or 'cubic', as in ``scipy.interpolate.griddata``.
+        :param fill_value: the value of the query points outside the convex hull ('linear' and 'cubic').
+        :return: the interpolated values of the shape xi.shape + values.shape[1:].
+        """
+        values = np.asarray(values)
+        if values.shape[0] != self.points.shape[0]:
+            raise ValueError("The values must have the same length as the points!")
+        extra_shape = values.shape[1:]
+        if method == 'nearest':
+            _, index = self.nearest()
+            result = values[index.flatten()]
+        elif method == 'linear':
+            simplex, weights = self._linear_weights()
+            vertices = self.tri.simplices[simplex]
+            weights = weights.reshape(weights.shape + (1,) * len(extra_shape))
+            result = np.sum(values[vertices] * weights, axis=1)
+            result[simplex < 0] = fill_value
+        elif method == 'cubic':
+            ip = CloughTocher2DInterpolator(self.tri, values, fill_value=fill_value)
+            result = ip(self.xi)
+        else:
+            raise NotImplementedError
+        return result.reshape(self.shape + extra_shape)
+
+
+_interpolators = collections.OrderedDict()
+max_cached_interpolators = 8
+_triangulations = collections.OrderedDict()
+max_cached_triangulations = 8
+
+
+def get_triangulation(points):
+    """
+    Get the Delaunay triangulation of the points. The triangulations are cached by the coordinates.
+    """
+    points = _as_points(points)
+    key = _hash_arrays(points)
+    if key in _triangulations.keys():
+        _triangulations.move_to_end(key)
+        return _triangulations[key]
+    tri = Delaunay(points)
+    _triangulations[key] = tri
+    if len(_triangulations) > max_cached_triangulations:
+        _triangulations.popitem(last=False)
+    return tri
+
+
+def get_interpolator(points, xi):
+    """
+    Get a ScatteredInterpolator for the points and the query points. The interpolators are cached by
+    the coordinates, so that the triangulation and the weights are reused by the calls on the same geometry.
+    """
+    points = _as_points(points)
+    xi_arr = _as_points(xi)
+    key = (_hash_arrays(points, xi_arr), np.shape(xi[0]) if isinstance(xi, tuple) else np.shape(xi)[:-1])
+    if key in _interpolators.keys():
+        _interpolators.move_to_end(key)
+        return _interpolators[key]
+    interpolator = ScatteredInterpolator(points, xi)
+    _interpolators[key] = interpolator
+    if len(_interpolators) > max_cached_interpolators:
+        _interpolators.popitem(last=False)
+    return interpolator
+
+
+def _hash_arrays(*arrays):
+    h = hashlib.blake2b(digest_size=16)
+    for a in arrays:
+        h.update(repr(a.shape).encode())
+        h.update(np.ascontiguousarray(a).tobytes())
+    return h.hexdigest()
+
+
+def _as_points(points):
+    if isinstance(points, tuple):
+        points = np.stack([np.asarray(p, dtype=float).flatten() for p in points], axis=-1)
+    else:
+        points = np.asarray(points, dtype=float)
+        points = points.reshape((-1, points.shape[-1]))
+    return points
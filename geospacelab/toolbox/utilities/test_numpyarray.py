@@ -0,0 +1,199 @@
+import unittest
+import numpy as np
+import geospacelab.toolbox.utilities.numpyarray as arraytool
+
+
+def triangle_wave(x, period=200.):
+    # linear between the kinks at the multiples of period / 2, and crossing 0 at period / 4 + k * period / 2.
+    return 2 * np.abs(np.mod(x / period, 1.) * 2 - 1) - 1
+
+
+class SearchCrossings(unittest.TestCase):
+
+    def test_known_crossings(self):
+        # the samples are not at the crossings, and are linear about them.
+        x = np.arange(3., 1000., 7.)
+        x_c, inds = arraytool.search_crossings(x, triangle_wave(x), 0.)
+        np.testing.assert_allclose(x_c, np.arange(50., 1000., 100.), rtol=1e-12)
+        np.testing.assert_array_equal(x[inds] <= x_c, True)
+        np.testing.assert_array_equal(x[inds + 1] > x_c, True)
+
+    def test_on_samples(self):
+        # the crossings on the samples are counted once, with the indices of the samples.
+        x = np.arange(0., 1000., 5.)
+        x_c, inds = arraytool.search_crossings(x, triangle_wave(x), 0.)
+        np.testing.assert_allclose(x_c, np.arange(50., 1000., 100.), rtol=1e-12)
+        np.testing.assert_array_equal(x[inds], x_c)
+
+        x_c, inds = arraytool.search_crossings(x[10:], triangle_wave(x[10:]), 0.)
+        self.assertEqual(x_c[0], 50.)
+        self.assertEqual(inds[0], 0)
+        # the peaks touching the value are counted once as well.
+        x_c, inds = arraytool.search_crossings(x, triangle_wave(x), 1.)
+        np.testing.assert_array_equal(x_c, [0., 200., 400., 600., 800.])
+        np.testing.assert_array_equal(x[inds], x_c)
+
+    def test_period(self):
+        # the longitudes in [0, 360), crossing 0 at x = 400 + k * 400, and the opposite value 180. at 200 + k * 400.
+        x = np.arange(1., 2000., 3.)
+        lon = np.mod(x * 0.9, 360.)
+        x_c, inds = arraytool.search_crossings(x, lon, 0., period=360.)
+        np.testing.assert_allclose(x_c, np.arange(400., 2000., 400.), rtol=1e-12)
+        x_c, inds = arraytool.search_crossings(x, lon, 90., period=360.)
+        np.testing.assert_allclose(x_c, np.arange(100., 2000., 400.), rtol=1e-12)
+        # the local times decreasing across 0.
+        lt = np.mod(6. - x * 0.01, 24.)
+        x_c, inds = arraytool.search_crossings(x, lt, 0., period=24.)
+        np.testing.assert_allclose(x_c, [600.], rtol=1e-12)
+
+    def test_gaps(self):
+        x = np.arange(3., 1000., 7.)
+        y = triangle_wave(x)
+        # the crossings at 250 and 350 in the gap are not reported.
+        y[(x > 240.) & (x < 380.)] = np.nan
+        x_c, inds = arraytool.search_crossings(x, y, 0.)
+        np.testing.assert_allclose(x_c, [50., 150., 450., 550., 650., 750., 850., 950.], rtol=1e-12)
+        self.assertTrue(np.all(np.isfinite(y[inds])))
+        self.assertTrue(np.all(np.isfinite(y[inds + 1])))
+
+    def test_empty(self):
+        for x, y in [([], []), ([1.], [2.])]:
+            x_c, inds = arraytool.search_crossings(x, y, 0.)
+            self.assertEqual(x_c.size, 0)
+            self.assertEqual(inds.size, 0)
+        x_c, inds = arraytool.search_crossings([1.], [0.], 0.)
+        np.testing.assert_array_equal(x_c, [1.])
+        np.testing.assert_array_equal(inds, [0])
+
+
+class InterpSeries(unittest.TestCase):
+
+    def test_linear(self):
+        x = np.arange(0., 1000., 10.)
+        xq = np.array([-1., 0., 55., 333.3, 990., 990.1])
+        yq = arraytool.interp_series(x, 2 * x + 1, xq)
+        np.testing.assert_allclose(yq, [np.nan, 1., 111., 667.6, 1981., np.nan], rtol=1e-12)
+
+    def test_period(self):
+        x = np.array([0., 10., 20., 30.])
+        lon = np.array([340., 350., 10., 30.])
+        yq = arraytool.interp_series(x, lon, [5., 12.5, 15., 25.], period=360.)
+        np.testing.assert_allclose(yq, [345., 355., 0., 20.], atol=1e-12)
+        self.assertTrue(np.all((yq >= 0.) & (yq < 360.)))
+
+    def test_empty(self):
+        self.assertEqual(arraytool.interp_series([], [], []).size, 0)
+        np.testing.assert_array_equal(arraytool.interp_series([], [], [1., 2.]), np.nan)
+        np.testing.assert_array_equal(arraytool.interp_series([1.], [5.], [1., 2.]), [5., np.nan])
+        self.assertEqual(arraytool.interp_series(np.arange(3.), np.arange(3.), []).size, 0)
+
+
+class MaskInRange(unittest.TestCase):
+
+    def test_range(self):
+        y = np.array([-1., 0., 0.5, 1., 1.5, np.nan])
+        np.testing.assert_array_equal(arraytool.mask_in_range(y, [0., 1.]), [0, 1, 1, 1, 0, 0])
+
+    def test_period(self):
+        lt = np.array([21., 22., 23.5, 0., 1., 2., 2.1, 12., np.nan])
+        np.testing.assert_array_equal(
+            arraytool.mask_in_range(lt, [22., 2.], period=24.), [0, 1, 1, 1, 1, 1, 0, 0, 0])
+        np.testing.assert_array_equal(
+            arraytool.mask_in_range(lt, [2., 22.], period=24.), [1, 1, 0, 0, 0, 1, 1, 1, 0])
+        # the full period.
+        np.testing.assert_array_equal(
+            arraytool.mask_in_range(lt, [0., 24.], period=24.), [1, 1, 1, 1, 1, 1, 1, 1, 0])
+        lon = np.array([-10., 350., 5., 20.])
+        np.testing.assert_array_equal(arraytool.mask_in_range(lon, [340., 10.], period=360.), [1, 1, 1, 0])
+
+    def test_empty(self):
+        self.assertEqual(arraytool.mask_in_range([], [0., 1.]).size, 0)
+        self.assertEqual(arraytool.mask_in_range([], [22., 2.], period=24.).size, 0)
+
+
+class RegridUniform(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(2021)
+        # the samples on a grid of 60 s, with the gaps of 1, 3 and 10 samples.
+        cls.nodes = np.delete(np.arange(300), np.r_[50:60, 150:153, 220])
+        cls.x = 1000. + cls.nodes * 60.
+        cls.z = rng.normal(size=(cls.nodes.size, 7))
+
+    def test_exact(self):
+        x_grid, z_grid = arraytool.regrid_uniform(self.x, self.z, exact=True)
+        np.testing.assert_array_equal(x_grid, 1000. + np.arange(300) * 60.)
+        self.assertEqual(z_grid.shape, (300, 7))
+        np.testing.assert_array_equal(z_grid[self.nodes], self.z)
+        in_gap = np.ones(300, dtype=bool)
+        in_gap[self.nodes] = False
+        self.assertTrue(np.all(np.isnan(z_grid[in_gap])))
+        # along the second axis.
+        x_grid, z_grid_t = arraytool.regrid_uniform(self.x, self.z.T, axis=1)
+        np.testing.assert_array_equal(z_grid_t, z_grid.T)
+
+    def test_not_uniform(self):
+        x = self.x.copy()
+        x[10] += 3.
+        self.assertIsNone(arraytool.regrid_uniform(x, self.z, exact=True))
+        self.assertIsNotNone(arraytool.regrid_uniform(x, self.z, exact=True, rtol=0.1))
+        self.assertIsNone(arraytool.regrid_uniform(self.x[::-1], self.z, exact=True))
+        self.assertIsNone(arraytool.regrid_uniform(self.x[:1], self.z[:1], exact=True))
+        self.assertIsNone(arraytool.regrid_uniform([], np.empty((0, 7)), exact=True))
+        # too many nodes for the samples.
+        self.assertIsNone(arraytool.regrid_uniform(self.x, self.z, xres=1., exact=False))
+
+    def test_regrid(self):
+        rng = np.random.default_rng(2022)
+        x = self.x + rng.uniform(-20., 20., self.x.size)
+        x[0] = self.x[0]
+        x_grid, z_grid = arraytool.regrid_uniform(x, self.z, xres=60., exact=False)
+        np.testing.assert_array_equal(x_grid, 1000. + np.arange(x_grid.size) * 60.)
+        # the nearest sample within 1.1 * 60 / 2 s of each node.
+        for k, xk in enumerate(x_grid):
+            d = np.abs(x - xk)
+            i = np.argmin(d)
+            if d[i] <= 33.:
+                np.testing.assert_array_equal(z_grid[k], self.z[i])
+            else:
+                self.assertTrue(np.all(np.isnan(z_grid[k])))
+        self.assertTrue(np.all(np.isnan(z_grid[51:59])))
+
+        # without the gaps masked.
+        x_grid, z_grid = arraytool.regrid_uniform(x, self.z, xres=60., xresscale=np.inf, exact=False)
+        self.assertFalse(np.any(np.isnan(z_grid)))
+        for k, xk in enumerate(x_grid):
+            np.testing.assert_array_equal(z_grid[k], self.z[np.argmin(np.abs(x - xk))])
+
+
+class BlockMean(unittest.TestCase):
+
+    def reference(self, z, factor):
+        n = -(-z.shape[0] // factor)
+        z_mean = np.full((n,) + z.shape[1:], np.nan)
+        for i in range(n):
+            block = z[i * factor: (i + 1) * factor]
+            finite = np.isfinite(block)
+            counts = np.sum(finite, axis=0)
+            z_mean[i] = np.where(counts > 0, np.nansum(block, axis=0) / np.maximum(counts, 1), np.nan)
+        return z_mean
+
+    def test_block_mean(self):
+        rng = np.random.default_rng(2023)
+        z = rng.normal(size=(103, 5))
+        z[rng.uniform(size=z.shape) < 0.2] = np.nan
+        # an empty block.
+        z[8:12, 2] = np.nan
+        for factor in [2, 3, 4, 10, 103, 200]:
+            with self.subTest(factor=factor):
+                expected = self.reference(z, factor)
+                self.assertEqual(expected.shape[0], int(np.ceil(103 / factor)))
+                np.testing.assert_allclose(arraytool.block_mean(z, factor), expected, rtol=1e-12)
+                np.testing.assert_allclose(arraytool.block_mean(z.T, factor, axis=1), expected.T, rtol=1e-12)
+        self.assertTrue(np.isnan(arraytool.block_mean(z, 4)[2, 2]))
+        np.testing.assert_array_equal(arraytool.block_mean(z, 1), z)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+import numpy as np
+from geospacelab.toolbox.utilities.numpybinning import GridBinner, get_bin_indices
+
+
+def get_edges(centers):
+    mids = (centers[1:] + centers[:-1]) / 2
+    return np.concatenate(([centers[0] - (centers[1] - centers[0]) / 2], mids,
+                           [centers[-1] + (centers[-1] - centers[-2]) / 2]))
+
+
+def bin_by_loops(x, y, values, x_grid, y_grid, func):
+    """The reference: the samples in each bin are selected by the bin edges one bin at a time."""
+    x_edges = get_edges(x_grid)
+    y_edges = get_edges(y_grid)
+    grid = np.full((x_grid.size, y_grid.size), np.nan)
+    for i in range(x_grid.size):
+        for j in range(y_grid.size):
+            in_bin = (x >= x_edges[i]) & (x < x_edges[i + 1]) & (y >= y_edges[j]) & (y < y_edges[j + 1])
+            in_bin &= np.isfinite(values)
+            grid[i, j] = func(values[in_bin], x[in_bin], y[in_bin], x_grid[i], y_grid[j])
+    return grid
+
+
+def circular_mean(v, period):
+    if not v.size:
+        return np.nan
+    factor = 2 * np.pi / period
+    r = np.mod(np.arctan2(np.mean(np.sin(v * factor)), np.mean(np.cos(v * factor))) / factor, period)
+    return r - period if r >= period else r
+
+
+def circular_median(v, period):
+    if not v.size:
+        return np.nan
+    center = circular_mean(v, period)
+    r = np.mod(np.median(center + np.mod(v - center + period / 2, period) - period / 2), period)
+    return r - period if r >= period else r
+
+
+def circular_distance(a, b, period):
+    return np.abs(np.mod(a - b + period / 2, period) - period / 2)
+
+
+class BinIndices(unittest.TestCase):
+
+    def test_edges(self):
+        centers = np.array([0., 1., 2., 4.])
+        x = np.array([-0.6, -0.5, 0.49, 0.5, 2.9, 3., 4.99, 5., np.nan])
+        np.testing.assert_array_equal(get_bin_indices(x, centers), [-1, 0, 0, 1, 2, 3, 3, -1, -1])
+
+
+class GridBinnerMethods(unittest.TestCase):
+    """The aggregation by the bin indices should agree with the brute-force binning."""
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(1989)
+        n = 3000
+        cls.x_grid = np.arange(0., 10., 1.)
+        cls.y_grid = np.arange(-5., 5., 0.5)
+        # some samples outside the grid, and empty bins at x > 8.
+        cls.x = rng.uniform(-1., 8.4, n)
+        cls.y = rng.uniform(-6., 6., n)
+        cls.values = rng.normal(size=n)
+        cls.values[rng.choice(n, 100, replace=False)] = np.nan
+        # the longitudes scattered around 0/360.
+        cls.lon = np.mod(rng.normal(0., 20., n), 360.)
+        cls.binner = GridBinner(cls.x, cls.y, cls.x_grid, cls.y_grid)
+
+    def reference(self, values, func):
+        return bin_by_loops(self.x, self.y, values, self.x_grid, self.y_grid, func)
+
+    def test_count(self):
+        expected = self.reference(self.values, lambda v, *args: v.size)
+        np.testing.assert_array_equal(self.binner(self.values, method='count'), expected)
+
+    def test_mean(self):
+        expected = self.reference(self.values, lambda v, *args: np.mean(v) if v.size else np.nan)
+        self.assertTrue(np.any(np.isnan(expected)))
+        np.testing.assert_allclose(self.binner(self.values, method='mean'), expected, rtol=1e-10, atol=1e-12)
+
+    def test_median(self):
+        expected = self.reference(self.values, lambda v, *args: np.median(v) if v.size else np.nan)
+        np.testing.assert_array_equal(self.binner(self.values, method='median'), expected)
+
+    def test_nearest(self):
+        dx, dy = 1., 0.5
+
+        def nearest(v, x, y, xc, yc):
+            if not v.size:
+                return np.nan
+            return v[np.argmin(np.hypot((x - xc) / dx, (y - yc) / dy))]
+
+        expected = self.reference(self.values, nearest)
+        np.testing.assert_array_equal(self.binner(self.values, method='nearest'), expected)
+
+    def test_period(self):
+        for method, func in [('mean', circular_mean), ('median', circular_median)]:
+            with self.subTest(method=method):
+                expected = self.reference(self.lon, lambda v, *args: func(v, 360.))
+                actual = self.binner(self.lon, method=method, period=360.)
+                np.testing.assert_array_equal(np.isnan(actual), np.isnan(expected))
+                valid = np.isfinite(actual)
+                self.assertTrue(np.all((actual[valid] >= 0.) & (actual[valid] < 360.)))
+                np.testing.assert_allclose(
+                    circular_distance(actual[valid], expected[valid], 360.), 0., atol=1e-9)
+
+    def test_period_wrap(self):
+        # the circular mean and median are just below 0.
+        lon = np.array([350., 10., 355., 5., 359.9999999999, 1e-10])
+        binner = GridBinner(np.zeros(lon.size), np.zeros(lon.size), np.array([0., 1.]), np.array([0., 1.]))
+        for method in ['mean', 'median']:
+            with self.subTest(method=method):
+                r = binner(lon, method=method, period=360.)[0, 0]
+                self.assertGreaterEqual(r, 0.)
+                self.assertLess(r, 360.)
+                self.assertLess(circular_distance(r, 0., 360.), 1e-6)
+
+    def test_multiple_variables(self):
+        values = np.stack((self.values, self.lon), axis=-1)
+        grids = self.binner(values, method='mean')
+        self.assertEqual(grids.shape, self.binner.shape + (2,))
+        np.testing.assert_array_equal(grids[..., 0], self.binner(self.values, method='mean'))
+        np.testing.assert_array_equal(grids[..., 1], self.binner(self.lon, method='mean'))
+
+
+if __name__ == '__main__':
+    unittest.main()
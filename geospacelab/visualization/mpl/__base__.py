@@ -11,6 +11,8 @@ from typing import Dict
 
 from matplotlib.gridspec import GridSpec, SubplotSpec
 from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib._pylab_helpers import Gcf
 
 from cycler import cycler
 
@@ -168,7 +170,7 @@ class FigureBase(Figure):
         return self.dashboards[label]
 
     def add_text(self, *args, **kwargs):
-        super().text(*args, **kwargs)
+        return super().text(*args, **kwargs)
 
     def add_watermark(self, watermark=None, style=None):
         if watermark is not None:
@@ -249,6 +251,8 @@ class DashboardBase(object):
             figure_config = {}
         self._figure_config = figure_config
 
+        # The figure not managed by pyplot (e.g., figure='agg'), which is kept alive by the dashboard.
+        self._figure_agg = None
         self.figure = figure
 
         self.panels : Dict[int, PanelBase] = {}
@@ -267,6 +271,18 @@ class DashboardBase(object):
             ax.remove()
         self.extra_axes = {}
 
+    def close(self):
+        """
+        Release the figure and the panels of the dashboard. The figure managed by pyplot is closed.
+        """
+        figure = self.figure
+        self.panels = {}
+        self.extra_axes = {}
+        self.gs = None
+        if figure is not None and _is_pyplot_figure(figure):
+            plt.close(figure)
+        self._figure_agg = None
+        self._figure_ref = None
 
     def set_layout(self, num_rows=None, num_cols=None, **kwargs):
         """
@@ -316,6 +332,7 @@ class DashboardBase(object):
             raise TypeError
 
         args = [self.gs[row_ind[0]:row_ind[1], col_ind[0]:col_ind[1]]]
+        kwargs.setdefault('figure', self.figure)
         panel = panel_class(*args, label=label, **kwargs)
 
         # panel.add_subplot(self.gs[row_ind[0]:row_ind[1], col_ind[0]:col_ind[1]], major=True, **kwargs)
@@ -353,7 +370,7 @@ class DashboardBase(object):
 
         y_new = self.gs.bottom + y * (self.gs.top - self.gs.bottom)
 
-        self.figure.add_text(x_new, y_new, text, **kwargs)
+        return self.figure.add_text(x_new, y_new, text, **kwargs)
 
     def add_title(self, x, y, title, **kwargs):
         # add text in dashboard cs
@@ -365,7 +382,7 @@ class DashboardBase(object):
         if y is None:
             y = 1.05
 
-        self.add_text(x, y, title, **kwargs)
+        return self.add_text(x, y, title, **kwargs)
 
     def add_panel_labels(self, panel_indices=None, style='alphabets', bbox_config=None, labels=list(), **kwargs):
         if panel_indices is None:
@@ -473,7 +490,8 @@ class DashboardBase(object):
                 format = 'png'
                 file_path = file_path.with_suffix('.png')
 
-        plt.savefig(file_path, dpi=dpi, format=format, **kwargs)
+        self.figure.savefig(file_path, dpi=dpi, format=format, **kwargs)
+        return file_path
 
     @staticmethod
     def show():
@@ -499,12 +517,18 @@ class DashboardBase(object):
             figure = plt.figure(FigureClass=self._figure_class, **self._figure_config)
             figure._default_dashboard_class = self.__class__
             mylog.simpleinfo.info(f"Create a new figure: {figure}.")
+        elif figure_obj == 'agg':
+            # A new figure drawn on an Agg canvas, which is not managed by pyplot, e.g., for rendering in batch.
+            figure = self._figure_class(**self._figure_config)
+            FigureCanvasAgg(figure)
+            figure._default_dashboard_class = self.__class__
         elif issubclass(figure_obj.__class__, self._figure_class):
             figure = figure_obj
         elif issubclass(figure_obj.__class__, plt.Figure):
             figure = figure_obj
         elif figure_obj=='off':
             figure = 'off'
+            self._figure_agg = None
             self._figure_ref = None
             return
         else:
@@ -512,6 +536,9 @@ class DashboardBase(object):
 
         if issubclass(figure.__class__, FigureBase) and not self._from_figure:
             figure.add_dashboard(self)
+        # The figures managed by pyplot are referenced weakly, so that they are released after being closed.
+        # The others are only kept alive by the dashboard.
+        self._figure_agg = None if _is_pyplot_figure(figure) else figure
         self._figure_ref = weakref.ref(figure)
 
     def __repr__(self):
@@ -519,6 +546,10 @@ class DashboardBase(object):
         return r
 
 
+def _is_pyplot_figure(figure):
+    return any(manager.canvas.figure is figure for manager in Gcf.get_all_fig_managers())
+
+
 class PanelBase(object):
     _ax_attr_model = {
         'twinx': 'off',
@@ -530,10 +561,17 @@ class PanelBase(object):
         'legend': None,
         'colorbar': None,
         'variables': [],
+        'artists': [],      # (variable, artists) in the order of drawing
+        'zero_line': None,
+        'colorbar_instance': None,
+        'timeline_texts': [],
+        'timeline_formatter': None,
     }
-    axes_overview = {}
 
     def __init__(self, *args, figure=None, from_subplot=True, **kwargs):
+        # The overview of the axes in this panel. It is an instance attribute, so that the axes of the closed
+        # figures are not kept alive by the class.
+        self.axes_overview = {}
         if figure is None:
             figure = plt.gcf()
         elif figure == 'new':
@@ -590,7 +628,8 @@ class PanelBase(object):
 
         :param ax: the ax instance belong to the attribute axes.
         """
-        plt.sca(ax)
+        if ax.figure.canvas.manager is not None:
+            plt.sca(ax)
         self._current_ax = ax
 
     def gca(self):
@@ -649,7 +688,7 @@ class PanelBase(object):
     @check_panel_ax
     def add_grid(self, ax=None, visible=True, which='major', axis='both', **kwargs):
         self.sca(ax)
-        plt.grid(visible=visible, which=which, axis=axis, **kwargs)
+        ax.grid(visible=visible, which=which, axis=axis, **kwargs)
 
     @check_panel_ax
     def clear_axes(self, ax=None, collection_names=('lines', 'collections', 'images', 'patches')):
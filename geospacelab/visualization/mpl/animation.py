@@ -0,0 +1,238 @@
+# Licensed under the BSD 3-Clause License
+# Copyright (C) 2021 GeospaceLab (geospacelab)
+# Author: Lei Cai, Space Physics and Astronomy, University of Oulu
+
+__author__ = "Lei Cai"
+__copyright__ = "Copyright 2021, GeospaceLab"
+__license__ = "BSD-3-Clause License"
+__email__ = "lei.cai@oulu.fi"
+__docformat__ = "reStructureText"
+
+import pathlib
+import subprocess
+
+import numpy as np
+import matplotlib as mpl
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import geospacelab.toolbox.utilities.pylogging as mylog
+
+
+class FFMpegPipe(object):
+    """
+    Stream the RGBA frames rendered by matplotlib to ffmpeg through a pipe, without writing the images to disk.
+    The path of the ffmpeg executable is rcParams['animation.ffmpeg_path'].
+
+    :param file_path: the path of the video file, e.g., 'movie.mp4' or 'movie.gif'.
+    :param fps: the frame rate.
+    :param codec: the video codec. If None, 'h264' for mp4, mov, m4v, and mkv, or the ffmpeg default for the others.
+    :param bitrate: the bitrate in kbps.
+    :param extra_args: a list of the extra arguments of ffmpeg for the output.
+    """
+
+    def __init__(self, file_path, fps=10, codec=None, bitrate=None, extra_args=None):
+        self.file_path = pathlib.Path(file_path)
+        self.fps = fps
+        if codec is None and self.file_path.suffix.lower() in ['.mp4', '.mov', '.m4v', '.mkv']:
+            codec = 'h264'
+        self.codec = codec
+        self.bitrate = bitrate
+        self.extra_args = extra_args if extra_args is not None else []
+        self.frame_shape = None
+        self.num_frames = 0
+        self._proc = None
+
+    def _args(self):
+        height, width = self.frame_shape[:2]
+        args = [
+            mpl.rcParams['animation.ffmpeg_path'], '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-vcodec', 'rawvideo', '-s', '{:d}x{:d}'.format(width, height),
+            '-pix_fmt', 'rgba', '-r', str(self.fps), '-i', 'pipe:'
+        ]
+        if self.codec is not None:
+            args.extend(['-vcodec', self.codec])
+        if self.codec in ['h264', 'libx264']:
+            # yuv420p requires even dimensions.
+            args.extend(['-pix_fmt', 'yuv420p', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2'])
+        if self.bitrate is not None:
+            args.extend(['-b:v', '{}k'.format(self.bitrate)])
+        args.extend(self.extra_args)
+        args.append(str(self.file_path))
+        return args
+
+    def write(self, frame):
+        """
+        Write a frame.
+
+        :param frame: an RGBA array of the shape (height, width, 4), e.g., canvas.buffer_rgba().
+        """
+        frame = np.asarray(frame)
+        if self._proc is None:
+            self.frame_shape = frame.shape
+            args = self._args()
+            try:
+                self._proc = subprocess.Popen(
+                    args, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            except FileNotFoundError:
+                raise RuntimeError(
+                    "ffmpeg is not found at {}! Install ffmpeg, or set its path to "
+                    "rcParams['animation.ffmpeg_path'].".format(args[0]))
+        elif frame.shape != self.frame_shape:
+            raise ValueError(
+                "The frame size {} differs from the size of the first frame {}!".format(frame.shape, self.frame_shape))
+        try:
+            self._proc.stdin.write(np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+        except BrokenPipeError:
+            self._raise_error()
+        self.num_frames += 1
+
+    def close(self):
+        if self._proc is None:
+            return
+        self._proc.stdin.close()
+        if self._proc.wait() != 0:
+            self._raise_error()
+        self._proc.stderr.close()
+        self._proc = None
+        mylog.simpleinfo.info("Saved {} frames to {}.".format(self.num_frames, self.file_path))
+
+    def _raise_error(self):
+        err = self._proc.stderr.read().decode(errors='replace')
+        self._proc.wait()
+        self._proc = None
+        raise RuntimeError("ffmpeg failed to write {}: {}".format(self.file_path, err))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        elif self._proc is not None:
+            self._proc.kill()
+            self._proc.wait()
+            self._proc = None
+
+
+def get_agg_canvas(figure):
+    """
+    Get the canvas of the figure to render the frames on. A new Agg canvas is attached to the figure,
+    if the figure is not drawn on an Agg-based canvas.
+    """
+    canvas = figure.canvas
+    if not isinstance(canvas, FigureCanvasAgg):
+        canvas = FigureCanvasAgg(figure)
+    return canvas
+
+
+def animate_figure(figure, frames, update_frame, file_path, blit=True, fps=10, **kwargs):
+    """
+    Animate a figure by updating its data artists for each frame, and stream the frames to ffmpeg.
+
+    The artists drawn before the animation (e.g., the gridlines, coastlines and boundaries of the maps, and the
+    colorbars) are static. For each frame, update_frame(frame) updates the data artists, e.g., by set_array for
+    pcolormesh and imshow, set_offsets for scatter, and set_UVC for quiver, or replaces them, and returns the
+    artists that change. With blit=True, the static layers are rendered once as a background, and only the
+    returned artists are drawn on it. With blit=False, the whole figure is redrawn for each frame, which is required
+    if update_frame changes the static layers, e.g., the map extent or the tick labels.
+
+    :param figure: the figure to animate.
+    :param frames: an iterable of the frames, e.g., the datetimes, passed to update_frame.
+    :param update_frame: a callable update_frame(frame) returning the list of the changed artists.
+    :param file_path: the path of the video file.
+    :param blit: if True, the static layers are rendered once.
+    :param fps: the frame rate.
+    :param kwargs: the keyword arguments of :class:`FFMpegPipe`, e.g., codec and bitrate.
+    :return: the number of the frames.
+    """
+    canvas_old = figure.canvas
+    canvas = get_agg_canvas(figure)
+    background = None
+    # the artists set animated here, which are excluded from the background and restored at the end.
+    artists_animated = []
+    try:
+        with FFMpegPipe(file_path, fps=fps, **kwargs) as writer:
+            for frame in frames:
+                artists = update_frame(frame)
+                if artists is None:
+                    artists = []
+                if not blit:
+                    canvas.draw()
+                else:
+                    draw_list = _get_draw_list(artists)
+                    for artist in draw_list:
+                        if not artist.get_animated():
+                            artist.set_animated(True)
+                            artists_animated.append(artist)
+                    if background is None:
+                        canvas.draw()
+                        background = canvas.copy_from_bbox(figure.bbox)
+                    else:
+                        canvas.restore_region(background)
+                    for artist in draw_list:
+                        figure.draw_artist(artist)
+                writer.write(canvas.buffer_rgba())
+            num_frames = writer.num_frames
+    finally:
+        for artist in artists_animated:
+            artist.set_animated(False)
+        if canvas is not canvas_old:
+            figure.set_canvas(canvas_old)
+    return num_frames
+
+
+def _get_draw_list(artists):
+    # The animated artists and the static artists above them (e.g., the gridlines and coastlines over a
+    # pcolormesh) in the same axes, in the drawing order.
+    draw_list = list(artists)
+    for ax in {artist.axes for artist in artists if artist.axes is not None}:
+        zorder = min(artist.get_zorder() for artist in artists if artist.axes is ax)
+        draw_list.extend(
+            child for child in ax.get_children()
+            if child.get_visible() and child.get_zorder() > zorder and child not in artists
+        )
+    return sorted(draw_list, key=lambda artist: artist.get_zorder())
+
+
+def render_frames(frames, draw_frame, file_path, n_workers=None, chunksize=1, fps=10, **kwargs):
+    """
+    Render the frames in a pool of processes, and stream them to ffmpeg in order. This is for the layouts which
+    cannot be blitted, e.g., the maps centered at a changing local time. Each frame is drawn from scratch by
+    draw_frame(frame), which must be picklable (a module-level function) and returns the dashboard or the figure
+    of the frame, e.g., a GeoDashboard created with figure='agg'.
+
+    :param frames: a sequence of the frames.
+    :param draw_frame: a callable draw_frame(frame) returning a dashboard or a figure.
+    :param file_path: the path of the video file.
+    :param n_workers: the number of the worker processes. If None or 1, the frames are rendered in this process.
+    :param chunksize: the number of the frames sent to a worker at once.
+    :param fps: the frame rate.
+    :param kwargs: the keyword arguments of :class:`FFMpegPipe`.
+    :return: the number of the frames.
+    """
+    with FFMpegPipe(file_path, fps=fps, **kwargs) as writer:
+        if n_workers is not None and n_workers > 1:
+            import concurrent.futures
+            with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker) as executor:
+                for frame in executor.map(_render_frame, [draw_frame] * len(frames), frames, chunksize=chunksize):
+                    writer.write(frame)
+        else:
+            for frame in frames:
+                writer.write(_render_frame(draw_frame, frame))
+        num_frames = writer.num_frames
+    return num_frames
+
+
+def _init_worker():
+    mpl.use('Agg')
+
+
+def _render_frame(draw_frame, frame):
+    obj = draw_frame(frame)
+    figure = getattr(obj, 'figure', obj)
+    canvas = get_agg_canvas(figure)
+    canvas.draw()
+    rgba = np.array(canvas.buffer_rgba())
+    plt.close(figure)
+    return rgba
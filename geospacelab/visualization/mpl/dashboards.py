@@ -9,8 +9,10 @@ __email__ = "lei.cai@oulu.fi"
 __docformat__ = "reStructureText"
 
 
+import contextlib
 import string
 import pathlib
+import time
 import matplotlib.pyplot as plt
 import numpy as np
 import datetime
@@ -22,6 +24,7 @@ from geospacelab.datahub import DataHub
 import geospacelab.visualization.mpl.panels as mpl_panel
 import geospacelab.toolbox.utilities.pybasic as basic
 import geospacelab.toolbox.utilities.pydatetime as dttool
+import geospacelab.toolbox.utilities.numpyarray as arraytool
 from geospacelab.visualization.mpl.__base__ import DashboardBase
 import geospacelab.visualization.mpl.panels as panels
 
@@ -69,6 +72,17 @@ class TSDashboard(Dashboard):
 
         self.panels: dict[int: panels.TSPanel] = {}
         self._xlim = [self.dt_fr, self.dt_to]
+        self._title = None
+        # The time (in seconds) spent in the drawing phases, see update.
+        self.timings = {}
+
+    @contextlib.contextmanager
+    def _timing(self, phase):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[phase] = self.timings.get(phase, 0.) + time.perf_counter() - t0
 
     def set_layout(self, panel_layouts=None, panels_classes=None, plot_styles=None, row_height_scales=1,
                    left=None, right=None, bottom=None, top=None, hspace=None, add_panels=True, **kwargs):
@@ -122,7 +136,8 @@ class TSDashboard(Dashboard):
             }
             rec = rec + height
         if add_panels:
-            self.add_panels()
+            with self._timing('layout'):
+                self.add_panels()
 
     def add_panels(self):
         bottom_panel = False
@@ -149,18 +164,87 @@ class TSDashboard(Dashboard):
         if not isinstance(time_res,list):
             time_res = [time_res] * len(self.panels.keys())
 
-        npanel = 0
-        for ind, panel in self.panels.items():
-            panel._xlim = self._xlim
-            panel.time_res = time_res[ind]
-            plot_layout = self.panel_layouts[npanel]
-            plot_layout = self._validate_plot_layout(plot_layout)
-            panel.draw(plot_layout)
-            npanel = npanel + 1
-
-        if auto_grid:
-            self.add_grid(panel_id=0, visible=True, which='major', axis='both', lw=0.5, color='grey', alpha=0.3)
-            self.add_grid(panel_id=0, visible=True, which='minor', axis='both', lw=0.3, color='grey', alpha=0.1)
+        with self._timing('draw'):
+            npanel = 0
+            for ind, panel in self.panels.items():
+                panel._xlim = self._xlim
+                panel.time_res = time_res[ind]
+                plot_layout = self.panel_layouts[npanel]
+                plot_layout = self._validate_plot_layout(plot_layout)
+                panel.draw(plot_layout)
+                npanel = npanel + 1
+
+            if auto_grid:
+                self.add_grid(panel_id=0, visible=True, which='major', axis='both', lw=0.5, color='grey', alpha=0.3)
+                self.add_grid(panel_id=0, visible=True, which='minor', axis='both', lw=0.3, color='grey', alpha=0.1)
+
+    def update(self, dt_fr, dt_to, datasets=None, file_dir=None, file_name=None, **kwargs):
+        """
+        Update the dashboard for a new time range in the template mode, e.g., for rendering the same layout for
+        different days. The dashboard is laid out and drawn once (set_layout and draw). For each update, the new
+        data are swapped into the existing panels: the lines are updated in place, the other data artists
+        are redrawn, and the x and y limits, the colorbars, the extra timeline labels, and the title are recomputed.
+        The panels, twin axes, tick locators and formatters, colorbar axes, and grids are kept.
+        Create the dashboard with figure='agg' for rendering without pyplot. The figure is kept by the dashboard
+        between the updates, and released by close().
+
+        The time spent in each phase ('data', 'artists', 'limits', 'ticks', and 'save') is recorded in
+        the attribute timings.
+
+        :param dt_fr: the start time.
+        :param dt_to: the stop time.
+        :param datasets: the new datasets, a dict {key: dataset} for the keys of the attribute datasets, or a list in
+            the order of the attribute datasets. The values, errors, and depends of the variables are copied to
+            the variables with the same names in the datasets of the dashboard. If None, the datasets of the dashboard have been
+            updated.
+        :param file_dir: the directory to save the figure.
+        :param file_name: if not None, the figure is saved by save_figure.
+        :param kwargs: other keyword arguments of save_figure.
+        :return: the file path if the figure is saved.
+        """
+        self.timings = {}
+        with self._timing('data'):
+            if datasets is not None:
+                if isinstance(datasets, (list, tuple)):
+                    datasets = dict(zip(self.datasets.keys(), datasets))
+                for key, ds_new in datasets.items():
+                    ds = self.datasets[key]
+                    for var_name, var_new in ds_new._variables.items():
+                        if var_name in ds._variables.keys():
+                            var = ds._variables[var_name]
+                            var.value = var_new.value
+                            # the errors and depends given by the variable names refer to the dataset of the dashboard.
+                            var.error = var_new._error
+                            var.depends = None
+                            var.depends = {axis: dict(depend) for axis, depend in var_new.depends.items()}
+                    ds.dt_fr = dt_fr
+                    ds.dt_to = dt_to
+        self._xlim[0] = dt_fr
+        self._xlim[1] = dt_to
+
+        if not any(list(panel._get_data_axes()) for panel in self.panels.values()):
+            # the first drawing
+            self.draw()
+        else:
+            with self._timing('artists'):
+                for panel in self.panels.values():
+                    panel._xlim = self._xlim
+                    panel.update_artists()
+            with self._timing('limits'):
+                for panel in self.panels.values():
+                    panel.update_limits()
+            with self._timing('ticks'):
+                for panel in self.panels.values():
+                    panel.update_timeline()
+                if self._title is not None:
+                    title, text, append_time = self._title
+                    if append_time:
+                        title = (title + ', ' + self.get_dt_range_str(style='title')).replace(', , ', ', ')
+                    text.set_text(title)
+
+        if file_name is None:
+            return None
+        return self.save_figure(file_dir=file_dir, file_name=file_name, **kwargs)
 
     def add_grid(self, panel_id=0, visible=None, which='major', axis='both', **kwargs):
         if panel_id == 0:
@@ -209,17 +293,24 @@ class TSDashboard(Dashboard):
 
         file_name = file_name + '.' + file_format
 
-        plt.savefig(file_dir / file_name, dpi=dpi, format=file_format, **kwargs)
+        file_path = file_dir / file_name
+        with self._timing('save'):
+            self.figure.savefig(file_path, dpi=dpi, format=file_format, **kwargs)
+        return file_path
 
     def add_title(self, x=0.5, y=1.08, title=None, **kwargs):
         append_time = kwargs.pop('append_time', True)
         kwargs.setdefault('fontsize', plt.rcParams['figure.titlesize'])
         kwargs.setdefault('fontweight', 'roman')
+        title_in = title
         if append_time:
             dt_range_str = self.get_dt_range_str(style='title')
             title = title + ', ' + dt_range_str
         title = title.replace(', , ', ', ')
-        super().add_title(x=x, y=y, title=title, **kwargs)
+        text = super().add_title(x=x, y=y, title=title, **kwargs)
+        # the title is updated for the new time range in update.
+        self._title = (title_in, text, append_time)
+        return text
 
     def get_dt_range_str(self, style='title'):
         dt_fr = self._xlim[0]
@@ -319,71 +410,60 @@ class TSDashboard(Dashboard):
             ax.plot(xx, yy, **kwargs)
 
 
-    def search_UTs(self, search_step=1/86400, **kwargs) -> list:
-        from scipy.interpolate import interp1d
-        from scipy.signal import argrelmin
-        import matplotlib.dates as mpl_dates
+    def search_UTs(self, search_step=None, **kwargs) -> list:
+        """
+        Search the times of the time series in the last panel, e.g., when a satellite crosses a magnetic latitude
+        within a range of longitudes,
+
+            >>> dts = dashboard.search_UTs(AACGM_LAT=66.6, GEO_LON=[8, 32])
+
+        The first keyword gives the value to be crossed (see :meth:`DatasetBase.search_crossings
+        <geospacelab.datahub.DatasetBase.search_crossings>`), or a range [v_0, v_1] for the samples in the range.
+        The following keywords give the ranges of the other variables at those times. The keywords are the labels
+        of the time dependence (e.g., 'AACGM_LAT') or the names of the variables in the dataset. The local times
+        and the longitudes are handled as periodic quantities.
+
+        :param search_step: not used, the crossings are refined by the linear interpolation.
+        :return: a list of the times of the samples nearest to the crossings or in the range.
+        """
         panel = list(self.panels.values())[-1]
         var_for_config = panel._var_for_config
         x_depend = var_for_config.get_depend(axis=0, retrieve_data=True)
-        x0 = np.array(mpl_dates.date2num(x_depend['UT'])).flatten()
-        x_fr = x0[0]
-        x_to = x0[-1]
-        x1 = np.arange(x_fr, x_to, search_step)
-        x1_0 = x1
-        ind_0 = np.array(range(x1.size))
-        for ind, (label, value) in enumerate(kwargs.items()):
+        dts = np.asarray(x_depend['UT']).flatten()
+        if not dts.size:
+            return []
+        x0, _ = dttool.convert_datetime_to_sectime(dts, dt0=dts[0])
+
+        def get_series(label):
             if label in x_depend.keys():
-                y0 = x_depend[label].flatten()
+                y0 = x_depend[label]
             elif label in var_for_config.dataset.keys():
                 y0 = var_for_config.dataset[label].value
             else:
                 raise KeyError
+            return np.asarray(y0, dtype=float).flatten(), var_for_config.dataset.get_variable_period(label)
+
+        inds = np.array([], dtype=int)
+        for ind, (label, value) in enumerate(kwargs.items()):
+            y0, period = get_series(label)
             if ind == 0:
-                if 'MLT' in label.upper():
-                    y0_sin = np.sin(y0 / 24. * 2 * np.pi)
-                    y0_cos = np.cos(y0 / 24. * 2 * np.pi)
-                    itpf_sin = interp1d(x0, y0_sin, bounds_error=False, fill_value='extrapolate')
-                    itpf_cos = interp1d(x0, y0_cos, bounds_error=False, fill_value="extrapolate")
-                    y0_sin_i = itpf_sin(x1)
-                    y0_cos_i = itpf_cos(x1)
-                    rad = np.sign(y0_sin_i) * (np.pi / 2 - np.arcsin(y0_cos_i))
-                    rad = np.where((rad >= 0), rad, rad + 2 * np.pi)
-                    y1 = rad / 2. / np.pi * 24.
-                elif 'LON' in label.upper():
-                    y0_sin = np.sin(y0 * np.pi / 180.)
-                    y0_cos = np.cos(y0 * np.pi / 180.)
-                    itpf_sin = interp1d(x0, y0_sin, bounds_error=False, fill_value='extrapolate')
-                    itpf_cos = interp1d(x0, y0_cos, bounds_error=False, fill_value="extrapolate")
-                    y0_sin_i = itpf_sin(x1)
-                    y0_cos_i = itpf_cos(x1)
-                    rad = np.sign(y0_sin_i) * (np.pi / 2 - np.arcsin(y0_cos_i))
-                    y1 = rad * 180. / np.pi
-                    if value is list:
-                        value = [(v + 180.) % 360 - 180 for v in value]
-                    else:
-                        value = (value + 180.) % 360 - 180
+                if isinstance(value, (list, tuple)):
+                    inds = np.flatnonzero(arraytool.mask_in_range(y0, value, period=period))
+                    x1 = x0[inds]
+                elif np.isscalar(value):
+                    x1, _ = arraytool.search_crossings(x0, y0, value, period=period)
+                    inds = arraytool.search_nearest_indices(x0, x1)
                 else:
-                    itpf = interp1d(x0, y0, bounds_error=False, fill_value='extrapolate')
-                    y1 = itpf(x1)
-            else:
-                y1 = y0
-            if type(value) in (int, float):
-                ind_1 = argrelmin(np.abs(y1 - value))
-            elif type(value) is list:
-                ind_1 = np.where((y1 > value[0]) & (y1 < value[1]))[0]
-            else:
+                    raise NotImplementedError
+                continue
+            if not isinstance(value, (list, tuple)):
                 raise NotImplementedError
+            y1 = arraytool.interp_series(x0, y0, x1, period=period)
+            mask = arraytool.mask_in_range(y1, value, period=period)
+            x1 = x1[mask]
+            inds = inds[mask]
 
-            x1 = x1[ind_1]
-            y1 = y1[ind_1]
-
-        results = []
-        for xx in x1:
-            ind_1 = argrelmin(np.abs(x0 - xx))
-            results.extend(mpl_dates.num2date(x0[ind_1]))
-
-        return results
+        return list(dts[np.unique(inds)])
 
     def add_shading(self, dt_fr, dt_to, panel_index=0,
                     label=None, label_position=None, top_extend=0., bottom_extend=0., **kwargs):
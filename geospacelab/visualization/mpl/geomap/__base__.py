@@ -8,6 +8,9 @@ __license__ = "BSD-3-Clause License"
 __email__ = "lei.cai@oulu.fi"
 __docformat__ = "reStructureText"
 
+import collections
+import hashlib
+
 import numpy as np
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
@@ -18,6 +21,8 @@ from cartopy.mpl.gridliner import LONGITUDE_FORMATTER, LATITUDE_FORMATTER
 import geospacelab.visualization.mpl.panels as panels
 import geospacelab.toolbox.utilities.pybasic as basic
 
+max_cached_transforms = 32
+
 
 class GeoPanelBase(panels.PanelBase):
 
@@ -27,6 +32,7 @@ class GeoPanelBase(panels.PanelBase):
         proj_config = proj_config if type(proj_config) is dict or proj_config is None else self._raise_error(TypeError)
         self.projection = self.proj_class(**proj_config)
         self._extent = None
+        self._transform_cache = collections.OrderedDict()
         kwargs.update(projection=self.projection)
         super().__init__(*args, **kwargs)
 
@@ -36,11 +42,47 @@ class GeoPanelBase(panels.PanelBase):
         ax = super().add_axes(*args, major=major, label=label, **kwargs)
         return ax
 
+    def transform_points(self, x, y, src_crs=None, inverse=False):
+        """
+        Transform the points from src_crs to the map projection, or from the map projection to src_crs if inverse
+        is True. The results are memoized in the panel (at most max_cached_transforms), keyed by the hash of
+        the coordinates, the projections, and the direction, so that the coordinates shared by the layers or the
+        frames of a map are transformed once.
+
+        :param x: the x coordinates, e.g., the longitudes.
+        :param y: the y coordinates, e.g., the latitudes.
+        :param src_crs: the source coordinate reference system, ccrs.PlateCarree() by default.
+        :param inverse: if True, transform the points in the map projection to src_crs.
+        :return: a read-only array of the shape x.shape + (3,), as ``cartopy.crs.CRS.transform_points``.
+        """
+        if src_crs is None:
+            src_crs = ccrs.PlateCarree()
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        h = hashlib.blake2b(digest_size=16)
+        for a in (x, y):
+            h.update(repr(a.shape).encode())
+            h.update(np.ascontiguousarray(a).tobytes())
+        key = (h.hexdigest(), src_crs.proj4_init, self.projection.proj4_init, inverse)
+        if key in self._transform_cache.keys():
+            self._transform_cache.move_to_end(key)
+            return self._transform_cache[key]
+
+        if inverse:
+            data = src_crs.transform_points(self.projection, x, y)
+        else:
+            data = self.projection.transform_points(src_crs, x, y)
+        data.flags.writeable = False
+        self._transform_cache[key] = data
+        if len(self._transform_cache) > max_cached_transforms:
+            self._transform_cache.popitem(last=False)
+        return data
+
     def set_map_extent(self, boundary_latitudes, boundary_longitudes, **kwargs):
         x = boundary_longitudes.flatten()
         y = boundary_latitudes.flatten()
 
-        data = self.projection.transform_points(ccrs.PlateCarree(), x, y)
+        data = self.transform_points(x, y)
         ext = [np.nanmin(data[:, 0]), np.nanmax(data[:, 0]), np.nanmin(data[:, 1]), np.nanmax(data[:, 1])]
 
         self._extent = ext
@@ -0,0 +1,119 @@
+# Licensed under the BSD 3-Clause License
+# Copyright (C) 2021 GeospaceLab (geospacelab)
+# Author: Lei Cai, Space Physics and Astronomy, University of Oulu
+
+__author__ = "Lei Cai"
+__copyright__ = "Copyright 2021, GeospaceLab"
+__license__ = "BSD-3-Clause License"
+__email__ = "lei.cai@oulu.fi"
+__docformat__ = "reStructureText"
+
+import collections
+import datetime
+
+import numpy as np
+
+
+# The coastline vertices in GEO, keyed by the resolution.
+_coastlines_geo = {}
+# The coastline vertices transformed to the other coordinate systems, keyed by (cs, epoch, resolution).
+_coastlines_cs = collections.OrderedDict()
+max_cached = 64
+
+
+def load_coastlines(resolution='110m'):
+    """
+    Load the Natural Earth coastlines once for a resolution.
+
+    :param resolution: the resolution of the Natural Earth data, '110m', '50m', or '10m'.
+    :return: lat, lon, offsets. The vertices of all the segments are packed in lat and lon (lon in [0, 360)).
+        The vertices of the ith segment are lat[offsets[i]:offsets[i+1]].
+    """
+    if resolution in _coastlines_geo.keys():
+        return _coastlines_geo[resolution]
+
+    import cartopy.io.shapereader as shpreader
+
+    shpfilename = shpreader.natural_earth(resolution=resolution,
+                                          category='physical',
+                                          name='coastline')
+    coastlines = list(shpreader.Reader(shpfilename).geometries())
+    lats = []
+    lons = []
+    for c in coastlines[:-1]:
+        try:
+            x0 = np.array(c.xy[0])
+            y0 = np.array(c.xy[1])
+        except Exception:
+            continue
+        lons.append(np.mod(x0, 360))
+        lats.append(y0)
+    offsets = np.concatenate(([0], np.cumsum([len(y0) for y0 in lats]))).astype(int)
+    lat = np.concatenate(lats)
+    lon = np.concatenate(lons)
+    for a in (lat, lon, offsets):
+        a.flags.writeable = False
+    _coastlines_geo[resolution] = (lat, lon, offsets)
+    return lat, lon, offsets
+
+
+def separate_segments(values, offsets):
+    """
+    Unpack the values of the segments to an array, where a NaN is appended to each segment, e.g., for ax.plot.
+    """
+    num_segments = offsets.size - 1
+    inds = np.arange(values.size) + np.repeat(np.arange(num_segments), np.diff(offsets))
+    values_new = np.full(values.size + num_segments, np.nan)
+    values_new[inds] = values
+    return values_new
+
+
+def get_coastlines(cs='GEO', ut=None, resolution='110m', epoch_res=3600., append_mlt=False):
+    """
+    Get the coastlines in a coordinate system.
+
+    The transformed coordinates are cached by (cs, epoch, resolution), where the epoch is the start of the time
+    bin (epoch_res) including ut. As the magnetic coordinates of the coastlines change slowly, they are computed
+    once at the epoch for all the maps in the time bin, e.g., the frames of a movie.
+    The MLTs, which depend on the exact time, are computed for ut. With the bins of one hour, the AACGM
+    coordinates differ from those at ut by less than 0.0005 deg in latitude and 0.002 deg in longitude
+    (poleward of 80 deg, where the meridians converge). With the bins of one day, the differences grow to about
+    0.008 deg in latitude and 0.035 deg in longitude.
+
+    :param cs: the coordinate system, e.g., 'GEO', 'AACGM', or 'APEX'.
+    :param ut: the time of the map, a datetime.
+    :param resolution: the resolution of the Natural Earth data.
+    :param epoch_res: the size of the time bins in seconds, one hour by default.
+    :param append_mlt: if True, the MLTs are returned as well (for AACGM and APEX).
+    :return: a dict of the coordinates 'lat', 'lon' (and 'mlt'), where the segments are separated by NaN.
+    """
+    lat, lon, offsets = load_coastlines(resolution=resolution)
+    cs = cs.upper()
+    if cs != 'GEO':
+        dt0 = datetime.datetime(1970, 1, 1)
+        n = np.floor((ut - dt0).total_seconds() / epoch_res)
+        epoch = dt0 + datetime.timedelta(seconds=n * epoch_res)
+        key = (cs, epoch, resolution)
+        if key in _coastlines_cs.keys():
+            _coastlines_cs.move_to_end(key)
+        else:
+            import geospacelab.cs as geo_cs
+            cs1 = geo_cs.GEO(coords={'lat': lat, 'lon': lon, 'height': np.zeros_like(lat)}, ut=epoch)
+            cs2 = cs1(cs_to=cs)
+            _coastlines_cs[key] = (np.asarray(cs2['lat'], dtype=float), np.asarray(cs2['lon'], dtype=float))
+            if len(_coastlines_cs) > max_cached:
+                _coastlines_cs.popitem(last=False)
+        lat, lon = _coastlines_cs[key]
+
+    coords = {'lat': separate_segments(lat, offsets), 'lon': separate_segments(lon, offsets)}
+    if append_mlt:
+        if cs == 'AACGM':
+            import aacgmv2 as aacgm
+            mlt = aacgm.convert_mlt(lon, ut)
+        elif cs == 'APEX':
+            import apexpy as apex
+            mlt = apex.Apex(ut).mlon2mlt(lon, ut)
+        else:
+            raise NotImplementedError
+        coords['mlt'] = separate_segments(np.asarray(mlt, dtype=float), offsets)
+    return coords
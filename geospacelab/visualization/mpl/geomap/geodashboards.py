@@ -9,7 +9,10 @@ __email__ = "lei.cai@oulu.fi"
 __docformat__ = "reStructureText"
 
 
+import pathlib
+
 import geospacelab.visualization.mpl as mpl
+import geospacelab.visualization.mpl.animation as mpl_animation
 import geospacelab.datahub as datahub
 from geospacelab.visualization.mpl.geomap.geopanels import PolarMapPanel
 
@@ -74,4 +77,45 @@ class GeoDashboard(mpl.Dashboard):
                                      proj_type=proj_type, **kwargs)
         return panel
 
-
+    def animate(self, frames, update_frame, file_path=None, file_dir=None, file_name=None, blit=True, fps=10,
+                dpi=None, **kwargs):
+        """
+        Make a movie of the dashboard, e.g., of the SuperDARN potentials, the AMPERE FACs, or the TEC maps.
+
+        The panels, the static layers (e.g., the coastlines, gridlines, and boundaries), and the data artists of the
+        first frame are drawn before calling animate. For each frame, update_frame(frame) updates the data artists,
+        e.g., ``im.set_array(data)`` for pcolormesh and imshow, ``sc.set_offsets(xy)`` for scatter, and
+        ``iq.set_UVC(u, v)`` for quiver, and returns the artists that change. The static layers are rendered once,
+        and the frames are streamed to ffmpeg without writing the images.
+
+        Use :func:`geospacelab.visualization.mpl.animation.render_frames` to draw the frames from scratch in
+        a pool of processes, if the layout changes with the frames.
+
+        :param frames: an iterable of the frames, e.g., the datetimes, passed to update_frame.
+        :param update_frame: a callable update_frame(frame) returning the list of the changed artists.
+        :param file_path: the path of the video file. If None, file_dir/file_name.
+        :param blit: if True, only the artists returned by update_frame are redrawn. If False, the whole figure
+            is redrawn for each frame.
+        :param fps: the frame rate.
+        :param dpi: the resolution of the frames, the dpi of the figure by default.
+        :param kwargs: the keyword arguments of :class:`FFMpegPipe <geospacelab.visualization.mpl.animation.FFMpegPipe>`,
+            e.g., codec and bitrate.
+        :return: the file path.
+        """
+        if file_path is None:
+            if type(file_name) is not str:
+                raise ValueError('The file name ("file_name") must be assigned!')
+            file_dir = pathlib.Path.cwd() if file_dir is None else pathlib.Path(file_dir)
+            file_path = file_dir / file_name
+        file_path = pathlib.Path(file_path)
+        if not file_path.suffix:
+            file_path = file_path.with_suffix('.mp4')
+
+        dpi_old = self.figure.dpi
+        if dpi is not None:
+            self.figure.set_dpi(dpi)
+        try:
+            mpl_animation.animate_figure(self.figure, frames, update_frame, file_path, blit=blit, fps=fps, **kwargs)
+        finally:
+            self.figure.set_dpi(dpi_old)
+        return file_path
@@ -21,7 +21,7 @@ import matplotlib.path as mpath
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 import matplotlib.cm as mcm
-from scipy.interpolate import interp1d, griddata
+from matplotlib.collections import LineCollection
 import matplotlib.cm as cm
 from cartopy.mpl.gridliner import LONGITUDE_FORMATTER, LATITUDE_FORMATTER
 
@@ -29,8 +29,10 @@ import geospacelab.visualization.mpl as mpl
 import geospacelab.toolbox.utilities.pylogging as mylog
 import geospacelab.toolbox.utilities.pydatetime as dttool
 import geospacelab.toolbox.utilities.numpymath as mathtool
+import geospacelab.toolbox.utilities.numpyinterp as interptool
 import geospacelab.toolbox.utilities.pybasic as pybasic
 from geospacelab.visualization.mpl.geomap.__base__ import GeoPanelBase
+import geospacelab.visualization.mpl.geomap._coastlines as mapcoast
 from geospacelab.datahub.__variable_base__ import VariableBase
 
 
@@ -162,39 +164,14 @@ class PolarMapPanel(GeoPanel):
 
     def overlay_coastlines(self, linestyle='-', linewidth=0.5, color='#797A7D', zorder=100, alpha=0.7,
                            resolution='110m', **kwargs):
-        import cartopy.io.shapereader as shpreader
-
-        shpfilename = shpreader.natural_earth(resolution=resolution,
-                                              category='physical',
-                                              name='coastline')
-        coastlines = list(shpreader.Reader(shpfilename).geometries())
-
-        x = np.array([])
-        y = np.array([])
-        for ind, c in enumerate(coastlines[:-1]):
-            # print(ind)
-            # print(len(c.xy[0]))
-            # if ind not in [4013, 4014]:
-            #    continue
-            try:
-                x0 = np.array(c.xy[0])
-                y0 = np.array(c.xy[1])
-            except:
-                continue
-            # if len(x0) < 20:  # omit small islands, etc.
-            #    continue
-            x0 = np.mod(x0[::1], 360)
-            y0 = y0[::1]
-            x = np.append(np.append(x, x0), np.nan)
-            y = np.append(np.append(y, y0), np.nan)
-
-            # csObj = scs.SpaceCS(x, y, CS='GEO', dt=self.dt, coords_labels=['lon', 'lat'])
-
-        coords = {'lat': y, 'lon': x, 'height': np.ones_like(y) * 0}
-        coords = self.cs_transform(cs_fr='GEO', cs_to=self.cs, coords=coords)
+        # The coastlines are loaded once and transformed once for a coordinate system and an hour (see _coastlines).
+        coords = mapcoast.get_coastlines(
+            cs=self.cs, ut=self.ut, resolution=resolution, append_mlt=self.depend_mlt)
+        coords['height'] = np.zeros_like(coords['lat'])
+        # Set the longitudes for the mapping style (LST or MLT).
+        coords = self.cs_transform(cs_fr=self.cs, cs_to=self.cs, coords=coords)
         x_new = coords['lon']
         y_new = coords['lat']
-        # x_new, y_new = x, y
         self().plot(
             x_new, y_new,
             transform=ccrs.Geodetic(),
@@ -400,7 +377,7 @@ class PolarMapPanel(GeoPanel):
             if self.boundary_style == 'circle':
                 lb_lats = np.empty_like(lb_lons)
                 lb_lats[:] = self.boundary_lat
-                data = self.projection.transform_points(ccrs.PlateCarree(), lb_lons_loc, lb_lats)
+                data = self.transform_points(lb_lons_loc, lb_lats)
                 xdata = data[:, 0]
                 ydata = data[:, 1]
                 scale = (self._extent[1] - self._extent[0]) * 0.03
@@ -602,7 +579,7 @@ class PolarMapPanel(GeoPanel):
         lat_pts = lat_in[ind_data]
         lon_pts = lon_in[ind_data]
 
-        pos_data = self.projection.transform_points(ccrs.PlateCarree(), lon_pts, lat_pts)
+        pos_data = self.transform_points(lon_pts, lat_pts)
         pos_x = np.float32(pos_data[:, 0])
         pos_y = np.float32(pos_data[:, 1])
 
@@ -622,18 +599,14 @@ class PolarMapPanel(GeoPanel):
             np.arange(lim[0], lim[1], grid_x_res)
         )
 
-        grid_data = griddata((pos_x, pos_y), data_pts, (grid_x, grid_y), method=interp_method)
-        grid_data_x = griddata(
-            (pos_x, pos_y), pos_x, (grid_x, grid_y), method='nearest'
-        )
-        grid_data_y = griddata(
-            (pos_x, pos_y), pos_y, (grid_x, grid_y), method='nearest'
-        )
+        # The triangulation and the nearest neighbours are cached for the same points and grid,
+        # e.g., for the variables or frames on the same pixels of an imager.
+        interpolator = interptool.get_interpolator((pos_x, pos_y), (grid_x, grid_y))
+        grid_data = interpolator(data_pts, method=interp_method)
 
         if sparsely:
-            ind_out = np.where(
-                np.sqrt((grid_data_x - grid_x) ** 2 + (grid_data_y - grid_y) ** 2) > data_res / lat_width * width
-            )
+            distance, _ = interpolator.nearest()
+            ind_out = np.where(distance > data_res / lat_width * width)
             grid_data[ind_out] = np.nan
 
         return grid_x, grid_y, grid_data
@@ -686,7 +659,7 @@ class PolarMapPanel(GeoPanel):
 
         lat_in = cs_new['lat'][ind_lat]
         lon_in = cs_new['lon'][ind_lat]
-        data = self.projection.transform_points(ccrs.PlateCarree(), lon_in, lat_in)
+        data = self.transform_points(lon_in, lat_in)
         xdata = np.float32(data[:, 0])
         ydata = np.float32(data[:, 1])
         # sign = np.sign(xdata[1] - xdata[0])
@@ -789,119 +762,126 @@ class PolarMapPanel(GeoPanel):
         # kwargs['trajectory_config'].update(color=color)
 
         cs_new = self.cs_transform(cs_fr=cs, coords=sc_coords, ut=sc_ut)
+        sc_ut = np.asarray(sc_ut).flatten()
+        lat = np.asarray(cs_new['lat']).flatten()
+        lon = np.asarray(cs_new['lon']).flatten()
 
         if self.pole == 'N':
-            ind_lat = np.where(cs_new['lat'] > self.boundary_lat)[0]
+            ind_lat = np.where(lat > self.boundary_lat)[0]
         else:
-            ind_lat = np.where(cs_new['lat'] < self.boundary_lat)[0]
-        
-        inds_gaps = np.where(np.diff(ind_lat) > 1)[0]
+            ind_lat = np.where(lat < self.boundary_lat)[0]
+        if not list(ind_lat):
+            return
+        if self.ut is None:
+            self.ut = sc_ut[0]
+
+        # The segments within the map boundary, the ith segment is [seg_bounds[i], seg_bounds[i+1]) in ind_lat.
+        inds_gaps = np.where(np.diff(ind_lat) > 1)[0] + 1
+        seg_bounds = np.concatenate(([0], inds_gaps, [ind_lat.size]))
+        lat_in = lat[ind_lat]
+        lon_in = lon[ind_lat]
+        data = self.transform_points(lon_in, lat_in)
+        xdata = data[:, 0]
+        ydata = data[:, 1]
+
+        zorder = kwargs['trajectory_config']['zorder']
+        alpha = kwargs['trajectory_config']['alpha']
+        if show_trajectory:
+            segments = [data[i_st:i_ed, :2] for i_st, i_ed in zip(seg_bounds[:-1], seg_bounds[1:])]
+            # The LineCollection takes the line properties only, the markers (e.g., marker, markersize) of
+            # the Line2D properties are drawn separately.
+            line_config = {
+                key: value for key, value in kwargs['trajectory_config'].items()
+                if hasattr(LineCollection, 'set_' + key)
+            }
+            marker_config = {
+                key: value for key, value in kwargs['trajectory_config'].items()
+                if key.startswith('marker') or key in ['ms', 'mec', 'mfc', 'mew', 'fillstyle']
+            }
+            lc = LineCollection(segments, **line_config)
+            self.major_ax.add_collection(lc)
+            if marker_config:
+                self.major_ax.plot(
+                    xdata, ydata, linestyle='none', color=line_config.get('color', 'k'),
+                    zorder=zorder, alpha=alpha, **marker_config
+                )
 
-        if not list(inds_gaps):
-            ind_lat_segments = [[ind_lat[0], ind_lat[-1]]]
-        else:
-            ngaps = len(inds_gaps)
+        if not time_tick:
+            return
 
-            ind_lat_segments = [[ind_lat[0], ind_lat[inds_gaps[0]]]]
-            seg_body = [[ind_lat[inds_gaps[i - 1] + 1], ind_lat[inds_gaps[i]]] for i in np.arange(1, ngaps)]
-            ind_lat_segments.extend(seg_body)
-            ind_lat_segments.extend([[ind_lat[inds_gaps[-1] + 1], ind_lat[-1]]])
+        dt0 = datetime.datetime(self.ut.year, self.ut.month, self.ut.day)
+        sectime, _ = dttool.convert_datetime_to_sectime(sc_ut[ind_lat], dt0)
+        slope = np.empty_like(xdata)
+        for i_st, i_ed in zip(seg_bounds[:-1], seg_bounds[1:]):
+            if i_ed - i_st < 2:
+                slope[i_st:i_ed] = np.nan
+                continue
+            slope[i_st:i_ed] = mathtool.calc_curve_tangent_slope(
+                xdata[i_st:i_ed], ydata[i_st:i_ed], degree=min(3, i_ed - i_st - 1))
+
+        if type(time_major_ticks) in [list, np.ndarray]:
+            time_ticks, _ = dttool.convert_datetime_to_sectime(np.array(time_major_ticks), dt0)
+            # the ticks within the segments.
+            ind_seg = np.searchsorted(sectime[seg_bounds[:-1]], time_ticks, side='right') - 1
+            in_seg = (ind_seg >= 0) & (time_ticks <= sectime[seg_bounds[1:] - 1][np.maximum(ind_seg, 0)])
+            time_ticks = time_ticks[in_seg]
+        else:
+            time_ticks = self._get_time_ticks(sectime, seg_bounds, time_tick_res)
 
-        for i_st, i_ed in ind_lat_segments:
-            lat_in = cs_new['lat'][i_st:i_ed+1]
-            lon_in = cs_new['lon'][i_st:i_ed+1]
-            dts_in = sc_ut[i_st:i_ed+1]
+        # The ticks are within the segments, where the positions are interpolated from the segment points.
+        x_i = np.interp(time_ticks, sectime, xdata)
+        y_i = np.interp(time_ticks, sectime, ydata)
+        slope_i = np.interp(time_ticks, sectime, slope)
+        width = self._extent[1] - self._extent[0]
+        l = width * time_tick_scale
 
-            if self.ut is None:
-                self.ut = sc_ut[0]
-            if show_trajectory:
-                self.major_ax.plot(lon_in, lat_in, transform=ccrs.Geodetic(), **kwargs['trajectory_config'])
+        self.major_ax.quiver(
+            x_i, y_i, - l * np.sin(slope_i), l * np.cos(slope_i),
+            units='xy', angles='xy', scale=1., scale_units='xy',
+            width=time_tick_width*0.003 * width,
+            headlength=0, headaxislength=0, pivot='middle', color=color, alpha=alpha,
+            zorder=zorder
+        )
 
-            if time_tick:
-                data = self.projection.transform_points(ccrs.PlateCarree(), lon_in, lat_in)
-                xdata = data[:, 0]
-                ydata = data[:, 1]
-                sectime, dt0 = dttool.convert_datetime_to_sectime(
-                    dts_in, datetime.datetime(self.ut.year, self.ut.month, self.ut.day)
-                )
-                if type(time_major_ticks) in [list, np.ndarray]:
-                    time_ticks, dt0 = dttool.convert_datetime_to_sectime(
-                        np.array(time_major_ticks), datetime.datetime(self.ut.year, self.ut.month, self.ut.day)
-                    )
-                else:
-                    time_ticks = np.arange(np.ceil(sectime[0] / time_tick_res) * time_tick_res,
-                                        np.ceil(sectime[-1] / time_tick_res) * time_tick_res, time_tick_res)
-
-                f = interp1d(sectime, xdata, fill_value='extrapolate')
-                x_i = f(time_ticks)
-                f = interp1d(sectime, ydata, fill_value='extrapolate')
-                y_i = f(time_ticks)
-
-                slope = mathtool.calc_curve_tangent_slope(xdata, ydata)
-                f = interp1d(sectime, slope, fill_value='extrapolate')
-                slope_i = f(time_ticks)
-                l = np.empty_like(x_i)
-                l[:] = (self._extent[1] - self._extent[0]) * time_tick_scale
-
-                xq = x_i
-                yq = y_i
-                uq1 = - l * np.sin(slope_i)
-                vq1 = l * np.cos(slope_i)
-
-                zorder = kwargs['trajectory_config']['zorder']
-                alpha = kwargs['trajectory_config']['alpha']
-                self.major_ax.quiver(
-                    xq, yq, uq1, vq1,
-                    units='xy', angles='xy', scale=1., scale_units='xy',
-                    width=time_tick_width*0.003 * (self._extent[1] - self._extent[0]),
-                    headlength=0, headaxislength=0, pivot='middle', color=color, alpha=alpha,
+        if time_tick_label:
+            offset = time_tick_label_offset * width
+            x_time_ticks = x_i - offset * np.sin(slope_i)
+            y_time_ticks = y_i + offset * np.cos(slope_i)
+            rotations = slope_i * 180. / np.pi + time_tick_label_rotation
+            for time_tick, x_time_tick, y_time_tick, rotation in zip(
+                    time_ticks, x_time_ticks, y_time_ticks, rotations):
+                time = dt0 + datetime.timedelta(seconds=int(time_tick))
+                self.major_ax.text(
+                    x_time_tick, y_time_tick, time.strftime(time_tick_label_format),
+                    fontsize=time_tick_label_fontsize, fontweight=time_tick_label_fontweight,
+                    rotation=rotation,
+                    ha='center', va='center', color=color, alpha=alpha,
                     zorder=zorder
                 )
 
-                if time_tick_label:
-                    offset = time_tick_label_offset * (self._extent[1] - self._extent[0])
-                    for ind, time_tick in enumerate(time_ticks):
-                        time = dt0 + datetime.timedelta(seconds=int(time_tick))
-                        x_time_tick = x_i[ind] - offset * np.sin(slope_i[ind])
-                        y_time_tick = y_i[ind] + offset * np.cos(slope_i[ind])
-
-                        self.major_ax.text(
-                            x_time_tick, y_time_tick, time.strftime(time_tick_label_format),
-                            fontsize=time_tick_label_fontsize, fontweight=time_tick_label_fontweight,
-                            rotation=slope_i[ind] * 180. / np.pi + time_tick_label_rotation,
-                            ha='center', va='center', color=color, alpha=alpha,
-                            zorder=zorder
-                        )
-
-                # self.major_ax.plot(x_time_ticks, y_time_ticks, **kwargs['time_tick_config'])
-
-                if time_minor_tick:
-
-                    time_ticks = np.arange(np.ceil(sectime[0] / time_minor_tick_res) * time_minor_tick_res,
-                                        np.ceil(sectime[-1] / time_minor_tick_res) * time_minor_tick_res, time_minor_tick_res)
-
-                    f = interp1d(sectime, xdata, fill_value='extrapolate')
-                    x_i = f(time_ticks)
-                    f = interp1d(sectime, ydata, fill_value='extrapolate')
-                    y_i = f(time_ticks)
-
-                    f = interp1d(sectime, slope, fill_value='extrapolate')
-                    slope_i = f(time_ticks)
-                    l = np.empty_like(x_i)
-                    l[:] = (self._extent[1] - self._extent[0]) * time_tick_scale / 2.5
-
-                    xq = x_i
-                    yq = y_i
-                    uq1 = - l * np.sin(slope_i)
-                    vq1 = l * np.cos(slope_i)
-
-                    self.major_ax.quiver(
-                        xq, yq, uq1, vq1,
-                        units='xy', angles='xy', scale=1., scale_units='xy',
-                        width=time_tick_width*0.002*(self._extent[1] - self._extent[0]),
-                        headlength=0, headaxislength=0, pivot='middle', color=color,
-                        zorder=zorder
-                    )
+        if time_minor_tick:
+            time_ticks = self._get_time_ticks(sectime, seg_bounds, time_minor_tick_res)
+            x_i = np.interp(time_ticks, sectime, xdata)
+            y_i = np.interp(time_ticks, sectime, ydata)
+            slope_i = np.interp(time_ticks, sectime, slope)
+            l = width * time_tick_scale / 2.5
+
+            self.major_ax.quiver(
+                x_i, y_i, - l * np.sin(slope_i), l * np.cos(slope_i),
+                units='xy', angles='xy', scale=1., scale_units='xy',
+                width=time_tick_width*0.002*width,
+                headlength=0, headaxislength=0, pivot='middle', color=color,
+                zorder=zorder
+            )
+
+    @staticmethod
+    def _get_time_ticks(sectime, seg_bounds, time_res):
+        # The multiples of time_res in [t_start, t_end) of each segment.
+        k_st = np.ceil(sectime[seg_bounds[:-1]] / time_res)
+        k_ed = np.ceil(sectime[seg_bounds[1:] - 1] / time_res)
+        num_ticks = np.maximum(k_ed - k_st, 0).astype(int)
+        k = np.arange(num_ticks.sum()) - np.repeat(np.cumsum(num_ticks) - num_ticks, num_ticks)
+        return (np.repeat(k_st, num_ticks) + k) * time_res
 
     def overlay_cross_track_vector(
             self, vector, unit_vector, sc_ut=None, sc_coords=None, cs=None, *,
@@ -943,7 +923,7 @@ class PolarMapPanel(GeoPanel):
         dts_in = sc_ut[ind_lat]
         vector = vector[ind_lat]
 
-        data = self.projection.transform_points(ccrs.PlateCarree(), lon_in, lat_in)
+        data = self.transform_points(lon_in, lat_in)
         xdata = np.float32(data[:, 0])
         ydata = np.float32(data[:, 1])
         slope = mathtool.calc_curve_tangent_slope(xdata, ydata, degree=3)
@@ -1007,9 +987,6 @@ class PolarMapPanel(GeoPanel):
     def overlay_sc_coloured_line(
             self, z_data, sc_coords=None, sc_ut=None, cs=None, *, c_map='jet',
             c_scale='linear', c_lim=None, line_width=6., **kwargs):
-        from matplotlib.collections import LineCollection
-        import matplotlib.colors as mpl_color
-
         kwargs.setdefault(
             'zorder', max([_.zorder for _ in self.major_ax.get_children()])
         )
@@ -1032,18 +1009,19 @@ class PolarMapPanel(GeoPanel):
 
         lat_in = cs_new['lat'][ind_lat]
         lon_in = cs_new['lon'][ind_lat]
-        dts_in = sc_ut[ind_lat]
 
-        pos_data = self.projection.transform_points(ccrs.PlateCarree(), lon_in, lat_in)
+        pos_data = self.transform_points(lon_in, lat_in)
         x = np.float32(pos_data[:, 0])
         y = np.float32(pos_data[:, 1])
         z = z_data[ind_lat]
 
         points = np.array([x, y]).T.reshape(-1, 1, 2)
         segments = np.concatenate([points[:-1], points[1:]], axis=1)
+        # Skip the line pieces across the gaps, where the trajectory is out of the map boundary.
+        inds = np.where(np.diff(ind_lat) == 1)[0]
 
-        lc = LineCollection(segments, norm=norm, cmap=c_map, **kwargs)
-        lc.set_array(z)
+        lc = LineCollection(segments[inds], norm=norm, cmap=c_map, **kwargs)
+        lc.set_array(np.asarray(z).flatten()[inds])
         lc.set_linewidth(line_width)
         lc.set_alpha(1)
         self().add_collection(lc)
@@ -1057,8 +1035,13 @@ class PolarMapPanel(GeoPanel):
         kwargs = pybasic.dict_set_default(kwargs, color='k', linestyle='', markersize=5, marker='.')
 
         cs_new = self.cs_transform(cs_fr=cs, coords=coords)
-        
-        isc = self().plot(cs_new['lon'], cs_new['lat'], transform=ccrs.PlateCarree(), **kwargs)
+
+        if kwargs['linestyle'] in ['', ' ', 'None', 'none', None]:
+            # The markers are projected through the cached transform.
+            data = self.transform_points(cs_new['lon'], cs_new['lat'])
+            isc = self().plot(data[..., 0], data[..., 1], **kwargs)
+        else:
+            isc = self().plot(cs_new['lon'], cs_new['lat'], transform=ccrs.PlateCarree(), **kwargs)
         return isc
 
     def add_colorbar(self, im, ax=None, figure=None,
@@ -1271,7 +1254,7 @@ class PolarSectorPanel(PolarMapPanel):
         blats = self.boundary_latitudes
         blons = self.boundary_longitudes
 
-        data = self.projection.transform_points(ccrs.PlateCarree(), blons, blats)
+        data = self.transform_points(blons, blats)
         verts = np.hstack((data[:, 0][:, np.newaxis], data[:, 1][:, np.newaxis]))
         path = mpath.Path(verts)
 
@@ -16,6 +16,7 @@ import matplotlib.pyplot as plt
 import matplotlib.colors as mpl_colors
 import matplotlib.ticker as mpl_ticker
 import matplotlib.dates as mpl_dates
+import matplotlib.image as mpl_image
 from matplotlib import rcParams
 from scipy.interpolate import interp1d
 from cycler import cycler
@@ -58,12 +59,14 @@ class TSPanel(Panel):
         'extral_labels_y_offset': None, 
     }
     _default_colorbar_offset = 0.1
+    # The series is decimated only if it has more samples than lod_factor * the number of pixel columns.
+    lod_factor = 8
 
     def __init__(
             self, *args, 
             dt_fr=None, dt_to=None, figure=None, from_subplot=True,
             bottom_panel=True, timeline_reverse=False, timeline_extra_labels=None,
-            time_gap=True, time_res=None, timeline_same_format=False,
+            time_gap=True, time_res=None, timeline_same_format=False, lod=True, raster='auto',
             **kwargs
     ):
         
@@ -77,6 +80,8 @@ class TSPanel(Panel):
         self.timeline_same_format=timeline_same_format
         self.time_gap = time_gap
         self.time_res = time_res
+        self.lod = lod
+        self.raster = raster
         if timeline_extra_labels is None:
             timeline_extra_labels = []
         self.timeline_extra_labels = timeline_extra_labels
@@ -144,6 +149,11 @@ class TSPanel(Panel):
 
     def overlay_a_variable(self, var, ax=None):
         self.axes_overview[ax]['variables'].extend([var])
+        iplt = self._overlay_variable(var, ax=ax)
+        self.axes_overview[ax]['artists'].append((var, iplt))
+        return iplt
+
+    def _overlay_variable(self, var, ax=None):
         var_for_config = self.axes_overview[ax]['variables'][0]
         plot_style = var_for_config.visual.plot_config.style
 
@@ -177,6 +187,87 @@ class TSPanel(Panel):
 
         return iplt
 
+    def update_artists(self):
+        """
+        Update the data artists in the existing axes, after the values of the variables or the time range (_xlim)
+        are changed, e.g., in the template mode of TSDashboard. The lines are updated in place, and the other artists
+        (e.g., errorbars, images, and pcolormeshes) are redrawn. The axes, twin axes, legends, colorbars, and tick
+        locators are kept.
+        """
+        for ax in self._get_data_axes():
+            ax_ov = self.axes_overview[ax]
+            self._set_xlim(ax)
+            items = []
+            for var, artists in ax_ov['artists']:
+                if self._update_lines(var, artists, ax=ax):
+                    items.append((var, artists))
+                    continue
+                for artist in artists:
+                    artist.remove()
+                    for key in ['lines', 'collections']:
+                        if artist in ax_ov[key]:
+                            ax_ov[key].remove(artist)
+                items.append((var, None))
+            # the data limits of the lines, the images and the patches, excluding the zero line.
+            if ax_ov['zero_line'] is not None:
+                ax_ov['zero_line'].set_visible(False)
+            ax.relim(visible_only=True)
+            for ind, (var, artists) in enumerate(items):
+                if artists is None:
+                    items[ind] = (var, self._overlay_variable(var, ax=ax))
+            ax_ov['artists'] = items
+
+    def update_limits(self):
+        """
+        Recompute the y limits of the axes and update the colorbars, after update_artists.
+        """
+        for ax in self._get_data_axes():
+            ax_ov = self.axes_overview[ax]
+            ax.set_autoscaley_on(True)
+            ax.autoscale_view(scalex=False)
+            self._set_ylim(ax=ax)
+            cb = ax_ov['colorbar_instance']
+            if cb is not None and list(ax_ov['collections']) and cb.mappable is not ax_ov['collections'][0]:
+                cb.update_normal(ax_ov['collections'][0])
+
+    def update_timeline(self):
+        """
+        Redraw the extra timeline labels (e.g., MLT and MLAT) below the bottom panel for the current ticks.
+        """
+        for ax in self._get_data_axes():
+            ax_ov = self.axes_overview[ax]
+            if ax_ov['timeline_formatter'] is None:
+                continue
+            for text in ax_ov['timeline_texts']:
+                text.remove()
+            ax_ov['timeline_texts'] = []
+            self._set_xaxis_ticklabels(ax, majorformatter=ax_ov['timeline_formatter'])
+
+    def _get_data_axes(self):
+        return [ax for ax, ax_ov in self.axes_overview.items() if list(ax_ov['artists'])]
+
+    def _set_xlim(self, ax):
+        var_for_config = self.axes_overview[ax]['variables'][0]
+        xlim = list(self._xlim)
+        if var_for_config.visual.axis[0].reverse and xlim[0] < xlim[1]:
+            xlim = [xlim[1], xlim[0]]
+        ax.set_xlim(xlim)
+
+    def _update_lines(self, var, artists, ax=None):
+        # Set the new data to the lines drawn by overlay_line, return False if the artists cannot be updated.
+        if not list(artists) or not all(isinstance(artist, mpl.lines.Line2D) for artist in artists):
+            return False
+        data = self._retrieve_data_1d(var, ax=ax, lod=True)
+        x = np.asarray(data['x'])
+        y = np.asarray(data['y'])
+        x = x.reshape((x.shape[0], -1))
+        y = y.reshape((y.shape[0], -1))
+        if y.shape[1] != len(artists):
+            return False
+        for ind, artist in enumerate(artists):
+            artist.set_data(x[:, min(ind, x.shape[1] - 1)], y[:, ind])
+        return True
+
     @check_panel_ax
     def overlay_line(self, var, ax=None, errorbar='off', **kwargs):
         """
@@ -189,7 +280,7 @@ class TSPanel(Panel):
         """
         il = None
 
-        data = self._retrieve_data_1d(var)
+        data = self._retrieve_data_1d(var, ax=ax, lod=True)
         x = data['x']
         y = data['y']
         y_err = data['y_err']
@@ -253,9 +344,18 @@ class TSPanel(Panel):
         return [ib]
 
     @check_panel_ax
-    def overlay_pcolormesh(self, *args, ax=None, **kwargs):
+    def overlay_pcolormesh(self, *args, ax=None, raster=None, **kwargs):
         var = args[0]
 
+        if raster is None:
+            raster = var.visual.plot_config.raster
+        if raster is None:
+            raster = self.raster
+        if raster:
+            im = self._overlay_raster(var, ax=ax, regrid=raster == 'regrid')
+            if im is not None:
+                return [im]
+
         data = self._retrieve_data_2d(var)
         x = data['x']
         y = data['y']
@@ -306,6 +406,132 @@ class TSPanel(Panel):
             self.axes_overview[ax]['colorbar'] = 'on'
         return [im]
 
+    @check_panel_ax
+    def overlay_imshow(self, *args, ax=None, **kwargs):
+        var = args[0]
+
+        im = self._overlay_raster(var, ax=ax, regrid=True)
+        if im is None:
+            mylog.StreamLogger.warning(
+                "The data of {} cannot be regridded to a uniform grid. Use pcolormesh instead.".format(var.name))
+            return self.overlay_pcolormesh(var, ax=ax, raster=False)
+        return [im]
+
+    def _overlay_raster(self, var, ax=None, regrid=False):
+        """
+        Draw a 2-D variable as an image (imshow), which is much faster than pcolormesh for a large array.
+
+        The times must be on a uniform grid, where the gaps are masked. If regrid is True, the data are put
+        onto the uniform grid of the time resolution by the nearest samples. The y values must be the same for all
+        the times. If they are not uniform, a NonUniformImage is drawn. If lod is set for the panel,
+        the data are averaged over the blocks of the cells, which are smaller than a pixel, before drawing.
+
+        :param regrid: If True, regrid the times to a uniform grid, otherwise, only the uniform times are drawn.
+        :return: the image, or None if the data cannot be drawn as an image.
+        """
+        if var.visual.axis[1].scale != 'linear':
+            return None
+        data = self._retrieve_data_2d(var, mask_gap=False)
+        x = np.asarray(data['x']).flatten()
+        y = np.asarray(data['y'])
+        z = np.asarray(data['z'], dtype=float)
+        if z.ndim != 2 or x.size != z.shape[0] or not isinstance(x[0], datetime.datetime):
+            return None
+        if y.ndim == 2:
+            if not np.all(y == y[0:1, :]):
+                return None
+            y = y[0, :]
+        y = y.astype(float)
+        if y.size != z.shape[1] or y.size < 2:
+            return None
+        if y[-1] < y[0]:
+            y = y[::-1]
+            z = z[:, ::-1]
+
+        x_sec = arraytool.convert_x_to_numeric(x, xtype='datetime')
+        xresscale = 1.1 if data['mask_gap'] else np.inf
+        grid = arraytool.regrid_uniform(x_sec, z, xres=data['x_res'], xresscale=xresscale, axis=0, exact=not regrid)
+        if grid is None:
+            return None
+        if not regrid and not data['mask_gap']:
+            # the nodes in the gaps take the nearest samples, as the cells of pcolormesh stretched over the gaps.
+            grid = arraytool.regrid_uniform(x_sec, z, xres=data['x_res'], xresscale=xresscale, axis=0, exact=False)
+        x_sec, z = grid
+        grid = arraytool.regrid_uniform(y, z, axis=1)
+        y_uniform = grid is not None
+        if y_uniform:
+            y, z = grid
+        elif np.any(np.diff(y) <= 0):
+            return None
+
+        config = self._get_colormap_config(var, z)
+
+        # only the cells within the time range of the panel are drawn.
+        x_res = x_sec[1] - x_sec[0]
+        if all(isinstance(xl, datetime.datetime) for xl in self._xlim):
+            xlim = arraytool.convert_x_to_numeric(np.array(self._xlim), xtype='datetime')
+            ind_x = np.flatnonzero((x_sec >= xlim[0] - x_res) & (x_sec <= xlim[1] + x_res))
+            if ind_x.size == 0:
+                return None
+            x_sec = x_sec[ind_x[0]: ind_x[-1] + 1]
+            z = z[ind_x[0]: ind_x[-1] + 1, :]
+
+        lod = var.visual.axis[0].lod
+        if lod is None:
+            lod = self.lod
+        if lod:
+            width, height = self._get_axes_size_in_pixels(ax)
+            factor = x_sec.size // max(width, 1)
+            if factor >= 2:
+                z = arraytool.block_mean(z, factor, axis=0)
+                x_sec = x_sec[0] + (factor - 1) / 2 * x_res + np.arange(z.shape[0]) * factor * x_res
+                x_res = x_res * factor
+            factor = y.size // max(height, 1)
+            if y_uniform and factor >= 2:
+                y_res = y[1] - y[0]
+                z = arraytool.block_mean(z, factor, axis=1)
+                y = y[0] + (factor - 1) / 2 * y_res + np.arange(z.shape[1]) * factor * y_res
+
+        # convert the times to the matplotlib date numbers.
+        x_num = mpl_dates.date2num(datetime.datetime(1970, 1, 1)) + x_sec / 86400.
+        dx = x_res / 86400. / 2
+        dy = (y[1] - y[0]) / 2 if y_uniform else 0.
+        extent = [x_num[0] - dx, x_num[-1] + dx, y[0] - dy, y[-1] + dy]
+
+        ax.xaxis.update_units(x[:1])
+        if y_uniform:
+            im = ax.imshow(z.T, origin='lower', extent=extent, aspect='auto', **config)
+        else:
+            im = mpl_image.NonUniformImage(ax, extent=extent, **config)
+            im.set_data(x_num, y, z.T)
+            ax.add_image(im)
+            im.sticky_edges.x[:] = extent[0:2]
+            im.sticky_edges.y[:] = extent[2:4]
+            ax.update_datalim([extent[0:4:2], extent[1:4:2]])
+            ax.autoscale_view()
+        self.axes_overview[ax]['collections'].extend([im])
+        if self.axes_overview[ax]['colorbar'] is None:
+            self.axes_overview[ax]['colorbar'] = 'on'
+        return im
+
+    @staticmethod
+    def _get_colormap_config(var, z):
+        config = {'interpolation': 'nearest'}
+        for key in ['alpha', 'zorder', 'rasterized']:
+            if key in var.visual.plot_config.pcolormesh.keys():
+                config[key] = var.visual.plot_config.pcolormesh[key]
+        config.update(var.visual.plot_config.imshow)
+        z_lim = var.visual.axis[2].lim
+        if z_lim is None:
+            z_lim = [np.nanmin(z.flatten()), np.nanmax(z.flatten())]
+        if var.visual.axis[2].scale == 'log':
+            config.update(norm=mpl_colors.LogNorm(vmin=z_lim[0], vmax=z_lim[1]))
+        else:
+            config.update(norm=mpl_colors.Normalize(vmin=z_lim[0], vmax=z_lim[1]))
+        config.update(cmap=mycmap.get_colormap(
+            config.get('cmap', var.visual.plot_config.pcolormesh.get('cmap', None))))
+        return config
+
     @check_panel_ax
     def _get_var_for_config(self, ax=None, ind=0):
         var_for_config = self.axes_overview[ax]['variables'][ind]
@@ -362,6 +588,7 @@ class TSPanel(Panel):
         minorlocator = DatetimeMinorLocator(ax=ax, majorlocator=majorlocator, maxticks=minormaxticks, minticks=minorminticks)
         ax.xaxis.set_minor_locator(minorlocator)
         if self.bottom_panel:
+            self.axes_overview[ax]['timeline_formatter'] = majorformatter
             self._set_xaxis_ticklabels(ax, majorformatter=majorformatter)
 
     def _set_xaxis_ticklabels(self, ax, majorformatter=None):
@@ -434,14 +661,15 @@ class TSPanel(Panel):
             ys.append(y1)
             xlabels.append(label)
 
+        texts = self.axes_overview[ax]['timeline_texts']
         for ind, xticks in enumerate(ys):
-            ax.text(
+            texts.append(ax.text(
                 xy_fig[0][0] + xoffset, xy_fig[0][1] + yoffset * ind - 0.013,
                 xlabels[ind].replace('_', '/'),
                 fontsize=plt.rcParams['xtick.labelsize']-2, fontweight='normal',
                 horizontalalignment='right', verticalalignment='top',
                 transform=self.figure.transFigure
-            )
+            ))
             for ind_pos, xtick in enumerate(xticks):
                 if np.isnan(xtick):
                     continue
@@ -451,13 +679,13 @@ class TSPanel(Panel):
                     text = (datetime.datetime(1970, 1, 1) + datetime.timedelta(hours=xtick)).strftime('%H:%M')
                 else:
                     text = '%.1f' % xtick
-                ax.text(
+                texts.append(ax.text(
                     xy_fig[ind_pos][0], xy_fig[ind_pos][1] + yoffset * ind - 0.013,
                     text,
                     fontsize=plt.rcParams['xtick.labelsize']-2,
                     horizontalalignment='center', verticalalignment='top',
                     transform=self.figure.transFigure
-                )
+                ))
         ax.xaxis.set_major_formatter(mpl_ticker.NullFormatter())
 
         # if self.major_timeline == 'MLT':
@@ -555,13 +783,22 @@ class TSPanel(Panel):
             maxlim = np.max(np.abs(ylim_current))
             ylim = [-maxlim, maxlim]
         else:
+            # a copy, not to fix the open limits of the variable for the other time ranges.
+            ylim = list(ylim)
             if ylim[0] is None:
                 ylim[0] = ylim_current[0]
             if ylim[1] is None:
                 ylim[1] = ylim_current[1]
         if zero_line == 'on' and self.axes_overview[ax]['twinx']=='off':
+            il = self.axes_overview[ax]['zero_line']
             if (ylim[0] < 0) and (ylim[1] > 0):
-                ax.plot(ax.get_xlim(), [0, 0], 'k--', linewidth=0.5)
+                if il is None:
+                    self.axes_overview[ax]['zero_line'] = ax.plot(ax.get_xlim(), [0, 0], 'k--', linewidth=0.5)[0]
+                else:
+                    il.set_data(ax.get_xlim(), [0, 0])
+                    il.set_visible(True)
+            elif il is not None:
+                il.set_visible(False)
 
         if var_for_config.visual.axis[1].reverse:
             ylim = [ylim[1], ylim[0]]
@@ -623,8 +860,20 @@ class TSPanel(Panel):
         )
 
         cb = self.add_colorbar(im, cax='new', **colorbar_config)
+        ax_ov['colorbar_instance'] = cb
 
-    def _retrieve_data_1d(self, var):
+    def _retrieve_data_1d(self, var, ax=None, lod=False):
+        """
+        Retrieve the x, y, and y_err data of a 1-D variable for plotting.
+
+        :param var: A GeospaceLab Variable object.
+        :param ax: The axes to plot, used for the level-of-detail (LOD) decimation.
+        :param lod: If True, the series longer than several times the axes width in pixels is decimated
+            to the first, last, min, and max samples in each pixel column, see arraytool.minmax_decimation_indices.
+            The decimation can be switched off for a panel by lod=False, or for a variable by
+            var.visual.axis[0].lod = False.
+        :return: A dict with the keys 'x', 'y', and 'y_err'.
+        """
         x_data = var.get_visual_axis_attr(axis=0, attr_name='data')
         if type(x_data) == list:
             x_data = x_data[0]
@@ -680,16 +929,56 @@ class TSPanel(Panel):
         time_gap = var.visual.axis[0].mask_gap
         if time_gap is None:
             time_gap = self.time_gap
+        x_num = None
         if time_gap:
-            x, y = arraytool.data_resample(
-                x_data, y_data, xtype='datetime', xres=x_data_res, method='Null', axis=0)
-
-            x, y_err = arraytool.data_resample(
-                x_data, y_err_data, xtype='datetime', xres=x_data_res, method='Null', axis=0)
+            # the times in seconds, computed once for the gap search and the decimation.
+            x_num = arraytool.convert_x_to_numeric(x_data, xtype='datetime')
+            gap_inds, x_data_res = arraytool.search_gaps(x_num, xres=x_data_res)
+            x, (y, y_err, x_num) = arraytool.mask_gaps(
+                x_data, [y_data, y_err_data, x_num], xtype='datetime', xres=x_data_res, axis=0, gap_inds=gap_inds)
+
+        lod_var = var.visual.axis[0].lod
+        if lod_var is None:
+            lod_var = self.lod
+        if lod and lod_var and ax is not None:
+            x, y, y_err = self._decimate_data_1d(ax, x, y, y_err, x_num=x_num)
         data = {'x': x, 'y': y, 'y_err': y_err}
         return data
 
-    def _retrieve_data_2d(self, var):
+    def _decimate_data_1d(self, ax, x, y, y_err, x_num=None):
+        n_bins, _ = self._get_axes_size_in_pixels(ax)
+        if n_bins < 1 or x.shape[0] <= self.lod_factor * n_bins or y.shape[0] != x.shape[0] \
+                or y_err.shape[0] != x.shape[0]:
+            return x, y, y_err
+
+        x_range = None
+        if isinstance(x.flatten()[0], datetime.datetime):
+            if x_num is None:
+                x_num = arraytool.convert_x_to_numeric(x, xtype='datetime')
+            if all(isinstance(xl, datetime.datetime) for xl in self._xlim):
+                x_range = arraytool.convert_x_to_numeric(np.array(self._xlim), xtype='datetime')
+        else:
+            x_num = arraytool.convert_x_to_numeric(x)
+        # the samples inserted at the gaps have nan times.
+        if np.any(np.diff(x_num[np.isfinite(x_num)]) < 0):
+            return x, y, y_err
+        inds = arraytool.minmax_decimation_indices(x_num, y, x_range=x_range, n_bins=n_bins, axis=0)
+        return x[inds], y[inds], y_err[inds]
+
+    @staticmethod
+    def _get_axes_size_in_pixels(ax):
+        """
+        The width and height of the axes in pixels, at the larger one of the figure dpi and the savefig dpi.
+        """
+        fig = ax.figure
+        dpi = rcParams['savefig.dpi']
+        dpi = max(dpi, fig.dpi) if basic.isnumeric(dpi) else fig.dpi
+        pos = ax.get_position()
+        width = int(np.ceil(pos.width * fig.get_figwidth() * dpi))
+        height = int(np.ceil(pos.height * fig.get_figheight() * dpi))
+        return width, height
+
+    def _retrieve_data_2d(self, var, mask_gap=True):
         x_data = var.get_visual_axis_attr(axis=0, attr_name='data')
         if type(x_data) == list:
             x_data = x_data[0]
@@ -736,7 +1025,7 @@ class TSPanel(Panel):
         time_gap = var.visual.axis[0].mask_gap
         if time_gap is None:
             time_gap = self.time_gap
-        if time_gap:
+        if time_gap and mask_gap:
             # x, y, z = arraytool.data_resample_2d(
             #     x=x_data, y=y_data, z=z_data, xtype='datetime', xres=x_data_res, method='Null', axis=0)
             x, y, z = arraytool.regridding_2d_xgaps(x_data, y_data, z_data, xtype='datetime', xres=x_data_res)
@@ -745,7 +1034,7 @@ class TSPanel(Panel):
             y = y_data
             z = z_data
 
-        data = {'x': x, 'y': y, 'z': z}
+        data = {'x': x, 'y': y, 'z': z, 'x_res': x_data_res, 'mask_gap': time_gap}
         return data
 
     @staticmethod
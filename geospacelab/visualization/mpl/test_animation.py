@@ -0,0 +1,158 @@
+import unittest
+import shutil
+import tempfile
+import pathlib
+from unittest import mock
+import numpy as np
+import matplotlib as mpl
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import geospacelab.visualization.mpl.animation as animation
+
+
+class RecordingPipe(object):
+    """A writer in place of FFMpegPipe, keeping the frames in memory."""
+
+    instances = []
+
+    def __init__(self, file_path, fps=10, **kwargs):
+        self.file_path = file_path
+        self.fps = fps
+        self.kwargs = kwargs
+        self.frames = []
+        self.closed = False
+        RecordingPipe.instances.append(self)
+
+    @property
+    def num_frames(self):
+        return len(self.frames)
+
+    def write(self, frame):
+        self.frames.append(np.array(frame))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.closed = True
+
+
+def create_figure():
+    # a map-like scene: a mesh under the static gridlines and a text, and a scatter of the satellite positions.
+    figure = Figure(figsize=(3, 2.5), dpi=80)
+    ax = figure.add_subplot()
+    x = np.linspace(0., 1., 25)
+    mesh = ax.pcolormesh(x, x, np.zeros((24, 24)), vmin=-1., vmax=1., cmap='viridis')
+    for v in [0.25, 0.5, 0.75]:
+        ax.axhline(v, color='w', lw=1.5, zorder=2)
+        ax.axvline(v, color='w', lw=1.5, zorder=2)
+    ax.text(0.05, 0.9, 'static', zorder=3)
+    scatter = ax.scatter([0.5], [0.5], c='r', s=30, zorder=4)
+    ax.set_xlim(0., 1.)
+    ax.set_ylim(0., 1.)
+    figure.colorbar(mesh, ax=ax)
+    xx, yy = np.meshgrid(x[:-1], x[:-1])
+
+    def update_frame(frame):
+        mesh.set_array(np.sin(2 * np.pi * (xx + yy + frame / 5.)).flatten())
+        scatter.set_offsets([[0.1 + 0.15 * frame, 0.2 + 0.1 * frame]])
+        return [mesh, scatter]
+
+    return figure, update_frame
+
+
+def render_from_scratch(frame):
+    figure, update_frame = create_figure()
+    update_frame(frame)
+    canvas = FigureCanvasAgg(figure)
+    canvas.draw()
+    return np.array(canvas.buffer_rgba())
+
+
+class AnimateFigure(unittest.TestCase):
+
+    frames = range(5)
+
+    def setUp(self):
+        RecordingPipe.instances = []
+        patcher = mock.patch.object(animation, 'FFMpegPipe', RecordingPipe)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def animate(self, blit):
+        figure, update_frame = create_figure()
+        canvas = figure.canvas
+        num_frames = animation.animate_figure(
+            figure, self.frames, update_frame, 'movie.mp4', blit=blit, fps=5, bitrate=1000)
+        pipe = RecordingPipe.instances[-1]
+        self.assertEqual(num_frames, len(self.frames))
+        self.assertTrue(pipe.closed)
+        self.assertEqual((pipe.fps, pipe.kwargs), (5, {'bitrate': 1000}))
+        # the canvas and the static artists are restored.
+        self.assertIs(figure.canvas, canvas)
+        self.assertFalse(any(artist.get_animated() for artist in figure.axes[0].get_children()))
+        return pipe.frames
+
+    def test_frames(self):
+        # the blitted frames are the same as the frames drawn from scratch, with the static artists over the mesh.
+        expected = [render_from_scratch(frame) for frame in self.frames]
+        self.assertFalse(np.array_equal(expected[0], expected[1]))
+        for blit in [True, False]:
+            with self.subTest(blit=blit):
+                frames = self.animate(blit)
+                self.assertEqual(len(frames), len(expected))
+                for frame, frame_expected in zip(frames, expected):
+                    self.assertEqual(frame.shape, frame_expected.shape)
+                    np.testing.assert_array_equal(frame, frame_expected)
+
+    def test_no_artists(self):
+        figure, update_frame = create_figure()
+        num_frames = animation.animate_figure(figure, self.frames, lambda frame: None, 'movie.mp4')
+        frames = RecordingPipe.instances[-1].frames
+        self.assertEqual(num_frames, len(self.frames))
+        for frame in frames[1:]:
+            np.testing.assert_array_equal(frame, frames[0])
+
+    def test_error_in_update(self):
+        figure, update_frame = create_figure()
+        canvas = figure.canvas
+
+        def update_failed(frame):
+            if frame == 2:
+                raise ValueError
+            return update_frame(frame)
+
+        with self.assertRaises(ValueError):
+            animation.animate_figure(figure, self.frames, update_failed, 'movie.mp4')
+        self.assertIs(figure.canvas, canvas)
+        self.assertFalse(any(artist.get_animated() for artist in figure.axes[0].get_children()))
+
+
+class FFMpegMissing(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = pathlib.Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def test_not_found(self):
+        figure, update_frame = create_figure()
+        canvas = figure.canvas
+        file_path = self.tmp_dir / 'movie.mp4'
+        with mpl.rc_context({'animation.ffmpeg_path': str(self.tmp_dir / 'ffmpeg')}):
+            with self.assertRaisesRegex(RuntimeError, 'ffmpeg is not found'):
+                animation.animate_figure(figure, range(3), update_frame, file_path)
+        self.assertIs(figure.canvas, canvas)
+        self.assertFalse(any(artist.get_animated() for artist in figure.axes[0].get_children()))
+        self.assertFalse(file_path.exists())
+
+    @unittest.skipIf(shutil.which('false') is None, "no executable failing without output")
+    def test_failed(self):
+        figure, update_frame = create_figure()
+        with mpl.rc_context({'animation.ffmpeg_path': shutil.which('false')}):
+            with self.assertRaisesRegex(RuntimeError, 'ffmpeg failed'):
+                animation.animate_figure(figure, range(3), update_frame, self.tmp_dir / 'movie.mp4')
+
+
+if __name__ == '__main__':
+    unittest.main()
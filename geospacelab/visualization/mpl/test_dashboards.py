@@ -0,0 +1,100 @@
+import unittest
+import datetime
+import gc
+import numpy as np
+import matplotlib.pyplot as plt
+
+from geospacelab.datahub import DatasetUser
+from geospacelab.visualization.mpl.dashboards import TSDashboard
+
+
+class AggFigure(unittest.TestCase):
+    """The figure on an Agg canvas is not managed by pyplot, and is kept alive by the dashboard."""
+
+    dt_fr = datetime.datetime(2020, 3, 1)
+    dt_to = datetime.datetime(2020, 3, 2)
+
+    def test_kept_alive(self):
+        num_figures = len(plt.get_fignums())
+        dashboard = TSDashboard(dt_fr=self.dt_fr, dt_to=self.dt_to, figure='agg')
+        gc.collect()
+        self.assertIsNotNone(dashboard.figure)
+        self.assertEqual(len(plt.get_fignums()), num_figures)
+        dashboard.set_layout(panel_layouts=[[], []])
+        self.assertEqual(len(dashboard.panels), 2)
+
+        dashboard.close()
+        self.assertIsNone(dashboard.figure)
+        self.assertEqual(dashboard.panels, {})
+
+    def test_pyplot_figure_closed(self):
+        dashboard = TSDashboard(dt_fr=self.dt_fr, dt_to=self.dt_to, figure='new')
+        figure = dashboard.figure
+        self.assertTrue(plt.fignum_exists(figure.number))
+        dashboard.close()
+        self.assertFalse(plt.fignum_exists(figure.number))
+        self.assertIsNone(dashboard.figure)
+
+
+class SearchUTs(unittest.TestCase):
+    """The times searched by the labels of the time dependence and the variables in the last panel."""
+
+    dt0 = datetime.datetime(2016, 3, 14)
+
+    def create_dashboard(self, secs, mlat):
+        dts = np.array([self.dt0 + datetime.timedelta(seconds=sec) for sec in secs])
+        # the variables refer to the dataset by a weak reference.
+        self.dataset = dataset = DatasetUser(dt_fr=self.dt0, dt_to=self.dt0 + datetime.timedelta(hours=6))
+        dataset.add_variable('SC_DATETIME', value=dts.reshape((-1, 1)))
+        dataset.add_variable('SC_AACGM_LAT', value=mlat.reshape((-1, 1)))
+        dataset.add_variable('SC_GEO_LON', value=np.mod(secs * 0.05 + 300., 360.).reshape((-1, 1)))
+        var = dataset.add_variable('TEST', value=np.cos(secs / 600.).reshape((-1, 1)))
+        var.visual = 'new'
+        var.depends = {0: {'UT': 'SC_DATETIME', 'AACGM_LAT': 'SC_AACGM_LAT'}}
+        dashboard = TSDashboard(dt_fr=self.dt0, dt_to=self.dt0 + datetime.timedelta(hours=6), figure='agg')
+        dashboard.set_layout(panel_layouts=[[var]])
+        dashboard.draw()
+        self.addCleanup(dashboard.close)
+        return dashboard
+
+    def setUp(self):
+        self.secs = np.arange(30., 6 * 3600., 60.)
+        # linear between the poles, crossing 60 deg at 375 s and 5625 s in each orbit of 6000 s.
+        self.mlat = 80. * (2 * np.abs(np.mod(self.secs / 6000., 1.) * 2 - 1) - 1)
+        self.secs_c = np.array([375., 5625., 6375., 11625., 12375., 17625., 18375.])
+
+    def get_expected(self, secs_c):
+        inds = np.argmin(np.abs(self.secs[np.newaxis, :] - np.asarray(secs_c)[:, np.newaxis]), axis=1)
+        return [self.dt0 + datetime.timedelta(seconds=sec) for sec in self.secs[inds]]
+
+    def test_crossings(self):
+        dashboard = self.create_dashboard(self.secs, self.mlat)
+        self.assertEqual(dashboard.search_UTs(AACGM_LAT=60.), self.get_expected(self.secs_c))
+        # the longitudes at the crossings are 318.75, 221.25, 258.75, 161.25, 198.75, 101.25, and 138.75.
+        self.assertEqual(
+            dashboard.search_UTs(AACGM_LAT=60., SC_GEO_LON=[250., 330.]), self.get_expected([375., 6375.]))
+        self.assertEqual(
+            dashboard.search_UTs(AACGM_LAT=60., SC_GEO_LON=[300., 230.]),
+            self.get_expected(np.delete(self.secs_c, 2)))
+        # not crossed.
+        self.assertEqual(dashboard.search_UTs(AACGM_LAT=85.), [])
+
+    def test_range(self):
+        dashboard = self.create_dashboard(self.secs, self.mlat)
+        in_range = (self.mlat >= 78.) & (self.mlat <= 80.)
+        expected = [self.dt0 + datetime.timedelta(seconds=sec) for sec in self.secs[in_range]]
+        self.assertEqual(dashboard.search_UTs(AACGM_LAT=[78., 80.]), expected)
+
+    def test_gaps(self):
+        mlat = self.mlat.copy()
+        mlat[(self.secs > 11000.) & (self.secs < 13000.)] = np.nan
+        dashboard = self.create_dashboard(self.secs, mlat)
+        self.assertEqual(dashboard.search_UTs(AACGM_LAT=60.), self.get_expected(np.delete(self.secs_c, [3, 4])))
+
+    def test_empty(self):
+        dashboard = self.create_dashboard(np.array([]), np.array([]))
+        self.assertEqual(dashboard.search_UTs(AACGM_LAT=60., SC_GEO_LON=[250., 330.]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import datetime
+import numpy as np
+import matplotlib.dates as mpl_dates
+from matplotlib.collections import QuadMesh
+from matplotlib.image import AxesImage
+
+from geospacelab.datahub import DatasetUser
+from geospacelab.visualization.mpl.dashboards import TSDashboard
+
+
+class RasterGaps(unittest.TestCase):
+    """The image drawn by the raster path (raster='auto') shows the same cells and gaps as the pcolormesh."""
+
+    dt0 = datetime.datetime(2021, 3, 1)
+    time_res = 60.
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(2021)
+        # the times on a grid of 60 s, with the gaps of 1, 3 and 10 samples.
+        cls.nodes = np.delete(np.arange(300), np.r_[50:60, 150:153, 220])
+        dts = np.array([cls.dt0 + datetime.timedelta(seconds=cls.time_res * k) for k in cls.nodes])
+        cls.dataset = DatasetUser(dt_fr=dts[0], dt_to=dts[-1])
+        cls.dataset.add_variable('DATETIME', value=dts.reshape((-1, 1)))
+        cls.dataset.add_variable('HEIGHT', value=np.arange(100., 400., 20.).reshape((1, -1)))
+        var = cls.dataset.add_variable('n_e', value=rng.uniform(1., 2., (cls.nodes.size, 15)))
+        var.visual = 'new'
+        var.depends = {0: {'UT': 'DATETIME'}, 1: {'HEIGHT': 'HEIGHT'}}
+        var.visual.plot_config.style = '2P'
+        var.visual.axis[0].data_res = cls.time_res
+        var.visual.axis[2].lim = [1., 2.]
+        cls.var = var
+
+    def draw(self, time_gap, raster=None):
+        self.var.visual.plot_config.raster = raster
+        dashboard = TSDashboard(
+            dt_fr=self.dt0 - datetime.timedelta(minutes=5), dt_to=self.dt0 + datetime.timedelta(minutes=305),
+            figure='agg')
+        self.addCleanup(dashboard.close)
+        dashboard.set_layout(panel_layouts=[[self.var]])
+        dashboard.panels[0].time_gap = time_gap
+        dashboard.draw()
+        return dashboard.panels[0].axes_overview[dashboard.panels[0]()]['collections'][0]
+
+    @staticmethod
+    def sample_mesh(mesh, x_probe, y_probe):
+        coords = mesh.get_coordinates()
+        x_edges = coords[0, :, 0]
+        y_edges = coords[:, 0, 1]
+        z = np.ma.filled(mesh.get_array().astype(float), np.nan).reshape((y_edges.size - 1, x_edges.size - 1))
+        i = np.searchsorted(x_edges, x_probe) - 1
+        j = np.searchsorted(y_edges, y_probe) - 1
+        return z[j[np.newaxis, :], i[:, np.newaxis]]
+
+    @staticmethod
+    def sample_image(im, x_probe, y_probe):
+        z = np.ma.filled(im.get_array().astype(float), np.nan)
+        x_0, x_1, y_0, y_1 = im.get_extent()
+        i = np.floor((x_probe - x_0) / (x_1 - x_0) * z.shape[1]).astype(int)
+        j = np.floor((y_probe - y_0) / (y_1 - y_0) * z.shape[0]).astype(int)
+        return z[j[np.newaxis, :], i[:, np.newaxis]]
+
+    def test_gaps(self):
+        # the probes at a quarter of a cell from the nodes and the heights, which are off the cell boundaries of
+        # both paths. The pcolormesh path puts the first boundaries at the first time and height.
+        secs = np.arange(300)[:, np.newaxis] * self.time_res + np.array([-15., 15.])
+        secs = secs.flatten()[1:]
+        y_probe = np.arange(100., 400., 20.) + 5.
+        for time_gap in [True, False]:
+            with self.subTest(time_gap=time_gap):
+                mesh = self.draw(time_gap, raster=False)
+                im = self.draw(time_gap)
+                self.assertIsInstance(mesh, QuadMesh)
+                self.assertIsInstance(im, AxesImage)
+                # one image column for each time node.
+                self.assertEqual(im.get_array().shape, (15, 300))
+
+                probes = secs
+                if not time_gap:
+                    # the boundaries of the cells stretched over a gap differ by half a cell.
+                    gap_middles = np.array([54.5, 151., 220.]) * self.time_res
+                    probes = secs[np.all(np.abs(secs[:, np.newaxis] - gap_middles) > self.time_res / 2, axis=1)]
+                x_probe = mpl_dates.date2num(self.dt0) + probes / 86400.
+                z_mesh = self.sample_mesh(mesh, x_probe, y_probe)
+                z_im = self.sample_image(im, x_probe, y_probe)
+
+                in_gap = ~np.isin(np.round(probes / self.time_res).astype(int), self.nodes)
+                self.assertTrue(np.any(in_gap))
+                np.testing.assert_array_equal(np.all(np.isnan(z_mesh), axis=1), in_gap & time_gap)
+                np.testing.assert_array_equal(np.isnan(z_im), np.isnan(z_mesh))
+                np.testing.assert_array_equal(z_im, z_mesh)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,204 @@
+# Licensed under the BSD 3-Clause License
+# Copyright (C) 2021 GeospaceLab (geospacelab)
+# Author: Lei Cai, Space Physics and Astronomy, University of Oulu
+
+__author__ = "Lei Cai"
+__copyright__ = "Copyright 2021, GeospaceLab"
+__license__ = "BSD-3-Clause License"
+__email__ = "lei.cai@oulu.fi"
+__docformat__ = "reStructureText"
+
+import pathlib
+
+try:
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+except ImportError as e:
+    raise ImportError(
+        "The interactive dashboards require plotly. Install it by: pip install geospacelab[interactive]"
+    ) from e
+
+from geospacelab.datahub import DataHub, VariableModel
+import geospacelab.visualization.plotly.ipanel as ipanel
+
+
+class TSDashboard(DataHub):
+    """
+    An interactive dashboard of the time series, which mirrors
+    :class:`TSDashboard <geospacelab.visualization.mpl.dashboards.TSDashboard>` with the plotly (WebGL) backend.
+    The datasets are docked in the same way, and the variables are drawn from the same visual configurations.
+
+    The panels share the time axis. Only the decimated data (see :class:`TSPanel
+    <geospacelab.visualization.plotly.ipanel.TSPanel>`) are sent to the browser. When the visible time range is
+    changed, the data are re-decimated for the new range on the Python side:
+
+        - In Jupyter, create the dashboard with widget=True. The figure is a go.FigureWidget, which calls
+          :meth:`update_range` when the x axis is zoomed or panned.
+        - In a Dash app, call :meth:`relayout` in the callback of the relayoutData of the graph, which returns
+          the updated figure.
+
+    :param dt_fr: the start time.
+    :param dt_to: the stop time.
+    :param time_gap: if True, the data gaps are masked.
+    :param n_bins: the number of the columns of the decimation.
+    :param widget: if True, the figure is a go.FigureWidget with the relayout callback.
+    :param figure_config: the keyword arguments of the figure layout, e.g., {'width': 1000, 'height': 800}.
+    """
+
+    _default_figure_config = {
+        'width': 1000,
+        'height': 800,
+        'template': 'simple_white',
+    }
+
+    def __init__(self, dt_fr=None, dt_to=None, time_gap=True, n_bins=2000, widget=False, figure_config=None,
+                 **kwargs):
+        self.panel_layouts = []
+        self.time_gap = time_gap
+        self.n_bins = n_bins
+        self.widget = widget
+        self.figure_config = dict(self._default_figure_config)
+        if figure_config is not None:
+            self.figure_config.update(figure_config)
+        self.figure = None
+        self.panels = {}
+        kwargs.update(visual='on')
+        super(TSDashboard, self).__init__(dt_fr=dt_fr, dt_to=dt_to, **kwargs)
+        self._xlim = [self.dt_fr, self.dt_to]
+        self._x_range_visible = None
+
+    def set_layout(self, panel_layouts=None, row_height_scales=1, vertical_spacing=0.02, time_res=None):
+        """
+        Set the layout of the panels.
+
+        :param panel_layouts: a list of the plot layouts of the panels, e.g., [[var1], [var2, var3, [var4]]],
+            where a nested list is drawn on the secondary y axis. The variables can be given by their indices in
+            the attribute variables.
+        :param row_height_scales: the relative heights of the panels, an int or a list.
+        :param vertical_spacing: the space between the panels, as a fraction of the figure height.
+        :param time_res: the time resolution(s) for the gap search, a number or a list for the panels.
+        """
+        num_rows = len(panel_layouts)
+        self.panel_layouts = [self._validate_plot_layout(layout) for layout in panel_layouts]
+        if type(row_height_scales) is not list:
+            row_height_scales = [row_height_scales] * num_rows
+        elif len(row_height_scales) != num_rows:
+            raise ValueError
+        if not isinstance(time_res, list):
+            time_res = [time_res] * num_rows
+
+        specs = [[{'secondary_y': any(isinstance(elem, list) for elem in layout)}] for layout in self.panel_layouts]
+        figure = make_subplots(
+            rows=num_rows, cols=1, shared_xaxes=True, vertical_spacing=vertical_spacing,
+            row_heights=row_height_scales, specs=specs)
+        if self.widget:
+            figure = go.FigureWidget(figure)
+        self.figure = figure
+
+        self.panels = {}
+        for ind in range(num_rows):
+            self.panels[ind] = ipanel.TSPanel(
+                figure=figure, row=ind + 1, col=1, dt_fr=self._xlim[0], dt_to=self._xlim[1],
+                time_gap=self.time_gap, time_res=time_res[ind], n_bins=self.n_bins,
+                bottom_panel=ind == num_rows - 1)
+
+    def draw(self, dt_fr=None, dt_to=None):
+        if dt_fr is not None:
+            self._xlim[0] = dt_fr
+        if dt_to is not None:
+            self._xlim[1] = dt_to
+        with self.figure.batch_update():
+            for ind, panel in self.panels.items():
+                panel.dt_fr, panel.dt_to = self._xlim
+                panel._xlim = list(self._xlim)
+                panel.draw(self.panel_layouts[ind])
+            self.figure.update_layout(showlegend=True, **self.figure_config)
+        if self.widget:
+            # the shared time axes are synchronized in the browser, any of them may report the zoom.
+            for name in self.figure.layout.to_plotly_json().keys():
+                if name.startswith('xaxis'):
+                    self.figure.layout.on_change(self._on_xaxis_change, name + '.range')
+
+    def update_range(self, x_range=None):
+        """
+        Re-decimate the data of all the panels for a visible time range, see :meth:`TSPanel.update_range
+        <geospacelab.visualization.plotly.ipanel.TSPanel.update_range>`.
+        """
+        with self.figure.batch_update():
+            for panel in self.panels.values():
+                panel.update_range(x_range)
+
+    def relayout(self, relayout_data):
+        """
+        Update the figure for the relayoutData of a Dash graph, e.g.,
+
+            >>> @app.callback(Output('graph', 'figure'), Input('graph', 'relayoutData'))
+            >>> def zoom(relayout_data):
+            >>>     return dashboard.relayout(relayout_data)
+
+        :param relayout_data: the dict of the changed layout properties.
+        :return: the figure.
+        """
+        if not relayout_data:
+            return self.figure
+        # the time axes are shared, any of them is zoomed.
+        for key, value in relayout_data.items():
+            if not key.startswith('xaxis'):
+                continue
+            if key.endswith('.range[0]'):
+                x_range = [value, relayout_data[key.replace('[0]', '[1]')]]
+            elif key.endswith('.range'):
+                x_range = value
+            elif key.endswith('.autorange'):
+                x_range = None
+            else:
+                continue
+            self.update_range(x_range)
+            if x_range is not None:
+                self.figure.update_xaxes(range=list(x_range))
+            else:
+                self.figure.update_xaxes(range=list(self._xlim))
+            break
+        return self.figure
+
+    def _on_xaxis_change(self, layout, x_range):
+        x_range = list(x_range) if x_range is not None else None
+        if x_range == self._x_range_visible:
+            return
+        self._x_range_visible = x_range
+        self.update_range(x_range)
+
+    def _validate_plot_layout(self, layout_in, level=0):
+        if (level == 0) and (not isinstance(layout_in, list)):
+            raise TypeError("The plot layout must be a list!")
+        layout_out = []
+        for elem in layout_in:
+            if isinstance(elem, list):
+                layout_out.append(self._validate_plot_layout(elem, level=level+1))
+            elif issubclass(elem.__class__, VariableModel):
+                layout_out.append(elem)
+            elif isinstance(elem, int):
+                layout_out.append(self.variables[elem])
+            else:
+                raise TypeError
+        return layout_out
+
+    def add_title(self, title=None, **kwargs):
+        self.figure.update_layout(title={'text': title, 'x': 0.5, **kwargs})
+
+    def show(self, **kwargs):
+        if self.widget:
+            return self.figure
+        self.figure.show(**kwargs)
+
+    def save_html(self, file_dir=None, file_name=None, **kwargs):
+        """
+        Save the figure as a standalone html file. The saved figure has the data decimated for the current
+        visible range, which are not re-decimated on zoom.
+        """
+        file_dir = pathlib.Path.cwd() if file_dir is None else pathlib.Path(file_dir)
+        if type(file_name) is not str:
+            raise ValueError
+        file_path = file_dir / (file_name + '.html')
+        self.figure.write_html(str(file_path), **kwargs)
+        return file_path
@@ -1,19 +1,443 @@
+# Licensed under the BSD 3-Clause License
+# Copyright (C) 2021 GeospaceLab (geospacelab)
+# Author: Lei Cai, Space Physics and Astronomy, University of Oulu
+
+__author__ = "Lei Cai"
+__copyright__ = "Copyright 2021, GeospaceLab"
+__license__ = "BSD-3-Clause License"
+__email__ = "lei.cai@oulu.fi"
+__docformat__ = "reStructureText"
+
+import datetime
+
+import numpy as np
+import matplotlib.colors as mpl_colors
+try:
+    import plotly.graph_objects as go
+except ImportError as e:
+    raise ImportError(
+        "The interactive dashboards require plotly. Install it by: pip install geospacelab[interactive]"
+    ) from e
+
+import geospacelab.toolbox.utilities.numpyarray as arraytool
+import geospacelab.toolbox.utilities.pylogging as mylog
+import geospacelab.visualization.mpl.colormaps as mycmap
+from geospacelab.datahub.__variable_base__ import VariableBase as VariableModel
+from geospacelab.visualization.mpl.panels import TSPanel as MPLTSPanel
 
 
 class Panel(object):
-    def __init__(self):
-        pass
+    """
+    A panel in a plotly figure, i.e., a cell (row, col) of the subplots created by plotly.subplots.make_subplots,
+    or the whole figure if row and col are None. The lines and scatters are drawn as WebGL (scattergl) traces.
+
+    :param figure: a plotly Figure or FigureWidget. If None, a new Figure is created.
+    :param row: the row of the subplot (starting from 1).
+    :param col: the column of the subplot (starting from 1).
+    """
+
+    def __init__(self, figure=None, row=None, col=None):
+        if figure is None:
+            figure = go.Figure()
+        self.figure = figure
+        self.row = row
+        self.col = col
+        self.traces = []
+
+    def add_trace(self, trace, secondary_y=False):
+        """
+        Add a trace to the panel, and return the trace in the figure (which may be updated later).
+        """
+        if self.row is None:
+            self.figure.add_trace(trace)
+        elif secondary_y:
+            self.figure.add_trace(trace, row=self.row, col=self.col, secondary_y=True)
+        else:
+            self.figure.add_trace(trace, row=self.row, col=self.col)
+        trace = self.figure.data[-1]
+        self.traces.append(trace)
+        return trace
+
+    def add_line(self, x, y, secondary_y=False, **kwargs):
+        kwargs.setdefault('mode', 'lines')
+        return self.add_trace(go.Scattergl(x=x, y=y, **kwargs), secondary_y=secondary_y)
+
+    def add_scatter(self, x, y, secondary_y=False, **kwargs):
+        kwargs.setdefault('mode', 'markers')
+        return self.add_trace(go.Scattergl(x=x, y=y, **kwargs), secondary_y=secondary_y)
+
+    def add_image(self, z, x0=0, dx=1, y0=0, dy=1, secondary_y=False, **kwargs):
+        """
+        Add an image on a uniform grid, z[iy, ix] at (x0 + ix * dx, y0 + iy * dy).
+        """
+        return self.add_trace(go.Heatmap(z=z, x0=x0, dx=dx, y0=y0, dy=dy, **kwargs), secondary_y=secondary_y)
+
+    def add_pcolor(self, x, y, z, secondary_y=False, **kwargs):
+        """
+        Add a pseudocolor plot, z[iy, ix] at the centers (x[ix], y[iy]) or in the cells bounded by x and y.
+        """
+        return self.add_trace(go.Heatmap(x=x, y=y, z=z, **kwargs), secondary_y=secondary_y)
+
+    def update_xaxes(self, **kwargs):
+        if self.row is None:
+            self.figure.update_xaxes(**kwargs)
+        else:
+            self.figure.update_xaxes(row=self.row, col=self.col, **kwargs)
+
+    def update_yaxes(self, secondary_y=False, **kwargs):
+        if self.row is None:
+            self.figure.update_yaxes(**kwargs)
+        else:
+            self.figure.update_yaxes(row=self.row, col=self.col, secondary_y=secondary_y, **kwargs)
+
+
+class TSPanel(Panel):
+    """
+    A panel of the time series for the interactive (web) figures, which draws the variables in the same way as
+    :class:`TSPanel <geospacelab.visualization.mpl.panels.TSPanel>` from the same visual configurations
+    (var.visual), e.g., the plot styles '1P', '1', '1E', '1S', '2P', and '2I', the data scales and shifts,
+    the gap masking, the axis labels, units, limits, and scales, and the colormaps.
+
+    The full-resolution data are kept in the panel, and only a decimated copy is sent to the browser:
+    a line keeps the first, last, minimum, and maximum samples in each of n_bins columns of the visible range
+    (arraytool.minmax_decimation_indices), and an image is averaged over the blocks of the samples in a column.
+    When the visible range is changed (e.g., zoomed), :meth:`update_range` re-decimates the data for the new range,
+    which is called by the dashboard in the relayout callback.
+
+    :param dt_fr: the start time of the panel.
+    :param dt_to: the stop time of the panel.
+    :param time_gap: if True, the data gaps are masked.
+    :param time_res: the time resolution in seconds for the gap search. If None, var.visual.axis[0].data_res.
+    :param lod: if True, the data are decimated to n_bins columns.
+    :param n_bins: the number of the columns of the decimation, e.g., the width of the plot in pixels.
+    :param bottom_panel: if True, the time axis is labeled.
+    """
+    _default_line_config = {
+        'mode': 'lines',
+        'line': {'width': 1.5},
+    }
+
+    def __init__(self, figure=None, row=None, col=None, dt_fr=None, dt_to=None, time_gap=True, time_res=None,
+                 lod=True, n_bins=2000, bottom_panel=True):
+        super(TSPanel, self).__init__(figure=figure, row=row, col=col)
+        self.dt_fr = dt_fr
+        self.dt_to = dt_to
+        self._xlim = [dt_fr, dt_to]
+        self.time_gap = time_gap
+        self.time_res = time_res
+        self.lod = lod
+        self.n_bins = n_bins
+        self.bottom_panel = bottom_panel
+        self.variables = {'primary': [], 'secondary': []}
+        # The full-resolution data of the decimated traces: a list of (trace, kind, data).
+        self._sources = []
+
+    # The data are retrieved from the variables as in the matplotlib TSPanel.
+    _retrieve_data_1d = MPLTSPanel._retrieve_data_1d
+    _retrieve_data_2d = MPLTSPanel._retrieve_data_2d
+    generate_label = staticmethod(MPLTSPanel.generate_label)
+
+    def draw(self, plot_layout):
+        """
+        Draw the variables in a plot layout. The variables in a nested list are drawn on the secondary y axis,
+        e.g., [var1, var2, [var3]].
+        """
+        if not list(plot_layout) or isinstance(plot_layout[0], list):
+            raise ValueError("The first element in the plot layout must be a variable!")
+        traces = []
+        for elem in plot_layout:
+            if issubclass(elem.__class__, VariableModel):
+                traces.extend(self.overlay_a_variable(elem))
+            elif isinstance(elem, list):
+                for var in elem:
+                    traces.extend(self.overlay_a_variable(var, secondary_y=True))
+            else:
+                raise NotImplementedError
+        self._set_xaxis()
+        self._set_yaxis()
+        if self.variables['secondary']:
+            self._set_yaxis(secondary_y=True)
+        return traces
+
+    def overlay_a_variable(self, var, secondary_y=False):
+        variables = self.variables['secondary' if secondary_y else 'primary']
+        variables.append(var)
+        plot_style = variables[0].visual.plot_config.style
+
+        if plot_style in ['1P', '1noE']:
+            traces = self.overlay_line(var, secondary_y=secondary_y)
+        elif plot_style in ['1', '1E']:
+            traces = self.overlay_line(var, secondary_y=secondary_y, errorbar='on')
+        elif plot_style in ['1S']:
+            traces = self.overlay_scatter(var, secondary_y=secondary_y)
+        elif plot_style in ['2P', '2I']:
+            traces = self.overlay_pcolormesh(var, secondary_y=secondary_y)
+        else:
+            mylog.StreamLogger.warning(
+                f'The plot style "{plot_style}" of {var.name} is not supported by the plotly panel!')
+            if var.ndim == 2 and var.value is not None and var.value.shape[1] > 1:
+                traces = self.overlay_pcolormesh(var, secondary_y=secondary_y)
+            else:
+                traces = self.overlay_line(var, secondary_y=secondary_y)
+        return traces
+
+    def overlay_line(self, var, secondary_y=False, errorbar='off', mode='lines', **kwargs):
+        """
+        Overlay the lines of a variable (a line for each column).
+
+        :param var: A GeospaceLab Variable object.
+        :param secondary_y: If True, the lines are drawn on the secondary y axis.
+        :param errorbar: If 'on', show the error bars.
+        :param mode: the mode of the scattergl traces, 'lines', 'markers', or 'lines+markers'.
+        :param kwargs: Other keyword arguments forwarded to go.Scattergl.
+        :return: the list of the traces.
+        """
+        data = self._retrieve_data_1d(var, lod=False)
+        x = np.asarray(data['x'])
+        y = np.asarray(data['y'], dtype=float)
+        y_err = np.asarray(data['y_err'], dtype=float)
+        if y.ndim == 1:
+            y = y[:, np.newaxis]
+        y_err = np.broadcast_to(y_err.reshape((y_err.shape[0], -1)), y.shape)
+        x_dt, x_num = self._convert_times(x)
+
+        if var.visual.axis[1].label is None:
+            var.visual.axis[1].label = '@v.label'
+        if var.visual.axis[1].unit is None:
+            var.visual.axis[1].unit = '@v.unit_label'
+        labels = var.get_visual_axis_attr(axis=2, attr_name='label')
+        if not isinstance(labels, list):
+            labels = [labels]
+
+        line_config = self._convert_line_config(var.visual.plot_config.line)
+        traces = []
+        for ind in range(y.shape[1]):
+            config = dict(self._default_line_config, mode=mode, **line_config)
+            if ind < len(labels) and labels[ind] is not None:
+                config.update(name=labels[ind])
+            config.update(kwargs)
+            source = {'x': x_dt, 'x_num': x_num, 'y': y[:, ind], 'y_err': y_err[:, ind] if errorbar == 'on' else None}
+            x_d, y_d, y_err_d = self._decimate_line(source)
+            if y_err_d is not None:
+                config.update(error_y={'type': 'data', 'array': y_err_d, 'visible': True})
+            trace = self.add_line(x_d, y_d, secondary_y=secondary_y, **config)
+            self._sources.append((trace, 'line', source))
+            traces.append(trace)
+        return traces
+
+    def overlay_scatter(self, var, secondary_y=False, **kwargs):
+        kwargs.setdefault('marker', {'size': 3})
+        return self.overlay_line(var, secondary_y=secondary_y, mode='markers', **kwargs)
+
+    def overlay_pcolormesh(self, var, secondary_y=False, **kwargs):
+        """
+        Overlay a 2-D variable as a heatmap. A NaN column (transparent) is inserted in each data gap.
+        The y values must be the same for all the times. Otherwise, the median of the y values at each index is used
+        as the y axis of the heatmap.
+
+        :param var: A GeospaceLab Variable object.
+        :param secondary_y: If True, the heatmap is drawn on the secondary y axis.
+        :param kwargs: Other keyword arguments forwarded to go.Heatmap.
+        :return: the list of the traces.
+        """
+        # the samples at their centres; the gaps are masked after the decimation.
+        data = self._retrieve_data_2d(var, mask_gap=False)
+        x = np.asarray(data['x'])
+        y = np.asarray(data['y'], dtype=float)
+        z = np.asarray(data['z'], dtype=float)
+        if x.ndim == 2:
+            x = x[:, 0]
+        if y.ndim == 2:
+            if y.shape[0] > 1 and not np.all((y == y[0:1, :]) | np.isnan(y)):
+                mylog.StreamLogger.warning(
+                    "The y values of {} change with time. The median values are used for the heatmap.".format(
+                        var.name))
+            y = np.nanmedian(y, axis=0) if y.shape[0] > 1 else y[0]
+        x_dt, x_num = self._convert_times(x)
+        _, x_res = arraytool.search_gaps(x_num, xres=data['x_res'])
+
+        z_scale = var.visual.axis[2].scale
+        z_lim = var.visual.axis[2].lim
+        if z_lim is None:
+            z_lim = [np.nanmin(z), np.nanmax(z)]
+        config = {
+            'colorscale': self._convert_colormap(
+                mycmap.get_colormap(var.visual.plot_config.pcolormesh.get('cmap', None))),
+            'zmin': z_lim[0], 'zmax': z_lim[1],
+            'colorbar': {'title': {'text': self._get_colorbar_label(var), 'side': 'right'}},
+        }
+        if z_scale == 'log':
+            # plotly has no log color scale, the logarithms are drawn.
+            with np.errstate(divide='ignore', invalid='ignore'):
+                z = np.log10(np.where(z > 0, z, np.nan))
+            config.update(zmin=np.log10(z_lim[0]), zmax=np.log10(z_lim[1]))
+            config['colorbar']['title']['text'] = 'log10 ' + config['colorbar']['title']['text']
+        config.update(kwargs)
+
+        source = {'x': x_dt, 'x_num': x_num, 'y': y, 'z': z, 'x_res': x_res, 'mask_gap': data['mask_gap']}
+        x_d, z_d = self._decimate_image(source)
+        trace = self.add_pcolor(x_d, y, z_d.T, secondary_y=secondary_y, **config)
+        self._sources.append((trace, 'image', source))
+        return [trace]
+
+    def update_range(self, x_range=None):
+        """
+        Re-decimate the data of the traces for a visible time range.
+
+        :param x_range: [dt_fr, dt_to], datetimes or the date strings of plotly (e.g., '2021-03-09 12:00:00.5').
+            If None, the time range of the panel is used (e.g., for the autorange).
+        """
+        self._xlim = self._convert_x_range(x_range) if x_range is not None else [self.dt_fr, self.dt_to]
+        for trace, kind, source in self._sources:
+            if kind == 'line':
+                x, y, y_err = self._decimate_line(source)
+                trace.update(x=x, y=y)
+                if y_err is not None:
+                    trace.update(error_y={'array': y_err})
+            elif kind == 'image':
+                x, z = self._decimate_image(source)
+                trace.update(x=x, z=z.T)
+
+    def _get_x_range_num(self):
+        if all(isinstance(xl, datetime.datetime) for xl in self._xlim):
+            return arraytool.convert_x_to_numeric(np.array(self._xlim), xtype='datetime')
+        return None
+
+    def _decimate_line(self, source):
+        x, x_num, y, y_err = source['x'], source['x_num'], source['y'], source['y_err']
+        if not self.lod or x.size <= 4 * self.n_bins:
+            return x, y, y_err
+        x_range = self._get_x_range_num()
+        if x_range is None:
+            x_range = [np.nanmin(x_num), np.nanmax(x_num)]
+        inds = arraytool.minmax_decimation_indices(x_num, y, x_range=x_range, n_bins=self.n_bins, axis=0)
+        return x[inds], y[inds], y_err[inds] if y_err is not None else None
+
+    def _decimate_image(self, source):
+        x, x_num, z = source['x'], source['x_num'], source['z']
+        x_res = source['x_res']
+        x_range = self._get_x_range_num()
+        if x_range is not None:
+            ind_x = np.flatnonzero((x_num >= x_range[0]) & (x_num <= x_range[1]))
+            if ind_x.size > 0:
+                # a sample outside on each side, not to leave blank edges.
+                i1 = max(ind_x[0] - 1, 0)
+                i2 = min(ind_x[-1] + 2, x_num.size)
+                x, x_num, z = x[i1:i2], x_num[i1:i2], z[i1:i2]
+        factor = x_num.size // self.n_bins if self.lod else 1
+        if factor >= 2:
+            z = arraytool.block_mean(z, factor, axis=0)
+            x_num = arraytool.block_mean(x_num, factor, axis=0)
+            x_res = x_res * factor
+            x = None
+        if source['mask_gap'] and x_num.size > 1:
+            # a NaN column in the middle of each gap.
+            inds, _ = arraytool.search_gaps(x_num, xres=x_res)
+            if inds.size > 0:
+                x_num = np.insert(x_num, inds + 1, (x_num[inds] + x_num[inds + 1]) / 2)
+                z = np.insert(np.asarray(z, dtype=float), inds + 1, np.nan, axis=0)
+                x = None
+        if x is None:
+            x = np.round(x_num * 1e6).astype(np.int64).astype('datetime64[us]')
+        return x, z
+
+    @staticmethod
+    def _convert_times(x):
+        """
+        Convert the times to datetime64 (sent to the browser without the conversion of the datetime objects)
+        and the seconds since 1970-01-01.
+        """
+        x_num = arraytool.convert_x_to_numeric(x, xtype='datetime')
+        x_dt = np.round(x_num * 1e6).astype(np.int64).astype('datetime64[us]')
+        return x_dt, x_num
+
+    @staticmethod
+    def _convert_x_range(x_range):
+        x_out = []
+        for xl in x_range:
+            if isinstance(xl, str):
+                xl = np.datetime64(xl.replace(' ', 'T'), 'us').astype(datetime.datetime)
+            x_out.append(xl)
+        return x_out
 
-    def add_line(self):
-        pass
+    @staticmethod
+    def _convert_line_config(line_config):
+        # the matplotlib line properties to the plotly ones.
+        config = {}
+        line = {}
+        if line_config.get('color', None) is not None:
+            line['color'] = mpl_colors.to_hex(line_config['color'])
+        for key in ['linewidth', 'lw']:
+            if key in line_config.keys():
+                line['width'] = line_config[key]
+        dashes = {'--': 'dash', ':': 'dot', '-.': 'dashdot', '-': 'solid'}
+        for key in ['linestyle', 'ls']:
+            if line_config.get(key, None) in dashes.keys():
+                line['dash'] = dashes[line_config[key]]
+        if line:
+            config['line'] = line
+        if 'alpha' in line_config.keys():
+            config['opacity'] = line_config['alpha']
+        return config
 
-    def add_image(self):
-        pass
+    @staticmethod
+    def _convert_colormap(cmap, num=64):
+        # a matplotlib colormap (or name) to a plotly colorscale.
+        if isinstance(cmap, str):
+            import matplotlib
+            cmap = matplotlib.colormaps[cmap]
+        levels = np.linspace(0, 1, num)
+        return [[float(level), mpl_colors.to_hex(cmap(level))] for level in levels]
 
-    def add_pcolor(self):
-        pass
+    def _get_colorbar_label(self, var):
+        label = var.get_visual_axis_attr(axis=2, attr_name='label')
+        unit = var.get_visual_axis_attr(axis=2, attr_name='unit')
+        label = label[0] if isinstance(label, list) else label
+        return self.generate_label(label if label is not None else '', unit=unit if unit is not None else '',
+                                   style='single')
 
-    def add_scatter(self):
-        pass
+    def _set_xaxis(self):
+        var_for_config = self.variables['primary'][0]
+        config = {'type': 'date', 'showgrid': True, 'ticks': 'inside', 'mirror': 'ticks', 'showline': True}
+        if all(xl is not None for xl in self._xlim):
+            config['range'] = list(self._xlim)
+            if var_for_config.visual.axis[0].reverse:
+                config['range'] = config['range'][::-1]
+        if self.bottom_panel:
+            config['title'] = {'text': 'UT'}
+        else:
+            config['showticklabels'] = False
+        self.update_xaxes(**config)
 
-    
+    def _set_yaxis(self, secondary_y=False):
+        var_for_config = self.variables['secondary' if secondary_y else 'primary'][0]
+        axis = var_for_config.visual.axis[1]
+        if secondary_y and axis.label in ['@v.group', None]:
+            axis.label = '@v.label'
+        label = var_for_config.get_visual_axis_attr('label', axis=1)
+        unit = var_for_config.get_visual_axis_attr('unit', axis=1)
+        label_style = 'single' if secondary_y else var_for_config.get_visual_axis_attr('label_style', axis=1)
+        title = self.generate_label(label if label is not None else '', unit=unit if unit is not None else '',
+                                    style=label_style)
+        config = {
+            'title': {'text': title.replace('\n', '<br>')},
+            'type': 'log' if axis.scale == 'log' else 'linear',
+            'ticks': 'inside', 'showline': True,
+        }
+        if not secondary_y:
+            config.update(mirror='ticks', showgrid=True, zeroline=True)
+        else:
+            config.update(showgrid=False)
+        ylim = axis.lim
+        if ylim is not None and all(yl is not None and np.isfinite(yl) for yl in ylim):
+            ylim = list(ylim)
+            if axis.scale == 'log':
+                ylim = list(np.log10(ylim))
+            config['range'] = ylim[::-1] if axis.reverse else ylim
+        elif axis.reverse:
+            config['autorange'] = 'reversed'
+        if axis.ticks is not None:
+            config['tickvals'] = list(axis.ticks)
+            if axis.tick_labels is not None:
+                config['ticktext'] = list(axis.tick_labels)
+        self.update_yaxes(secondary_y=secondary_y, **config)
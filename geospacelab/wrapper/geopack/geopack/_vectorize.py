@@ -0,0 +1,39 @@
+import numpy as np
+
+
+def evaluate_by_region(region, funcs, *args, nout=3):
+    """
+    Evaluates the model function of the region, where each point is located.
+
+    The Fortran models branch on the position of the point (e.g., inside the magnetosphere,
+    in the boundary layer, or outside). For an array of points, each function in funcs is
+    called only once with the subset of points in its region, so that the results are the
+    same as those from the point-by-point calls, while the cost of the unused branches is saved.
+
+    :param region: the region flag (integer) of the points, a scalar or an array.
+    :param funcs: a dict, the key is the region flag and the value is the function of that region,
+        which returns a tuple of nout components.
+    :param args: the point-wise inputs of the functions, broadcastable to the shape of region.
+    :param nout: the number of the output components.
+    :return: a tuple of nout components, having the same shape as region.
+    """
+    if np.ndim(region) == 0:
+        region = int(region)
+        if region not in funcs:
+            raise ValueError
+        return funcs[region](*args)
+
+    region = np.asarray(region)
+    if not np.all(np.isin(region, list(funcs.keys()))):
+        raise ValueError
+    args = [np.broadcast_to(arg, region.shape) for arg in args]
+    outputs = [np.zeros(region.shape) for i in range(nout)]
+    for key, func in funcs.items():
+        ind = region == key
+        if not np.any(ind):
+            continue
+        results = func(*[arg[ind] for arg in args])
+        for output, result in zip(outputs, results):
+            output[ind] = result
+    return tuple(outputs)
+
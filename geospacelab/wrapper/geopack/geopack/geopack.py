@@ -1,23 +1,29 @@
 import numpy as np
-from geopack import t89,t96,t01,t04
+from . import t89,t96,t01,t04
 import os.path
 import datetime
 
-def init_igrf():
-    """
-    Initialize the IGRF coefficients and related coefs.
-    Should be called once and only once when importing the geopack module.
-    """
+from geospacelab.config import prf
+import geospacelab.toolbox.utilities.pylogging as mylog
 
-    global igrf, nmn,mns, nyear,years,yruts
+# The compiled IGRF table: the epochs (ut sec), the Schmidt-normalized g and h at the epochs, and the
+# secular variations of g and h (per second) from each epoch to the next one, one epoch per row.
+# The table shipped with the package is read-only; a recompiled one is cached in the data root directory.
+igrf_txt_file = os.path.join(os.path.dirname(__file__), 'igrf13coeffs.txt')
+igrf_npy_file = os.path.join(os.path.dirname(__file__), 'igrf13coeffs.npy')
+igrf_npy_cache_file = prf.datahub_data_root_dir / 'Geopack' / 'igrf13coeffs.npy'
 
-    # print('Load IGRF coefficients ...')
 
-    bfn = 'igrf13coeffs.txt'
-    locffn = os.path.join(os.path.dirname(__file__), bfn)
+def read_igrf_txt(fn=igrf_txt_file):
+    """
+    Read the IGRF coefficients from the text table released by IAGA.
+    :param fn: the file path of the table.
+    :return: years, g, h. g/h are the coefficients in nT with the shape (nyear, nmn), ordered by mn = n(n+1)/2+m.
+        The secular variations in the last column are converted to the coefficients 5 years later.
+    """
 
     nheader = 3
-    with open(locffn, 'r') as file:
+    with open(fn, 'r') as file:
         for i in range(nheader):
             next(file)
         header = file.readline().rstrip()
@@ -31,12 +37,6 @@ def init_igrf():
     k = np.int32(cols[1]) + 1
     nmn = np.int32((k + 1) * k * 0.5)
     igrf = np.zeros((nmn, nyear, 2), dtype=float)
-    mns = np.empty((nmn, 2), dtype=np.int32)
-    l = 0
-    for i in range(k):
-        for j in range(i + 1):
-            mns[l, :] = [i, j]
-            l += 1
 
     for line in lines:
         cols = line.split()
@@ -51,46 +51,178 @@ def init_igrf():
     # treat the last column
     years[-1] += 5
     igrf[:, -1, :] = igrf[:, -2, :] + igrf[:, -1, :] * 5
-    yruts = np.empty(nyear, dtype=float)
+    return years, igrf[:,:,0].T, igrf[:,:,1].T
+
+
+def schmidt_factors(k):
+    """
+    The Schmidt quasi-normalization factors S_n,m, and the coefficients K^n,m used in the recursion
+    relations of the associated Legendre polynomials (following the notation in Davis 2004).
+
+    Since g_n^m * P_n^m should be constant, mutiplying S_n,m to g_n^m is equivalently converting P_n^m to P^n,m.
+    The benefit of doing so is that P^n,m follows simple recursive form, c.f. Eq (16 a-c) and Eq(17 a-b).
+
+    :param k: the maximum degree + 1.
+    :return: s, rec. Arrays of the length k(k+1)/2, ordered by mn = n(n+1)/2+m.
+    """
+    nmn = np.int32((k+1)*k/2)
+    schmidt = np.empty(nmn, dtype=float)
+    rec = np.empty(nmn, dtype=float)
+    mn = 0
+    s = 1.
+    for n in range(k):
+        n2 = 2*n+1
+        n2 = n2*(n2-2)
+        if n > 0: s *= (2*n-1)/n        # S_0,0 = 1, S_n,0 = S_n-1,0 * (2n-1)/n, Eq (18a-b)
+        p = s
+        for m in range(n+1):
+            if m > 0:
+                aa = 2 if m == 1 else 1     # aa = delta_m,1
+                p *= np.sqrt(aa*(n-m+1)/(n+m))  # S_n,m = S_n,m-1 * sqrt(aa(n-m+1)/(n+m)), Eq (18c)
+            schmidt[mn] = p
+            rec[mn] = (n-m)*(n+m)/n2    # K^n,m = (n-m)(n+m)/(2n+1)(2n-1), Eq (17b), K^1,m = 0, Eq (17a)
+            mn += 1
+    return schmidt, rec
+
+
+def compile_igrf(fn_txt=igrf_txt_file, fn_npy=igrf_npy_cache_file):
+    """
+    Compile the IGRF text table to the binary table used by init_igrf.
+    :param fn_npy: the file path to save the table, or None. The table is still returned if it cannot be saved.
+    :return: table. The array of the shape (nyear, 1+4*nmn), see init_igrf.
+    """
+    years, g, h = read_igrf_txt(fn_txt)
+    k = np.int32(np.sqrt(2*g.shape[1]))     # nmn = k(k+1)/2
+    schmidt, rec = schmidt_factors(k)
+    g = g*schmidt
+    h = h*schmidt
+    t0_datetime = datetime.datetime(1970,1,1)
+    yruts = np.array([(datetime.datetime(year,1,1)-t0_datetime).total_seconds() for year in years])
+    # The secular variation of the last epoch continues that of the previous one.
+    dt = np.diff(yruts)[:,np.newaxis]
+    sv_g = np.diff(g, axis=0)/dt
+    sv_h = np.diff(h, axis=0)/dt
+    sv_g = np.concatenate((sv_g, sv_g[-1:]))
+    sv_h = np.concatenate((sv_h, sv_h[-1:]))
+    table = np.concatenate((yruts[:,np.newaxis], g, h, sv_g, sv_h), axis=1)
+    if fn_npy is not None:
+        try:
+            os.makedirs(os.path.dirname(fn_npy), exist_ok=True)
+            np.save(fn_npy, table)
+        except OSError as e:
+            mylog.StreamLogger.warning(
+                "Cannot save the compiled IGRF table to {}: {}. The table is kept in memory.".format(fn_npy, e))
+    return table
+
+
+def init_igrf():
+    """
+    Initialize the IGRF coefficients and related coefs.
+    Should be called once and only once when importing the geopack module.
+
+    The coefficients are memory-mapped from the compiled table igrf13coeffs.npy, either cached in the data root
+    directory or shipped with the package. The table is compiled from igrf13coeffs.txt if neither matches the
+    epochs of the text table.
+    """
+
+    global igrf, nmn, nyear, yruts, rec
+
+    with open(igrf_txt_file, 'r') as file:
+        header = [next(file) for i in range(4)][-1]
+    years = [int(col[0:4]) for col in header.split()[3:]]
+    years[-1] += 5
     t0_datetime = datetime.datetime(1970,1,1)
-    for i in range(nyear):
-        yruts[i] = (datetime.datetime(years[i],1,1)-t0_datetime).total_seconds()
-    # separate g/h
-    igrf = {'g': igrf[:,:,0], 'h': igrf[:,:,1]}
+    yruts = np.array([(datetime.datetime(year,1,1)-t0_datetime).total_seconds() for year in years])
+    nyear = len(years)
+
+    table = None
+    for fn in (igrf_npy_cache_file, igrf_npy_file):
+        if not os.path.exists(fn):
+            continue
+        try:
+            table = np.load(fn, mmap_mode='r')
+        except (OSError, ValueError):
+            continue
+        # Skip the compiled table if its epochs do not match the text table.
+        if table.ndim == 2 and table.shape[0] == nyear and np.array_equal(table[:,0], yruts):
+            break
+        table = None
+    if table is None:
+        table = compile_igrf()
+
+    nmn = (table.shape[1]-1)//4
+    # plain ndarray views of the mapped table, avoiding the overhead of the memmap subclass.
+    table = np.asarray(table)
+    igrf = {
+        'g': table[:,1:1+nmn], 'h': table[:,1+nmn:1+2*nmn],
+        'sv_g': table[:,1+2*nmn:1+3*nmn], 'sv_h': table[:,1+3*nmn:1+4*nmn]}
+    k = np.int32(np.sqrt(2*nmn))
+    rec = schmidt_factors(k)[1]
+    rec.flags.writeable = False
 
 
 def load_igrf(ut):
     """
     Load the IGRF coefficients for the given time.
-    :param ut: ut sec, a float.
-    :return: g,h. The IGRF coef at given time.
+    :param ut: ut sec, a float or an array.
+    :return: g,h. The IGRF coef at given time, multiplied by the Schmidt normalization factors.
+        For an array of ut, g/h have the shape of ut + (nmn,).
     """
 
-    # igrf should be initilized already.
-    global igrf, nmn,nyear, mns, years, yruts
-    try: isinstance(igrf, dict)
-    except: init_igrf()
+    # locate the epoch of interest, the coefs before the first and after the last epochs are extrapolated.
+    yridx = np.clip(np.searchsorted(yruts, ut, side='right')-1, 0, nyear-2)
+    dut = np.expand_dims(ut - yruts[yridx], -1)
+    g = igrf['g'][yridx] + igrf['sv_g'][yridx]*dut
+    h = igrf['h'][yridx] + igrf['sv_h'][yridx]*dut
+    return g, h
 
-    # locate the two years of interest.
-    if ut <= yruts[0]: yridx = 0
-    elif ut >= yruts[-1]: yridx = -2
-    else:
-        yridx = np.argwhere(yruts <= ut)[-1]
 
-    g0 = np.squeeze(igrf['g'][:,yridx])
-    h0 = np.squeeze(igrf['h'][:,yridx])
-    g1 = np.squeeze(igrf['g'][:,yridx+1])
-    h1 = np.squeeze(igrf['h'][:,yridx+1])
+class GeopackContext(object):
+    """
+    Holds the epoch-dependent state prepared by recalc_context, i.e., the contents of the
+    Fortran common blocks /geopack1/ (elements of the rotation matrices, dipole tilt angle, etc.)
+    and /geopack2/ (IGRF coefficients g, h and the recursion coefficients rec).
+
+    A context is not modified after it is created. It can be shared between threads, and contexts
+    for several epochs can be used side by side, e.g., ctx = recalc_context(ut); igrf_gsm(x,y,z, ctx=ctx).
+    """
+
+    __slots__ = (
+        'ut', 'vxgse', 'vygse', 'vzgse',
+        'st0', 'ct0', 'sl0', 'cl0', 'ctcl', 'stcl', 'ctsl', 'stsl', 'sfi', 'cfi', 'sps', 'cps',
+        'shi', 'chi', 'hi', 'psi', 'xmut', 'cgst', 'sgst',
+        'a11', 'a21', 'a31', 'a12', 'a22', 'a32', 'a13', 'a23', 'a33',
+        'e11', 'e21', 'e31', 'e12', 'e22', 'e32', 'e13', 'e23', 'e33',
+        'g', 'h', 'rec',
+    )
+
+    def __init__(self, **kwargs):
+        for key in self.__slots__:
+            setattr(self, key, kwargs[key])
 
-    ut0 = yruts[yridx]
-    ut1 = yruts[yridx+1]
-    f1 = (ut-ut0)/(ut1-ut0)
-    f0 = 1-f1
+    def as_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__}
 
-    return g0*f0+g1*f1, h0*f0+h1*f1
+    def __repr__(self):
+        return '{}(ut={}, psi={})'.format(self.__class__.__name__, self.ut, self.psi)
 
 
-def igrf_gsw(xgsw,ygsw,zgsw):
+# The context set by the last call of recalc, used when no context is passed explicitly.
+_context = None
+
+
+def get_context(ctx=None):
+    """
+    Returns ctx if given, otherwise the context prepared by the last call of recalc.
+    """
+    if ctx is not None:
+        return ctx
+    if _context is None:
+        raise RuntimeError('recalc (or recalc_context) must be invoked before this subroutine!')
+    return _context
+
+
+def igrf_gsw(xgsw,ygsw,zgsw, ctx=None):
     """
     Calculates components of the main (internal) geomagnetic field in the geocentric solar
     magnetospheric coordinate system, using IAGA international geomagnetic reference model
@@ -103,14 +235,16 @@ def igrf_gsw(xgsw,ygsw,zgsw):
     Python version by Sheng Tian
 
     :param xgsw,ygsw,zgsw: cartesian GSW coordinates (in units Re=6371.2 km)
+    :param ctx: a GeopackContext, if None, the context set by the last recalc is used.
     :return: hxgsw,hygsw,hzgsw. Cartesian GSW components of the main geomagnetic field in nanotesla
     """
-    xgsm,ygsm,zgsm = gswgsm(xgsw,ygsw,zgsw, 1)
-    bxgsm,bygsm,bzgsm = igrf_gsm(xgsm,ygsm,zgsm)
-    return gswgsm(bxgsm,bygsm,bzgsm, -1)
+    ctx = get_context(ctx)
+    xgsm,ygsm,zgsm = gswgsm(xgsw,ygsw,zgsw, 1, ctx=ctx)
+    bxgsm,bygsm,bzgsm = igrf_gsm(xgsm,ygsm,zgsm, ctx=ctx)
+    return gswgsm(bxgsm,bygsm,bzgsm, -1, ctx=ctx)
 
 
-def igrf_gsm(xgsm,ygsm,zgsm):
+def igrf_gsm(xgsm,ygsm,zgsm, ctx=None):
     """
     Calculates components of the main (internal) geomagnetic field in the geocentric solar
     magnetospheric coordinate system, using IAGA international geomagnetic reference model
@@ -123,17 +257,19 @@ def igrf_gsm(xgsm,ygsm,zgsm):
     Python version by Sheng Tian
 
     :param xgsm,ygsm,zgsm: cartesian GSM coordinates (in units Re=6371.2 km)
+    :param ctx: a GeopackContext, if None, the context set by the last recalc is used.
     :return: hxgsm,hygsm,hzgsm. Cartesian GSM components of the main geomagnetic field in nanotesla
     """
 
-    xgeo,ygeo,zgeo = geogsm(xgsm,ygsm,zgsm, -1)
+    ctx = get_context(ctx)
+    xgeo,ygeo,zgeo = geogsm(xgsm,ygsm,zgsm, -1, ctx=ctx)
     r,theta,phi = sphcar(xgeo,ygeo,zgeo, -1)
-    br,btheta,bphi = igrf_geo(r,theta,phi)
+    br,btheta,bphi = igrf_geo(r,theta,phi, ctx=ctx)
     bxgeo,bygeo,bzgeo = bspcar(theta,phi,br,btheta,bphi)
-    return geogsm(bxgeo,bygeo,bzgeo, 1)
+    return geogsm(bxgeo,bygeo,bzgeo, 1, ctx=ctx)
 
 
-def igrf_geo(r,theta,phi):
+def igrf_geo(r,theta,phi, ctx=None):
     """
     Calculates components of the main (internal) geomagnetic field in the spherical geographic
     (geocentric) coordinate system, using IAGA international geomagnetic reference model
@@ -147,37 +283,40 @@ def igrf_geo(r,theta,phi):
     :param r: spherical geographic (geocentric) coordinates: radial distance r in units Re=6371.2 km
     :param theta: colatitude theta in radians
     :param phi: longitude phi in radians
+    :param ctx: a GeopackContext, if None, the context set by the last recalc is used.
     :return: br, btheta, bphi. Spherical components of the main geomagnetic field in nanotesla
         (positive br outward, btheta southward, bphi eastward)
     """
 
 
     # common /geopack2/ g(105),h(105),rec(105)
-    global g, h, rec
+    ctx = get_context(ctx)
+    g, h, rec = ctx.g, ctx.h, ctx.rec
 
     ct = np.cos(theta)
     st = np.sin(theta)
     minst = 1e-5
-    if np.abs(st) < minst: smlst = True
-    else: smlst = False
+    smlst = np.abs(st) < minst
 
     # In this new version, the optimal value of the parameter nm (maximal order of the spherical
     # harmonic expansion) is not user-prescribed, but calculated inside the subroutine, based
     # on the value of the radial distance r:
     irp3 = np.int64(r+2)
     nm = np.int64(3+30/irp3)
-    if nm > 13: nm = 13
+    nm = np.minimum(nm, 13)
     k = nm+1
+    kmax = np.max(k)    # for an array of points, the expansion is done to the largest order.
 
     # r dependence is encapsulated here.
-    a = np.empty(k)
-    b = np.empty(k)
+    a = [None]*kmax
+    b = [None]*kmax
     ar = 1/r        # a/r
     a[0] = ar*ar    # a[n] = (a/r)^(n+2).
-    b[0] = a[0]     # b[n] = (n+1)(a/r)^(n+2)
-    for n in range(1,k):
+    for n in range(1,kmax):
         a[n] = a[n-1]*ar
-        b[n] = a[n]*(n+1)
+    for n in range(kmax):
+        a[n] = a[n]*(n < k)     # the terms beyond the order of a point vanish.
+        b[n] = a[n]*(n+1)       # b[n] = (n+1)(a/r)^(n+2)
 
 
     # t - short for theta, f - short for phi.
@@ -190,7 +329,7 @@ def igrf_geo(r,theta,phi):
     p1,d1,p2,d2 = [p,d,0.,0]
     l0 = 0
     mn = l0
-    for n in range(m,k):
+    for n in range(m,kmax):
         w = g[mn]*cmf+h[mn]*smf
         br += b[n]*w*p1          # p1 is P^n,m.
         bt -= a[n]*w*d1          # d1 is dP^n,m/dt.
@@ -208,19 +347,18 @@ def igrf_geo(r,theta,phi):
 
     # Similarly for P^n,m
     l0 = 0
-    for m in range(1,k):        # sum over m
+    for m in range(1,kmax):     # sum over m
         smf = np.sin(m*phi)     # sin(m*phi)
         cmf = np.cos(m*phi)     # cos(m*phi)
         p1,d1,p2,d2 = [p,d,0.,0]
         tbf = 0.
         l0 += m+1
         mn = l0
-        for n in range(m,k):    # sum over n
+        for n in range(m,kmax): # sum over n
             w=g[mn]*cmf+h[mn]*smf   # [g^n,m*cos(m*phi)+h^n,m*sin(m*phi)]
             br += b[n]*w*p1
             bt -= a[n]*w*d1
-            tp = p1
-            if smlst: tp = d1
+            tp = np.where(smlst, d1, p1)
             tbf += a[n]*(g[mn]*smf-h[mn]*cmf)*tp
             xk = rec[mn]
             d0 = ct*d1-st*p1-xk*d2   # dP^n,m/dt = ct*dP^n-1,m/dt - st*P_n-1,m - K^n,m*dP^n-2,m/dt
@@ -236,22 +374,21 @@ def igrf_geo(r,theta,phi):
         tbf *= m
         bf += tbf
 
-    if smlst:
-        if ct < 0.: bf = -bf
-    else: bf /= st
+    bf = np.where(smlst, np.where(ct < 0., -bf, bf), bf/np.where(smlst, 1., st))
 
     return br,bt,bf
 
 
 
 
-def dip(xgsm,ygsm,zgsm):
+def dip(xgsm,ygsm,zgsm, ctx=None):
     """
     Calculates gsm components of a geodipole field with the dipole moment
     corresponding to the epoch, specified by calling subroutine recalc (should be
     invoked before the first use of this one and in case the date/time was changed).
 
     :param xgsm,ygsm,zgsm: GSM coordinates in Re (1 Re = 6371.2 km)
+    :param ctx: a GeopackContext, if None, the context set by the last recalc is used.
     :return: bxgsm,bygsm,gzgsm. Field components in gsm system, in nanotesla.
 
     Last modification: May 4, 2005.
@@ -260,7 +397,8 @@ def dip(xgsm,ygsm,zgsm):
 
     # common /geopack1/ aaa(10),sps,cps,bbb(23)
     # common /geopack2/ g(105),h(105),rec(105)
-    global aaa, sps,cps, bbb, g, h, rec
+    ctx = get_context(ctx)
+    sps, cps, g, h = ctx.sps, ctx.cps, ctx.g, ctx.h
 
     dipmom = np.sqrt(g[1]**2+g[2]**2+h[2]**2)
 
@@ -277,20 +415,22 @@ def dip(xgsm,ygsm,zgsm):
     return bxgsm,bygsm,bzgsm
 
 
-def dip_gsw(xgsw,ygsw,zgsw):
+def dip_gsw(xgsw,ygsw,zgsw, ctx=None):
     """
     Calculates gsm components of a geodipole field with the dipole moment
     corresponding to the epoch, specified by calling subroutine recalc (should be
     invoked before the first use of this one and in case the date/time was changed).
 
     :param xgsw,ygsw,zgsw: GSW coordinates in Re (1 Re = 6371.2 km)
+    :param ctx: a GeopackContext, if None, the context set by the last recalc is used.
     :return: bxgsm,bygsm,gzgsm. Field components in gsm system, in nanotesla.
 
     Author: Sheng Tian
     """
-    xgsm,ygsm,zgsm = gswgsm(xgsw,ygsw,zgsw, 1)
-    bxgsm,bygsm,bzgsm = dip(xgsm,ygsm,zgsm)
-    return gswgsm(bxgsm,bygsm,bzgsm, -1)
+    ctx = get_context(ctx)
+    xgsm,ygsm,zgsm = gswgsm(xgsw,ygsw,zgsw, 1, ctx=ctx)
+    bxgsm,bygsm,bzgsm = dip(xgsm,ygsm,zgsm, ctx=ctx)
+    return gswgsm(bxgsm,bygsm,bzgsm, -1, ctx=ctx)
 
 
 def recalc(ut, vxgse=-400,vygse=0,vzgse=0):
@@ -303,12 +443,44 @@ def recalc(ut, vxgse=-400,vygse=0,vzgse=0):
         igrf_geo, igrf_gsm, dip, geomag, geogsm, magsm, smgsm, gsmgse, geigeo.
     There is no need to repeatedly invoke recalc, if multiple calculations are made for the same date and time.
 
+    The prepared quantities are kept as module globals and as the default context of the
+    subroutines above. Use recalc_context to get a context without touching the module state.
+
     :param ut: Universal time in second.
     :param v[xyz]gse: The solar wind velocity expressed in GSE.
     :return: psi. Dipole tilt angle in radian.
 
     Python version by Sheng Tian
     """
+    global _context
+
+    ctx = recalc_context(ut, vxgse,vygse,vzgse)
+    # Keep the globals of the common blocks /geopack1/ and /geopack2/ for the legacy API.
+    globals().update(ctx.as_dict())
+    _context = ctx
+    return ctx.psi
+
+
+def recalc_context(ut, vxgse=-400,vygse=0,vzgse=0):
+    """
+    Same as recalc, but returns the prepared quantities as a GeopackContext instead of
+    storing them in the module globals. The context can be passed to the subroutines
+    igrf_geo, igrf_gsm, dip, geomag, geogsm, magsm, smgsm, gsmgse, geigeo, gswgsm, trace, etc.
+    through the keyword argument ctx.
+
+    A context can also be prepared for many epochs at once by passing an array of ut (and optionally
+    arrays of v[xyz]gse). Then the quantities in the context are 1-D arrays, one element per epoch, and
+    the coordinate transformations (geomag, geigeo, magsm, smgsm, gsmgse, geogsm, gswgsm, transform)
+    with this context convert each input point with the epoch of the same index. The field models and
+    tracing subroutines require a single-epoch context.
+
+    :param ut: Universal time in second, a float or an array.
+    :param v[xyz]gse: The solar wind velocity expressed in GSE.
+    :return: ctx. A GeopackContext, the dipole tilt angle in radian is ctx.psi.
+    """
+    if np.ndim(ut) > 0:
+        ut = np.ravel(np.asarray(ut, dtype=float))
+        vxgse,vygse,vzgse = [np.ravel(v) if np.ndim(v) > 0 else v for v in (vxgse,vygse,vzgse)]
 
 
     # The common block /geopack1/ contains elements of the rotation matrices and other
@@ -326,61 +498,23 @@ def recalc(ut, vxgse=-400,vygse=0,vzgse=0):
     # cgst/sgst - cos/sin of gst.
     # ds3.
     # ba(6).
-    global st0,ct0,sl0,cl0,ctcl,stcl,ctsl,stsl,sfi,cfi,sps,cps, \
-        shi,chi,hi,psi,xmut,ds3,cgst,sgst,ba, \
-        a11,a21,a31,a12,a22,a32,a13,a23,a33, \
-        e11,e21,e31,e12,e22,e32,e13,e23,e33
+    # All of them are collected in the returned context, except ds3, which is passed to rhand by the tracing
+    # subroutines.
 
     # The common block /geopack2/ contains coefficients of the IGRF field model, calculated
     # for a given year and day from their standard epoch values. the array rec contains
     # coefficients used in the recursion relations for legendre associate polynomials.
     # common /geopack2/ g(105),h(105),rec(105)
-    global g,h,rec
 
 
-    # Compute the m,n related coefficients (following the notation in Davis 2004):
-    # 1. The Schmidt quasi-normalization: S_n,m, which normalizes the associated Legendre polynomials P_n^m
-    #    to the Guassian normalized associated Legendre polynomials P^n,m.
-    #
-    #    Since g_n^m * P_n^m should be constant, mutiplying S_n,m to g_n^m is equivalently converting P_n^m to P^n,m.
-    #    The benefit of doing so is that P^n,m follows simple recursive form, c.f. Eq (16 a-c) and Eq(17 a-b).
-    # 2. rec[mn], which used in the recursion relation.
-    k = 14
-    nmn = np.int32((k+1)*k/2)
-
-    # rec[mn].
-    rec = np.empty(nmn,dtype=float)
-    mn = 0
-    for n in range(k):                  # K^1,m = 0, Eq (17a), automatically done.
-        n2 = 2*n+1
-        n2 = n2*(n2-2)
-        for m in range(n+1):
-            rec[mn] = (n-m)*(n+m)/n2    # K^n,m = (n-m)(n+m)/(2n+1)(2n-1), Eq (17b)
-            mn += 1
-
-    # coefficients for a given time, g_n^m(t), h_n^m(t)
+    # Get the IGRF coefficients for the given time, multiplied by the Schmidt normalization factors,
+    # i.e., g_n^m(t), h_n^m(t) are converted to g^n,m, h^n,m, Eq (14 a-b). The array rec contains the
+    # coefficients K^n,m used in the recursion relations, see schmidt_factors.
     g,h = load_igrf(ut)
 
-    # now multiply them by schmidt normalization factors:
-    s = 1.                      # S_0,0 = 1, Eq (18a)
-    mn = 0
-    for n in range(1,k):
-        mn += 1                 # skip m=0.
-        s *= (2*n-1)/n
-        g[mn] *= s              # S_n,0 = S_n-1,0 * (2n-1)/n, Eq (18b)
-        h[mn] *= s
-        p = s
-        for m in range(1,n+1):
-            if m == 1: aa = 2   # aa = delta_m,1
-            else: aa = 1
-            p *= np.sqrt(aa*(n-m+1)/(n+m))
-            mn += 1
-            g[mn] *= p          # S_n,m = S_n,m-1 * sqrt(aa(n-m+1)/(n+m)), Eq (18c)
-            h[mn] *= p          # now g/h are actually g^n,m, Eq (14 a-b)
-
-    g10=-g[1]
-    g11=-g[2]
-    h11=-h[2]
+    g10=-g[...,1]
+    g11=-g[...,2]
+    h11=-h[...,2]
 
     # Now calculate the components of the unit vector ezmag in geo coord.system:
     # sin(teta0)*cos(lambda0), sin(teta0)*sin(lambda0), and cos(teta0)
@@ -531,7 +665,15 @@ def recalc(ut, vxgse=-400,vygse=0,vzgse=0):
     a32=-zgsm_x*sgst+zgsm_y*cgst
     a33= zgsm_z
 
-    return psi
+    return GeopackContext(
+        ut=ut, vxgse=vxgse, vygse=vygse, vzgse=vzgse,
+        st0=st0, ct0=ct0, sl0=sl0, cl0=cl0, ctcl=ctcl, stcl=stcl, ctsl=ctsl, stsl=stsl,
+        sfi=sfi, cfi=cfi, sps=sps, cps=cps, shi=shi, chi=chi, hi=hi, psi=psi, xmut=xmut,
+        cgst=cgst, sgst=sgst,
+        a11=a11, a21=a21, a31=a31, a12=a12, a22=a22, a32=a32, a13=a13, a23=a23, a33=a33,
+        e11=e11, e21=e21, e31=e31, e12=e12, e22=e22, e32=e32, e13=e13, e23=e23, e33=e33,
+        g=g, h=h, rec=rec,
+    )
 
 def sun(ut):
     """
@@ -613,7 +755,7 @@ def sun(ut):
     return gmst,l,srasn,sdec,e
 
 
-def gswgsm(p1,p2,p3, j):
+def gswgsm(p1,p2,p3, j, ctx=None):
     """
     Converts gsm to gsw coordinates or vice versa.
                        j>0                       j<0
@@ -622,9 +764,12 @@ def gswgsm(p1,p2,p3, j):
 
     :param p1,p2,p3: input position
     :param j: flag
+    :param ctx: a GeopackContext, if None, the context set by the last recalc is used.
     :return: output position
     """
-    global e11, e21, e31, e12, e22, e32, e13, e23, e33
+    ctx = get_context(ctx)
+    e11, e21, e31, e12, e22, e32, e13, e23, e33 = \
+        ctx.e11, ctx.e21, ctx.e31, ctx.e12, ctx.e22, ctx.e32, ctx.e13, ctx.e23, ctx.e33
 
     if j > 0:
         xgsw,ygsw,zgsw = [p1,p2,p3]
@@ -640,7 +785,7 @@ def gswgsm(p1,p2,p3, j):
         return xgsw,ygsw,zgsw
 
 
-def geomag(p1,p2,p3, j):
+def geomag(p1,p2,p3, j, ctx=None):
     """
     Converts geographic (geo) to dipole (mag) coordinates or vice versa.
                    j>0                       j<0
@@ -649,6 +794,7 @@ def geomag(p1,p2,p3, j):
 
     :param p1,p2,p3: input position
     :param j: flag
+    :param ctx: a GeopackContext, if None, the context set by the last recalc is used.
     :return: output position
     """
 
@@ -657,7 +803,9 @@ def geomag(p1,p2,p3, j):
     #     /b/  if the values of time have been changed
 
     # common /geopack1/ st0,ct0,sl0,cl0,ctcl,stcl,ctsl,stsl,ab(19),bb(8)
-    global st0,ct0, sl0,sl0, ctcl,stcl, ctsl,stsl
+    ctx = get_context(ctx)
+    st0,ct0, sl0,cl0, ctcl,stcl, ctsl,stsl = \
+        ctx.st0, ctx.ct0, ctx.sl0, ctx.cl0, ctx.ctcl, ctx.stcl, ctx.ctsl, ctx.stsl
 
     if j > 0:
         xgeo,ygeo,zgeo = [p1,p2,p3]
@@ -672,7 +820,7 @@ def geomag(p1,p2,p3, j):
         zgeo = zmag*ct0-xmag*st0
         return xgeo,ygeo,zgeo
 
-def geigeo(p1,p2,p3, j):
+def geigeo(p1,p2,p3, j, ctx=None):
     """
     Converts equatorial inertial (gei) to geographical (geo) coords or vice versa.
                    j>0                       j<0
@@ -681,6 +829,7 @@ def geigeo(p1,p2,p3, j):
 
     :param p1,p2,p3: input position
     :param j: flag
+    :param ctx: a GeopackContext, if None, the context set by the last recalc is used.
     :return: output position
     """
 
@@ -689,7 +838,8 @@ def geigeo(p1,p2,p3, j):
     #     /b/  if the values of time have been changed
 
     # common /geopack1/ a(27),cgst,sgst,b(6)
-    global cgst,sgst
+    ctx = get_context(ctx)
+    cgst,sgst = ctx.cgst, ctx.sgst
 
     if j > 0:
         xgei,ygei,zgei = [p1,p2,p3]
@@ -704,7 +854,7 @@ def geigeo(p1,p2,p3, j):
         zgei = zgeo
         return xgei,ygei,zgei
 
-def magsm(p1,p2,p3, j):
+def magsm(p1,p2,p3, j, ctx=None):
     """
     Converts dipole (mag) to solar magnetic (sm) coordinates or vice versa
                    j>0                       j<0
@@ -713,6 +863,7 @@ def magsm(p1,p2,p3, j):
 
     :param p1,p2,p3: input position
     :param j: flag
+    :param ctx: a GeopackContext, if None, the context set by the last recalc is used.
     :return: output position
     """
 
@@ -721,7 +872,8 @@ def magsm(p1,p2,p3, j):
     #     /b/  if the values of time have been changed
 
     # common /geopack1/ a(8),sfi,cfi,b(7),ab(10),ba(8)
-    global sfi,cfi
+    ctx = get_context(ctx)
+    sfi,cfi = ctx.sfi, ctx.cfi
 
     if j > 0:
         xmag,ymag,zmag = [p1,p2,p3]
@@ -736,7 +888,7 @@ def magsm(p1,p2,p3, j):
         zmag = zsm
         return xmag,ymag,zmag
 
-def gsmgse(p1,p2,p3, j):
+def gsmgse(p1,p2,p3, j, ctx=None):
     """
     converts geocentric solar magnetospheric (gsm) coords to solar ecliptic (gse) ones or vice versa.
                    j>0                       j<0
@@ -745,11 +897,13 @@ def gsmgse(p1,p2,p3, j):
 
     :param p1,p2,p3: input position
     :param j: flag
+    :param ctx: a GeopackContext, if None, the context set by the last recalc is used.
     :return: output position
     """
 
     # common /geopack1/ a(12),shi,chi,ab(13),ba(8)
-    global shi,chi
+    ctx = get_context(ctx)
+    shi,chi = ctx.shi, ctx.chi
 
     if j > 0:
         xgsm,ygsm,zgsm = [p1,p2,p3]
@@ -764,7 +918,7 @@ def gsmgse(p1,p2,p3, j):
         zgsm = zgse*chi-ygse*shi
         return xgsm,ygsm,zgsm
 
-def smgsm(p1,p2,p3, j):
+def smgsm(p1,p2,p3, j, ctx=None):
     """
     Converts solar magnetic (sm) to geocentric solar magnetospheric (gsm) coordinates or vice versa.
                    j>0                       j<0
@@ -773,6 +927,7 @@ def smgsm(p1,p2,p3, j):
 
     :param p1,p2,p3: input position
     :param j: flag
+    :param ctx: a GeopackContext, if None, the context set by the last recalc is used.
     :return: output position
     """
 
@@ -781,7 +936,8 @@ def smgsm(p1,p2,p3, j):
     #     /b/  if the values of time have been changed
 
     # common /geopack1/ a(10),sps,cps,b(15),ab(8)
-    global sps,cps
+    ctx = get_context(ctx)
+    sps,cps = ctx.sps, ctx.cps
 
     if j > 0:
         xsm,ysm,zsm = [p1,p2,p3]
@@ -796,7 +952,7 @@ def smgsm(p1,p2,p3, j):
         zsm = xgsm*sps+zgsm*cps
         return xsm,ysm,zsm
 
-def geogsm(p1,p2,p3, j):
+def geogsm(p1,p2,p3, j, ctx=None):
     """
     Converts geographic (geo) to geocentric solar magnetospheric (gsm) coordinates or vice versa.
                    j>0                       j<0
@@ -805,6 +961,7 @@ def geogsm(p1,p2,p3, j):
 
     :param p1,p2,p3: input position
     :param j: flag
+    :param ctx: a GeopackContext, if None, the context set by the last recalc is used.
     :return: output position
     """
 
@@ -813,7 +970,9 @@ def geogsm(p1,p2,p3, j):
     #     /b/  if the values of time have been changed
 
     # common /geopack1/aa(17),a11,a21,a31,a12,a22,a32,a13,a23,a33,d,b(8)
-    global a11,a21,a31,a12,a22,a32,a13,a23,a33
+    ctx = get_context(ctx)
+    a11,a21,a31,a12,a22,a32,a13,a23,a33 = \
+        ctx.a11, ctx.a21, ctx.a31, ctx.a12, ctx.a22, ctx.a32, ctx.a13, ctx.a23, ctx.a33
 
     if j > 0:
         xgeo,ygeo,zgeo = [p1,p2,p3]
@@ -829,6 +988,79 @@ def geogsm(p1,p2,p3, j):
         return xgeo,ygeo,zgeo
 
 
+coordinate_systems = ('geo', 'gei', 'mag', 'sm', 'gsm', 'gse', 'gsw')
+
+
+def rotation_matrix(cs_in, cs_out, ctx=None):
+    """
+    Returns the rotation matrix converting the vectors from the coordinate system cs_in to cs_out.
+    The matrix is composed of the matrices from geo to cs_in and to cs_out, which are built from the
+    same elements as used in geigeo, geomag, magsm, geogsm, smgsm, gsmgse, and gswgsm.
+
+    :param cs_in, cs_out: 'geo', 'gei', 'mag', 'sm', 'gsm', 'gse', or 'gsw'.
+    :param ctx: a GeopackContext, if None, the context set by the last recalc is used.
+    :return: m. The matrix of the shape (3,3), or (n,3,3) for a context of n epochs.
+    """
+    ctx = get_context(ctx)
+    m_in = _rotation_matrix_from_geo(cs_in, ctx)
+    m_out = _rotation_matrix_from_geo(cs_out, ctx)
+    # the inverse of a rotation matrix is its transpose.
+    return np.einsum('...ij,...kj->...ik', m_out, m_in)
+
+
+def _rotation_matrix_from_geo(cs, ctx):
+    cs = cs.lower()
+    if cs not in coordinate_systems:
+        raise ValueError('Unknown coordinate system: {}!'.format(cs))
+    zero = np.zeros_like(ctx.cgst)
+    one = np.ones_like(ctx.cgst)
+
+    def stack(rows):
+        return np.moveaxis(np.array(rows, dtype=float), (0,1), (-2,-1))
+
+    if cs == 'geo':
+        return stack([[one,zero,zero], [zero,one,zero], [zero,zero,one]])
+    if cs == 'gei':
+        return stack([[ctx.cgst,-ctx.sgst,zero], [ctx.sgst,ctx.cgst,zero], [zero,zero,one]])
+    m_mag = stack([[ctx.ctcl,ctx.ctsl,-ctx.st0], [-ctx.sl0,ctx.cl0,zero], [ctx.stcl,ctx.stsl,ctx.ct0]])
+    if cs == 'mag':
+        return m_mag
+    if cs == 'sm':
+        m_sm = stack([[ctx.cfi,-ctx.sfi,zero], [ctx.sfi,ctx.cfi,zero], [zero,zero,one]])
+        return np.einsum('...ij,...jk->...ik', m_sm, m_mag)
+    m_gsm = stack([[ctx.a11,ctx.a12,ctx.a13], [ctx.a21,ctx.a22,ctx.a23], [ctx.a31,ctx.a32,ctx.a33]])
+    if cs == 'gsm':
+        return m_gsm
+    if cs == 'gse':
+        m = stack([[one,zero,zero], [zero,ctx.chi,-ctx.shi], [zero,ctx.shi,ctx.chi]])
+    else:
+        m = stack([[ctx.e11,ctx.e21,ctx.e31], [ctx.e12,ctx.e22,ctx.e32], [ctx.e13,ctx.e23,ctx.e33]])
+    return np.einsum('...ij,...jk->...ik', m, m_gsm)
+
+
+def transform(p1,p2,p3, cs_in, cs_out, ut=None, vxgse=-400,vygse=0,vzgse=0, ctx=None):
+    """
+    Converts the vectors between any two of the coordinate systems geo, gei, mag, sm, gsm, gse, and gsw,
+    with one epoch per vector. The rotation matrices of all the epochs are computed at once and
+    applied as batched matrix products.
+
+    :param p1,p2,p3: input vector components, arrays of the same shape (n,) or scalars.
+    :param cs_in, cs_out: 'geo', 'gei', 'mag', 'sm', 'gsm', 'gse', or 'gsw'.
+    :param ut: ut sec of the vectors, a float or an array of the shape (n,).
+    :param v[xyz]gse: The solar wind velocity expressed in GSE, used for gsw, floats or arrays of the shape (n,).
+    :param ctx: a GeopackContext used if ut is None, e.g., from recalc_context(ut) with an array of ut.
+        If both are None, the context set by the last recalc is used.
+    :return: output vector components, with the shape of the inputs.
+    """
+    if ut is not None:
+        ctx = recalc_context(ut, vxgse,vygse,vzgse)
+    m = rotation_matrix(cs_in, cs_out, ctx)
+    p = np.stack(np.broadcast_arrays(
+        np.asarray(p1, dtype=float), np.asarray(p2, dtype=float), np.asarray(p3, dtype=float)), axis=-1)
+    q = np.einsum('...ij,...j->...i', m, p)
+    return q[...,0], q[...,1], q[...,2]
+
+
 def geodgeo(p1,p2, j):
     """
     This subroutine (1) converts vertical local height (altitude) h and geodetic
@@ -922,15 +1154,11 @@ def sphcar(p1,p2,p3, j):
         x,y,z = [p1,p2,p3]
         sq=x**2+y**2
         r=np.sqrt(sq+z**2)
-        if sq != 0:
-            sq=np.sqrt(sq)
-            phi=np.arctan2(y,x)
-            theta=np.arctan2(sq,z)
-            if phi < 0: phi += 2*np.pi
-        else:
-            phi=0.
-            if z < 0: theta = np.pi
-            else: theta = 0
+        pole = sq == 0
+        sq=np.sqrt(sq)
+        phi=np.where(pole, 0., np.arctan2(y,x))
+        phi=np.where(phi < 0, phi+2*np.pi, phi)
+        theta=np.where(pole, np.where(z < 0, np.pi, 0.), np.arctan2(sq,z))
         return r,theta,phi
 
 def bspcar(theta,phi,br,btheta,bphi):
@@ -973,12 +1201,10 @@ def bcarsp(x,y,z,bx,by,bz):
     r=np.sqrt(rho2+z**2)
     rho=np.sqrt(rho2)
 
-    if rho != 0:
-        cphi=x/rho
-        sphi=y/rho
-    else:
-        cphi=1.
-        sphi=0.
+    on_axis = rho == 0
+    rho_ = np.where(on_axis, 1., rho)
+    cphi=np.where(on_axis, 1., x/rho_)
+    sphi=np.where(on_axis, 0., y/rho_)
 
     ct=z/r
     st=rho/r
@@ -1002,15 +1228,15 @@ def call_external_model(exname, par, ps, x,y,z):
     else:
         raise ValueError
 
-def call_internal_model(inname, x,y,z):
+def call_internal_model(inname, x,y,z, ctx=None):
     if inname == 'dipole':
-        return dip(x,y,z)
+        return dip(x,y,z, ctx=ctx)
     elif inname == 'igrf':
-        return igrf_gsm(x,y,z)
+        return igrf_gsm(x,y,z, ctx=ctx)
     else:
         raise ValueError
 
-def rhand(x,y,z,parmod,exname,inname):
+def rhand(x,y,z,parmod,exname,inname, ds3, ctx=None):
     """
     Calculates the components of the right hand side vector in the geomagnetic field
     line equation  (a subsidiary subroutine for the subroutine step)
@@ -1019,16 +1245,18 @@ def rhand(x,y,z,parmod,exname,inname):
     :param parmod:
     :param exname: name of the subroutine for the external field.
     :param inname: name of the subroutine for the internal field.
+    :param ds3: -ds/3, ds is the step size.
+    :param ctx: a GeopackContext, if None, the context set by the last recalc is used.
 
     Last mofification:  March 31, 2003
     Author:  N.A. Tsyganenko
     :return: r1,r2,r3.
     """
     #  common /geopack1/ a(15),psi,aa(10),ds3,bb(8)
-    global a, psi, aa, ds3, bb
+    ctx = get_context(ctx)
 
-    bxgsm,bygsm,bzgsm = call_external_model(exname, parmod, psi, x,y,z)
-    hxgsm,hygsm,hzgsm = call_internal_model(inname, x,y,z)
+    bxgsm,bygsm,bzgsm = call_external_model(exname, parmod, ctx.psi, x,y,z)
+    hxgsm,hygsm,hzgsm = call_internal_model(inname, x,y,z, ctx=ctx)
 
     bx=bxgsm+hxgsm
     by=bygsm+hygsm
@@ -1041,7 +1269,7 @@ def rhand(x,y,z,parmod,exname,inname):
 
     return r1,r2,r3
 
-def step(x,y,z, ds,errin,parmod,exname,inname):
+def step(x,y,z, ds,errin,parmod,exname,inname, ctx=None):
     """
     Re-calculates {x,y,z}, making a step along a field line.
     model version, the array parmod contains input parameters for that model
@@ -1052,6 +1280,7 @@ def step(x,y,z, ds,errin,parmod,exname,inname):
     :param parmod: contains input parameters for that model
     :param exname: name of the subroutine for the external field.
     :param inname: name of the subroutine for the internal field.
+    :param ctx: a GeopackContext, if None, the context set by the last recalc is used.
     :return: x,y,z. The output position
 
     Last mofification:  March 31, 2003
@@ -1059,7 +1288,8 @@ def step(x,y,z, ds,errin,parmod,exname,inname):
     """
 
     # common /geopack1/ a(26),ds3,b(8)
-    global a, ds3, b
+    # ds3 is kept local, so that several field lines can be traced concurrently.
+    ctx = get_context(ctx)
 
     if errin <=0: raise ValueError
     errcur = errin
@@ -1068,11 +1298,11 @@ def step(x,y,z, ds,errin,parmod,exname,inname):
 
     while (errcur >= errin) & (i < maxloop):
         ds3=-ds/3.
-        r11,r12,r13 = rhand(x,y,z,parmod,exname,inname)
-        r21,r22,r23 = rhand(x+r11,y+r12,z+r13,parmod,exname,inname)
-        r31,r32,r33 = rhand(x+.5*(r11+r21),y+.5*(r12+r22),z+.5*(r13+r23),parmod,exname,inname)
-        r41,r42,r43 = rhand(x+.375*(r11+3.*r31),y+.375*(r12+3.*r32),z+.375*(r13+3.*r33),parmod,exname,inname)
-        r51,r52,r53 = rhand(x+1.5*(r11-3.*r31+4.*r41),y+1.5*(r12-3.*r32+4.*r42),z+1.5*(r13-3.*r33+4.*r43),parmod,exname,inname)
+        r11,r12,r13 = rhand(x,y,z,parmod,exname,inname, ds3=ds3, ctx=ctx)
+        r21,r22,r23 = rhand(x+r11,y+r12,z+r13,parmod,exname,inname, ds3=ds3, ctx=ctx)
+        r31,r32,r33 = rhand(x+.5*(r11+r21),y+.5*(r12+r22),z+.5*(r13+r23),parmod,exname,inname, ds3=ds3, ctx=ctx)
+        r41,r42,r43 = rhand(x+.375*(r11+3.*r31),y+.375*(r12+3.*r32),z+.375*(r13+3.*r33),parmod,exname,inname, ds3=ds3, ctx=ctx)
+        r51,r52,r53 = rhand(x+1.5*(r11-3.*r31+4.*r41),y+1.5*(r12-3.*r32+4.*r42),z+1.5*(r13-3.*r33+4.*r43),parmod,exname,inname, ds3=ds3, ctx=ctx)
         errcur=np.abs(r11-4.5*r31+4.*r41-.5*r51)+np.abs(r12-4.5*r32+4.*r42-.5*r52)+np.abs(r13-4.5*r33+4.*r43-.5*r53)
         if errcur < errin: break
 
@@ -1090,7 +1320,7 @@ def step(x,y,z, ds,errin,parmod,exname,inname):
 
     return x,y,z
 
-def trace(xi,yi,zi,dir,rlim=10,r0=1,parmod=2,exname='t89',inname='igrf',maxloop=1000):
+def trace(xi,yi,zi,dir,rlim=10,r0=1,parmod=2,exname='t89',inname='igrf',maxloop=1000, ctx=None):
     """
     Traces a field line from an arbitrary point of space to the earth's surface or
     to a model limiting boundary.
@@ -1120,6 +1350,8 @@ def trace(xi,yi,zi,dir,rlim=10,r0=1,parmod=2,exname='t89',inname='igrf',maxloop=
         The concrete meaning of the components of parmod depends on a specific version of the external field model.
     :param exname: name of the subroutine for the external field.
     :param inname: name of the subroutine for the internal field.
+    :param maxloop: the maximal number of steps.
+    :param ctx: a GeopackContext, if None, the context set by the last recalc is used.
     :return:
         xf,yf,zf. GSM coords of the last calculated point of a field line
         xx,yy,zz. Arrays containing coords of field line points. Here their maximal length was assumed equal to 999.
@@ -1130,7 +1362,7 @@ def trace(xi,yi,zi,dir,rlim=10,r0=1,parmod=2,exname='t89',inname='igrf',maxloop=
     """
 
     # common /geopack1/ aa(26),dd,bb(8)
-    global aa, dd, bb, ds3
+    ctx = get_context(ctx)
 
     err, l, ds, x,y,z, dd, al = 0.001, 0, 0.5*dir, xi,yi,zi, dir, 0.
     xx = np.array([x])
@@ -1141,7 +1373,7 @@ def trace(xi,yi,zi,dir,rlim=10,r0=1,parmod=2,exname='t89',inname='igrf',maxloop=
     # vector, and to determine the initial direction of the tracing (i.e., either away
     # or towards Earth):
     ds3 = -ds/3.
-    r1,r2,r3 = rhand(x,y,z,parmod,exname,inname)
+    r1,r2,r3 = rhand(x,y,z,parmod,exname,inname, ds3=ds3, ctx=ctx)
 
     # |ad|=0.01 and its sign follows the rule:
     # (1) if dir=1 (tracing antiparallel to B vector) then the sign of ad is the same as of Br
@@ -1191,7 +1423,7 @@ def trace(xi,yi,zi,dir,rlim=10,r0=1,parmod=2,exname='t89',inname='igrf',maxloop=
                 al = fc*(r-r0+0.2)
                 ds = dir*al
         rr=r
-        x,y,z = step(x,y,z,ds,err,parmod,exname,inname)
+        x,y,z = step(x,y,z,ds,err,parmod,exname,inname, ctx=ctx)
         xx = np.append(xx,x)
         yy = np.append(yy,y)
         zz = np.append(zz,z)
@@ -1199,6 +1431,197 @@ def trace(xi,yi,zi,dir,rlim=10,r0=1,parmod=2,exname='t89',inname='igrf',maxloop=
 
     return x,y,z, xx,yy,zz
 
+def step_batch(x,y,z, ds,errin,parmod,exname,inname, maxloop=100, ctx=None):
+    """
+    Makes a step along each of many field lines at once. This is the array version of step:
+    the step size is controlled line by line, i.e., the step of a line is halved until its
+    error is below errin, independently of the other lines.
+
+    :param x,y,z: 1-d arrays of the input positions.
+    :param ds: the step sizes, a scalar or an array with the same shape as x.
+    :param errin: the permissible error value
+    :param parmod: contains input parameters for that model
+    :param exname: name of the subroutine for the external field.
+    :param inname: name of the subroutine for the internal field.
+    :param maxloop: the maximal number of the halvings of the step size.
+    :param ctx: a GeopackContext, if None, the context set by the last recalc is used.
+    :return: x,y,z, ok. The output positions, and a boolean array, which is False for the lines
+        whose error was still too large after maxloop halvings (their positions are unchanged).
+    """
+
+    ctx = get_context(ctx)
+
+    if errin <=0: raise ValueError
+    x,y,z = [np.array(p, dtype=float) for p in (x,y,z)]
+    ds = np.array(np.broadcast_to(ds, x.shape), dtype=float)
+    ok = np.zeros(x.shape, dtype=bool)
+
+    # the indices of the lines whose step has not been accepted yet.
+    ind = np.arange(x.size)
+    for i in range(maxloop):
+        if ind.size == 0: break
+        xi,yi,zi = x[ind],y[ind],z[ind]
+        ds3=-ds[ind]/3.
+        r11,r12,r13 = rhand(xi,yi,zi,parmod,exname,inname, ds3=ds3, ctx=ctx)
+        r21,r22,r23 = rhand(xi+r11,yi+r12,zi+r13,parmod,exname,inname, ds3=ds3, ctx=ctx)
+        r31,r32,r33 = rhand(xi+.5*(r11+r21),yi+.5*(r12+r22),zi+.5*(r13+r23),parmod,exname,inname, ds3=ds3, ctx=ctx)
+        r41,r42,r43 = rhand(xi+.375*(r11+3.*r31),yi+.375*(r12+3.*r32),zi+.375*(r13+3.*r33),parmod,exname,inname, ds3=ds3, ctx=ctx)
+        r51,r52,r53 = rhand(xi+1.5*(r11-3.*r31+4.*r41),yi+1.5*(r12-3.*r32+4.*r42),zi+1.5*(r13-3.*r33+4.*r43),parmod,exname,inname, ds3=ds3, ctx=ctx)
+        errcur=np.abs(r11-4.5*r31+4.*r41-.5*r51)+np.abs(r12-4.5*r32+4.*r42-.5*r52)+np.abs(r13-4.5*r33+4.*r43-.5*r53)
+
+        done = errcur < errin
+        j = ind[done]
+        x[j] = xi[done]+0.5*(r11+4.*r41+r51)[done]
+        y[j] = yi[done]+0.5*(r12+4.*r42+r52)[done]
+        z[j] = zi[done]+0.5*(r13+4.*r43+r53)[done]
+        ok[j] = True
+
+        ind = ind[~done]
+        ds[ind] *= 0.5
+
+    return x,y,z, ok
+
+
+def trace_batch(xi,yi,zi,dir,rlim=10,r0=1,parmod=2,exname='t89',inname='igrf',maxloop=1000,
+                return_lines=False, n_workers=None, n_chunks=None, ctx=None):
+    """
+    Traces many field lines simultaneously, e.g., from the points along a satellite orbit or
+    from a grid of seed points. This is the array version of trace: all the lines, which are
+    still being traced, are advanced together by one step per iteration, with the same step
+    size control and termination rules as in trace, so that each line ends at the same point
+    as it would in trace (to within the round-off errors).
+
+    :param xi,yi,zi: gsm coords of the initial points (in earth radii), scalars or arrays.
+    :param dir: sign of the tracing direction (see trace), a scalar or an array for each line.
+    :param rlim: upper limit of the geocentric distance, where the tracing is terminated.
+    :param r0: radius of a sphere (in re) for which the field line endpoint coordinates should be calculated.
+    :param parmod: the iopt for T89, or the 10-element array of the model parameters for the other Txx models.
+    :param exname: name of the subroutine for the external field.
+    :param inname: name of the subroutine for the internal field.
+    :param maxloop: the maximal number of steps.
+    :param return_lines: if True, the coordinates of the field line points are returned as well.
+    :param n_workers: if larger than 1, the lines are split into chunks, which are traced in a pool
+        of n_workers processes.
+    :param n_chunks: the number of the chunks for the process pool, by default n_workers.
+    :param ctx: a GeopackContext, if None, the context set by the last recalc is used.
+    :return:
+        xf,yf,zf. GSM coords of the last calculated points of the field lines, with the shape of the inputs.
+        flag. The termination flag of each line: 1 - the line reached the sphere of r0; 2 - the line reached
+            the outer boundary; 0 - maxloop steps were made; -1 - the step size control failed.
+        xx,yy,zz (if return_lines is True). Arrays of the shape of the inputs + (npoint,) containing the
+            coords of the field line points, where npoint is the number of the points of the longest line.
+            The shorter lines are padded with nan.
+    """
+
+    ctx = get_context(ctx)
+    xi,yi,zi,dir = np.broadcast_arrays(
+        np.asarray(xi, dtype=float), np.asarray(yi, dtype=float), np.asarray(zi, dtype=float),
+        np.asarray(dir, dtype=float))
+    shape = xi.shape
+    xi,yi,zi,dir = [np.ravel(p) for p in (xi,yi,zi,dir)]
+
+    if xi.size == 0:
+        # no line to trace, the outputs are empty with the shape of the inputs.
+        outputs = [np.empty(0), np.empty(0), np.empty(0), np.empty(0, dtype=np.int64)]
+        if return_lines:
+            outputs.extend([np.empty((0, 0)) for _ in range(3)])
+    elif n_workers is not None and n_workers > 1 and xi.size > 1:
+        import concurrent.futures
+        if n_chunks is None: n_chunks = n_workers
+        chunks = np.array_split(np.arange(xi.size), min(n_chunks, xi.size))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = [
+                executor.submit(
+                    _trace_lines, xi[ind],yi[ind],zi[ind],dir[ind], rlim,r0,parmod,exname,inname,maxloop,
+                    return_lines, ctx)
+                for ind in chunks]
+            results = [future.result() for future in futures]
+        if return_lines:
+            # pad the lines of the chunks to the same number of points.
+            npoint = max(result[4].shape[1] for result in results)
+            results = [
+                result[:4] + tuple(np.pad(line, ((0,0), (0,npoint-line.shape[1])), constant_values=np.nan)
+                                   for line in result[4:])
+                for result in results]
+        outputs = [np.concatenate(output, axis=0) for output in zip(*results)]
+    else:
+        outputs = _trace_lines(xi,yi,zi,dir, rlim,r0,parmod,exname,inname,maxloop, return_lines, ctx)
+
+    xf,yf,zf,flag = [np.reshape(p, shape) for p in outputs[:4]]
+    if not return_lines:
+        return xf,yf,zf, flag
+    xx,yy,zz = [np.reshape(p, shape+(p.shape[-1],)) for p in outputs[4:]]
+    return xf,yf,zf, flag, xx,yy,zz
+
+
+def _trace_lines(xi,yi,zi,dir, rlim,r0,parmod,exname,inname,maxloop, return_lines, ctx):
+    """
+    Traces the field lines from the 1-d arrays of the initial points. See trace_batch.
+    """
+
+    n = xi.size
+    err = 0.001
+    x,y,z = xi.copy(),yi.copy(),zi.copy()
+    ds = 0.5*dir
+    flag = np.zeros(n, dtype=np.int64)
+
+    # The points of the lines are kept in the buffers of (step, line), which are enlarged by doubling
+    # when needed, instead of appending the point at every step.
+    if return_lines:
+        nbuf = min(maxloop+1, 64)
+        buffers = [np.full((nbuf, n), np.nan) for i in range(3)]
+        for buffer, p in zip(buffers, (x,y,z)): buffer[0] = p
+        npoint = 1
+
+    # find out the sign of the radial component of the field vector, to determine the initial
+    # direction of the tracing (see trace):
+    r1,r2,r3 = rhand(x,y,z,parmod,exname,inname, ds3=-ds/3., ctx=ctx)
+    ad = np.where((x*r1+y*r2+z*r3) < 0, -0.01, 0.01)
+    rr = np.sqrt(x**2+y**2+z**2)+ad
+
+    # the indices of the lines being traced.
+    ind = np.arange(n)
+    for l in range(maxloop):
+        xa,ya,za = x[ind],y[ind],z[ind]
+        ryz=ya**2+za**2
+        r=np.sqrt(xa**2+ryz)
+        rra = rr[ind]
+
+        # check if the line hit the outer tracing boundary, or crossed the inner tracing boundary from outside.
+        outer = (r >= rlim) | (ryz >= 1600) | (xa >= 20)
+        inner = (r < r0) & (rra > r) & ~outer
+        flag[ind[outer]] = 2
+        flag[ind[inner]] = 1
+        going = ~(outer | inner)
+        ind,r,rra = ind[going],r[going],rra[going]
+        if ind.size == 0: break
+
+        # the same step size rules as in trace.
+        dsa, dira = ds[ind], dir[ind]
+        near = ~((r >= rra) | (r > 5))
+        fc = np.where((r-r0) < 0.05, 0.05, 0.2)
+        dsa = np.where(near, np.where(r >= 3, dira, dira*fc*(r-r0+0.2)), dsa)
+        ds[ind] = dsa
+        rr[ind] = r
+
+        xn,yn,zn, ok = step_batch(x[ind],y[ind],z[ind], dsa,err,parmod,exname,inname, ctx=ctx)
+        flag[ind[~ok]] = -1
+        ind,xn,yn,zn = ind[ok],xn[ok],yn[ok],zn[ok]
+        x[ind],y[ind],z[ind] = xn,yn,zn
+
+        if return_lines:
+            if l+1 >= nbuf:
+                nbuf = min(2*nbuf, maxloop+1)
+                buffers = [np.concatenate((buffer, np.full((nbuf-buffer.shape[0], n), np.nan))) for buffer in buffers]
+            for buffer, p in zip(buffers, (xn,yn,zn)): buffer[l+1,ind] = p
+            if ind.size > 0: npoint = l+2
+
+    outputs = [x,y,z, flag]
+    if return_lines:
+        outputs.extend(np.ascontiguousarray(buffer[:npoint].T) for buffer in buffers)
+    return tuple(outputs)
+
+
 def shuetal_mgnp(xn_pd,vel,bzimf,xgsm,ygsm,zgsm):
     """
     For any point of space with coordinates (xgsm,ygsm,zgsm) and specified conditions
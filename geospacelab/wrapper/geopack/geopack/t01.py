@@ -1,5 +1,7 @@
 import numpy as np
 
+from ._vectorize import evaluate_by_region
+
 def t01(parmod, ps, x, y, z):
     """
     Release date of this version: August 8, 2001.
@@ -46,15 +48,15 @@ def t01(parmod, ps, x, y, z):
     """
 
     a = np.array([
-        1.00000,2.48341,.58315,.31917,-.08796,-1.17266,3.57478,
-        -.06143,-.01113,.70924,-.01675,-.46056,-.87754,-.03025,
-        .18933,.28089,.16636,-.02932,.02592,-.23537,-.07659,
-        .09117,-.02492,.06816,.55417,.68918,-.04604,2.33521,
-        3.90147,1.28978,.03139,.98751,.21824,41.60182,1.12761,
-        .01376,1.02751,.02969,.15790,8.94335,28.31280,1.24364,.38013])
+        1.00000, 2.47341, 0.40791, 0.30429, -0.10637, -0.89108, 3.29350,
+        -0.05413, -0.00696, 1.07869, -0.02314, -0.66173, -0.68018, -0.03246,
+        0.02681, 0.28062, 0.16535, -0.02939, 0.02639, -0.24891, -0.08063,
+        0.08900, -0.02475, 0.05887, 0.57691, 0.65256, -0.03230, 2.24733,
+        4.10546, 1.13665, 0.05506, 0.97669, 0.21164, 0.64594, 1.12556, 0.01389,
+        1.02978, 0.02968, 0.15821, 9.00519, 28.17582, 1.35285, 0.42279])
 
     # The disclaimer below is temporarily disabled:
-    if x < -20:
+    if np.any(x < -20):
        print('Attention: the model is valid sunward from x=-15 re only, while you are trying to use it at x=', x)
        raise ValueError
 
@@ -130,10 +132,6 @@ def extall(iopgen,iopt,iopb,iopr,a,ntot,pdyn,dst,byimf,bzimf,vbimf1,vbimf2,ps,x,
 
     xappa3=xappa**3
 
-    xx=x*xappa
-    yy=y*xappa
-    zz=z*xappa
-
     sps=np.sin(ps)
 
     x0=a0_x0/xappa
@@ -147,7 +145,7 @@ def extall(iopgen,iopt,iopb,iopr,a,ntot,pdyn,dst,byimf,bzimf,vbimf1,vbimf2,ps,x,
         theta = 0.
     else:
         theta=np.arctan2(byimf,bzimf)
-        if theta <= 0: theta = 2*np.pi
+        if theta <= 0: theta += 2*np.pi
 
     ct=np.cos(theta)
     st=np.sin(theta)
@@ -169,22 +167,25 @@ def extall(iopgen,iopt,iopb,iopr,a,ntot,pdyn,dst,byimf,bzimf,vbimf1,vbimf2,ps,x,
     zss=z
 
     # begin iterative search of unwarped coords (to find sigma)
+    # For an array of points, the iteration of a point is frozen once it has converged.
     dd = 1.
-    while dd > 1e-6:
+    active = True
+    while np.any(active):
         xsold=xss
         zsold=zss
 
         rh=rh0+rh2*(zss/r)**2
         sinpsas=sps/(1+(r/rh)**3)**0.33333333
         cospsas=np.sqrt(1-sinpsas**2)
-        zss=x*sinpsas+z*cospsas
-        xss=x*cospsas-z*sinpsas
-        dd=np.abs(xss-xsold)+np.abs(zss-zsold)
+        zss=np.where(active, x*sinpsas+z*cospsas, zsold)
+        xss=np.where(active, x*cospsas-z*sinpsas, xsold)
+        dd=np.where(active, np.abs(xss-xsold)+np.abs(zss-zsold), dd)
+        active = dd > 1e-6
 
     rho2=y**2+zss**2
     asq=am**2
     xmxm=am+xss-x0
-    if xmxm < 0: xmxm = 0   # the boundary is a cylinder tailward of x=x0-am
+    xmxm=np.where(xmxm < 0, 0, xmxm)   # the boundary is a cylinder tailward of x=x0-am
     axx0=xmxm**2
     aro=asq+rho2
     sigma=np.sqrt((aro+axx0+np.sqrt((aro+axx0)**2-4.*asq*axx0))/(2.*asq))
@@ -193,9 +194,18 @@ def extall(iopgen,iopt,iopb,iopr,a,ntot,pdyn,dst,byimf,bzimf,vbimf1,vbimf2,ps,x,
     #    (1) inside the magnetosphere
     #    (2) in the boundary layer
     #    (3) outside the magnetosphere and b.layer
+    loc = np.where(sigma < (s0-dsig), 1, np.where(sigma < (s0+dsig), 2, 3))
 
     # First of all, consider the cases (1) and (2):
-    if sigma < (s0+dsig):     # cases (1) or (2); calculate the model field (with the potential "penetrated" interconnection field):
+    def model_field(x,y,z):
+        # calculate the model field (with the potential "penetrated" interconnection field):
+        global dxshift1, dxshift2, d, deltady
+        global xkappa1, xkappa2
+        global sc_sy, sc_pr, phi
+
+        xx=x*xappa
+        yy=y*xappa
+        zz=z*xappa
 
         bxcf,bycf,bzcf = [0.]*3
         if iopgen <= 1:
@@ -265,23 +275,34 @@ def extall(iopgen,iopt,iopb,iopr,a,ntot,pdyn,dst,byimf,bzimf,vbimf1,vbimf2,ps,x,
             +a[23]*hzimf+a[24]*hzimf*sthetah
 
         # And we have the total external field.
-        #  Now, let us check whether we have the case (1). if yes - we are done:
-        if sigma < (s0-dsig):   # (x,y,z) is inside the magnetosphere
-            bx,by,bz = [bbx,bby,bbz]
-        else:                   # this is the most complex case: we are inside the interpolation region
-            fint=0.5*(1.-(sigma-s0)/dsig)
-            fext=0.5*(1.+(sigma-s0)/dsig)
-
-            qx,qy,qz = dipole(ps,x,y,z)
-            bx=(bbx+qx)*fint+oimfx*fext -qx
-            by=(bby+qy)*fint+oimfy*fext -qy
-            bz=(bbz+qz)*fint+oimfz*fext -qz
-    # The cases (1) and (2) are exhausted; the only remaining possibility is now the case (3):
-    else:
+        return bbx,bby,bbz
+
+    # case (1): (x,y,z) is inside the magnetosphere
+    def inside(x,y,z, sigma):
+        return model_field(x,y,z)
+
+    # case (2): this is the most complex case: we are inside the interpolation region
+    def boundary_layer(x,y,z, sigma):
+        bbx,bby,bbz = model_field(x,y,z)
+        fint=0.5*(1.-(sigma-s0)/dsig)
+        fext=0.5*(1.+(sigma-s0)/dsig)
+
+        qx,qy,qz = dipole(ps,x,y,z)
+        bx=(bbx+qx)*fint+oimfx*fext -qx
+        by=(bby+qy)*fint+oimfy*fext -qy
+        bz=(bbz+qz)*fint+oimfz*fext -qz
+        return bx,by,bz
+
+    # case (3): outside the magnetosphere and b.layer
+    def outside(x,y,z, sigma):
         qx,qy,qz = dipole(ps,x,y,z)
         bx=oimfx-qx
         by=oimfy-qy
         bz=oimfz-qz
+        return bx,by,bz
+
+    bx,by,bz = evaluate_by_region(
+        loc, {1: inside, 2: boundary_layer, 3: outside}, x,y,z, sigma)
 
     return bx,by,bz
 
@@ -668,14 +689,11 @@ def warped(iopt,ps, x,y,z):
     rho2=y**2+z**2
     rho=np.sqrt(rho2)
 
-    if (y == 0) & (z == 0):
-        phi=0.
-        cphi=1.
-        sphi=0.
-    else:
-        phi=np.arctan2(z,y)
-        cphi=y/rho
-        sphi=z/rho
+    on_axis = (y == 0) & (z == 0)
+    rho_ = np.where(on_axis, 1., rho)
+    phi=np.where(on_axis, 0., np.arctan2(z,y))
+    cphi=np.where(on_axis, 1., y/rho_)
+    sphi=np.where(on_axis, 0., z/rho_)
 
     rr4l4=rho/(rho2**2+xl**4)
 
@@ -1112,10 +1130,7 @@ def birk_1n2(numb,mode,ps,x,y,z):        # NB# 6, p.60
     rsc=np.sqrt(xsc**2+ysc**2+zsc**2)   # scaled
     rho2=rho_0**2
 
-    if (xsc == 0) & (zsc == 0):
-        phi=0.
-    else:
-        phi=np.arctan2(-zsc,xsc)  # from cartesian to cylindrical (rho,phi,y)
+    phi=np.where((xsc == 0) & (zsc == 0), 0., np.arctan2(-zsc,xsc))  # from cartesian to cylindrical (rho,phi,y)
 
     sphic=np.sin(phi)
     cphic=np.cos(phi)   # "c" means "cylindrical", to distinguish from spherical phi
@@ -1266,72 +1281,73 @@ def fialcos(r,theta,phi,n,theta0,dt):
     :return: btheta,bphi.
     """
 
-    # btn, and bpn are the arrays of btheta and bphi (btn(i), bpn(i) correspond to i-th mode).
-    # only first n mode amplitudes are computed (n<=10).
+    # btn, and bpn are btheta and bphi of the i-th mode; the modes are computed recursively up to
+    # the n-th one (n<=10), whose amplitudes are returned.
     # theta0 is the angular half-width of the cone, dt is the angular h.-w. of the current layer
     # note: br=0  (because only radial currents are present in this model)
 
-    # dimension  btn(10),bpn(10),ccos(10),ssin(10)
-    btn = np.empty(10)
-    bpn = np.empty(10)
-    ccos = np.empty(10)
-    ssin = np.empty(10)
-
-    sinte=np.sin(theta)
-    ro=r*sinte
-    coste=np.cos(theta)
-    sinfi=np.sin(phi)
-    cosfi=np.cos(phi)
-    tg=sinte/(1+coste)   # tan(theta/2)
-    ctg=sinte/(1-coste)  # cot(theta/2)
-
-
     tetanp=theta0+dt
     tetanm=theta0-dt
-    if theta >= tetanm:
-        tgp=np.tan(tetanp*0.5)
-        tgm=np.tan(tetanm*0.5)
-        tgm2=tgm*tgm
-        tgp2=tgp*tgp
-
-    [cosm1, sinm1] = [1.,0]
-    tm = 1
-    [tgm2m,tgp2m] = [1.,1]
-
-    for m in range(1,n+1):
-        tm=tm*tg
-        ccos[m-1]=cosm1*cosfi-sinm1*sinfi
-        ssin[m-1]=sinm1*cosfi+cosm1*sinfi
-        cosm1=ccos[m-1]
-        sinm1=ssin[m-1]
-        if theta < tetanm:
-            t=tm
-            dtt=0.5*m*tm*(tg+ctg)
-            dtt0=0
-        elif theta < tetanp:
-            tgm2m=tgm2m*tgm2
-            fc=1/(tgp-tgm)
-            fc1=1/(2*m+1)
-            tgm2m1=tgm2m*tgm
-            tg21=1+tg*tg
-            t=fc*(tm*(tgp-tg)+fc1*(tm*tg-tgm2m1/tm))
-            dtt=0.5*m*fc*tg21*(tm/tg*(tgp-tg)-fc1*(tm-tgm2m1/(tm*tg)))
-            dtt0=0.5*fc*((tgp+tgm)*(tm*tg-fc1*(tm*tg-tgm2m1/tm))+tm*(1-tgp*tgm)-(1+tgm2)*tgm2m/tm)
-        else:
-            tgp2m=tgp2m*tgp2
-            tgm2m=tgm2m*tgm2
-            fc=1/(tgp-tgm)
-            fc1=1/(2*m+1)
-            t=fc*fc1*(tgp2m*tgp-tgm2m*tgm)/tm
-            dtt=-t*m*0.5*(tg+ctg)
-
-        btn[m-1]=m*t*ccos[m-1]/ro
-        bpn[m-1]=-dtt*ssin[m-1]/r
-
-    btheta=btn[n-1] *800.
-    bphi  =bpn[n-1] *800.
-
-    return btheta, bphi
+    tgp=np.tan(tetanp*0.5)
+    tgm=np.tan(tetanm*0.5)
+    tgm2=tgm*tgm
+    tgp2=tgp*tgp
+
+    # the point is (1) poleward of, (2) within, or (3) equatorward of the current layer.
+    loc = np.where(theta < tetanm, 1, np.where(theta < tetanp, 2, 3))
+
+    def cone_field(loc):
+        def func(r,theta,phi):
+            sinte=np.sin(theta)
+            ro=r*sinte
+            coste=np.cos(theta)
+            sinfi=np.sin(phi)
+            cosfi=np.cos(phi)
+            tg=sinte/(1+coste)   # tan(theta/2)
+            ctg=sinte/(1-coste)  # cot(theta/2)
+
+            [cosm1, sinm1] = [1.,0]
+            tm = 1
+            [tgm2m,tgp2m] = [1.,1]
+
+            for m in range(1,n+1):
+                tm=tm*tg
+                ccos=cosm1*cosfi-sinm1*sinfi
+                ssin=sinm1*cosfi+cosm1*sinfi
+                cosm1=ccos
+                sinm1=ssin
+                if loc == 1:
+                    t=tm
+                    dtt=0.5*m*tm*(tg+ctg)
+                    dtt0=0
+                elif loc == 2:
+                    tgm2m=tgm2m*tgm2
+                    fc=1/(tgp-tgm)
+                    fc1=1/(2*m+1)
+                    tgm2m1=tgm2m*tgm
+                    tg21=1+tg*tg
+                    t=fc*(tm*(tgp-tg)+fc1*(tm*tg-tgm2m1/tm))
+                    dtt=0.5*m*fc*tg21*(tm/tg*(tgp-tg)-fc1*(tm-tgm2m1/(tm*tg)))
+                    dtt0=0.5*fc*((tgp+tgm)*(tm*tg-fc1*(tm*tg-tgm2m1/tm))+tm*(1-tgp*tgm)-(1+tgm2)*tgm2m/tm)
+                else:
+                    tgp2m=tgp2m*tgp2
+                    tgm2m=tgm2m*tgm2
+                    fc=1/(tgp-tgm)
+                    fc1=1/(2*m+1)
+                    t=fc*fc1*(tgp2m*tgp-tgm2m*tgm)/tm
+                    dtt=-t*m*0.5*(tg+ctg)
+
+                btn=m*t*ccos/ro
+                bpn=-dtt*ssin/r
+
+            btheta=btn *800.
+            bphi  =bpn *800.
+
+            return btheta, bphi
+        return func
+
+    return evaluate_by_region(
+        loc, {1: cone_field(1), 2: cone_field(2), 3: cone_field(3)}, r,theta,phi, nout=2)
 
 
 
@@ -1455,24 +1471,24 @@ def full_rc(iopr,ps,x,y,z):
 
     # corrected values(as of may 2006)
     c_sy = np.array([   # sy short for symmetric
-        1675.694858, 1780.006388, -961.6082149, -1668.914259,
-        -27.40437029, -107.4169670, 27.76189943, 92.89740503, -43.92949274,
-        -403.6444072, 6.167161865, 298.2779761, -1680.779044, -1780.933039,
-        964.1861088, 1670.988659, 27.48864650, 107.7809519, -27.84600972,
-        -93.20691865, 44.28496784, 404.4537249, -6.281958730, -298.6050952,
-        -7.971914848, 2.017383761, -1.492230168, -1.957411655, -.08525523181,
-        -.3811813235, .08446716725, .3215044399, -.7141912767, -.9086294596,
-        .2966677742, -.04736679933, -11.38731325, .1719795189, 1.356233066,
-        .8613438429, -.09143823092, -.2593979098, .04244838338, .06318383319,
-        -.5861372726, -.03368780733, -.07104470269, -.06909052953,
-        -60.18659631, -32.87563877, 11.76450433, 5.891673644, 2.562360333,
-        6.215377232, -1.273945165, -1.864704763, -5.394837143, -8.799382627,
-        3.743066561, -.7649164511, 57.09210569, 32.61236511, -11.28688017,
-        -5.849523392, -2.470635922, -5.961417272, 1.230031099, 1.793192595,
-        5.383736074, 8.369895153, -3.611544412, .7898988697, 7.970609948,
-        7.981216562, 35.16822497, 12.45651654, 1.689755359, 3.678712366,
-        23.66117284, 6.987136092, 6.886678677, 20.91245928, 1.650064156,
-        3.474068566, .3474715765, .6564043111 ])
+        -957.2534900, -817.5450246, 583.2991249, 758.8568270,
+        13.17029064, 68.94173502, -15.29764089, -53.43151590, 27.34311724,
+        149.5252826, -11.00696044, -179.7031814, 953.0914774, 817.2340042,
+        -581.0791366, -757.5387665, -13.10602697, -68.58155678, 15.22447386,
+        53.15535633, -27.07982637, -149.1413391, 10.91433279, 179.3251739,
+        -6.028703251, 1.303196101, -1.345909343, -1.138296330, -0.06642634348,
+        -0.3795246458, .07487833559, .2891156371, -.5506314391, -.4443105812,
+        0.2273682152, 0.01086886655, -9.130025352, 1.118684840, 1.110838825,
+        .1219761512, -.06263009645, -.1896093743, .03434321042, .01523060688,
+        -.4913171541, -.2264814165, -.04791374574, .1981955976, -68.32678140,
+        -48.72036263, 14.03247808, 16.56233733, 2.369921099, 6.200577111,
+        -1.415841250, -0.8184867835, -3.401307527, -8.490692287, 3.217860767,
+        -9.037752107, 66.09298105, 48.23198578, -13.67277141, -16.27028909,
+        -2.309299411, -6.016572391, 1.381468849, 0.7935312553, 3.436934845,
+        8.260038635, -3.136213782, 8.833214943, 8.041075485, 8.024818618,
+        35.54861873, 12.55415215, 1.738167799, 3.721685353, 23.06768025,
+        6.871230562, 6.806229878, 21.35990364, 1.687412298, 3.500885177,
+        0.3498952546, 0.6595919814])
 
     c_pr = np.array([   # pr short for partial
         -64820.58481, -63965.62048, 66267.93413, 135049.7504, -36.56316878,
@@ -1612,14 +1628,16 @@ def rc_symm(x,y,z):
     cost=z/r
 
     # too close to the z-axis; using a linear approximation a_phi~sint to avoid the singularity problem
-    if sint < ds:
+    def near_axis(x,y,z, r,r2,rp,rm,sint,cost):
         a=ap(r,ds,dc)/ds
         dardr=(rp*ap(rp,ds,dc)-rm*ap(rm,ds,dc))*drd
         fxy=z*(2*a-dardr)/(r*r2)
         bx=fxy*x
         by=fxy*y
         bz=(2*a*cost**2+dardr*sint**2)/r
-    else:
+        return bx,by,bz
+
+    def off_axis(x,y,z, r,r2,rp,rm,sint,cost):
         theta=np.arctan2(sint,cost)
         tp=theta+d
         tm=theta-d
@@ -1633,6 +1651,11 @@ def rc_symm(x,y,z):
         bx=fxy*x
         by=fxy*y
         bz=br*cost-bt*sint
+        return bx,by,bz
+
+    loc = np.where(sint < ds, 1, 2)
+    bx,by,bz = evaluate_by_region(
+        loc, {1: near_axis, 2: off_axis}, x,y,z, r,r2,rp,rm,sint,cost)
 
     return bx, by, bz
 
@@ -1646,20 +1669,16 @@ def ap(r,sint,cost):
     """
 
     a1,a2,rrc1,dd1,rrc2,dd2,p1,r1,dr1,dla1,p2,r2,dr2,dla2,p3,r3,dr3 = [
-        -563.3722359,425.0891691,4.150588549,2.266150226,3.334503403,
-        3.079071195,.02602428295,8.937790598,3.327934895,.4487061833,
-        .09125832351,6.243029867,1.750145910,.4181957162,.06106691992,
-        2.079908581,.6828548533]
+        -456.5289941, 375.9055332, 4.274684950, 2.439528329, 3.367557287,
+        3.146382545, -0.2291904607, 3.746064740, 1.508802177, 0.5873525737,
+        0.1556236119, 4.993638842, 3.324180497, 0.4368407663, 0.1855957207,
+        2.969226745, 2.243367377]
 
 # indicates whether we are too close to the axis of symmetry, where the inversion of dipolar coordinates becomes inaccurate
-    prox = False
-    sint1=sint
-    cost1=cost
     # too close to z-axis; use linear interpolation between sint=0 & sint=0.01
-    if (sint1 < 1.e-2):
-        sint1=1.e-2
-        cost1=0.99994999875
-        prox=True
+    prox=sint < 1.e-2
+    sint1=np.where(prox, 1.e-2, sint)
+    cost1=np.where(prox, 0.99994999875, cost)
 
     alpha=sint1**2/r    # r,theta -> alpha,gamma
     gamma=cost1/r**2
@@ -1668,20 +1687,9 @@ def ap(r,sint,cost):
     arg2=-((r-r2)/dr2)**2-(cost1/dla2)**2
     arg3=-((r-r3)/dr3)**2
 
-    if arg1 < -500:     # to prevent "floating underflow" crashes
-        dexp1=0.
-    else:
-        dexp1=np.exp(arg1)
-
-    if arg2 < -500:     # to prevent "floating underflow" crashes
-        dexp2=0.
-    else:
-        dexp2=np.exp(arg2)
-
-    if arg3 < -500:     # to prevent "floating underflow" crashes
-        dexp3=0.
-    else:
-        dexp3=np.exp(arg3)
+    dexp1=np.where(arg1 < -500, 0., np.exp(arg1))    # to prevent "floating underflow" crashes
+    dexp2=np.where(arg2 < -500, 0., np.exp(arg2))    # to prevent "floating underflow" crashes
+    dexp3=np.where(arg3 < -500, 0., np.exp(arg3))    # to prevent "floating underflow" crashes
 
     # alpha -> alpha_s  (deformed)
     alpha_s=alpha*(1+p1*dexp1+p2*dexp2+p3*dexp3)
@@ -1693,7 +1701,7 @@ def ap(r,sint,cost):
     f=64/27*gammas2+alsqh**2
     q=(np.sqrt(f)+alsqh)**(1/3)
     c=q-4*gammas2**(1/3)/(3*q)
-    if c < 0: c=0
+    c=np.where(c < 0, 0, c)
     g=np.sqrt(c**2+4*gammas2**(1/3))
     rs=4/((np.sqrt(2*g-c)+np.sqrt(c))*(g+c))
     costs=gamma_s*rs**2
@@ -1731,8 +1739,7 @@ def ap(r,sint,cost):
     aphi2=((1-xk2*0.5)*elk-ele)/xkrho12
 
     ap=a1*aphi1+a2*aphi2
-    if prox:
-        ap=ap*sint/sint1    # linear interpolation, if too close to the z-axis
+    ap=np.where(prox, ap*sint/sint1, ap)    # linear interpolation, if too close to the z-axis
 
     return ap
 
@@ -1759,14 +1766,16 @@ def prc_symm(x,y,z):
     cost=z/r
 
     # too close to the z-axis; using a linear approximation a_phi~sint to avoid the singularity problem
-    if sint < ds:
+    def near_axis(x,y,z, r,r2,rp,rm,sint,cost):
         a=apprc(r,ds,dc)/ds
         dardr=(rp*apprc(rp,ds,dc)-rm*apprc(rm,ds,dc))*drd
         fxy=z*(2*a-dardr)/(r*r2)
         bx=fxy*x
         by=fxy*y
         bz=(2*a*cost**2+dardr*sint**2)/r
-    else:
+        return bx,by,bz
+
+    def off_axis(x,y,z, r,r2,rp,rm,sint,cost):
         theta=np.arctan2(sint,cost)
         tp=theta+d
         tm=theta-d
@@ -1780,6 +1789,11 @@ def prc_symm(x,y,z):
         bx=fxy*x
         by=fxy*y
         bz=br*cost-bt*sint
+        return bx,by,bz
+
+    loc = np.where(sint < ds, 1, 2)
+    bx,by,bz = evaluate_by_region(
+        loc, {1: near_axis, 2: off_axis}, x,y,z, r,r2,rp,rm,sint,cost)
 
     return bx, by, bz
 
@@ -1802,14 +1816,10 @@ def apprc(r,sint,cost):
         .2647095287,.07091230197,.01512963586,6.861329631,.1677400816,
         .04433648846,.05553741389,.7665599464,.7277854652]
 
-    prox=False
-    sint1=sint
-    cost1=cost
     # too close to z-axis; use linear interpolation between sint=0 & sint=0.01
-    if (sint1 < 1.e-2):
-        sint1=1.e-2
-        cost1=0.99994999875
-        prox=True
+    prox=sint < 1.e-2
+    sint1=np.where(prox, 1.e-2, sint)
+    cost1=np.where(prox, 0.99994999875, cost)
 
     alpha=sint1**2/r    # r,theta -> alpha,gamma
     gamma=cost1/r**2
@@ -1817,15 +1827,8 @@ def apprc(r,sint,cost):
     arg1=-(gamma/dg1)**2
     arg2=-((alpha-alpha4)/dal4)**2-(gamma/dg4)**2
 
-    if arg1 < -500:     # to prevent "floating underflow" crashes
-        dexp1=0.
-    else:
-        dexp1=np.exp(arg1)
-
-    if arg2 < -500:     # to prevent "floating underflow" crashes
-        dexp2=0.
-    else:
-        dexp2=np.exp(arg2)
+    dexp1=np.where(arg1 < -500, 0., np.exp(arg1))    # to prevent "floating underflow" crashes
+    dexp2=np.where(arg2 < -500, 0., np.exp(arg2))    # to prevent "floating underflow" crashes
 
     # alpha -> alpha_s  (deformed)
     alpha_s = alpha*(1 + p1/(1+((alpha-alpha1)/dal1)**2)**beta1*dexp1
@@ -1842,7 +1845,7 @@ def apprc(r,sint,cost):
     f=64./27.*gammas2+alsqh**2
     q=(np.sqrt(f)+alsqh)**(1/3)
     c=q-4.*gammas2**(1/3)/(3.*q)
-    if c < 0: c=0
+    c=np.where(c < 0, 0, c)
     g=np.sqrt(c**2+4*gammas2**(1/3))
     rs=4./((np.sqrt(2*g-c)+np.sqrt(c))*(g+c))
     costs=gamma_s*rs**2
@@ -1881,8 +1884,7 @@ def apprc(r,sint,cost):
     aphi2=((1-xk2*0.5)*elk-ele)/xkrho12
 
     apprc=a1*aphi1+a2*aphi2
-    if prox:
-        apprc=apprc*sint/sint1  # linear interpolation, if too close to the z-axis
+    apprc=np.where(prox, apprc*sint/sint1, apprc)  # linear interpolation, if too close to the z-axis
 
     return apprc
 
@@ -1906,7 +1908,7 @@ def prc_quad(x,y,z):
     rp=r+d
     rm=r-d
 
-    if sint > ds:
+    def off_axis(x,y,z, r,rho,rp,rm,sint,cost):
         cphi=x/rho
         sphi=y/rho
         br=br_prc_q(r,sint,cost)
@@ -1923,10 +1925,11 @@ def prc_quad(x,y,z):
         bx=sint*(br+(br+r*dbrr+dbtt)*sphi**2)+cost*bt
         by=-sint*sphi*cphi*(br+r*dbrr+dbtt)
         bz=(br*cost-bt*sint)*cphi
-    else:
+        return bx,by,bz
+
+    def near_axis(x,y,z, r,rho,rp,rm,sint,cost):
         st=ds
-        ct=dc
-        if z < 0: ct=-dc
+        ct=np.where(z < 0, -dc, dc)
         theta=np.arctan2(st,ct)
         tp=theta+d
         tm=theta-d
@@ -1942,6 +1945,11 @@ def prc_quad(x,y,z):
         bx=(br*(x**2+2.*y**2)+fcxy*y**2)/(r*st)**2+bt*cost
         by=-(br+fcxy)*x*y/(r*st)**2
         bz=(br*cost/st-bt)*x/r
+        return bx,by,bz
+
+    loc = np.where(sint > ds, 1, 2)
+    bx,by,bz = evaluate_by_region(
+        loc, {1: off_axis, 2: near_axis}, x,y,z, r,rho,rp,rm,sint,cost)
 
     return bx,by,bz
 
@@ -1,5 +1,7 @@
 import numpy as np
 
+from ._vectorize import evaluate_by_region
+
 # t04 is identical to t01 except for several factors.
 
 def t04(parmod,ps,x,y,z):
@@ -102,10 +104,6 @@ def extern(iopgen,iopt,iopb,iopr,a,ntot,pdyn,dst,bximf,byimf,bzimf,w1,w2,w3,w4,w
 
     xappa3=xappa**3
 
-    xx=x*xappa
-    yy=y*xappa
-    zz=z*xappa
-
     sps=np.sin(ps)
 
     x0=a0_x0/xappa
@@ -125,22 +123,25 @@ def extern(iopgen,iopt,iopb,iopr,a,ntot,pdyn,dst,bximf,byimf,bzimf,w1,w2,w3,w4,w
     zss=z
 
     # begin iterative search of unwarped coords (to find sigma)
+    # For an array of points, the iteration of a point is frozen once it has converged.
     dd = 1.
-    while dd > 1e-6:
+    active = True
+    while np.any(active):
         xsold=xss
         zsold=zss
 
         rh=rh0+rh2*(zss/r)**2
         sinpsas=sps/(1+(r/rh)**3)**0.33333333
         cospsas=np.sqrt(1-sinpsas**2)
-        zss=x*sinpsas+z*cospsas
-        xss=x*cospsas-z*sinpsas
-        dd=np.abs(xss-xsold)+np.abs(zss-zsold)
+        zss=np.where(active, x*sinpsas+z*cospsas, zsold)
+        xss=np.where(active, x*cospsas-z*sinpsas, xsold)
+        dd=np.where(active, np.abs(xss-xsold)+np.abs(zss-zsold), dd)
+        active = dd > 1e-6
 
     rho2=y**2+zss**2
     asq=am**2
     xmxm=am+xss-x0
-    if xmxm < 0: xmxm = 0   # the boundary is a cylinder tailward of x=x0-am
+    xmxm=np.where(xmxm < 0, 0, xmxm)   # the boundary is a cylinder tailward of x=x0-am
     axx0=xmxm**2
     aro=asq+rho2
     sigma=np.sqrt((aro+axx0+np.sqrt((aro+axx0)**2-4.*asq*axx0))/(2.*asq))
@@ -149,9 +150,18 @@ def extern(iopgen,iopt,iopb,iopr,a,ntot,pdyn,dst,bximf,byimf,bzimf,w1,w2,w3,w4,w
     #    (1) inside the magnetosphere
     #    (2) in the boundary layer
     #    (3) outside the magnetosphere and b.layer
+    loc = np.where(sigma < (s0-dsig), 1, np.where(sigma < (s0+dsig), 2, 3))
 
     # First of all, consider the cases (1) and (2):
-    if sigma < (s0+dsig):     # cases (1) or (2); calculate the model field (with the potential "penetrated" interconnection field):
+    def model_field(x,y,z):
+        # calculate the model field (with the potential "penetrated" interconnection field):
+        global dxshift1, dxshift2, d, deltady
+        global xkappa1, xkappa2
+        global sc_sy, sc_pr, phi
+
+        xx=x*xappa
+        yy=y*xappa
+        zz=z*xappa
 
         bxcf,bycf,bzcf = [0.]*3
         if iopgen <= 1:
@@ -215,23 +225,34 @@ def extern(iopgen,iopt,iopb,iopr,a,ntot,pdyn,dst,bximf,byimf,bzimf,w1,w2,w3,w4,w
         bbz=a[0]*bzcf + tamp1*bzt1+tamp2*bzt2 + a_src*bzsrc+a_prc*bzprc + a_r11*bzr11+a_r21*bzr21 + a[19]*hzimf
 
         # And we have the total external field.
-        #  Now, let us check whether we have the case (1). if yes - we are done:
-        if sigma < (s0-dsig):   # (x,y,z) is inside the magnetosphere
-            bx,by,bz = [bbx,bby,bbz]
-        else:                   # this is the most complex case: we are inside the interpolation region
-            fint=0.5*(1.-(sigma-s0)/dsig)
-            fext=0.5*(1.+(sigma-s0)/dsig)
-
-            qx,qy,qz = dipole(ps,x,y,z)
-            bx=(bbx+qx)*fint+oimfx*fext -qx
-            by=(bby+qy)*fint+oimfy*fext -qy
-            bz=(bbz+qz)*fint+oimfz*fext -qz
-    # The cases (1) and (2) are exhausted; the only remaining possibility is now the case (3):
-    else:
+        return bbx,bby,bbz
+
+    # case (1): (x,y,z) is inside the magnetosphere
+    def inside(x,y,z, sigma):
+        return model_field(x,y,z)
+
+    # case (2): this is the most complex case: we are inside the interpolation region
+    def boundary_layer(x,y,z, sigma):
+        bbx,bby,bbz = model_field(x,y,z)
+        fint=0.5*(1.-(sigma-s0)/dsig)
+        fext=0.5*(1.+(sigma-s0)/dsig)
+
+        qx,qy,qz = dipole(ps,x,y,z)
+        bx=(bbx+qx)*fint+oimfx*fext -qx
+        by=(bby+qy)*fint+oimfy*fext -qy
+        bz=(bbz+qz)*fint+oimfz*fext -qz
+        return bx,by,bz
+
+    # case (3): outside the magnetosphere and b.layer
+    def outside(x,y,z, sigma):
         qx,qy,qz = dipole(ps,x,y,z)
         bx=oimfx-qx
         by=oimfy-qy
         bz=oimfz-qz
+        return bx,by,bz
+
+    bx,by,bz = evaluate_by_region(
+        loc, {1: inside, 2: boundary_layer, 3: outside}, x,y,z, sigma)
 
     return bx,by,bz
 
@@ -614,14 +635,11 @@ def warped(iopt, ps, x,y,z):
     rho2=y**2+z**2
     rho=np.sqrt(rho2)
 
-    if (y == 0) & (z == 0):
-        phi=0.
-        cphi=1.
-        sphi=0.
-    else:
-        phi=np.arctan2(z,y)
-        cphi=y/rho
-        sphi=z/rho
+    on_axis = (y == 0) & (z == 0)
+    rho_ = np.where(on_axis, 1., rho)
+    phi=np.where(on_axis, 0., np.arctan2(z,y))
+    cphi=np.where(on_axis, 1., y/rho_)
+    sphi=np.where(on_axis, 0., z/rho_)
 
     rr4l4=rho/(rho2**2+xl**4)
 
@@ -1048,10 +1066,7 @@ def birk_1n2(numb,mode,ps,x,y,z):        # NB# 6, p.60
     rsc=np.sqrt(xsc**2+ysc**2+zsc**2)   # scaled
     rho2=rho_0**2
 
-    if (xsc == 0) & (zsc == 0):
-        phi=0.
-    else:
-        phi=np.arctan2(-zsc,xsc)  # from cartesian to cylindrical (rho,phi,y)
+    phi=np.where((xsc == 0) & (zsc == 0), 0., np.arctan2(-zsc,xsc))  # from cartesian to cylindrical (rho,phi,y)
 
     sphic=np.sin(phi)
     cphic=np.cos(phi)   # "c" means "cylindrical", to distinguish from spherical phi
@@ -1202,72 +1217,73 @@ def fialcos(r,theta,phi,n,theta0,dt):
     :return: btheta,bphi.
     """
 
-    # btn, and bpn are the arrays of btheta and bphi (btn(i), bpn(i) correspond to i-th mode).
-    # only first n mode amplitudes are computed (n<=10).
+    # btn, and bpn are btheta and bphi of the i-th mode; the modes are computed recursively up to
+    # the n-th one (n<=10), whose amplitudes are returned.
     # theta0 is the angular half-width of the cone, dt is the angular h.-w. of the current layer
     # note: br=0  (because only radial currents are present in this model)
 
-    # dimension  btn(10),bpn(10),ccos(10),ssin(10)
-    btn = np.empty(10)
-    bpn = np.empty(10)
-    ccos = np.empty(10)
-    ssin = np.empty(10)
-
-    sinte=np.sin(theta)
-    ro=r*sinte
-    coste=np.cos(theta)
-    sinfi=np.sin(phi)
-    cosfi=np.cos(phi)
-    tg=sinte/(1+coste)   # tan(theta/2)
-    ctg=sinte/(1-coste)  # cot(theta/2)
-
-
     tetanp=theta0+dt
     tetanm=theta0-dt
-    if theta >= tetanm:
-        tgp=np.tan(tetanp*0.5)
-        tgm=np.tan(tetanm*0.5)
-        tgm2=tgm*tgm
-        tgp2=tgp*tgp
-
-    [cosm1, sinm1] = [1.,0]
-    tm = 1
-    [tgm2m,tgp2m] = [1.,1]
-
-    for m in range(1,n+1):
-        tm=tm*tg
-        ccos[m-1]=cosm1*cosfi-sinm1*sinfi
-        ssin[m-1]=sinm1*cosfi+cosm1*sinfi
-        cosm1=ccos[m-1]
-        sinm1=ssin[m-1]
-        if theta < tetanm:
-            t=tm
-            dtt=0.5*m*tm*(tg+ctg)
-            dtt0=0
-        elif theta < tetanp:
-            tgm2m=tgm2m*tgm2
-            fc=1/(tgp-tgm)
-            fc1=1/(2*m+1)
-            tgm2m1=tgm2m*tgm
-            tg21=1+tg*tg
-            t=fc*(tm*(tgp-tg)+fc1*(tm*tg-tgm2m1/tm))
-            dtt=0.5*m*fc*tg21*(tm/tg*(tgp-tg)-fc1*(tm-tgm2m1/(tm*tg)))
-            dtt0=0.5*fc*((tgp+tgm)*(tm*tg-fc1*(tm*tg-tgm2m1/tm))+tm*(1-tgp*tgm)-(1+tgm2)*tgm2m/tm)
-        else:
-            tgp2m=tgp2m*tgp2
-            tgm2m=tgm2m*tgm2
-            fc=1/(tgp-tgm)
-            fc1=1/(2*m+1)
-            t=fc*fc1*(tgp2m*tgp-tgm2m*tgm)/tm
-            dtt=-t*m*0.5*(tg+ctg)
-
-        btn[m-1]=m*t*ccos[m-1]/ro
-        bpn[m-1]=-dtt*ssin[m-1]/r
-
-    btheta=btn[n-1] *800.
-    bphi  =bpn[n-1] *800.
-
-    return btheta, bphi
+    tgp=np.tan(tetanp*0.5)
+    tgm=np.tan(tetanm*0.5)
+    tgm2=tgm*tgm
+    tgp2=tgp*tgp
+
+    # the point is (1) poleward of, (2) within, or (3) equatorward of the current layer.
+    loc = np.where(theta < tetanm, 1, np.where(theta < tetanp, 2, 3))
+
+    def cone_field(loc):
+        def func(r,theta,phi):
+            sinte=np.sin(theta)
+            ro=r*sinte
+            coste=np.cos(theta)
+            sinfi=np.sin(phi)
+            cosfi=np.cos(phi)
+            tg=sinte/(1+coste)   # tan(theta/2)
+            ctg=sinte/(1-coste)  # cot(theta/2)
+
+            [cosm1, sinm1] = [1.,0]
+            tm = 1
+            [tgm2m,tgp2m] = [1.,1]
+
+            for m in range(1,n+1):
+                tm=tm*tg
+                ccos=cosm1*cosfi-sinm1*sinfi
+                ssin=sinm1*cosfi+cosm1*sinfi
+                cosm1=ccos
+                sinm1=ssin
+                if loc == 1:
+                    t=tm
+                    dtt=0.5*m*tm*(tg+ctg)
+                    dtt0=0
+                elif loc == 2:
+                    tgm2m=tgm2m*tgm2
+                    fc=1/(tgp-tgm)
+                    fc1=1/(2*m+1)
+                    tgm2m1=tgm2m*tgm
+                    tg21=1+tg*tg
+                    t=fc*(tm*(tgp-tg)+fc1*(tm*tg-tgm2m1/tm))
+                    dtt=0.5*m*fc*tg21*(tm/tg*(tgp-tg)-fc1*(tm-tgm2m1/(tm*tg)))
+                    dtt0=0.5*fc*((tgp+tgm)*(tm*tg-fc1*(tm*tg-tgm2m1/tm))+tm*(1-tgp*tgm)-(1+tgm2)*tgm2m/tm)
+                else:
+                    tgp2m=tgp2m*tgp2
+                    tgm2m=tgm2m*tgm2
+                    fc=1/(tgp-tgm)
+                    fc1=1/(2*m+1)
+                    t=fc*fc1*(tgp2m*tgp-tgm2m*tgm)/tm
+                    dtt=-t*m*0.5*(tg+ctg)
+
+                btn=m*t*ccos/ro
+                bpn=-dtt*ssin/r
+
+            btheta=btn *800.
+            bphi  =bpn *800.
+
+            return btheta, bphi
+        return func
+
+    return evaluate_by_region(
+        loc, {1: cone_field(1), 2: cone_field(2), 3: cone_field(3)}, r,theta,phi, nout=2)
 
 
 
@@ -1550,14 +1566,16 @@ def rc_symm(x,y,z):
     cost=z/r
 
     # too close to the z-axis; using a linear approximation a_phi~sint to avoid the singularity problem
-    if sint < ds:
+    def near_axis(x,y,z, r,r2,rp,rm,sint,cost):
         a=ap(r,ds,dc)/ds
         dardr=(rp*ap(rp,ds,dc)-rm*ap(rm,ds,dc))*drd
         fxy=z*(2*a-dardr)/(r*r2)
         bx=fxy*x
         by=fxy*y
         bz=(2*a*cost**2+dardr*sint**2)/r
-    else:
+        return bx,by,bz
+
+    def off_axis(x,y,z, r,r2,rp,rm,sint,cost):
         theta=np.arctan2(sint,cost)
         tp=theta+d
         tm=theta-d
@@ -1571,6 +1589,11 @@ def rc_symm(x,y,z):
         bx=fxy*x
         by=fxy*y
         bz=br*cost-bt*sint
+        return bx,by,bz
+
+    loc = np.where(sint < ds, 1, 2)
+    bx,by,bz = evaluate_by_region(
+        loc, {1: near_axis, 2: off_axis}, x,y,z, r,r2,rp,rm,sint,cost)
 
     return bx, by, bz
 
@@ -1592,14 +1615,10 @@ def ap(r,sint,cost):
             
 
     # indicates whether we are too close to the axis of symmetry, where the inversion of dipolar coordinates becomes inaccurate
-    prox = False
-    sint1=sint
-    cost1=cost
     # too close to z-axis; use linear interpolation between sint=0 & sint=0.01
-    if (sint1 < 1.e-2):
-        sint1=1.e-2
-        cost1=0.99994999875
-        prox=True
+    prox=sint < 1.e-2
+    sint1=np.where(prox, 1.e-2, sint)
+    cost1=np.where(prox, 0.99994999875, cost)
 
     alpha=sint1**2/r    # r,theta -> alpha,gamma
     gamma=cost1/r**2
@@ -1608,20 +1627,9 @@ def ap(r,sint,cost):
     arg2=-((r-r2)/dr2)**2-(cost1/dla2)**2
     arg3=-((r-r3)/dr3)**2
 
-    if arg1 < -500:     # to prevent "floating underflow" crashes
-        dexp1=0.
-    else:
-        dexp1=np.exp(arg1)
-
-    if arg2 < -500:     # to prevent "floating underflow" crashes
-        dexp2=0.
-    else:
-        dexp2=np.exp(arg2)
-
-    if arg3 < -500:     # to prevent "floating underflow" crashes
-        dexp3=0.
-    else:
-        dexp3=np.exp(arg3)
+    dexp1=np.where(arg1 < -500, 0., np.exp(arg1))    # to prevent "floating underflow" crashes
+    dexp2=np.where(arg2 < -500, 0., np.exp(arg2))    # to prevent "floating underflow" crashes
+    dexp3=np.where(arg3 < -500, 0., np.exp(arg3))    # to prevent "floating underflow" crashes
 
     # alpha -> alpha_s  (deformed)
     alpha_s=alpha*(1+p1*dexp1+p2*dexp2+p3*dexp3)
@@ -1633,7 +1641,7 @@ def ap(r,sint,cost):
     f=64/27*gammas2+alsqh**2
     q=(np.sqrt(f)+alsqh)**(1/3)
     c=q-4*gammas2**(1/3)/(3*q)
-    if c < 0: c=0
+    c=np.where(c < 0, 0, c)
     g=np.sqrt(c**2+4*gammas2**(1/3))
     rs=4/((np.sqrt(2*g-c)+np.sqrt(c))*(g+c))
     costs=gamma_s*rs**2
@@ -1671,8 +1679,7 @@ def ap(r,sint,cost):
     aphi2=((1-xk2*0.5)*elk-ele)/xkrho12
 
     ap=a1*aphi1+a2*aphi2
-    if prox:
-        ap=ap*sint/sint1    # linear interpolation, if too close to the z-axis
+    ap=np.where(prox, ap*sint/sint1, ap)    # linear interpolation, if too close to the z-axis
 
     return ap
 
@@ -1699,14 +1706,16 @@ def prc_symm(x,y,z):
     cost=z/r
 
     # too close to the z-axis; using a linear approximation a_phi~sint to avoid the singularity problem
-    if sint < ds:
+    def near_axis(x,y,z, r,r2,rp,rm,sint,cost):
         a=apprc(r,ds,dc)/ds
         dardr=(rp*apprc(rp,ds,dc)-rm*apprc(rm,ds,dc))*drd
         fxy=z*(2*a-dardr)/(r*r2)
         bx=fxy*x
         by=fxy*y
         bz=(2*a*cost**2+dardr*sint**2)/r
-    else:
+        return bx,by,bz
+
+    def off_axis(x,y,z, r,r2,rp,rm,sint,cost):
         theta=np.arctan2(sint,cost)
         tp=theta+d
         tm=theta-d
@@ -1720,6 +1729,11 @@ def prc_symm(x,y,z):
         bx=fxy*x
         by=fxy*y
         bz=br*cost-bt*sint
+        return bx,by,bz
+
+    loc = np.where(sint < ds, 1, 2)
+    bx,by,bz = evaluate_by_region(
+        loc, {1: near_axis, 2: off_axis}, x,y,z, r,r2,rp,rm,sint,cost)
 
     return bx, by, bz
 
@@ -1742,14 +1756,10 @@ def apprc(r,sint,cost):
         .2647095287,.07091230197,.01512963586,6.861329631,.1677400816,
         .04433648846,.05553741389,.7665599464,.7277854652]
 
-    prox=False
-    sint1=sint
-    cost1=cost
     # too close to z-axis; use linear interpolation between sint=0 & sint=0.01
-    if (sint1 < 1.e-2):
-        sint1=1.e-2
-        cost1=0.99994999875
-        prox=True
+    prox=sint < 1.e-2
+    sint1=np.where(prox, 1.e-2, sint)
+    cost1=np.where(prox, 0.99994999875, cost)
 
     alpha=sint1**2/r    # r,theta -> alpha,gamma
     gamma=cost1/r**2
@@ -1757,15 +1767,8 @@ def apprc(r,sint,cost):
     arg1=-(gamma/dg1)**2
     arg2=-((alpha-alpha4)/dal4)**2-(gamma/dg4)**2
 
-    if arg1 < -500:     # to prevent "floating underflow" crashes
-        dexp1=0.
-    else:
-        dexp1=np.exp(arg1)
-
-    if arg2 < -500:     # to prevent "floating underflow" crashes
-        dexp2=0.
-    else:
-        dexp2=np.exp(arg2)
+    dexp1=np.where(arg1 < -500, 0., np.exp(arg1))    # to prevent "floating underflow" crashes
+    dexp2=np.where(arg2 < -500, 0., np.exp(arg2))    # to prevent "floating underflow" crashes
 
     # alpha -> alpha_s  (deformed)
     alpha_s = alpha*(1 + p1/(1+((alpha-alpha1)/dal1)**2)**beta1*dexp1
@@ -1782,7 +1785,7 @@ def apprc(r,sint,cost):
     f=64./27.*gammas2+alsqh**2
     q=(np.sqrt(f)+alsqh)**(1/3)
     c=q-4.*gammas2**(1/3)/(3.*q)
-    if c < 0: c=0
+    c=np.where(c < 0, 0, c)
     g=np.sqrt(c**2+4*gammas2**(1/3))
     rs=4./((np.sqrt(2*g-c)+np.sqrt(c))*(g+c))
     costs=gamma_s*rs**2
@@ -1821,8 +1824,7 @@ def apprc(r,sint,cost):
     aphi2=((1-xk2*0.5)*elk-ele)/xkrho12
 
     apprc=a1*aphi1+a2*aphi2
-    if prox:
-        apprc=apprc*sint/sint1  # linear interpolation, if too close to the z-axis
+    apprc=np.where(prox, apprc*sint/sint1, apprc)  # linear interpolation, if too close to the z-axis
 
     return apprc
 
@@ -1846,7 +1848,7 @@ def prc_quad(x,y,z):
     rp=r+d
     rm=r-d
 
-    if sint > ds:
+    def off_axis(x,y,z, r,rho,rp,rm,sint,cost):
         cphi=x/rho
         sphi=y/rho
         br=br_prc_q(r,sint,cost)
@@ -1863,10 +1865,11 @@ def prc_quad(x,y,z):
         bx=sint*(br+(br+r*dbrr+dbtt)*sphi**2)+cost*bt
         by=-sint*sphi*cphi*(br+r*dbrr+dbtt)
         bz=(br*cost-bt*sint)*cphi
-    else:
+        return bx,by,bz
+
+    def near_axis(x,y,z, r,rho,rp,rm,sint,cost):
         st=ds
-        ct=dc
-        if z < 0: ct=-dc
+        ct=np.where(z < 0, -dc, dc)
         theta=np.arctan2(st,ct)
         tp=theta+d
         tm=theta-d
@@ -1882,6 +1885,11 @@ def prc_quad(x,y,z):
         bx=(br*(x**2+2.*y**2)+fcxy*y**2)/(r*st)**2+bt*cost
         by=-(br+fcxy)*x*y/(r*st)**2
         bz=(br*cost/st-bt)*x/r
+        return bx,by,bz
+
+    loc = np.where(sint > ds, 1, 2)
+    bx,by,bz = evaluate_by_region(
+        loc, {1: off_axis, 2: near_axis}, x,y,z, r,rho,rp,rm,sint,cost)
 
     return bx,by,bz
 
@@ -63,7 +63,7 @@ def t89(iopt, ps, x, y, z):
 
     id = 1
     a = param[:,iopt-1]
-    xi = np.array([x,y,z,ps])
+    xi = [x,y,z,ps]
     bx,by,bz, der = extern(id, a, xi)
     return bx,by,bz
 
@@ -128,7 +128,8 @@ def extern(id, a, xi):
 
     dxl = 20.
 
-    der = np.zeros((3,30))
+    x,y,z,tilt = xi[0:4]
+    der = np.zeros((3,30)+np.broadcast(x,y,z).shape)
     dyc = a[29]     # Dyc - the Dy parameter for closure current system; in T89 fixed at 20.0
     dyc2 = dyc**2
     dx = a[17]      # characteristic scale of the Chapman-Ferraro field along the x-axis
@@ -175,7 +176,6 @@ def extern(id, a, xi):
     ynp = rpi/yn*0.5
     ynd = 2.*yn
 
-    x,y,z,tilt = xi[0:4]
     tlt2 = tilt**2
     sps = np.sin(tilt)
     cps = np.cos(tilt)
@@ -1,6 +1,8 @@
 import numpy as np
 from scipy import special
 
+from ._vectorize import evaluate_by_region
+
 def t96(parmod,ps,x,y,z):
     """
     Release date of this version: June 22, 1996.
@@ -66,18 +68,15 @@ def t96(parmod,ps,x,y,z):
     rimfampl=reconn*bt
 
     pps=ps
-    xx=x*xappa
-    yy=y*xappa
-    zz=z*xappa
 
     # Scale and calculate the magnetopause parameters for the interpolation across
-    # the boundary layer (the coordinates xx,yy,zz  are already scaled)
+    # the boundary layer (the coordinates xx,yy,zz are scaled in model_field below)
     x0=x00/xappa
     am=am0/xappa
     rho2=y**2+z**2
     asq=am**2
     xmxm=am+x-x0
-    if xmxm < 0: xmxm = 0   # the boundary is a cylinder tailward of x=x0-am
+    xmxm=np.where(xmxm < 0, 0, xmxm)   # the boundary is a cylinder tailward of x=x0-am
     axx0=xmxm**2
     aro=asq+rho2
     sigma=np.sqrt((aro+axx0+np.sqrt((aro+axx0)**2-4.*asq*axx0))/(2.*asq))
@@ -86,9 +85,14 @@ def t96(parmod,ps,x,y,z):
     #    (1) inside the magnetosphere
     #    (2) in the boundary layer
     #    (3) outside the magnetosphere and b.layer
+    loc = np.where(sigma < (s0-dsig), 1, np.where(sigma < (s0+dsig), 2, 3))
 
     # First of all, consider the cases (1) and (2):
-    if sigma < (s0+dsig):     # cases (1) or (2); calculate the model field (with the potential "penetrated" interconnection field):
+    def model_field(x,y,z, ys,zs):
+        # calculate the model field (with the potential "penetrated" interconnection field):
+        xx=x*xappa
+        yy=y*xappa
+        zz=z*xappa
         cfx,cfy,cfz = dipshld(pps,xx,yy,zz)
         bxrc,byrc,bzrc,bxt2,byt2,bzt2,bxt3,byt3,bzt3 = tailrc96(sps,xx,yy,zz)
         r1x,r1y,r1z = birk1tot_02(pps,xx,yy,zz)
@@ -100,24 +104,34 @@ def t96(parmod,ps,x,y,z):
         fx=cfx*xappa3 + rcampl*bxrc+tampl2*bxt2+tampl3*bxt3+ b1ampl*r1x +b2ampl*r2x +rimfampl*rimfx
         fy=cfy*xappa3 + rcampl*byrc+tampl2*byt2+tampl3*byt3+ b1ampl*r1y +b2ampl*r2y +rimfampl*rimfy
         fz=cfz*xappa3 + rcampl*bzrc+tampl2*bzt2+tampl3*bzt3+ b1ampl*r1z +b2ampl*r2z +rimfampl*rimfz
+        return fx,fy,fz
+
+    # case (1): (x,y,z) is inside the magnetosphere
+    def inside(x,y,z, ys,zs, sigma, oimfy,oimfz):
+        return model_field(x,y,z, ys,zs)
+
+    # case (2): this is the most complex case: we are inside the interpolation region
+    def boundary_layer(x,y,z, ys,zs, sigma, oimfy,oimfz):
+        fx,fy,fz = model_field(x,y,z, ys,zs)
+        fint=0.5*(1.-(sigma-s0)/dsig)
+        fext=0.5*(1.+(sigma-s0)/dsig)
 
-        #  Now, let us check whether we have the case (1). if yes - we are done:
-        if sigma < (s0-dsig):   # (x,y,z) is inside the magnetosphere
-            bx,by,bz = [fx,fy,fz]
-        else:                   # this is the most complex case: we are inside the interpolation region
-            fint=0.5*(1.-(sigma-s0)/dsig)
-            fext=0.5*(1.+(sigma-s0)/dsig)
-
-            qx,qy,qz = dipole(ps,x,y,z)
-            bx=(fx+qx)*fint+oimfx*fext -qx
-            by=(fy+qy)*fint+oimfy*fext -qy
-            bz=(fz+qz)*fint+oimfz*fext -qz
-    # The cases (1) and (2) are exhausted; the only remaining possibility is now the case (3):
-    else:
+        qx,qy,qz = dipole(ps,x,y,z)
+        bx=(fx+qx)*fint+oimfx*fext -qx
+        by=(fy+qy)*fint+oimfy*fext -qy
+        bz=(fz+qz)*fint+oimfz*fext -qz
+        return bx,by,bz
+
+    # case (3): outside the magnetosphere and b.layer
+    def outside(x,y,z, ys,zs, sigma, oimfy,oimfz):
         qx,qy,qz = dipole(ps,x,y,z)
         bx=oimfx-qx
         by=oimfy-qy
         bz=oimfz-qz
+        return bx,by,bz
+
+    bx,by,bz = evaluate_by_region(
+        loc, {1: inside, 2: boundary_layer, 3: outside}, x,y,z, ys,zs, sigma, oimfy,oimfz)
 
     return bx,by,bz
 
@@ -153,13 +167,10 @@ def cylharm(a, x,y,z):
     """
 
     rho=np.sqrt(y**2+z**2)
-    if rho < 1e-8:
-        sinfi=1.
-        cosfi=0.
-        rho=1e-8
-    else:
-        sinfi=z/rho
-        cosfi=y/rho
+    small = rho < 1e-8
+    rho=np.where(small, 1e-8, rho)
+    sinfi=np.where(small, 1., z/rho)
+    cosfi=np.where(small, 0., y/rho)
 
     sinfi2=sinfi**2
     si2co2=sinfi2-cosfi**2
@@ -200,13 +211,10 @@ def cylhar1(a, x,y,z):
     """
 
     rho=np.sqrt(y**2+z**2)
-    if rho < 1e-8:
-        sinfi=1.
-        cosfi=0.
-        rho=1e-8
-    else:
-        sinfi=z/rho
-        cosfi=y/rho
+    small = rho < 1e-8
+    rho=np.where(small, 1e-8, rho)
+    sinfi=np.where(small, 1., z/rho)
+    cosfi=np.where(small, 0., y/rho)
 
     bx,by,bz =[0.]*3
 
@@ -421,8 +429,8 @@ def ringcurr96(x,y,z):
     """
 
     # common /warp/ cpss,spss,dpsrr, xnext(3),xs,zswarped,dxsx,dxsy, dxsz,dzsx,dzsywarped,dzsz,other(4),zs
-    # zs here is without y-z warp
-    global cpss,spss,dpsrr, xnext,xs,zswarped,dxsx,dxsy, dxsz,dzsx,dzsywarped,dzsz,other,zs
+    # zs here is without y-z warp, i.e., zsww in tailrc96
+    global cpss,spss,dpsrr, xnext,xs,zswarped,dxsx,dxsy, dxsz,dzsx,dzsywarped,dzsz,other,zsww
     d0,deltadx,xd,xldx = [2.,0.,0.,4.]  # the rc is now completely symmetric (deltadx=0)
 
     # the original values of f[i] were multiplied by beta[i] (to reduce the number of
@@ -438,20 +446,18 @@ def ringcurr96(x,y,z):
     d=d0+deltadx*fdx
 
     # this is the same simple way to spread out the sheet, as that used in t89
+    zs=zsww
     dzetas=np.sqrt(zs**2+d**2)
     rhos=  np.sqrt(xs**2+y**2)
     ddzetadx=(zs*dzsx+d*dddx)/dzetas
     ddzetady=zs*dzsy/dzetas
     ddzetadz=zs*dzsz/dzetas
 
-    if rhos < 1e-5:
-        drhosdx=0
-        drhosdy=np.sign(y)
-        drhosdz=0
-    else:
-        drhosdx=xs*dxsx/rhos
-        drhosdy=(xs*dxsy+y)/rhos
-        drhosdz=xs*dxsz/rhos
+    small = rhos < 1e-5
+    rhos_ = np.where(small, 1., rhos)
+    drhosdx=np.where(small, 0, xs*dxsx/rhos_)
+    drhosdy=np.where(small, np.sign(y), (xs*dxsy+y)/rhos_)
+    drhosdz=np.where(small, 0, xs*dxsz/rhos_)
 
     [bx,by,bz] = [0.]*3
 
@@ -512,14 +518,11 @@ def taildisk(x,y,z):
     beta = np.array([7.9250000,8.0850000,8.4712500,27.89500])
 
     rhos=np.sqrt((xs-xshift)**2+y**2)
-    if rhos < 1e-5:
-       drhosdx=0
-       drhosdy=np.sign(y)
-       drhosdz=0
-    else:
-       drhosdx=(xs-xshift)*dxsx/rhos
-       drhosdy=((xs-xshift)*dxsy+y)/rhos
-       drhosdz=(xs-xshift)*dxsz/rhos
+    small = rhos < 1e-5
+    rhos_ = np.where(small, 1., rhos)
+    drhosdx=np.where(small, 0, (xs-xshift)*dxsx/rhos_)
+    drhosdy=np.where(small, np.sign(y), ((xs-xshift)*dxsy+y)/rhos_)
+    drhosdz=np.where(small, 0, (xs-xshift)*dxsz/rhos_)
 
     bx,by,bz = [0.]*3
 
@@ -727,15 +730,13 @@ def birk1tot_02(ps, x,y,z):
     cpsas=np.sqrt(1-spsas**2)
     xas = x*cpsas-z*spsas
     zas = x*spsas+z*cpsas
-    pas = 0.
-    if (xas != 0) & (y != 0):
-        pas = np.arctan2(y,xas)
+    pas=np.where((xas != 0) | (y != 0), np.arctan2(y,xas), 0.)
     tas=np.arctan2(np.sqrt(xas**2+y**2),zas)
     stas=np.sin(tas)
     f=stas/(stas**6*(1-r3)+r3)**0.1666666667
 
     tet0=np.arcsin(f)
-    if tas > 1.5707963: tet0=np.pi-tet0
+    tet0=np.where(tas > 1.5707963, np.pi-tet0, tet0)
     dtet=dtetdn*np.sin(pas*0.5)**2
     tetr1n=tnoonn+dtet
     tetr1s=tnoons-dtet
@@ -744,28 +745,33 @@ def birk1tot_02(ps, x,y,z):
     # plasma sheet, southern psbl) does the point (x,y,z) belong to:
     # tetr1s is greater than tetr1n. That's why high lat is when tetr1n<tetr1n-dtet0. -Sheng.
     loc = 0
-    if (tet0 < tetr1n-dtet0) | (tet0 > tetr1s+dtet0):   loc = 1   # high-lat
-    if (tet0 > tetr1n+dtet0) & (tet0 < tetr1s-dtet0):   loc = 2   # pl.sheet
-    if (tet0 >= tetr1n-dtet0) & (tet0 <= tetr1n+dtet0): loc = 3 # north psbl
-    if (tet0 >= tetr1s-dtet0) & (tet0 <= tetr1s+dtet0): loc = 4 # south psbl
+    loc = np.where((tet0 < tetr1n-dtet0) | (tet0 > tetr1s+dtet0), 1, loc)     # high-lat
+    loc = np.where((tet0 > tetr1n+dtet0) & (tet0 < tetr1s-dtet0), 2, loc)     # pl.sheet
+    loc = np.where((tet0 >= tetr1n-dtet0) & (tet0 <= tetr1n+dtet0), 3, loc)   # north psbl
+    loc = np.where((tet0 >= tetr1s-dtet0) & (tet0 <= tetr1s+dtet0), 4, loc)   # south psbl
 
-    bx,by,bz = [0.]*3
     # in the high-lat. region use the subroutine dipoct
-    if loc == 1:
+    def high_lat(x,y,z, r,r3,pas,cpsas,spsas,tetr1n,tetr1s):
+        bx,by,bz = [0.]*3
         xi = [x,y,z,ps]
         d1 = diploop1(xi)
         for i in range(26):
             bx=bx+c1[i]*d1[0,i]
             by=by+c1[i]*d1[1,i]
             bz=bz+c1[i]*d1[2,i]
-    elif loc == 2:
+        return bx,by,bz
+
+    def plasma_sheet(x,y,z, r,r3,pas,cpsas,spsas,tetr1n,tetr1s):
+        bx,by,bz = [0.]*3
         xi = [x,y,z,ps]
         d2 = condip1(xi)
         for i in range(79):
             bx=bx+c2[i]*d2[0,i]
             by=by+c2[i]*d2[1,i]
             bz=bz+c2[i]*d2[2,i]
-    elif loc == 3:
+        return bx,by,bz
+
+    def north_psbl(x,y,z, r,r3,pas,cpsas,spsas,tetr1n,tetr1s):
         t01=tetr1n-dtet0
         t02=tetr1n+dtet0
         sqr=np.sqrt(r)
@@ -811,7 +817,9 @@ def birk1tot_02(ps, x,y,z):
         bx=bx1*(1-frac)+bx2*frac
         by=by1*(1-frac)+by2*frac
         bz=bz1*(1-frac)+bz2*frac
-    elif loc == 4:
+        return bx,by,bz
+
+    def south_psbl(x,y,z, r,r3,pas,cpsas,spsas,tetr1n,tetr1s):
         t01=tetr1s-dtet0
         t02=tetr1s+dtet0
         sqr=np.sqrt(r)
@@ -841,7 +849,7 @@ def birk1tot_02(ps, x,y,z):
         zas2=r*ct02as
         x2= xas2*cpsas+zas2*spsas
         z2=-xas2*spsas+zas2*cpsas
-        xi = [x1,y1,z1,ps]
+        xi = [x2,y2,z2,ps]
         d1 = diploop1(xi)
         # bx2,by2,bz2 are field components in the southern boundary point
         bx2,by2,bz2 = [0.]*3
@@ -857,7 +865,11 @@ def birk1tot_02(ps, x,y,z):
         bx=bx1*(1-frac)+bx2*frac
         by=by1*(1-frac)+by2*frac
         bz=bz1*(1-frac)+bz2*frac
-    else: raise ValueError
+        return bx,by,bz
+
+    bx,by,bz = evaluate_by_region(
+        loc, {1: high_lat, 2: plasma_sheet, 3: north_psbl, 4: south_psbl},
+        x,y,z, r,r3,pas,cpsas,spsas,tetr1n,tetr1s)
 
     # Now, let us add the shielding field
     bsx,bsy,bsz = birk1shld(ps, x,y,z)
@@ -890,7 +902,7 @@ def diploop1(xi):
 
     x,y,z, ps = xi
     sps=np.sin(ps)
-    d = np.empty((3,26))
+    d = np.empty((3,26)+np.broadcast(x,y,z).shape)
 
     for i in range(12):
         r2=(xx1[i]*dipx)**2+(yy1[i]*dipy)**2
@@ -1045,10 +1057,11 @@ def circle(x,y,z,rl):
     e=1+xk2s*(0.44325141463+xk2s*(0.0626060122+xk2s*(0.04757383546+xk2s*0.01736506451)))+\
       dl*xk2s*(0.2499836831+xk2s*(0.09200180037+xk2s*(0.04069697526+xk2s*0.00526449639)))
 
-    if rho > 1e-6:
-        brho=z/(rho2*r2)*(r32/r12*e-k) # this is not exactly the b-rho component - note the additional division by rho
-    else:
-        brho=np.pi*rl/r2*(rl-rho)/r12*z/(r32-rho2)
+    big = rho > 1e-6
+    rho2_ = np.where(big, rho2, 1.)
+    brho=np.where(big,
+        z/(rho2_*r2)*(r32/r12*e-k),     # this is not exactly the b-rho component - note the additional division by rho
+        np.pi*rl/r2*(rl-rho)/r12*z/(r32-rho2))
 
     bx=brho*x
     by=brho*y
@@ -1078,9 +1091,10 @@ def condip1(xi):
     x,y,z, ps = xi
     sps=np.sin(ps)
     cps=np.cos(ps)
-    d = np.empty((3,79))
-    cf = np.empty(5)
-    sf = np.empty(5)
+    shape = np.broadcast(x,y,z).shape
+    d = np.empty((3,79)+shape)
+    cf = np.empty((5,)+shape)
+    sf = np.empty((5,)+shape)
 
     xsm=x*cps-z*sps-dx
     zsm=z*cps+x*sps
@@ -1395,29 +1409,43 @@ def r2_birk(x,y,z, ps):
     zsm=z*cps+x*sps
 
     xks=xksi(xsm,y,zsm)
-    if xks < -(delarg+delarg1):
+    loc=np.where(xks < -(delarg+delarg1), 1,
+        np.where(xks < -delarg+delarg1, 2,
+        np.where(xks < delarg-delarg1, 3,
+        np.where(xks < delarg+delarg1, 4, 5))))
+
+    def outer(xsm,y,zsm, xks):
         # all components are multiplied by the factor -0.02, so that bz=-1 nt at x=-5.3 re, y=z=0
-        bxsm,by,bzsm = np.dot(r2outer(xsm,y,zsm),-0.02)
-    elif (xks < -delarg+delarg1):
+        return np.dot(r2outer(xsm,y,zsm),-0.02)
+
+    def outer_sheet(xsm,y,zsm, xks):
         f2=-0.02*tksi(xks,-delarg,delarg1)
         f1=-0.02-f2
-        bxsm1,by1,bzsm1 = np.dot(r2outer(xsm,y,zsm),f1)
-        bxsm2,by2,bzsm2 = np.dot(r2sheet(xsm,y,zsm),f2)
+        bxsm1,by1,bzsm1 = np.multiply(r2outer(xsm,y,zsm),f1)
+        bxsm2,by2,bzsm2 = np.multiply(r2sheet(xsm,y,zsm),f2)
         bxsm=bxsm1+bxsm2
         by  =by1+by2
         bzsm=bzsm1+bzsm2
-    elif (xks < delarg-delarg1):
-        bxsm,by,bzsm = np.dot(r2outer(xsm,y,zsm),-0.02)
-    elif (xks < delarg+delarg1):
+        return bxsm,by,bzsm
+
+    def sheet(xsm,y,zsm, xks):
+        return np.dot(r2sheet(xsm,y,zsm),-0.02)
+
+    def inner_sheet(xsm,y,zsm, xks):
         f1=-0.02*tksi(xks,delarg,delarg1)
         f2=-0.02-f1
-        bxsm1,by1,bzsm1 = np.dot(r2inner(xsm,y,zsm),f1)
-        bxsm2,by2,bzsm2 = np.dot(r2sheet(xsm,y,zsm),f2)
+        bxsm1,by1,bzsm1 = np.multiply(r2inner(xsm,y,zsm),f1)
+        bxsm2,by2,bzsm2 = np.multiply(r2sheet(xsm,y,zsm),f2)
         bxsm=bxsm1+bxsm2
         by  =by1+by2
         bzsm=bzsm1+bzsm2
-    else:
-        bxsm,by,bzsm = np.dot(r2inner(xsm,y,zsm),-0.02)
+        return bxsm,by,bzsm
+
+    def inner(xsm,y,zsm, xks):
+        return np.dot(r2inner(xsm,y,zsm),-0.02)
+
+    bxsm,by,bzsm = evaluate_by_region(
+        loc, {1: outer, 2: outer_sheet, 3: sheet, 4: inner_sheet, 5: inner}, xsm,y,zsm, xks)
 
     bx=bxsm*cps+bzsm*sps
     bz=bzsm*cps-bxsm*sps
@@ -1447,8 +1475,7 @@ def xksi(x,y,z):
     yr=y/r
     zr=z/r
 
-    if r < r0: pr=0
-    else: pr=np.sqrt((r-r0)**2+dr2)-dr
+    pr=np.where(r < r0, 0, np.sqrt((r-r0)**2+dr2)-dr)
 
     f=x+pr*(a11a12+a21a22*xr+a41a42*xr*xr+a51a52*yr*yr+a61a62*zr*zr)
     g=y+pr*(b11b12*yr+b21b22*xr*yr)
@@ -1459,33 +1486,25 @@ def xksi(x,y,z):
     fgh32=np.sqrt(fgh)**3
     fchsg2=f**2+g2
 
-    if fchsg2 < 1e-5:
-        # this is just for eliminating problems on the z-axis
-        xksi = -1.
-    else:
-        sqfchsg2=np.sqrt(fchsg2)
-        alpha=fchsg2/fgh32
-        theta=tnoon+0.5*dteta*(1-f/sqfchsg2)
-        phi=np.sin(theta)**2
-        xksi=alpha-phi
+    # xksi=-1 for fchsg2 < 1e-5, this is just for eliminating problems on the z-axis
+    onz = fchsg2 < 1e-5
+    fchsg2_=np.where(onz, 1., fchsg2)
+    sqfchsg2=np.sqrt(fchsg2_)
+    alpha=fchsg2_/fgh32
+    theta=tnoon+0.5*dteta*(1-f/sqfchsg2)
+    phi=np.sin(theta)**2
+    xksi=np.where(onz, -1., alpha-phi)
 
     return xksi
 
 def tksi(xksi,xks0,dxksi):
 
     tdz3=2.*dxksi**3
-    if xksi-xks0 < -dxksi:
-        tksii=0.
-    elif xksi < xks0:
-        br3=(xksi-xks0+dxksi)**3
-        tksii=1.5*br3/(tdz3+br3)
-    elif xksi-xks0 < dxksi:
-        br3=(xksi-xks0-dxksi)**3
-        tksii=1.+1.5*br3/(tdz3-br3)
-    elif xksi-xks0 >= dxksi:
-        tksii=1.
-    else:
-        raise ValueError
+    br3m=(xksi-xks0+dxksi)**3
+    br3p=(xksi-xks0-dxksi)**3
+    tksii=np.select(
+        [xksi-xks0 < -dxksi, xksi < xks0, xksi-xks0 < dxksi, xksi-xks0 >= dxksi],
+        [0., 1.5*br3m/(tdz3+br3m), 1.+1.5*br3p/(tdz3-br3p), 1.], np.nan)
 
     return tksii
 
@@ -1750,9 +1769,10 @@ def bconic(x,y,z,nmax):
     :param nmax:
     :return:
     """
-    cbx = np.empty(nmax)
-    cby = np.empty(nmax)
-    cbz = np.empty(nmax)
+    shape = np.broadcast(x,y,z).shape
+    cbx = np.empty((nmax,)+shape)
+    cby = np.empty((nmax,)+shape)
+    cbz = np.empty((nmax,)+shape)
 
     ro2=x**2+y**2
     ro=np.sqrt(ro2)
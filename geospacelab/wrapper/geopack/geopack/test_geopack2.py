@@ -0,0 +1,129 @@
+import unittest
+import datetime
+import os
+import tempfile
+import warnings
+import numpy as np
+from geospacelab.wrapper.geopack.geopack import geopack,t89,t96,t01,t04
+
+
+class ArrayInputs(unittest.TestCase):
+    """The models evaluated over arrays of points should agree with the point-by-point evaluation."""
+
+    ut = (datetime.datetime(2001,1,1,2,3,4)-datetime.datetime(1970,1,1)).total_seconds()
+    ps = -0.533585131
+    parmod = [2,-87,2,-5, 0.5,1.2, 0.3,0.2,0.1,0.4]
+
+    # The array path uses the same formulas as the scalar path, but numpy's vectorized loops may round
+    # differently in the last bit, which is amplified by the numerical derivatives in t01 and t04.
+    rtol = 1e-8
+    atol = 1e-6     # nT
+
+    @classmethod
+    def setUpClass(cls):
+        geopack.recalc(cls.ut)
+
+        rng = np.random.default_rng(2021)
+        n = 100
+        r = rng.uniform(1., 30., n)
+        theta = np.arccos(rng.uniform(-1, 1, n))
+        phi = rng.uniform(0, 2*np.pi, n)
+        x,y,z = geopack.sphcar(r,theta,phi, 1)
+        # points on the axes, where the models switch to the special branches.
+        x[:4] = [-10.,5.,0.,0.]
+        y[:4] = 0.
+        z[:4] = [0.,0.,3.,-4.]
+        cls.xyz = (np.maximum(x, -15.), y, z)     # t01 is not valid beyond x=-20 Re
+
+    def assert_same_as_scalar(self, func):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            b_array = np.array(func(*self.xyz))
+            b_scalar = np.array([func(x,y,z) for x,y,z in zip(*self.xyz)]).T
+        self.assertEqual(b_array.shape, b_scalar.shape)
+        np.testing.assert_allclose(b_array, b_scalar, rtol=self.rtol, atol=self.atol)
+
+    def test_t89(self):
+        self.assert_same_as_scalar(lambda x,y,z: t89.t89(2, self.ps, x,y,z))
+
+    def test_t96(self):
+        self.assert_same_as_scalar(lambda x,y,z: t96.t96(self.parmod, self.ps, x,y,z))
+
+    def test_t01(self):
+        self.assert_same_as_scalar(lambda x,y,z: t01.t01(self.parmod, self.ps, x,y,z))
+
+    def test_t04(self):
+        self.assert_same_as_scalar(lambda x,y,z: t04.t04(self.parmod, self.ps, x,y,z))
+
+    def test_dip(self):
+        self.assert_same_as_scalar(geopack.dip)
+
+    def test_igrf_gsm(self):
+        self.assert_same_as_scalar(geopack.igrf_gsm)
+
+    def test_trace_batch(self):
+        x,y,z = [p[10:30] for p in self.xyz]
+        for exname, parmod in [('t89', 2), ('t96', self.parmod)]:
+            xf,yf,zf, flag, xx,yy,zz = geopack.trace_batch(
+                x,y,z, -1, 10, 1.1, parmod, exname, 'igrf', return_lines=True)
+            for i in range(x.size):
+                xf0,yf0,zf0, xx0,yy0,zz0 = geopack.trace(x[i],y[i],z[i], -1, 10, 1.1, parmod, exname, 'igrf')
+                np.testing.assert_allclose([xf[i],yf[i],zf[i]], [xf0,yf0,zf0], rtol=0, atol=1e-8)
+                npoint = np.sum(np.isfinite(xx[i]))
+                self.assertEqual(npoint, xx0.size)
+                np.testing.assert_allclose(zz[i,:npoint], zz0, rtol=0, atol=1e-8)
+            self.assertTrue(np.all(flag > 0))
+
+    def test_trace_batch_empty(self):
+        for shape in [(0,), (3,0)]:
+            x = np.empty(shape)
+            xf,yf,zf, flag = geopack.trace_batch(x,x,x, -1, 10, 1.1, 2, 't89', 'igrf')
+            for p in (xf,yf,zf,flag):
+                self.assertEqual(p.shape, shape)
+            self.assertTrue(np.issubdtype(flag.dtype, np.integer))
+            xf,yf,zf, flag, xx,yy,zz = geopack.trace_batch(
+                x,x,x, -1, 10, 1.1, 2, 't89', 'igrf', return_lines=True, n_workers=2)
+            for p in (xx,yy,zz):
+                self.assertEqual(p.shape, shape+(0,))
+
+    def test_2d_array(self):
+        x,y,z = [np.reshape(p[:100], (10,10)) for p in self.xyz]
+        b_2d = np.array(t96.t96(self.parmod, self.ps, x,y,z))
+        b_1d = np.array(t96.t96(self.parmod, self.ps, x.ravel(),y.ravel(),z.ravel()))
+        self.assertEqual(b_2d.shape, (3,10,10))
+        np.testing.assert_array_equal(b_2d.reshape(3,-1), b_1d)
+
+    def test_transform_multi_epoch(self):
+        x,y,z = [p[:20] for p in self.xyz]
+        uts = self.ut + np.linspace(0, 86400*100, x.size)
+        xgsm,ygsm,zgsm = geopack.transform(x,y,z, 'gse', 'gsm', ut=uts)
+        xsm,ysm,zsm = geopack.transform(x,y,z, 'geo', 'sm', ut=uts)
+        for i in range(x.size):
+            ctx = geopack.recalc_context(uts[i])
+            np.testing.assert_allclose(
+                [xgsm[i],ygsm[i],zgsm[i]], geopack.gsmgse(x[i],y[i],z[i], -1, ctx=ctx), rtol=0, atol=1e-12)
+            np.testing.assert_allclose(
+                [xsm[i],ysm[i],zsm[i]], geopack.magsm(*geopack.geomag(x[i],y[i],z[i], 1, ctx=ctx), 1, ctx=ctx),
+                rtol=0, atol=1e-12)
+
+
+class CompileIGRF(unittest.TestCase):
+
+    def test_save(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fn_npy = os.path.join(tmp_dir, 'Geopack', 'igrf13coeffs.npy')
+            table = geopack.compile_igrf(fn_npy=fn_npy)
+            np.testing.assert_array_equal(np.load(fn_npy), table)
+            np.testing.assert_array_equal(table, np.load(geopack.igrf_npy_file))
+
+    def test_unwritable(self):
+        # the table is returned and the failure is logged if the file cannot be written.
+        with tempfile.NamedTemporaryFile() as file:
+            fn_npy = os.path.join(file.name, 'igrf13coeffs.npy')
+            with self.assertLogs('StreamLogger', level='WARNING'):
+                table = geopack.compile_igrf(fn_npy=fn_npy)
+        np.testing.assert_array_equal(table, geopack.compile_igrf(fn_npy=None))
+
+
+if __name__ == '__main__':
+    unittest.main()
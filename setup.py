@@ -67,6 +67,12 @@ setuptools.setup(
               'sscws',
               'pandas>=1.5.3',
           ],
+    extras_require={
+        # the interactive dashboards in geospacelab.visualization.plotly
+        'interactive': ['plotly>=5.0', 'anywidget'],
+        # the TLE propagation in geospacelab.observatory.orbit.propagation
+        'orbit': ['sgp4>=2.7'],
+    },
     python_requires='>=3.7',
     # py_modules=["geospacelab"],
     # package_dir={'':'geospacelab'},